@@ -0,0 +1,200 @@
+# app/bars.py
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, NamedTuple, Optional, Sequence
+from app.logger_setup import app_logger
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Columns of the per-symbol history rings, in storage order
+BAR_FIELDS = ("start", "open", "high", "low", "close", "volume", "vwap")
+
+# Positions in the open-bar lists kept per symbol and timeframe
+_START, _OPEN, _HIGH, _LOW, _CLOSE, _VOLUME, _TURNOVER, _LIVE = range(8)
+
+
+class Bar(NamedTuple):
+    symbol: str
+    timeframe: int
+    start: float
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    vwap: float
+
+
+def timeframe_label(seconds: int) -> str:
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+
+class _Symbol:
+    __slots__ = ("row", "last_volume", "bars")
+
+    def __init__(self, row: int, timeframes: int):
+        self.row = row
+        self.last_volume = None
+        self.bars = [[float("-inf"), 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, False] for _ in range(timeframes)]
+
+
+class BarBuilder:
+    """Streaming OHLCV + VWAP bars for every symbol on several timeframes.
+
+    A tick only updates the open bar of each timeframe, held in plain lists, so
+    it costs the same whatever the history length. Completed bars are copied
+    into preallocated NumPy rings of `history` bars per symbol and timeframe,
+    handed to subscribers and, when `persist` is on, queued for export().
+    Bars are aligned to the epoch and only exist for periods that saw a tick;
+    sweep() closes bars whose period ended without a later tick.
+    """
+
+    def __init__(self, timeframes: Sequence[int] = (1, 60, 300), history: int = 500, capacity: int = 1024,
+                 persist: bool = False, max_pending: int = 100000, time_source: Callable[[], float] = time.time):
+        import numpy as np
+        self.timeframes = tuple(sorted(int(tf) for tf in timeframes))
+        self.history = history
+        self.time_source = time_source
+        self.capacity = capacity
+        self._symbols: Dict[str, _Symbol] = {}
+        self._rings = [np.zeros((capacity, history, len(BAR_FIELDS))) for _ in self.timeframes]
+        self._counts = [np.zeros(capacity, dtype=np.int64) for _ in self.timeframes]
+        self._subscribers: List[tuple] = []
+        self.persist = persist
+        self._pending: Optional[Deque[Bar]] = deque(maxlen=max_pending) if persist else None
+
+    def subscribe(self, callback: Callable[[Bar], None], timeframe: Optional[int] = None):
+        """Calls `callback(bar)` on the event loop for each completed bar, optionally of one timeframe only."""
+        self._subscribers.append((callback, timeframe))
+
+    def unsubscribe(self, callback: Callable[[Bar], None]):
+        self._subscribers = [(cb, tf) for cb, tf in self._subscribers if cb != callback]
+
+    def _add_symbol(self, symbol: str) -> _Symbol:
+        import numpy as np
+        row = len(self._symbols)
+        if row == self.capacity:
+            grow = self.capacity
+            self._rings = [np.concatenate([ring, np.zeros_like(ring[:grow])]) for ring in self._rings]
+            self._counts = [np.concatenate([counts, np.zeros_like(counts[:grow])]) for counts in self._counts]
+            self.capacity += grow
+        entry = self._symbols[symbol] = _Symbol(row, len(self.timeframes))
+        return entry
+
+    def on_tick(self, symbol: str, price: float, cumulative_volume=None, ts: Optional[float] = None):
+        """Folds one trade price into the open bars. `cumulative_volume` is the day volume (`v`) from the feed."""
+        if ts is None:
+            ts = self.time_source()
+        entry = self._symbols.get(symbol)
+        if entry is None:
+            entry = self._add_symbol(symbol)
+        quantity = 0.0
+        if cumulative_volume is not None:
+            volume = float(cumulative_volume)
+            last = entry.last_volume
+            if last is not None and volume > last:
+                quantity = volume - last
+            entry.last_volume = volume
+        turnover = price * quantity
+        timeframes = self.timeframes
+        for i, bar in enumerate(entry.bars):
+            start = ts - ts % timeframes[i]
+            if start > bar[_START]:
+                if bar[_LIVE]:
+                    self._complete(symbol, entry, i, bar)
+                bar[:] = (start, price, price, price, price, quantity, turnover, True)
+            elif bar[_LIVE]:
+                if price > bar[_HIGH]:
+                    bar[_HIGH] = price
+                elif price < bar[_LOW]:
+                    bar[_LOW] = price
+                bar[_CLOSE] = price
+                bar[_VOLUME] += quantity
+                bar[_TURNOVER] += turnover
+            # Otherwise a late tick for a bar sweep() already closed; it is dropped
+
+    def _complete(self, symbol: str, entry: _Symbol, i: int, bar: list):
+        volume = bar[_VOLUME]
+        # Without traded volume the VWAP falls back to the close
+        vwap = bar[_TURNOVER] / volume if volume > 0 else bar[_CLOSE]
+        counts = self._counts[i]
+        row = entry.row
+        self._rings[i][row, counts[row] % self.history] = (
+            bar[_START], bar[_OPEN], bar[_HIGH], bar[_LOW], bar[_CLOSE], volume, vwap
+        )
+        counts[row] += 1
+        bar[_LIVE] = False
+        if self._pending is None and not self._subscribers:
+            return
+        completed = Bar(symbol, self.timeframes[i], bar[_START], bar[_OPEN], bar[_HIGH], bar[_LOW], bar[_CLOSE],
+                        volume, vwap)
+        if self._pending is not None:
+            self._pending.append(completed)
+        for callback, timeframe in self._subscribers:
+            if timeframe is None or timeframe == completed.timeframe:
+                try:
+                    callback(completed)
+                except Exception as e:
+                    app_logger.error("Bar subscriber %s failed: %s", getattr(callback, '__qualname__', callback), e,
+                                     exc_info=True)
+
+    def sweep(self, now: Optional[float] = None):
+        """Completes open bars whose period has ended. Meant to run on a timer about once per shortest timeframe."""
+        if now is None:
+            now = self.time_source()
+        timeframes = self.timeframes
+        for symbol, entry in self._symbols.items():
+            for i, bar in enumerate(entry.bars):
+                if bar[_LIVE] and bar[_START] + timeframes[i] <= now:
+                    self._complete(symbol, entry, i, bar)
+
+    def current(self, symbol: str, timeframe: int) -> Optional[Bar]:
+        """The bar still being built, if there is one."""
+        entry = self._symbols.get(symbol)
+        if entry is None:
+            return None
+        bar = entry.bars[self.timeframes.index(timeframe)]
+        if not bar[_LIVE]:
+            return None
+        vwap = bar[_TURNOVER] / bar[_VOLUME] if bar[_VOLUME] > 0 else bar[_CLOSE]
+        return Bar(symbol, timeframe, bar[_START], bar[_OPEN], bar[_HIGH], bar[_LOW], bar[_CLOSE], bar[_VOLUME], vwap)
+
+    def history_of(self, symbol: str, timeframe: int, count: Optional[int] = None) -> Dict[str, "np.ndarray"]:
+        """The last `count` completed bars (all kept ones by default), oldest first, as one array per BAR_FIELDS column."""
+        import numpy as np
+        entry = self._symbols.get(symbol)
+        i = self.timeframes.index(timeframe)
+        total = int(self._counts[i][entry.row]) if entry else 0
+        kept = min(total, self.history, count if count is not None else self.history)
+        if kept == 0:
+            return {field: np.empty(0) for field in BAR_FIELDS}
+        positions = np.arange(total - kept, total) % self.history
+        rows = self._rings[i][entry.row, positions]
+        return {field: rows[:, column] for column, field in enumerate(BAR_FIELDS)}
+
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
+
+    def export(self, influxdb_manager, limit: int = 5000):
+        """Writes queued completed bars to the `bars` measurement in batches of `limit`. Call off the event loop."""
+        if not self._pending:
+            return
+        while self._pending:
+            batch = []
+            while self._pending and len(batch) < limit:
+                bar = self._pending.popleft()
+                batch.append({
+                    "measurement": "bars",
+                    "fields": {
+                        "open": bar.open, "high": bar.high, "low": bar.low, "close": bar.close,
+                        "volume": bar.volume, "vwap": bar.vwap,
+                    },
+                    "tags": {"symbol": bar.symbol, "timeframe": timeframe_label(bar.timeframe)},
+                    "time": int(bar.start * 1e9),
+                })
+            influxdb_manager.write_points(batch)
\ No newline at end of file
@@ -0,0 +1,318 @@
+# app/clock.py
+import abc
+import math
+import time
+import asyncio
+from datetime import datetime, time as dtime
+from typing import Callable, List, Optional, Union
+from app.logger_setup import app_logger
+
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4
+
+
+class Timer:
+    __slots__ = ("when", "tick", "callback", "args", "interval", "cancelled")
+
+    def __init__(self, when: float, callback: Callable, args: tuple, interval: Optional[float] = None):
+        self.when = when
+        self.tick = 0
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """Hierarchical timing wheel (4 levels of 64 slots) keyed by integer ticks.
+
+    Scheduling and cancelling are O(1); a timer is moved down a level at most
+    three times before it expires. Timers further out than 64**4 ticks park in
+    the top level and are re-filed each time it comes round.
+    """
+
+    def __init__(self, current_tick: int = 0):
+        self.current_tick = current_tick
+        self.wheels: List[List[List[Timer]]] = [[[] for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self.filed = [0] * LEVELS
+        self.pending = 0
+
+    def add(self, timer: Timer):
+        timer.tick = max(timer.tick, self.current_tick + 1)
+        self.pending += 1
+        self._file(timer)
+
+    def _file(self, timer: Timer):
+        delta = timer.tick - self.current_tick
+        tick = timer.tick
+        for level in range(LEVELS):
+            if delta < 1 << (SLOT_BITS * (level + 1)):
+                break
+        else:
+            level = LEVELS - 1
+            tick = self.current_tick + (1 << (SLOT_BITS * LEVELS)) - 1
+        self.wheels[level][(tick >> (SLOT_BITS * level)) & SLOT_MASK].append(timer)
+        self.filed[level] += 1
+
+    def next_tick(self) -> Optional[int]:
+        """Earliest tick at which expire() has work to do, or None when empty."""
+        if not self.pending:
+            return None
+        current = self.current_tick
+        best = None
+        if self.filed[0]:
+            level0 = self.wheels[0]
+            for offset in range(1, SLOTS):
+                if level0[(current + offset) & SLOT_MASK]:
+                    best = current + offset
+                    break
+        for level in range(1, LEVELS):
+            shift = SLOT_BITS * level
+            boundary = ((current >> shift) + 1) << shift
+            if best is not None and best <= boundary:
+                # Upper levels only cascade at or after this boundary
+                break
+            if not self.filed[level]:
+                continue
+            slots = self.wheels[level]
+            first_index = (boundary >> shift) & SLOT_MASK
+            for offset in range(SLOTS):
+                if slots[(first_index + offset) & SLOT_MASK]:
+                    candidate = boundary + (offset << shift)
+                    if best is None or candidate < best:
+                        best = candidate
+                    break
+        return best
+
+    def expire(self, tick: int) -> List[Timer]:
+        """Moves to `tick` and returns the timers due there. Nothing may be due before `tick`."""
+        self.current_tick = tick
+        if not tick & SLOT_MASK:
+            for level in range(1, LEVELS):
+                index = (tick >> (SLOT_BITS * level)) & SLOT_MASK
+                slot = self.wheels[level][index]
+                self.wheels[level][index] = []
+                self.filed[level] -= len(slot)
+                for timer in slot:
+                    self._file(timer)
+                if index:
+                    break
+        index = tick & SLOT_MASK
+        slot = self.wheels[0][index]
+        self.wheels[0][index] = []
+        self.filed[0] -= len(slot)
+        due = []
+        for timer in slot:
+            if timer.tick > tick:
+                self._file(timer)
+            else:
+                self.pending -= 1
+                if not timer.cancelled:
+                    due.append(timer)
+        return due
+
+
+class Clock(abc.ABC):
+    """Time source and timer service shared by the strategy and simulation components.
+
+    `time()` is epoch seconds and `now()` a naive local datetime, like
+    time.time() and datetime.now(). Timers are kept on a TimerWheel with
+    `resolution`-second ticks; callbacks may be plain functions or coroutine
+    functions.
+    """
+
+    def __init__(self, resolution: float):
+        self.resolution = resolution
+        self.wheel = TimerWheel(self._current_tick(self.time()))
+
+    @abc.abstractmethod
+    def time(self) -> float:
+        ...
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.time())
+
+    def at_time_of_day(self, when: dtime) -> datetime:
+        return datetime.combine(self.now().date(), when)
+
+    @abc.abstractmethod
+    async def sleep(self, seconds: float):
+        ...
+
+    async def sleep_until(self, when: Union[float, datetime]):
+        await self.sleep(self._timestamp(when) - self.time())
+
+    def call_at(self, when: Union[float, datetime], callback: Callable, *args) -> Timer:
+        return self._schedule(Timer(self._timestamp(when), callback, args))
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Timer:
+        return self._schedule(Timer(self.time() + delay, callback, args))
+
+    def call_every(self, interval: float, callback: Callable, *args, first: Optional[Union[float, datetime]] = None) -> Timer:
+        """Runs `callback` every `interval` seconds. Intervals missed during a stall are skipped, not replayed."""
+        if interval <= 0:
+            raise ValueError(f"interval must be positive, got {interval}")
+        when = self._timestamp(first) if first is not None else self.time() + interval
+        return self._schedule(Timer(when, callback, args, interval))
+
+    def close(self):
+        pass
+
+    def _timestamp(self, when: Union[float, datetime]) -> float:
+        return when.timestamp() if isinstance(when, datetime) else float(when)
+
+    # The epsilon keeps a deadline and the time it is advanced to on the same tick despite float rounding
+    def _deadline_tick(self, timestamp: float) -> int:
+        return math.ceil(timestamp / self.resolution - 1e-6)
+
+    def _current_tick(self, timestamp: float) -> int:
+        return math.floor(timestamp / self.resolution + 1e-6)
+
+    def _schedule(self, timer: Timer) -> Timer:
+        timer.tick = self._deadline_tick(timer.when)
+        self.wheel.add(timer)
+        return timer
+
+    def _run_due(self, target_tick: int):
+        wheel = self.wheel
+        while True:
+            tick = wheel.next_tick()
+            if tick is None or tick > target_tick:
+                break
+            self._on_tick(tick)
+            for timer in wheel.expire(tick):
+                self._fire(timer)
+        if wheel.current_tick < target_tick:
+            wheel.current_tick = target_tick
+
+    def _on_tick(self, tick: int):
+        pass
+
+    def _fire(self, timer: Timer):
+        try:
+            result = timer.callback(*timer.args)
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result)
+        except Exception as e:
+            app_logger.error(f"Timer callback {getattr(timer.callback, '__qualname__', timer.callback)} failed: {e}", exc_info=True)
+        if timer.interval and not timer.cancelled:
+            now = self.time()
+            timer.when += timer.interval
+            if timer.when <= now:
+                timer.when += math.ceil((now - timer.when) / timer.interval) * timer.interval
+                if timer.when <= now:
+                    timer.when += timer.interval
+            self._schedule(timer)
+
+
+class RealClock(Clock):
+    """Wall-clock time. A single driver task sleeps until the next timer is due."""
+
+    def __init__(self, resolution: float = 0.01):
+        super().__init__(resolution)
+        self._driver: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(max(0.0, seconds))
+
+    def _schedule(self, timer: Timer) -> Timer:
+        super()._schedule(timer)
+        if self._driver is None:
+            self._wakeup = asyncio.Event()
+            self._driver = asyncio.get_running_loop().create_task(self._drive())
+        self._wakeup.set()
+        return timer
+
+    async def _drive(self):
+        try:
+            while True:
+                self._wakeup.clear()
+                self._run_due(self._current_tick(self.time()))
+                next_tick = self.wheel.next_tick()
+                timeout = None if next_tick is None else max(0.0, next_tick * self.resolution - self.time())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            pass
+
+    def close(self):
+        if self._driver:
+            self._driver.cancel()
+            self._driver = None
+
+
+class SimulatedClock(Clock):
+    """Virtual time that only moves when advanced.
+
+    `run(coro)` drives a whole session: whenever the event loop has nothing
+    ready to run, time jumps straight to the next timer or sleep. Awaiting
+    real I/O does not hold virtual time back, so use it with fakes that
+    complete promptly.
+    """
+
+    def __init__(self, start: Optional[Union[float, datetime]] = None, resolution: float = 0.001):
+        self._now = self._timestamp(start) if start is not None else time.time()
+        super().__init__(resolution)
+
+    def time(self) -> float:
+        return self._now
+
+    async def sleep(self, seconds: float):
+        future = asyncio.get_running_loop().create_future()
+        self.call_later(max(0.0, seconds), lambda: future.done() or future.set_result(None))
+        await future
+
+    def advance(self, seconds: float):
+        """Moves time forward by `seconds`, firing every timer due on the way."""
+        target = self._now + seconds
+        self._run_due(self._current_tick(target))
+        self._now = max(self._now, target)
+
+    def advance_to_next(self) -> bool:
+        next_tick = self.wheel.next_tick()
+        if next_tick is None:
+            return False
+        self._run_due(next_tick)
+        return True
+
+    def _on_tick(self, tick: int):
+        self._now = max(self._now, tick * self.resolution)
+
+    async def run(self, coro):
+        task = asyncio.ensure_future(coro)
+        while not task.done():
+            await self._settle()
+            if task.done():
+                break
+            if not self.advance_to_next():
+                # Nothing scheduled in virtual time; the session is waiting on real I/O
+                await asyncio.sleep(0.001)
+        return task.result()
+
+    @staticmethod
+    async def _settle():
+        # Yields until every other task is parked on a pending future. Reading the
+        # tasks rather than the loop's ready queue works on any loop, uvloop included
+        current = asyncio.current_task()
+        while True:
+            await asyncio.sleep(0)
+            if not any(
+                task is not current and not task.done()
+                and (task._fut_waiter is None or task._fut_waiter.done())
+                for task in asyncio.all_tasks()
+            ):
+                return
\ No newline at end of file
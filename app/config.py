@@ -2,55 +2,179 @@ import os
 import logging
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
+from app.rules import Rules, load_rules
 
 logger = logging.getLogger(__name__)
 
 class Config:
-    def __init__(self, rules_file: str):
+    def __init__(self, rules_file: str, env: Optional[Dict[str, str]] = None):
         load_dotenv()
-        self._rules: Dict[str, Any] = self._load_rules(rules_file)
-
-    def _load_rules(self, file_path: str) -> Dict[str, Any]:
-        import yaml
-        if not os.path.exists(file_path):
-            logger.error(f"Rules file not found: {file_path}")
-            return {}
+        self.rules_file = rules_file
+        # Per-account overrides of the environment, e.g. credentials and state dirs of one supervised account
+        self.env = {key: str(value) for key, value in (env or {}).items()}
         try:
-            with open(file_path, 'r') as file:
-                return yaml.safe_load(file)
+            self.rules: Rules = load_rules(rules_file)
         except Exception as e:
-            logger.error(f"Error loading rules from {file_path}: {e}", exc_info=True)
-            return {}
+            logger.error(f"Invalid rules file {rules_file}: {e}")
+            raise
 
     def get_config(self, key: str, default: Optional[Any] = None) -> Any:
-        return os.environ.get(key, default)
+        return self.env[key] if key in self.env else os.environ.get(key, default)
     
     def get_rule(self, key: str, default: Optional[Any] = None) -> Any:
-        return self._rules.get(key, default)
+        """Raw value from the rules file. Prefer the typed attributes on `self.rules`."""
+        return self.rules.raw.get(key, default)
 
     def get_redis_config(self) -> Dict[str, Any]:
         return {
-            "host": os.environ.get("REDIS_HOST", "localhost"),
-            "port": int(os.environ.get("REDIS_PORT", 6379)),
+            "host": self.get_config("REDIS_HOST", "localhost"),
+            "port": int(self.get_config("REDIS_PORT", 6379)),
+            "unix_socket": self.get_config("REDIS_UNIX_SOCKET"),
+            "max_connections": int(self.get_config("REDIS_MAX_CONNECTIONS", 32)),
+            "pubsub_max_connections": int(self.get_config("REDIS_PUBSUB_MAX_CONNECTIONS", 4)),
         }
 
     def get_influxdb_config(self) -> Dict[str, Any]:
         return {
-            "url": os.environ.get("INFLUXDB_URL"),
-            "token": os.environ.get("INFLUXDB_TOKEN"),
-            "org": os.environ.get("INFLUXDB_ORG"),
-            "bucket": os.environ.get("INFLUXDB_BUCKET"),
+            "url": self.get_config("INFLUXDB_URL"),
+            "token": self.get_config("INFLUXDB_TOKEN"),
+            "org": self.get_config("INFLUXDB_ORG"),
+            "bucket": self.get_config("INFLUXDB_BUCKET"),
+            # Window of the downsampling tasks for high-rate measurements; empty leaves the tasks alone
+            "downsample_every": self.get_config("INFLUXDB_DOWNSAMPLE_EVERY", "1m"),
+            "downsample_bucket": self.get_config("INFLUXDB_DOWNSAMPLE_BUCKET") or None,
         }
 
     def get_user_credentials(self) -> Dict[str, str]:
         return {
-            "user": os.environ.get("API_USER"),
-            "pwd": os.environ.get("API_PWD"),
-            "vc": os.environ.get("API_VC"),
-            "app_key": os.environ.get("API_KEY"),
-            "secret": os.environ.get("API_SECRET"),
-            "imei": os.environ.get("API_IMEI"),
+            "user": self.get_config("API_USER"),
+            "pwd": self.get_config("API_PWD"),
+            "vc": self.get_config("API_VC"),
+            "app_key": self.get_config("API_KEY"),
+            "secret": self.get_config("API_SECRET"),
+            "imei": self.get_config("API_IMEI"),
+        }
+
+    def get_state_config(self) -> Dict[str, Any]:
+        return {
+            "state_dir": self.get_config("STATE_DIR", "state"),
+            "snapshot_interval": float(self.get_config("STATE_SNAPSHOT_INTERVAL", 5)),
+            "fsync": self.get_config("STATE_FSYNC", "true").lower() == "true",
+        }
+
+    def get_journal_config(self) -> Dict[str, Any]:
+        # An empty JOURNAL_DIR turns the columnar trade journal off
+        return {
+            "root": self.get_config("JOURNAL_DIR", "journal"),
+            "strategy": self.get_config("JOURNAL_STRATEGY", "straddle"),
+            "flush_interval": float(self.get_config("JOURNAL_FLUSH_INTERVAL", 5)),
+            "pnl_interval": float(self.get_config("JOURNAL_PNL_INTERVAL", 1)),
+        }
+
+    def get_bar_config(self) -> Dict[str, Any]:
+        # Comma-separated bar timeframes in seconds; empty turns the bar builder off
+        timeframes = self.get_config("BAR_TIMEFRAMES", "1,60,300")
+        return {
+            "timeframes": [int(tf) for tf in timeframes.split(",") if tf.strip()],
+            "history": int(self.get_config("BAR_HISTORY", 500)),
+            "persist_interval": float(self.get_config("BAR_PERSIST_INTERVAL", 10)),
+        }
+
+    def get_iv_surface_config(self) -> Dict[str, Any]:
+        # Strikes each side of the money to subscribe for the IV surface; 0 turns it off
+        return {
+            "strikes_each_side": int(self.get_config("IV_SURFACE_STRIKES", 0)),
+            "expiries": int(self.get_config("IV_SURFACE_EXPIRIES", 1)),
+            "rate": float(self.get_config("IV_SURFACE_RATE", 0.0)),
+            "refit_interval": float(self.get_config("IV_SURFACE_REFIT_INTERVAL", 1)),
+            "refit_fraction": float(self.get_config("IV_SURFACE_REFIT_FRACTION", 0.2)),
+        }
+
+    def get_websocket_config(self) -> Dict[str, Any]:
+        # WS_TOKEN_STALE_AFTER flags a single token stale after that many silent seconds; 0 leaves quiet tokens alone
+        return {
+            "heartbeat_interval": float(self.get_config("WS_HEARTBEAT_INTERVAL", 0.5)),
+            "stall_timeout": float(self.get_config("WS_STALL_TIMEOUT", 5.0)),
+            "token_stale_after": float(self.get_config("WS_TOKEN_STALE_AFTER", 0)),
+            "reconnect_backoff": float(self.get_config("WS_RECONNECT_BACKOFF", 0.5)),
+            "max_reconnect_backoff": float(self.get_config("WS_RECONNECT_MAX_BACKOFF", 30)),
+        }
+
+    def get_session_cache_file(self) -> Optional[str]:
+        # Empty disables reuse of the broker session token across restarts
+        return self.get_config("SESSION_CACHE_FILE", os.path.join(self.get_config("STATE_DIR", "state"), "session.json")) or None
+
+    def get_broker_config(self) -> Dict[str, Any]:
+        return {
+            "max_workers": int(self.get_config("BROKER_GATEWAY_WORKERS", 4)),
+            "rate_limit": float(self.get_config("BROKER_ORDER_RATE_LIMIT", 10)),
+            "burst": int(self.get_config("BROKER_ORDER_BURST", 10)),
+            "timeout": float(self.get_config("BROKER_REQUEST_TIMEOUT", 5)),
+        }
+
+    def get_rest_config(self) -> Dict[str, Any]:
+        # Quotes, limits and SPAN reads; a TTL of 0 turns caching of that read off
+        return {
+            "rate_limit": float(self.get_config("NOREN_REST_RATE_LIMIT", 20)),
+            "burst": int(self.get_config("NOREN_REST_BURST", 20)),
+            "timeout": float(self.get_config("NOREN_REST_TIMEOUT", 5)),
+            "max_connections": int(self.get_config("NOREN_REST_MAX_CONNECTIONS", 8)),
+            "quote_ttl": float(self.get_config("NOREN_QUOTE_CACHE_TTL", 0.5)),
+            "limits_ttl": float(self.get_config("NOREN_LIMITS_CACHE_TTL", 5)),
+            "span_ttl": float(self.get_config("NOREN_SPAN_CACHE_TTL", 30)),
+        }
+
+    def get_diagnostics_config(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.get_config("DIAGNOSTICS", "false").lower() == "true",
+            "lag_threshold_ms": float(self.get_config("DIAG_LOOP_LAG_MS", 100)),
+            "cpu_accounting": self.get_config("DIAG_CPU_ACCOUNTING", "true").lower() == "true",
+            "tracemalloc_interval": float(self.get_config("DIAG_TRACEMALLOC_INTERVAL", 0)),
+            "profile_signal": self.get_config("DIAG_PROFILE_SIGNAL", "SIGUSR1"),
+            "profile_seconds": float(self.get_config("DIAG_PROFILE_SECONDS", 10)),
+            "report_interval": float(self.get_config("DIAG_REPORT_INTERVAL", 60)),
+        }
+
+    def get_clock_config(self) -> Dict[str, Any]:
+        # simulated: replay the session in virtual time; the start is an ISO datetime, else today's start_time
+        return {
+            "mode": self.get_config("CLOCK", "real").lower(),
+            "start": self.get_config("SIMULATED_CLOCK_START") or None,
         }
 
+    def get_event_loop(self) -> str:
+        # asyncio, uvloop, or auto for uvloop when installed; diagnostics' CPU accounting needs asyncio
+        return self.get_config("EVENT_LOOP", "asyncio")
+
+    def get_rules_reload_interval(self) -> float:
+        # 0 disables hot reload of the rules file
+        return float(self.get_config("RULES_RELOAD_INTERVAL", 1.0))
+
+    def get_latency_sample_every(self) -> int:
+        # 0 disables tick latency stamping
+        return int(self.get_config("LATENCY_SAMPLE_EVERY", 10))
+
+    def get_order_id_block_size(self) -> int:
+        return int(self.get_config("ORDER_ID_BLOCK_SIZE", 100))
+
+    def get_account_name(self) -> str:
+        # Set per account by the supervisor; namespaces the account's order keys and order update channel
+        return self.get_config("ACCOUNT_NAME", "")
+
+    def get_supervisor_config(self) -> Dict[str, Any]:
+        # SUPERVISOR_WORKERS of 0 runs one worker process per core; WORKER_HANG_TIMEOUT of 0 never kills a silent worker
+        return {
+            "accounts_file": self.get_config("ACCOUNTS_FILE", "/app/creds/accounts.yaml"),
+            "workers": int(self.get_config("SUPERVISOR_WORKERS", 0)) or os.cpu_count() or 1,
+            "feed_account": self.get_config("FEED_ACCOUNT") or None,
+            "report_interval": float(self.get_config("WORKER_REPORT_INTERVAL", 5)),
+            "hang_timeout": float(self.get_config("WORKER_HANG_TIMEOUT", 30)),
+            "restart_backoff": float(self.get_config("WORKER_RESTART_BACKOFF", 1)),
+            "max_restart_backoff": float(self.get_config("WORKER_RESTART_MAX_BACKOFF", 60)),
+        }
+
+    def get_shared_feed_sync_interval(self) -> float:
+        return float(self.get_config("FEED_SYNC_INTERVAL", 5))
+
     def get_simulation_duration(self) -> int:
-        return int(os.environ.get("SIMULATION_DURATION", 60))
\ No newline at end of file
+        return int(self.get_config("SIMULATION_DURATION", 60))
\ No newline at end of file
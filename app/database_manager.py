@@ -1,36 +1,72 @@
 import redis.asyncio as aioredis
-from influxdb_client import InfluxDBClient
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from app.config import Config
+from app.metrics import RedisMetrics
 import logging
 
+if TYPE_CHECKING:
+    from influxdb_client import InfluxDBClient
+
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
     def __init__(self, config: Config):
         self.config = config
         self.redis: Optional[aioredis.Redis] = None
-        self.influxdb: Optional[InfluxDBClient] = None
+        self.redis_pubsub: Optional[aioredis.Redis] = None
+        self.influxdb: Optional["InfluxDBClient"] = None
+        self.redis_metrics = RedisMetrics()
+
+    def _create_redis_pool(self, max_connections: int) -> aioredis.ConnectionPool:
+        redis_config = self.config.get_redis_config()
+        if redis_config.get('unix_socket'):
+            return aioredis.ConnectionPool(
+                connection_class=aioredis.UnixDomainSocketConnection,
+                path=redis_config.get('unix_socket'),
+                max_connections=max_connections,
+            )
+        return aioredis.ConnectionPool(
+            host=redis_config.get('host'),
+            port=redis_config.get('port'),
+            max_connections=max_connections,
+        )
 
     async def connect_redis(self) -> aioredis.Redis:
+        """Pooled client for commands and pipelines."""
         if self.redis and await self.redis.ping():
             logger.info("Reusing existing Redis connection.")
             return self.redis
         try:
             redis_config = self.config.get_redis_config()
-            self.redis = await aioredis.from_url(
-                f"redis://{redis_config.get('host')}:{redis_config.get('port')}"
-            )
-            logger.info("Connected to Redis.")
+            pool = self._create_redis_pool(redis_config.get('max_connections'))
+            self.redis = aioredis.Redis(connection_pool=pool)
+            await self.redis.ping()
+            logger.info(f"Connected to Redis (command pool, max {redis_config.get('max_connections')} connections).")
             return self.redis
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}", exc_info=True)
             raise
 
-    def connect_influxdb(self) -> InfluxDBClient:
+    async def connect_redis_pubsub(self) -> aioredis.Redis:
+        """Separate pool for long-lived pub/sub subscriptions so they never starve commands."""
+        if self.redis_pubsub and await self.redis_pubsub.ping():
+            return self.redis_pubsub
+        try:
+            redis_config = self.config.get_redis_config()
+            pool = self._create_redis_pool(redis_config.get('pubsub_max_connections'))
+            self.redis_pubsub = aioredis.Redis(connection_pool=pool)
+            await self.redis_pubsub.ping()
+            logger.info(f"Connected to Redis (pub/sub pool, max {redis_config.get('pubsub_max_connections')} connections).")
+            return self.redis_pubsub
+        except Exception as e:
+            logger.error(f"Failed to connect to Redis pub/sub pool: {e}", exc_info=True)
+            raise
+
+    def connect_influxdb(self) -> "InfluxDBClient":
         if self.influxdb:
             return self.influxdb
         try:
+            from influxdb_client import InfluxDBClient
             influxdb_config = self.config.get_influxdb_config()
             self.influxdb = InfluxDBClient(
                 url=influxdb_config.get('url'),
@@ -45,9 +81,13 @@ class DatabaseManager:
 
     async def close(self):
         try:
+            for client in (self.redis, self.redis_pubsub):
+                if client:
+                    await client.close()
+                    await client.connection_pool.disconnect()
             if self.redis:
-                await self.redis.close()
-                logger.info("Redis connection closed.")
+                self.redis_metrics.log_summary()
+                logger.info("Redis connection pools closed.")
             if self.influxdb:
                 self.influxdb.close()
                 logger.info("InfluxDB connection closed.")
@@ -0,0 +1,334 @@
+# app/diagnostics.py
+import os
+import sys
+import time
+import signal
+import asyncio
+import threading
+import traceback
+import tracemalloc
+from collections import Counter
+from typing import Optional
+from app.logger_setup import app_logger
+from app.metrics import LatencyHistogram
+from app.event_loop import running_loop_name
+
+
+class LoopWatchdog:
+    """Detects event-loop stalls from a separate thread and samples the loop's stack while stalled.
+
+    A heartbeat coroutine on the loop records when it last ran and how late its
+    sleep woke up (loop lag). The watchdog thread wakes every `check_interval`
+    seconds; when the heartbeat is older than `threshold_ms` it captures the loop
+    thread's current stack once per stall and logs it when the stall ends.
+    """
+
+    def __init__(self, threshold_ms: float = 100.0, heartbeat_interval: float = 0.02):
+        self.threshold = threshold_ms / 1000
+        self.heartbeat_interval = min(heartbeat_interval, self.threshold / 4)
+        self.check_interval = max(0.005, self.threshold / 4)
+        self.lag = LatencyHistogram()
+        self.stalls = 0
+        self.max_stall = 0.0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _heartbeat(self):
+        try:
+            while True:
+                before = time.monotonic()
+                await asyncio.sleep(self.heartbeat_interval)
+                now = time.monotonic()
+                self.lag.record(int((now - before - self.heartbeat_interval) * 1e9))
+                self._last_beat = now
+        except asyncio.CancelledError:
+            pass
+
+    def _watch(self):
+        stalled_stack = None
+        stall_started = 0.0
+        while not self._stop.wait(self.check_interval):
+            since_beat = time.monotonic() - self._last_beat
+            if since_beat > self.threshold:
+                if stalled_stack is None:
+                    stall_started = self._last_beat
+                    frame = sys._current_frames().get(self._loop_thread_id)
+                    stalled_stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+            elif stalled_stack is not None:
+                duration = self._last_beat - stall_started
+                self.stalls += 1
+                self.max_stall = max(self.max_stall, duration)
+                app_logger.warning(
+                    f"Event loop blocked for ~{duration * 1000:.0f} ms (threshold {self.threshold * 1000:.0f} ms). "
+                    f"Loop stack while blocked:\n{stalled_stack}"
+                )
+                stalled_stack = None
+
+    async def stop(self):
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+        if self._thread:
+            self._thread.join(timeout=1)
+
+
+class CallbackCpuAccounting:
+    """Attributes the CPU and wall time of every loop callback to its owning coroutine.
+
+    Wraps asyncio.Handle._run, so it covers task steps and plain callbacks alike.
+    The wrapper is process-wide and only installed while diagnostics are enabled.
+    """
+
+    _original_run = None
+
+    def __init__(self):
+        self.cpu_ns = Counter()
+        self.wall_ns = Counter()
+        self.calls = Counter()
+        self.slowest = Counter()
+
+    def install(self):
+        if CallbackCpuAccounting._original_run is not None:
+            return
+        original_run = asyncio.events.Handle._run
+        CallbackCpuAccounting._original_run = original_run
+        accounting = self
+
+        def _run(handle):
+            wall_start = time.perf_counter_ns()
+            cpu_start = time.thread_time_ns()
+            try:
+                original_run(handle)
+            finally:
+                accounting._record(handle, time.thread_time_ns() - cpu_start, time.perf_counter_ns() - wall_start)
+
+        asyncio.events.Handle._run = _run
+
+    def uninstall(self):
+        if CallbackCpuAccounting._original_run is not None:
+            asyncio.events.Handle._run = CallbackCpuAccounting._original_run
+            CallbackCpuAccounting._original_run = None
+
+    def _record(self, handle, cpu_ns: int, wall_ns: int):
+        callback = handle._callback
+        owner = getattr(callback, "__self__", None)
+        if isinstance(owner, asyncio.Task):
+            coro = owner.get_coro()
+            name = getattr(coro, "__qualname__", None) or repr(coro)
+        else:
+            name = getattr(callback, "__qualname__", None) or repr(callback)
+        self.cpu_ns[name] += cpu_ns
+        self.wall_ns[name] += wall_ns
+        self.calls[name] += 1
+        if wall_ns > self.slowest[name]:
+            self.slowest[name] = wall_ns
+
+    def top(self, limit: int = 10):
+        return [
+            {
+                "name": name,
+                "cpu_ms": cpu_ns / 1e6,
+                "wall_ms": self.wall_ns[name] / 1e6,
+                "calls": self.calls[name],
+                "slowest_ms": self.slowest[name] / 1e6,
+            }
+            for name, cpu_ns in self.cpu_ns.most_common(limit)
+        ]
+
+    def reset(self):
+        for counter in (self.cpu_ns, self.wall_ns, self.calls, self.slowest):
+            counter.clear()
+
+
+class SamplingProfiler:
+    """On-demand statistical profile of the loop thread, written as folded stacks for flamegraph.pl / speedscope."""
+
+    def __init__(self, output_dir: str = "logs", duration: float = 10.0, interval_ms: float = 5.0):
+        self.output_dir = output_dir
+        self.duration = duration
+        self.interval = interval_ms / 1000
+        self._running = threading.Event()
+
+    def trigger(self, thread_id: int):
+        if self._running.is_set():
+            app_logger.info("Sampling profile already in progress.")
+            return
+        self._running.set()
+        threading.Thread(target=self._sample, args=(thread_id,), name="sampling-profiler", daemon=True).start()
+
+    def _sample(self, thread_id: int):
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + self.duration
+        try:
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    stacks[";".join(reversed(stack))] += 1
+                    samples += 1
+                time.sleep(self.interval)
+
+            path = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+            with open(path, "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            app_logger.info(f"Sampling profile written to {path} ({samples} samples over {self.duration:.0f}s)")
+        except Exception as e:
+            app_logger.error(f"Sampling profiler failed: {e}", exc_info=True)
+        finally:
+            self._running.clear()
+
+
+class MemorySnapshots:
+    """Periodic tracemalloc snapshots, logging the top allocation growth since the previous one."""
+
+    def __init__(self, interval: float, top: int = 10, frames: int = 1):
+        self.interval = interval
+        self.top = top
+        self.frames = frames
+        self._previous = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                # Taking and diffing a snapshot is heavy, keep it off the loop thread
+                await asyncio.to_thread(self.take_snapshot)
+        except asyncio.CancelledError:
+            pass
+
+    def take_snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"tracemalloc: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB"]
+        if self._previous is not None:
+            for stat in snapshot.compare_to(self._previous, "lineno")[:self.top]:
+                lines.append(f"  {stat}")
+        self._previous = snapshot
+        app_logger.info("\n".join(lines))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class Diagnostics:
+    def __init__(self, influxdb_manager=None, lag_threshold_ms: float = 100.0, cpu_accounting: bool = True,
+                 tracemalloc_interval: float = 0.0, profile_signal: str = "SIGUSR1", profile_seconds: float = 10.0,
+                 profile_interval_ms: float = 5.0, report_interval: float = 60.0, output_dir: str = "logs"):
+        self.influxdb_manager = influxdb_manager
+        self.watchdog = LoopWatchdog(lag_threshold_ms)
+        self.cpu_accounting = CallbackCpuAccounting() if cpu_accounting else None
+        self.memory = MemorySnapshots(tracemalloc_interval) if tracemalloc_interval > 0 else None
+        self.profiler = SamplingProfiler(output_dir, profile_seconds, profile_interval_ms)
+        self.profile_signal = getattr(signal, profile_signal, None) if profile_signal else None
+        self.report_interval = report_interval
+        self._loop_thread_id: Optional[int] = None
+        self._report_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self.watchdog.start()
+        if self.cpu_accounting and running_loop_name() == 'uvloop':
+            # uvloop runs its callbacks in C and never calls asyncio.Handle._run
+            app_logger.warning("Callback CPU accounting is not available on uvloop; disabled.")
+            self.cpu_accounting = None
+        if self.cpu_accounting:
+            self.cpu_accounting.install()
+        if self.memory:
+            self.memory.start()
+        if self.profile_signal is not None:
+            try:
+                asyncio.get_running_loop().add_signal_handler(self.profile_signal, self.trigger_profile)
+            except (NotImplementedError, RuntimeError) as e:
+                app_logger.warning(f"Cannot install profile signal handler: {e}")
+        self._report_task = asyncio.create_task(self._report_periodically())
+        app_logger.info("Diagnostics enabled: loop watchdog, CPU accounting and on-demand profiling.")
+
+    def trigger_profile(self):
+        self.profiler.trigger(self._loop_thread_id)
+
+    async def _report_periodically(self):
+        try:
+            while True:
+                await asyncio.sleep(self.report_interval)
+                self.report()
+        except asyncio.CancelledError:
+            pass
+
+    def report(self):
+        lag = self.watchdog.lag.summary()
+        app_logger.info(
+            f"Loop health: lag p50 {lag['p50_us']:.0f}us, p99 {lag['p99_us']:.0f}us, max {lag['max_us']:.0f}us, "
+            f"{self.watchdog.stalls} stalls (max {self.watchdog.max_stall * 1000:.0f} ms)"
+        )
+        points = [{"measurement": "loop_health", "fields": dict(lag, stalls=self.watchdog.stalls), "tags": {}}]
+        if self.cpu_accounting:
+            top = self.cpu_accounting.top()
+            for entry in top:
+                app_logger.info(
+                    f"  CPU {entry['cpu_ms']:.1f} ms / wall {entry['wall_ms']:.1f} ms over {entry['calls']} steps "
+                    f"(slowest {entry['slowest_ms']:.1f} ms): {entry['name']}"
+                )
+                points.append({
+                    "measurement": "coroutine_cpu",
+                    "fields": {k: v for k, v in entry.items() if k != "name"},
+                    "tags": {"coroutine": entry["name"]},
+                })
+            self.cpu_accounting.reset()
+        if self.influxdb_manager:
+            self.influxdb_manager.write_points(points)
+        self.watchdog.lag.reset()
+
+    async def stop(self):
+        if self._report_task:
+            self._report_task.cancel()
+            try:
+                await self._report_task
+            except asyncio.CancelledError:
+                pass
+        self.report()
+        if self.profile_signal is not None:
+            try:
+                asyncio.get_running_loop().remove_signal_handler(self.profile_signal)
+            except (NotImplementedError, RuntimeError):
+                pass
+        if self.cpu_accounting:
+            self.cpu_accounting.uninstall()
+        if self.memory:
+            await self.memory.stop()
+        await self.watchdog.stop()
\ No newline at end of file
@@ -0,0 +1,55 @@
+# app/event_loop.py
+# Which event loop the process runs on. uvloop (libuv, with the loop, its
+# transports and its callback scheduling in C) cuts the per-await overhead
+# that the many small Redis round trips of each tick pay. The standard asyncio
+# loop is the default: callback CPU accounting (app/diagnostics.py) needs it,
+# and uvloop is opted into with EVENT_LOOP=uvloop, or 'auto' to take it when
+# installed.
+import sys
+import asyncio
+from typing import Any, Callable, Coroutine
+from app.logger_setup import app_logger
+
+EVENT_LOOPS = ('auto', 'uvloop', 'asyncio')
+
+
+def resolve(name: str = 'asyncio') -> str:
+    """The loop `name` asks for, as it can be had here: 'uvloop' or 'asyncio'."""
+    if name not in EVENT_LOOPS:
+        raise ValueError(f"Unknown event loop '{name}'; expected one of {', '.join(EVENT_LOOPS)}")
+    if name == 'asyncio':
+        return 'asyncio'
+    try:
+        import uvloop  # noqa: F401
+        return 'uvloop'
+    except ImportError:
+        if name == 'uvloop':
+            app_logger.warning("EVENT_LOOP=uvloop but uvloop is not installed; using the asyncio loop.")
+        return 'asyncio'
+
+
+def loop_factory(name: str = 'asyncio') -> Callable[[], asyncio.AbstractEventLoop]:
+    if resolve(name) == 'uvloop':
+        import uvloop
+        return uvloop.new_event_loop
+    return asyncio.new_event_loop
+
+
+def run(main: Coroutine[Any, Any, Any], name: str = 'asyncio') -> Any:
+    """asyncio.run on the chosen loop implementation."""
+    name = resolve(name)
+    factory = loop_factory(name)
+    app_logger.info(f"Running on the {name} event loop.")
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=factory) as runner:
+            return runner.run(main)
+    # Before 3.11 the loop can only be chosen through the policy
+    if factory is not asyncio.new_event_loop:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(main)
+
+
+def running_loop_name() -> str:
+    """'uvloop' or 'asyncio', for the loop of the calling coroutine."""
+    return 'uvloop' if type(asyncio.get_running_loop()).__module__.startswith('uvloop') else 'asyncio'
\ No newline at end of file
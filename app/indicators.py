@@ -0,0 +1,299 @@
+# app/indicators.py
+# Incremental indicators for the tick and bar streams. Every update() does a
+# fixed amount of work into state allocated up front, and each class has a
+# batch() that computes the same series over recorded data in one vectorised
+# pass (pandas/NumPy), for backtests. Until an indicator has seen a full window
+# its value is NaN, the same as batch().
+import math
+from collections import deque
+from typing import Optional
+
+NAN = float("nan")
+
+
+class EMA:
+    """Exponential moving average seeded with the first value."""
+
+    def __init__(self, period: Optional[int] = None, alpha: Optional[float] = None):
+        if alpha is None:
+            if not period or period < 1:
+                raise ValueError("EMA needs a period >= 1 or an alpha")
+            alpha = 2.0 / (period + 1)
+        self.alpha = alpha
+        self.value = NAN
+        self.ready = False
+
+    def update(self, x: float) -> float:
+        if self.ready:
+            self.value += self.alpha * (x - self.value)
+        else:
+            self.value = x
+            self.ready = True
+        return self.value
+
+    def reset(self):
+        self.value = NAN
+        self.ready = False
+
+    @staticmethod
+    def batch(values, period: Optional[int] = None, alpha: Optional[float] = None):
+        import pandas as pd
+        alpha = alpha if alpha is not None else 2.0 / (period + 1)
+        return pd.Series(values, dtype=float).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+class RollingStats:
+    """Mean and sample standard deviation over the last `window` values.
+
+    The window slides with Welford-style add/remove updates rather than
+    running sums, so a long session doesn't lose precision.
+    """
+
+    def __init__(self, window: int):
+        if window < 2:
+            raise ValueError("RollingStats needs a window >= 2")
+        self.window = window
+        self._ring = [0.0] * window
+        self._count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._count >= self.window
+
+    def update(self, x: float):
+        window = self.window
+        slot = self._count % window
+        if self._count < window:
+            n = self._count + 1
+            delta = x - self.mean
+            self.mean += delta / n
+            self._m2 += delta * (x - self.mean)
+        else:
+            old = self._ring[slot]
+            previous_mean = self.mean
+            self.mean += (x - old) / window
+            self._m2 += (x - old) * (x - self.mean + old - previous_mean)
+            if self._m2 < 0.0:
+                self._m2 = 0.0
+        self._ring[slot] = x
+        self._count += 1
+
+    @property
+    def std(self) -> float:
+        if self._count < self.window:
+            return NAN
+        return math.sqrt(self._m2 / (self.window - 1))
+
+    def reset(self):
+        self._count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    @staticmethod
+    def batch(values, window: int):
+        """(mean, std) arrays over `values`, NaN until the first full window."""
+        import pandas as pd
+        rolling = pd.Series(values, dtype=float).rolling(window)
+        return rolling.mean().to_numpy(), rolling.std().to_numpy()
+
+
+class ZScore:
+    """How many rolling standard deviations the latest value is from the rolling mean."""
+
+    def __init__(self, window: int):
+        self.stats = RollingStats(window)
+        self.value = NAN
+
+    @property
+    def ready(self) -> bool:
+        return self.stats.ready
+
+    def update(self, x: float) -> float:
+        stats = self.stats
+        stats.update(x)
+        std = stats.std
+        self.value = (x - stats.mean) / std if std > 0.0 else NAN
+        return self.value
+
+    def reset(self):
+        self.stats.reset()
+        self.value = NAN
+
+    @staticmethod
+    def batch(values, window: int):
+        import numpy as np
+        import pandas as pd
+        series = pd.Series(values, dtype=float)
+        rolling = series.rolling(window)
+        std = rolling.std().to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (series.to_numpy() - rolling.mean().to_numpy()) / std
+        return np.where(std > 0.0, z, np.nan)
+
+
+class RealizedVolatility:
+    """Standard deviation of the last `window` log returns, scaled by sqrt(`periods_per_year`).
+
+    Feed it prices at a fixed interval (e.g. 1s bar closes) for an annualised
+    figure; with the default scale of 1 it is per update.
+    """
+
+    def __init__(self, window: int, periods_per_year: float = 1.0):
+        self.stats = RollingStats(window)
+        self.scale = math.sqrt(periods_per_year)
+        self._last = NAN
+        self.value = NAN
+
+    @property
+    def ready(self) -> bool:
+        return self.stats.ready
+
+    def update(self, price: float) -> float:
+        last = self._last
+        self._last = price
+        if last > 0.0 and price > 0.0:
+            self.stats.update(math.log(price / last))
+            self.value = self.stats.std * self.scale
+        return self.value
+
+    def reset(self):
+        self.stats.reset()
+        self._last = NAN
+        self.value = NAN
+
+    @staticmethod
+    def batch(prices, window: int, periods_per_year: float = 1.0):
+        import numpy as np
+        import pandas as pd
+        prices = np.asarray(prices, dtype=float)
+        returns = np.full(len(prices), np.nan)
+        returns[1:] = np.log(prices[1:] / prices[:-1])
+        std = pd.Series(returns[1:]).rolling(window).std().to_numpy()
+        result = np.full(len(prices), np.nan)
+        result[1:] = std * math.sqrt(periods_per_year)
+        return result
+
+
+class ATR:
+    """Average true range over bars, with Wilder's smoothing seeded by the first true range."""
+
+    def __init__(self, period: int = 14):
+        self.ema = EMA(alpha=1.0 / period)
+        self._previous_close = NAN
+
+    @property
+    def value(self) -> float:
+        return self.ema.value
+
+    @property
+    def ready(self) -> bool:
+        return self.ema.ready
+
+    def update(self, high: float, low: float, close: float) -> float:
+        previous = self._previous_close
+        self._previous_close = close
+        true_range = high - low
+        if previous == previous:
+            true_range = max(true_range, abs(high - previous), abs(low - previous))
+        return self.ema.update(true_range)
+
+    def reset(self):
+        self.ema.reset()
+        self._previous_close = NAN
+
+    @staticmethod
+    def batch(high, low, close, period: int = 14):
+        import numpy as np
+        high, low, close = (np.asarray(a, dtype=float) for a in (high, low, close))
+        previous = np.empty_like(close)
+        previous[0] = np.nan
+        previous[1:] = close[:-1]
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+        return EMA.batch(true_range, alpha=1.0 / period)
+
+
+class VWAP:
+    """Volume-weighted average price since the last reset(), typically the session open."""
+
+    def __init__(self):
+        self._turnover = 0.0
+        self._volume = 0.0
+        self.value = NAN
+
+    @property
+    def ready(self) -> bool:
+        return self._volume > 0.0
+
+    def update(self, price: float, volume: float) -> float:
+        if volume > 0.0:
+            self._turnover += price * volume
+            self._volume += volume
+            self.value = self._turnover / self._volume
+        return self.value
+
+    def reset(self):
+        self._turnover = 0.0
+        self._volume = 0.0
+        self.value = NAN
+
+    @staticmethod
+    def batch(prices, volumes):
+        import numpy as np
+        prices, volumes = np.asarray(prices, dtype=float), np.asarray(volumes, dtype=float)
+        volumes = np.where(volumes > 0.0, volumes, 0.0)
+        cumulative_volume = np.cumsum(volumes)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(cumulative_volume > 0.0, np.cumsum(prices * volumes) / cumulative_volume, np.nan)
+
+
+class RollingMax:
+    """Maximum of the last `window` values, kept with a monotonic deque of positions (amortised O(1))."""
+
+    _keep_larger = True
+
+    def __init__(self, window: int):
+        self.window = window
+        self._ring = [0.0] * window
+        self._positions = deque()
+        self._count = 0
+        self.value = NAN
+
+    @property
+    def ready(self) -> bool:
+        return self._count >= self.window
+
+    def update(self, x: float) -> float:
+        window, ring, positions, i = self.window, self._ring, self._positions, self._count
+        # Expire before writing: the slot about to be overwritten belongs to position i - window
+        if positions and positions[0] <= i - window:
+            positions.popleft()
+        ring[i % window] = x
+        if self._keep_larger:
+            while positions and ring[positions[-1] % window] <= x:
+                positions.pop()
+        else:
+            while positions and ring[positions[-1] % window] >= x:
+                positions.pop()
+        positions.append(i)
+        self._count = i + 1
+        self.value = ring[positions[0] % window] if self._count >= window else NAN
+        return self.value
+
+    def reset(self):
+        self._positions.clear()
+        self._count = 0
+        self.value = NAN
+
+    @classmethod
+    def batch(cls, values, window: int):
+        import pandas as pd
+        rolling = pd.Series(values, dtype=float).rolling(window)
+        return (rolling.max() if cls._keep_larger else rolling.min()).to_numpy()
+
+
+class RollingMin(RollingMax):
+    """Minimum of the last `window` values."""
+
+    _keep_larger = False
\ No newline at end of file
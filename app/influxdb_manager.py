@@ -1,23 +1,98 @@
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
-from datetime import datetime
+import re
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Union
 from app.logger_setup import app_logger
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+TimeLike = Union[str, datetime, None]
+
+# High-rate measurements written by PositionManager and the aggregates their
+# downsampling tasks keep. The first aggregate keeps the field name, the rest
+# are written as `<field>_<fn>`.
+DOWNSAMPLED_MEASUREMENTS = {
+    "pnl": ("last", "min", "max"),
+    "positions": ("last",),
+}
+
+_DURATION_RE = re.compile(r"(\d+)(ms|s|m|h|d|w)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_]\w*$")
+
+
+def parse_duration(value: str) -> timedelta:
+    """Flux duration literal such as `90s`, `1h30m` or `-2d` as a timedelta."""
+    body = value[1:] if value.startswith("-") else value
+    parts = _DURATION_RE.findall(body)
+    if not parts or "".join(n + u for n, u in parts) != body:
+        raise ValueError(f"Invalid duration: {value!r}")
+    seconds = sum(int(n) * _DURATION_UNITS[u] for n, u in parts)
+    return timedelta(seconds=-seconds if value.startswith("-") else seconds)
+
+
+def _flux_string(value) -> str:
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("${", "\\${")
+    return f'"{value}"'
+
+
+def _flux_time(value: Union[str, datetime]) -> str:
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        # Naive datetimes are UTC, the same as the timestamps write_data stamps
+        return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    try:
+        parse_duration(value)
+        return value
+    except ValueError:
+        return _flux_time(datetime.fromisoformat(value.replace("Z", "+00:00")))
+
+
+def _utc(value: TimeLike, now: datetime) -> datetime:
+    if value is None:
+        return now
+    if isinstance(value, str) and not value.startswith("-"):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return now + parse_duration(value)
+
+
+def _flux_any(column: str, values) -> str:
+    if isinstance(values, (str, int, float)):
+        values = [values]
+    return " or ".join(f'r[{_flux_string(column)}] == {_flux_string(v)}' for v in values)
+
+
 class InfluxDBManager:
     def __init__(self, url, token, org, bucket, send_data_to_influxdb):
-        self.client = InfluxDBClient(url=url, token=token)
-        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
-        self.query_api = self.client.query_api()
+        self.url = url
+        self.token = token
+        self.client = None
+        self.write_api = None
+        self.query_api = None
         self.bucket = bucket
         self.org = org
         self.send_data_to_influxdb = send_data_to_influxdb
 
+    def connect(self):
+        # influxdb_client is slow to import, so the client is built on first use or during startup warm-up
+        if self.client is None:
+            from influxdb_client import InfluxDBClient
+            from influxdb_client.client.write_api import SYNCHRONOUS
+            self.client = InfluxDBClient(url=self.url, token=self.token)
+            self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+            self.query_api = self.client.query_api()
+        return self.client
+
     def write_data(self, measurement, fields, tags=None):
         if not self.send_data_to_influxdb:
             app_logger.debug(f"InfluxDB data push is disabled. Skipping write for measurement: {measurement}")
             return
 
         try:
+            self.connect()
             point = self._create_point(measurement, fields, tags)
             self.write_api.write(bucket=self.bucket, org=self.org, record=point)
         except Exception as e:
@@ -29,12 +104,14 @@ class InfluxDBManager:
             return
 
         try:
+            self.connect()
             influx_points = [self._create_point(**point) for point in points]
             self.write_api.write(bucket=self.bucket, org=self.org, record=influx_points)
         except Exception as e:
             app_logger.error(f"Error writing multiple points to InfluxDB: {e}")
 
-    def _create_point(self, measurement, fields, tags=None):
+    def _create_point(self, measurement, fields, tags=None, time=None):
+        from influxdb_client import Point, WritePrecision
         point = Point(measurement)
         for key, value in fields.items():
             if isinstance(value, (int, float)):
@@ -44,29 +121,167 @@ class InfluxDBManager:
         if tags:
             for key, value in tags.items():
                 point = point.tag(key, str(value))
-        return point.time(datetime.utcnow(), WritePrecision.NS)
+        # `time` is epoch nanoseconds for points that carry their own timestamp, such as bars
+        return point.time(datetime.utcnow() if time is None else time, WritePrecision.NS)
 
     def query_data(self, measurement, start="-1h"):
         try:
-            query = f'''
-            from(bucket:"{self.bucket}")
-                |> range(start: {start})
-                |> filter(fn: (r) => r._measurement == "{measurement}")
-            '''
-            result = self.query_api.query(org=self.org, query=query)
-
-            for table in result:
-                for record in table.records:
-                    yield {
-                        'time': record.get_time(),
-                        'measurement': record.get_measurement(),
-                        'field': record.get_field(),
-                        'value': record.get_value()
-                    }
+            query = self.build_query(measurement, start, pivot=False)
+            self.connect()
+            # Streamed record by record instead of materialising every table first
+            for record in self.query_api.query_stream(org=self.org, query=query):
+                yield {
+                    'time': record.get_time(),
+                    'measurement': record.get_measurement(),
+                    'field': record.get_field(),
+                    'value': record.get_value()
+                }
         except Exception as e:
             app_logger.error(f"Error querying data from InfluxDB: {e}")
             yield None
 
+    def build_query(self, measurement: str, start: TimeLike = "-1h", stop: TimeLike = None,
+                    fields: Optional[Sequence[str]] = None, tags: Optional[Dict[str, object]] = None,
+                    every: Optional[str] = None, fn: str = "mean", pivot: bool = True,
+                    limit: Optional[int] = None, bucket: Optional[str] = None) -> str:
+        """Flux that filters, downsamples and pivots in the server rather than in Python.
+
+        `tags` maps a tag to a value or a list of accepted values. With `every`,
+        each field is reduced to one `fn` value per window. With `pivot`, rows
+        are one per timestamp with a column per field.
+        """
+        if not _IDENTIFIER_RE.match(fn):
+            raise ValueError(f"Invalid aggregate function: {fn!r}")
+        stop_clause = f", stop: {_flux_time(stop)}" if stop is not None else ""
+        lines = [
+            f"from(bucket: {_flux_string(bucket or self.bucket)})",
+            f"    |> range(start: {_flux_time(start)}{stop_clause})",
+            f"    |> filter(fn: (r) => r._measurement == {_flux_string(measurement)})",
+        ]
+        if fields:
+            lines.append(f"    |> filter(fn: (r) => {_flux_any('_field', fields)})")
+        for tag, values in (tags or {}).items():
+            lines.append(f"    |> filter(fn: (r) => {_flux_any(tag, values)})")
+        if every:
+            parse_duration(every)
+            lines.append(f"    |> aggregateWindow(every: {every}, fn: {fn}, createEmpty: false)")
+        if pivot:
+            lines.append('    |> drop(columns: ["_start", "_stop"])')
+            lines.append('    |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")')
+        if limit:
+            lines.append(f"    |> limit(n: {int(limit)})")
+        return "\n".join(lines)
+
+    def _time_slices(self, start: TimeLike, stop: TimeLike, chunk: Optional[str], every: Optional[str]):
+        if not chunk:
+            yield start, stop
+            return
+        now = datetime.now(timezone.utc)
+        begin, end = _utc(start, now), _utc(stop, now)
+        step = parse_duration(chunk)
+        align = parse_duration(every) if every else None
+        if step <= timedelta(0) or (align and step < align):
+            raise ValueError(f"Chunk {chunk!r} must be positive and at least one window")
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        while begin < end:
+            boundary = min(begin + step, end)
+            if align and boundary < end:
+                # Keep every aggregate window inside a single slice
+                boundary = epoch + (boundary - epoch) // align * align
+            yield begin, boundary
+            begin = boundary
+
+    def query_frames(self, measurement: str, start: TimeLike = "-1h", stop: TimeLike = None,
+                     chunk: Optional[str] = None, **query_options) -> Iterator["pd.DataFrame"]:
+        """Yields pandas DataFrames as they are parsed off the response.
+
+        `chunk` (e.g. `"1h"`) splits the range into one query per slice so only
+        one slice is in memory at a time. Other options are build_query's.
+        """
+        try:
+            self.connect()
+            for begin, end in self._time_slices(start, stop, chunk, query_options.get("every")):
+                query = self.build_query(measurement, begin, end, **query_options)
+                for frame in self.query_api.query_data_frame_stream(query, org=self.org):
+                    if len(frame):
+                        yield frame.drop(columns=["result", "table"], errors="ignore")
+        except Exception as e:
+            app_logger.error(f"Error streaming {measurement} from InfluxDB: {e}")
+
+    def query_frame(self, measurement: str, start: TimeLike = "-1h", stop: TimeLike = None,
+                    chunk: Optional[str] = None, **query_options) -> "pd.DataFrame":
+        import pandas as pd
+        frames = list(self.query_frames(measurement, start, stop, chunk, **query_options))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def query_csv(self, measurement: str, start: TimeLike = "-1h", stop: TimeLike = None,
+                  chunk: Optional[str] = None, **query_options) -> Iterator[List[str]]:
+        """Yields plain CSV rows (header first) straight off the HTTP response."""
+        from influxdb_client import Dialect
+        dialect = Dialect(header=True, annotations=[], delimiter=",", date_time_format="RFC3339")
+        header = None
+        try:
+            self.connect()
+            for begin, end in self._time_slices(start, stop, chunk, query_options.get("every")):
+                query = self.build_query(measurement, begin, end, **query_options)
+                for row in self.query_api.query_csv(query, org=self.org, dialect=dialect):
+                    if not row or row == header:
+                        continue
+                    if header is None:
+                        header = row
+                    yield row
+        except Exception as e:
+            app_logger.error(f"Error exporting {measurement} from InfluxDB as CSV: {e}")
+
+    def downsampling_task_flux(self, measurement: str, aggregates: Sequence[str], every: str,
+                               target_bucket: Optional[str] = None) -> str:
+        parse_duration(every)
+        name = f"{measurement}_{every}"
+        source = (
+            f"from(bucket: {_flux_string(self.bucket)})\n"
+            f"    |> range(start: -task.every)\n"
+            f"    |> filter(fn: (r) => r._measurement == {_flux_string(measurement)})"
+        )
+        streams = []
+        for i, fn in enumerate(aggregates):
+            if not _IDENTIFIER_RE.match(fn):
+                raise ValueError(f"Invalid aggregate function: {fn!r}")
+            stream = f"data |> aggregateWindow(every: task.every, fn: {fn}, createEmpty: false)"
+            if i:
+                stream += f' |> map(fn: (r) => ({{r with _field: r._field + "_{fn}"}}))'
+            streams.append(stream)
+        combined = streams[0] if len(streams) == 1 else "union(tables: [\n    " + ",\n    ".join(streams) + ",\n])"
+        return (
+            f'option task = {{name: "downsample_{name}", every: {every}, offset: 10s}}\n\n'
+            f"data = {source}\n\n"
+            f"{combined}\n"
+            f'    |> set(key: "_measurement", value: {_flux_string(name)})\n'
+            f"    |> to(bucket: {_flux_string(target_bucket or self.bucket)}, org: {_flux_string(self.org)})\n"
+        )
+
+    def ensure_downsampling_tasks(self, every: str = "1m", target_bucket: Optional[str] = None) -> bool:
+        """Creates or updates InfluxDB tasks that roll DOWNSAMPLED_MEASUREMENTS up into
+        `<measurement>_<every>`, so dashboards and research over long ranges need not scan raw points."""
+        try:
+            from influxdb_client.domain.task_create_request import TaskCreateRequest
+            self.connect()
+            tasks_api = self.client.tasks_api()
+            for measurement, aggregates in DOWNSAMPLED_MEASUREMENTS.items():
+                flux = self.downsampling_task_flux(measurement, aggregates, every, target_bucket)
+                name = f"downsample_{measurement}_{every}"
+                existing = [task for task in tasks_api.find_tasks(name=name) if task.name == name]
+                if not existing:
+                    tasks_api.create_task(task_create_request=TaskCreateRequest(org=self.org, flux=flux, status="active"))
+                    app_logger.info(f"Created InfluxDB downsampling task {name}.")
+                elif existing[0].flux != flux:
+                    existing[0].flux = flux
+                    tasks_api.update_task(existing[0])
+                    app_logger.info(f"Updated InfluxDB downsampling task {name}.")
+            return True
+        except Exception as e:
+            app_logger.error(f"Error setting up InfluxDB downsampling tasks: {e}")
+            return False
+
     def write_test_point(self):
         self.write_data("tick_data", {"last_price": 100.0})
 
@@ -74,4 +289,5 @@ class InfluxDBManager:
         return list(self.query_data("tick_data"))
 
     def close(self):
-        self.client.close()
\ No newline at end of file
+        if self.client:
+            self.client.close()
\ No newline at end of file
@@ -0,0 +1,428 @@
+# app/iv_surface.py
+import math
+import time
+import asyncio
+import threading
+from datetime import date, datetime, time as dtime
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+from app.logger_setup import app_logger
+
+YEAR_SECONDS = 365.0 * 86400
+MIN_EXPIRY_YEARS = 60.0 / YEAR_SECONDS
+SQRT_2PI = math.sqrt(2.0 * math.pi)
+SQRT_2 = math.sqrt(2.0)
+
+
+def _cdf(x: float) -> float:
+    return 0.5 * math.erfc(-x / SQRT_2)
+
+
+def _pdf(x: float) -> float:
+    return math.exp(-0.5 * x * x) / SQRT_2PI
+
+
+def black76_price(forward: float, strike: float, years: float, vol: float, is_call: bool, rate: float = 0.0) -> float:
+    discount = math.exp(-rate * years)
+    if vol <= 0.0 or years <= 0.0:
+        intrinsic = forward - strike if is_call else strike - forward
+        return discount * max(intrinsic, 0.0)
+    sd = vol * math.sqrt(years)
+    d1 = math.log(forward / strike) / sd + 0.5 * sd
+    d2 = d1 - sd
+    if is_call:
+        return discount * (forward * _cdf(d1) - strike * _cdf(d2))
+    return discount * (strike * _cdf(-d2) - forward * _cdf(-d1))
+
+
+def black76_greeks(forward: float, strike: float, years: float, vol: float, is_call: bool,
+                   rate: float = 0.0) -> Dict[str, float]:
+    """Price and greeks with respect to the futures price. Vega is per vol point, theta per calendar day."""
+    years = max(years, MIN_EXPIRY_YEARS)
+    discount = math.exp(-rate * years)
+    root = math.sqrt(years)
+    sd = vol * root
+    d1 = math.log(forward / strike) / sd + 0.5 * sd
+    d2 = d1 - sd
+    density = _pdf(d1)
+    if is_call:
+        price = discount * (forward * _cdf(d1) - strike * _cdf(d2))
+        delta = discount * _cdf(d1)
+    else:
+        price = discount * (strike * _cdf(-d2) - forward * _cdf(-d1))
+        delta = -discount * _cdf(-d1)
+    theta = -discount * forward * density * vol / (2.0 * root) + rate * price
+    return {
+        "price": price,
+        "iv": vol,
+        "delta": delta,
+        "gamma": discount * density / (forward * sd),
+        "vega": discount * forward * density * root / 100.0,
+        "theta": theta / 365.0,
+    }
+
+
+def implied_vol(price: float, forward: float, strike: float, years: float, is_call: bool, rate: float = 0.0,
+                tolerance: float = 1e-6, max_iterations: int = 50) -> Optional[float]:
+    """Black-76 implied volatility by safeguarded Newton; None when the price is outside no-arbitrage bounds."""
+    years = max(years, MIN_EXPIRY_YEARS)
+    discount = math.exp(-rate * years)
+    undiscounted = price / discount
+    intrinsic = max(forward - strike if is_call else strike - forward, 0.0)
+    upper = forward if is_call else strike
+    if not intrinsic < undiscounted < upper:
+        return None
+    root = math.sqrt(years)
+    low, high = 1e-4, 5.0
+    # Brenner-Subrahmanyam guess, good near the money
+    vol = min(max(SQRT_2PI * (undiscounted - 0.5 * intrinsic) / (forward * root), 0.05), 2.0)
+    log_moneyness = math.log(forward / strike)
+    for _ in range(max_iterations):
+        sd = vol * root
+        d1 = log_moneyness / sd + 0.5 * sd
+        d2 = d1 - sd
+        if is_call:
+            model = forward * _cdf(d1) - strike * _cdf(d2)
+        else:
+            model = strike * _cdf(-d2) - forward * _cdf(-d1)
+        diff = model - undiscounted
+        if abs(diff) < tolerance:
+            return vol
+        if diff > 0.0:
+            high = vol
+        else:
+            low = vol
+        vega = forward * _pdf(d1) * root
+        step = diff / vega if vega > 1e-12 else 0.0
+        candidate = vol - step
+        # Newton when it stays inside the bracket, bisection otherwise
+        vol = candidate if low < candidate < high and step else 0.5 * (low + high)
+    return vol
+
+
+class SVI(NamedTuple):
+    """Raw SVI total variance w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + sigma^2)), k = ln(K / F)."""
+    a: float
+    b: float
+    rho: float
+    m: float
+    sigma: float
+
+    def total_variance(self, k: float) -> float:
+        x = k - self.m
+        return self.a + self.b * (self.rho * x + math.sqrt(x * x + self.sigma * self.sigma))
+
+
+def _svi_from_free(x) -> SVI:
+    return SVI(float(x[0]), math.exp(x[1]), math.tanh(x[2]), float(x[3]), math.exp(x[4]))
+
+
+def _svi_guess(k, w) -> SVI:
+    """Starting point from the data: vertex at the lowest variance, wings from the outer slopes."""
+    lowest = int(w.argmin())
+    left = (w[0] - w[lowest]) / (k[0] - k[lowest]) if lowest > 0 else -0.1
+    right = (w[-1] - w[lowest]) / (k[-1] - k[lowest]) if lowest < len(k) - 1 else 0.1
+    b = max((right - left) / 2.0, 1e-3)
+    rho = min(max((right + left) / (right - left), -0.9), 0.9) if right > left else 0.0
+    sigma = max(0.1 * float(k[-1] - k[0]), 1e-3)
+    return SVI(float(w[lowest]) - b * sigma * math.sqrt(1.0 - rho * rho), b, rho, float(k[lowest]), sigma)
+
+
+def _svi_to_free(svi: SVI) -> List[float]:
+    rho = min(max(svi.rho, -0.999), 0.999)
+    return [svi.a, math.log(max(svi.b, 1e-8)), math.atanh(rho), svi.m, math.log(max(svi.sigma, 1e-8))]
+
+
+def _nelder_mead(f: Callable, x0: Sequence[float], step: Sequence[float], max_iterations: int = 400,
+                 tolerance: float = 1e-12) -> Tuple[List[float], float, int]:
+    import numpy as np
+    n = len(x0)
+    simplex = np.array([x0] + [np.add(x0, np.eye(n)[i] * step[i]) for i in range(n)], dtype=float)
+    values = np.array([f(point) for point in simplex])
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        order = np.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if values[-1] - values[0] <= tolerance * (abs(values[0]) + tolerance):
+            break
+        centroid = simplex[:-1].mean(axis=0)
+        reflected = centroid + (centroid - simplex[-1])
+        value = f(reflected)
+        if value < values[0]:
+            expanded = centroid + 2.0 * (centroid - simplex[-1])
+            expanded_value = f(expanded)
+            if expanded_value < value:
+                simplex[-1], values[-1] = expanded, expanded_value
+            else:
+                simplex[-1], values[-1] = reflected, value
+        elif value < values[-2]:
+            simplex[-1], values[-1] = reflected, value
+        else:
+            contracted = centroid + 0.5 * (simplex[-1] - centroid)
+            contracted_value = f(contracted)
+            if contracted_value < values[-1]:
+                simplex[-1], values[-1] = contracted, contracted_value
+            else:
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                values[1:] = [f(point) for point in simplex[1:]]
+    best = int(np.argmin(values))
+    return list(simplex[best]), float(values[best]), iteration
+
+
+def fit_svi(log_moneyness, total_variance, weights=None, start: Optional[SVI] = None,
+            max_iterations: int = 400) -> Tuple[SVI, float, int]:
+    """Least-squares raw SVI fit by Nelder-Mead, warm-started from `start` when given.
+
+    `log_moneyness` must be sorted. Returns the fit, its RMS error in total
+    variance and the iterations used.
+    """
+    import numpy as np
+    # Fitted in units where k and w are of order one, so one simplex step size suits every expiry
+    k_scale = float(np.std(log_moneyness)) or 1.0
+    w_scale = float(np.mean(total_variance)) or 1.0
+    k = np.asarray(log_moneyness, dtype=float) / k_scale
+    w = np.asarray(total_variance, dtype=float) / w_scale
+    weights = np.ones_like(w) if weights is None else np.asarray(weights, dtype=float)
+    weights = weights / weights.sum()
+
+    def objective(x):
+        a, b, rho, m, sigma = x[0], math.exp(x[1]), math.tanh(x[2]), x[3], math.exp(x[4])
+        shifted = k - m
+        model = a + b * (rho * shifted + np.sqrt(shifted * shifted + sigma * sigma))
+        error = float(np.dot(weights, (model - w) ** 2))
+        # Keep total variance positive at its minimum
+        floor = a + b * sigma * math.sqrt(1.0 - rho * rho)
+        return error + (1e3 * floor * floor if floor < 0.0 else 0.0)
+
+    if start is None:
+        start = _svi_guess(k, w)
+        step = [0.2, 0.5, 0.3, 0.2, 0.5]
+    else:
+        start = SVI(start.a / w_scale, start.b * k_scale / w_scale, start.rho, start.m / k_scale, start.sigma / k_scale)
+        step = [0.02, 0.05, 0.05, 0.02, 0.05]
+    x, error, iterations = _nelder_mead(objective, _svi_to_free(start), step, max_iterations)
+    fit = _svi_from_free(x)
+    fit = SVI(fit.a * w_scale, fit.b * w_scale / k_scale, fit.rho, fit.m * k_scale, fit.sigma * k_scale)
+    return fit, math.sqrt(max(error, 0.0)) * w_scale, iterations
+
+
+class Smile:
+    """One expiry's fitted smile. Immutable, so lookups on the event loop can read it while a refit builds the next one."""
+
+    def __init__(self, expiry: datetime, forward: float, years: float, svi: Optional[SVI],
+                 strikes: List[float], vols: List[float], rms_error: float, fitted_at: float):
+        self.expiry = expiry
+        self.forward = forward
+        self.years = years
+        self.svi = svi
+        self.strikes = strikes
+        self.vols = vols
+        self.rms_error = rms_error
+        self.fitted_at = fitted_at
+
+    def iv(self, strike: float) -> Optional[float]:
+        if self.svi is not None:
+            w = self.svi.total_variance(math.log(strike / self.forward))
+            return math.sqrt(w / self.years) if w > 0.0 else None
+        # Too few strikes for SVI: linear in strike between observed vols, flat beyond them
+        strikes, vols = self.strikes, self.vols
+        if not strikes:
+            return None
+        if strike <= strikes[0]:
+            return vols[0]
+        if strike >= strikes[-1]:
+            return vols[-1]
+        for i in range(1, len(strikes)):
+            if strike <= strikes[i]:
+                weight = (strike - strikes[i - 1]) / (strikes[i] - strikes[i - 1])
+                return vols[i - 1] + weight * (vols[i] - vols[i - 1])
+        return vols[-1]
+
+
+class _Option:
+    __slots__ = ("expiry", "strike", "is_call", "price", "fitted_price", "vega")
+
+    def __init__(self, expiry: datetime, strike: float, is_call: bool):
+        self.expiry = expiry
+        self.strike = strike
+        self.is_call = is_call
+        self.price = None
+        self.fitted_price = None
+        self.vega = 0.0
+
+
+class IVSurface:
+    """Implied volatility per expiry for a subscribed option chain, priced off the futures with Black-76.
+
+    on_price() only stores the option price and, using the vega from the last
+    fit, counts how many strikes have moved more than `iv_tolerance` in vol
+    terms. refit() (run it on a timer) refits an expiry on a worker thread once
+    `refit_fraction` of its strikes have moved: it re-derives the forward from
+    put-call parity around the money, solves each out-of-the-money option's IV
+    and fits SVI warm-started from the previous parameters. iv() and greeks()
+    evaluate the latest fit with plain math, in a few microseconds.
+    """
+
+    def __init__(self, rate: float = 0.0, min_strikes: int = 5, refit_fraction: float = 0.2,
+                 iv_tolerance: float = 0.0025, expiry_time: dtime = dtime(15, 30),
+                 time_source: Callable[[], float] = time.time):
+        self.rate = rate
+        self.min_strikes = min_strikes
+        self.refit_fraction = refit_fraction
+        self.iv_tolerance = iv_tolerance
+        self.expiry_time = expiry_time
+        self.time_source = time_source
+        self.options: Dict[str, _Option] = {}
+        self.forwards: Dict[datetime, float] = {}
+        self.smiles: Dict[datetime, Smile] = {}
+        self._chains: Dict[datetime, Dict[Tuple[float, bool], _Option]] = {}
+        self._moved: Dict[datetime, set] = {}
+        self._fitting: set = set()
+        self._lock = threading.Lock()
+        self.fits = 0
+
+    def _expiry(self, expiry: Union[date, datetime]) -> datetime:
+        if isinstance(expiry, datetime) and (expiry.hour, expiry.minute, expiry.second) != (0, 0, 0):
+            return expiry
+        day = expiry.date() if isinstance(expiry, datetime) else expiry
+        return datetime.combine(day, self.expiry_time)
+
+    def add_option(self, symbol: str, expiry: Union[date, datetime], strike: float, option_type: str):
+        """Registers a contract, e.g. from a symbol master row (`Expiry`, `StrikePrice`, `OptionType`)."""
+        expiry = self._expiry(expiry)
+        option = _Option(expiry, float(strike), option_type.upper() in ("CE", "C", "CALL"))
+        self.options[symbol] = option
+        self._chains.setdefault(expiry, {})[(option.strike, option.is_call)] = option
+        self._moved.setdefault(expiry, set())
+
+    def set_forward(self, price: float, expiry: Optional[Union[date, datetime]] = None):
+        """Futures price for one expiry, or for every expiry without its own when `expiry` is None."""
+        self.forwards[self._expiry(expiry) if expiry is not None else None] = price
+
+    def on_price(self, symbol: str, price: float):
+        option = self.options.get(symbol)
+        if option is None:
+            return
+        option.price = price
+        moved = self._moved[option.expiry]
+        if option.fitted_price is None or option.vega <= 0.0:
+            moved.add((option.strike, option.is_call))
+        elif abs(price - option.fitted_price) > self.iv_tolerance * 100.0 * option.vega:
+            moved.add((option.strike, option.is_call))
+
+    def years_to(self, expiry: datetime, now: Optional[float] = None) -> float:
+        now = self.time_source() if now is None else now
+        return max((expiry.timestamp() - now) / YEAR_SECONDS, MIN_EXPIRY_YEARS)
+
+    def needs_refit(self) -> List[datetime]:
+        due = []
+        for expiry, chain in self._chains.items():
+            if expiry in self._fitting:
+                continue
+            priced = sum(1 for option in chain.values() if option.price is not None)
+            moved = len(self._moved[expiry])
+            if priced and moved and (expiry not in self.smiles or moved >= self.refit_fraction * priced):
+                due.append(expiry)
+        return due
+
+    async def refit(self, force: bool = False):
+        """Refits each expiry that needs it on a worker thread. Meant for a clock timer."""
+        expiries = list(self._chains) if force else self.needs_refit()
+        for expiry in expiries:
+            self._fitting.add(expiry)
+            try:
+                await asyncio.to_thread(self.fit_expiry, expiry)
+            except Exception as e:
+                app_logger.error(f"IV surface refit for {expiry:%Y-%m-%d} failed: {e}", exc_info=True)
+            finally:
+                self._fitting.discard(expiry)
+
+    def _parity_forward(self, prices: Dict[Tuple[float, bool], float], guess: Optional[float], years: float) -> Optional[float]:
+        pairs = sorted(
+            (strike for strike, is_call in prices if is_call and (strike, False) in prices),
+            key=lambda strike: abs(strike - guess) if guess else 0.0,
+        )[:3]
+        if not pairs:
+            return guess
+        growth = math.exp(self.rate * years)
+        estimates = [strike + growth * (prices[(strike, True)] - prices[(strike, False)]) for strike in pairs]
+        return sum(estimates) / len(estimates)
+
+    def fit_expiry(self, expiry: datetime) -> Optional[Smile]:
+        """Solves IVs and fits the smile for one expiry. Thread-safe; normally called through refit()."""
+        with self._lock:
+            chain = self._chains[expiry]
+            moved = self._moved[expiry]
+            prices = {key: option.price for key, option in chain.items() if option.price is not None}
+            moved.clear()
+            now = self.time_source()
+            years = self.years_to(expiry, now)
+            forward = self._parity_forward(prices, self.forwards.get(expiry) or self.forwards.get(None), years)
+            if not forward or not prices:
+                return None
+
+            strikes, vols, k, w, weights = [], [], [], [], []
+            for strike in sorted({strike for strike, _ in prices}):
+                # Out-of-the-money side: tighter spreads and no early-exercise or carry noise in the price
+                is_call = strike >= forward
+                price = prices.get((strike, is_call))
+                if price is None:
+                    continue
+                vol = implied_vol(price, forward, strike, years, is_call, self.rate)
+                if vol is None:
+                    continue
+                strikes.append(strike)
+                vols.append(vol)
+                k.append(math.log(strike / forward))
+                w.append(vol * vol * years)
+                weights.append(max(black76_greeks(forward, strike, years, vol, is_call, self.rate)["vega"], 1e-6))
+
+            previous = self.smiles.get(expiry)
+            svi, rms_error = None, 0.0
+            if len(strikes) >= self.min_strikes:
+                start = previous.svi if previous and previous.svi else None
+                svi, rms_error, iterations = fit_svi(k, w, weights, start)
+                app_logger.debug("SVI fit %s: %d strikes, %d iterations, rms %.2e", expiry, len(strikes), iterations,
+                                 rms_error)
+            smile = Smile(expiry, forward, years, svi, strikes, vols, rms_error, now)
+
+            # Vega at the fitted vol turns later price moves into vol moves for on_price()
+            for option in chain.values():
+                vol = smile.iv(option.strike)
+                option.fitted_price = prices.get((option.strike, option.is_call))
+                option.vega = (
+                    black76_greeks(forward, option.strike, years, vol, option.is_call, self.rate)["vega"]
+                    if vol else 0.0
+                )
+            self.forwards[expiry] = forward
+            self.smiles[expiry] = smile
+            self.fits += 1
+            return smile
+
+    def nearest_expiry(self) -> Optional[datetime]:
+        now = self.time_source()
+        live = [expiry for expiry in self.smiles if expiry.timestamp() > now]
+        return min(live) if live else None
+
+    def iv(self, strike: float, expiry: Optional[datetime] = None) -> Optional[float]:
+        smile = self.smiles.get(expiry if expiry is not None else self.nearest_expiry())
+        return smile.iv(strike) if smile else None
+
+    def atm_iv(self, expiry: Optional[datetime] = None) -> Optional[float]:
+        smile = self.smiles.get(expiry if expiry is not None else self.nearest_expiry())
+        return smile.iv(smile.forward) if smile else None
+
+    def greeks(self, strike: float, option_type: str, expiry: Optional[datetime] = None) -> Optional[Dict[str, float]]:
+        smile = self.smiles.get(expiry if expiry is not None else self.nearest_expiry())
+        if smile is None:
+            return None
+        vol = smile.iv(strike)
+        if not vol:
+            return None
+        is_call = option_type.upper() in ("CE", "C", "CALL")
+        return black76_greeks(smile.forward, strike, self.years_to(smile.expiry), vol, is_call, self.rate)
+
+    def greeks_for(self, symbol: str) -> Optional[Dict[str, float]]:
+        option = self.options.get(symbol)
+        if option is None:
+            return None
+        return self.greeks(option.strike, "CE" if option.is_call else "PE", option.expiry)
\ No newline at end of file
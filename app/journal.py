@@ -0,0 +1,249 @@
+# app/journal.py
+import os
+import time
+import asyncio
+import threading
+from datetime import date
+from queue import Empty, SimpleQueue
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
+from app.logger_setup import app_logger
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Column names per table, in record order. `ts` is epoch nanoseconds.
+FILL_COLUMNS = ("ts", "symbol", "side", "quantity", "price", "reference_price", "position", "trade_pnl", "realized_pnl")
+PNL_COLUMNS = ("ts", "total_pnl", "realized_pnl", "unrealized_pnl", "trade_margin")
+TABLES = {"fills": FILL_COLUMNS, "pnl": PNL_COLUMNS}
+
+DateLike = Union[str, date, None]
+
+
+def _arrow_schemas():
+    import pyarrow as pa
+    ts = pa.timestamp("ns")
+    return {
+        "fills": pa.schema([
+            ("ts", ts), ("symbol", pa.string()), ("side", pa.string()), ("quantity", pa.int64()),
+            ("price", pa.float64()), ("reference_price", pa.float64()), ("position", pa.int64()),
+            ("trade_pnl", pa.float64()), ("realized_pnl", pa.float64()),
+        ]),
+        "pnl": pa.schema([
+            ("ts", ts), ("total_pnl", pa.float64()), ("realized_pnl", pa.float64()),
+            ("unrealized_pnl", pa.float64()), ("trade_margin", pa.float64()),
+        ]),
+    }
+
+
+class TradeJournal:
+    """Columnar journal of fills and PnL, stored as Parquet under
+    `<root>/<table>/date=YYYY-MM-DD/strategy=<name>/`.
+
+    Recording only appends a tuple to a queue. A background thread turns
+    batches into Arrow tables every `flush_interval` seconds, and close()
+    compacts the session's small files into one file per partition. PnL is
+    sampled at most once per `pnl_interval` seconds.
+    """
+
+    def __init__(self, root: str, strategy: str, flush_interval: float = 5.0, pnl_interval: float = 1.0,
+                 time_source: Callable[[], float] = time.time):
+        self.root = root
+        self.strategy = strategy
+        self.flush_interval = flush_interval
+        self.pnl_interval = pnl_interval
+        self.time_source = time_source
+        self._queue: SimpleQueue = SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_pnl = float("-inf")
+        self._written: Dict[Tuple[str, str], List[str]] = {}
+        self._part = 0
+
+    # --- Hot path: enqueue only ---
+
+    def record_fill(self, symbol: str, side: str, quantity: int, price: float, reference_price: Optional[float],
+                    position: int, trade_pnl: Optional[float], realized_pnl: float):
+        # The PnL update that follows a fill is always recorded
+        self._last_pnl = float("-inf")
+        self._queue.put(("fills", (
+            int(self.time_source() * 1e9), symbol, side, quantity, price, reference_price, position, trade_pnl,
+            realized_pnl,
+        )))
+
+    def record_pnl(self, realized_pnl: float, unrealized_pnl: float, trade_margin: float):
+        now = self.time_source()
+        if now - self._last_pnl < self.pnl_interval:
+            return
+        self._last_pnl = now
+        self._queue.put(("pnl", (int(now * 1e9), realized_pnl + unrealized_pnl, realized_pnl, unrealized_pnl, trade_margin)))
+
+    # --- Background writer ---
+
+    def start(self):
+        if self._thread:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer_loop, name="trade-journal-writer", daemon=True)
+        self._thread.start()
+
+    def _writer_loop(self):
+        # Wakes on a timer rather than per record, so recording never has to hand the GIL to this thread
+        while True:
+            stopping = self._stop.wait(self.flush_interval)
+            pending = {table: [] for table in TABLES}
+            while True:
+                try:
+                    table, row = self._queue.get_nowait()
+                except Empty:
+                    break
+                pending[table].append(row)
+            for table, rows in pending.items():
+                if rows:
+                    try:
+                        self.write_rows(table, rows)
+                    except Exception as e:
+                        app_logger.error(f"Trade journal failed to write {len(rows)} {table} rows: {e}", exc_info=True)
+            if stopping:
+                return
+
+    def write_rows(self, table: str, rows: List[tuple]):
+        """Writes rows straight to Parquet, one file per date partition. Runs on the writer thread."""
+        import pyarrow as pa
+        by_date: Dict[str, List[tuple]] = {}
+        for row in rows:
+            day = time.strftime("%Y-%m-%d", time.localtime(row[0] // 1_000_000_000))
+            by_date.setdefault(day, []).append(row)
+        schema = _arrow_schemas()[table]
+        for day, day_rows in by_date.items():
+            columns = list(zip(*day_rows))
+            batch = pa.table([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+            directory = os.path.join(self.root, table, f"date={day}", f"strategy={self.strategy}")
+            os.makedirs(directory, exist_ok=True)
+            path = self._write_file(directory, batch)
+            self._written.setdefault((table, directory), []).append(path)
+
+    def _write_file(self, directory: str, batch) -> str:
+        import pyarrow.parquet as pq
+        self._part += 1
+        name = f"part-{time.strftime('%H%M%S')}-{os.getpid()}-{self._part:05d}.parquet"
+        # Readers skip dot-files, so a half-written file is never picked up
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        pq.write_table(batch, tmp_path, row_group_size=1 << 20)
+        os.replace(tmp_path, os.path.join(directory, name))
+        return os.path.join(directory, name)
+
+    def compact(self):
+        """Merges the files this journal wrote into one file per partition."""
+        import pyarrow.parquet as pq
+        import pyarrow as pa
+        for (table, directory), paths in list(self._written.items()):
+            if len(paths) < 2:
+                continue
+            try:
+                merged = pa.concat_tables([pq.read_table(path) for path in paths]).sort_by("ts")
+                target = self._write_file(directory, merged)
+                for path in paths:
+                    os.remove(path)
+                self._written[(table, directory)] = [target]
+            except Exception as e:
+                app_logger.error(f"Trade journal compaction of {directory} failed: {e}", exc_info=True)
+
+    async def close(self):
+        if self._thread:
+            self._stop.set()
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+            await asyncio.to_thread(self.compact)
+
+
+class JournalReader:
+    """Reads the journal back as pandas frames, pruning partitions by date and strategy."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dataset(self, table: str):
+        import pyarrow.dataset as ds
+        # Dictionary-typed so the partition columns come back as pandas categoricals, not a string per row
+        partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+        return ds.dataset(os.path.join(self.root, table), format="parquet", partitioning=partitioning)
+
+    def read(self, table: str, start: DateLike = None, end: DateLike = None, strategy: Optional[str] = None,
+             columns: Optional[List[str]] = None) -> "pd.DataFrame":
+        """Rows of `table` between `start` and `end` (inclusive dates), oldest first."""
+        import pyarrow.dataset as ds
+        import pandas as pd
+        if not os.path.isdir(os.path.join(self.root, table)):
+            return pd.DataFrame(columns=list(columns or TABLES[table]) + ["date", "strategy"])
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field("date") >= str(start))
+        if end is not None:
+            conditions.append(ds.field("date") <= str(end))
+        if strategy is not None:
+            conditions.append(ds.field("strategy") == strategy)
+        condition = None
+        for expression in conditions:
+            condition = expression if condition is None else condition & expression
+        wanted = None if columns is None else list(dict.fromkeys(["ts", *columns, "date", "strategy"]))
+        frame = self._dataset(table).to_table(columns=wanted, filter=condition).to_pandas()
+        # Partitions are read in date order and compacted files are sorted, so this is usually a no-op
+        if not frame["ts"].is_monotonic_increasing or frame["strategy"].nunique() > 1:
+            frame = frame.sort_values(["strategy", "ts"], kind="stable").reset_index(drop=True)
+        return frame
+
+    def fills(self, start: DateLike = None, end: DateLike = None, strategy: Optional[str] = None,
+              columns: Optional[List[str]] = None) -> "pd.DataFrame":
+        return self.read("fills", start, end, strategy, columns)
+
+    def pnl(self, start: DateLike = None, end: DateLike = None, strategy: Optional[str] = None,
+            columns: Optional[List[str]] = None) -> "pd.DataFrame":
+        return self.read("pnl", start, end, strategy, columns)
+
+    def session_analytics(self, start: DateLike = None, end: DateLike = None,
+                          strategy: Optional[str] = None) -> "pd.DataFrame":
+        """One row per (date, strategy): final and peak PnL, max drawdown, fills, slippage and holding time.
+
+        Slippage is signed against the LTP the order was priced from (positive
+        means paid more than the LTP when buying or got less when selling).
+        Holding time runs from the fill that opens a position to the one that
+        flattens it.
+        """
+        import numpy as np
+        import pandas as pd
+        keys = ["date", "strategy"]
+        pnl = self.pnl(start, end, strategy, columns=["total_pnl"])
+        fills = self.fills(start, end, strategy, columns=["symbol", "side", "quantity", "price", "reference_price", "position"])
+
+        pnl["drawdown"] = pnl.groupby(keys, observed=True)["total_pnl"].cummax() - pnl["total_pnl"]
+        grouped = pnl.groupby(keys, sort=True, observed=True)
+        sessions = pd.DataFrame({
+            "final_pnl": grouped["total_pnl"].last(),
+            "peak_pnl": grouped["total_pnl"].max(),
+            "trough_pnl": grouped["total_pnl"].min(),
+            "max_drawdown": grouped["drawdown"].max(),
+        })
+
+        if len(fills):
+            sign = np.where(fills["side"].to_numpy() == "B", 1.0, -1.0)
+            slippage = (fills["price"].to_numpy() - fills["reference_price"].to_numpy()) * sign
+            fills = fills.assign(slippage=slippage, slippage_value=slippage * fills["quantity"].to_numpy())
+
+            fills = fills.sort_values(keys + ["symbol", "ts"], kind="stable")
+            previous = fills.groupby(keys + ["symbol"], observed=True)["position"].shift(fill_value=0)
+            fills["opened_at"] = fills["ts"].where(previous.to_numpy() == 0)
+            opened_at = fills.groupby(keys + ["symbol"], observed=True)["opened_at"].ffill()
+            closing = (fills["position"].to_numpy() == 0) & (previous.to_numpy() != 0)
+            holding = (fills["ts"] - opened_at).dt.total_seconds().where(closing)
+            fills = fills.assign(holding_s=holding)
+
+            by_session = fills.groupby(keys, sort=True, observed=True)
+            sessions = sessions.join(pd.DataFrame({
+                "fills": by_session.size(),
+                "mean_slippage": by_session["slippage"].mean(),
+                "slippage_value": by_session["slippage_value"].sum(),
+                "round_trips": by_session["holding_s"].count(),
+                "mean_holding_s": by_session["holding_s"].mean(),
+                "max_holding_s": by_session["holding_s"].max(),
+            }), how="outer")
+        return sessions.reset_index()
\ No newline at end of file
@@ -0,0 +1,101 @@
+# app/latency.py
+import time
+from typing import Dict, List
+from app.metrics import LatencyHistogram
+
+# A sampled tick carries a list of time.time_ns() stamps under this key. It is
+# appended to at each hop and travels inside the JSON published on `market_data`.
+STAMPS_KEY = "_lt"
+
+WS_CALLBACK, QUEUE_DEQUEUE, BUS_PUBLISH, PROCESSOR_UPDATE = range(4)
+
+STAGES = (
+    "exchange_to_ws",
+    "ws_to_dequeue",
+    "dequeue_to_publish",
+    "publish_to_processor",
+    "processor_to_strategy",
+    "strategy_to_order",
+    "ws_to_processor",
+    "ws_to_order",
+)
+
+
+class TickLatencyTracker:
+    """Per-stage latency histograms for sampled ticks, from broker callback to order emit.
+
+    Only one tick in `sample_every` is stamped, so the cost on unsampled ticks is a
+    counter increment on the WebSocket thread and a dict lookup further down the path.
+    """
+
+    def __init__(self, sample_every: int = 10):
+        self.sample_every = max(1, sample_every)
+        self.histograms: Dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in STAGES}
+        self._counter = 0
+        self._processed: Dict[str, List[int]] = {}
+        self._read: Dict[str, List[int]] = {}
+
+    # --- WebSocket thread ---
+
+    def stamp_ws_callback(self, tick_data: dict):
+        self._counter += 1
+        if self._counter % self.sample_every:
+            return
+        now = time.time_ns()
+        tick_data[STAMPS_KEY] = [now]
+        feed_time = tick_data.get("ft")
+        if feed_time:
+            # Noren feed time has one-second resolution, so this stage is coarse by nature
+            self.histograms["exchange_to_ws"].record(now - int(feed_time) * 1_000_000_000)
+
+    # --- Event loop ---
+
+    @staticmethod
+    def stamp(tick_data: dict):
+        stamps = tick_data.get(STAMPS_KEY)
+        if stamps is not None:
+            stamps.append(time.time_ns())
+
+    def record_processor_update(self, symbol: str, tick_data: dict):
+        stamps = tick_data.get(STAMPS_KEY)
+        if stamps is None or len(stamps) != PROCESSOR_UPDATE:
+            return
+        stamps.append(time.time_ns())
+        histograms = self.histograms
+        histograms["ws_to_dequeue"].record(stamps[QUEUE_DEQUEUE] - stamps[WS_CALLBACK])
+        histograms["dequeue_to_publish"].record(stamps[BUS_PUBLISH] - stamps[QUEUE_DEQUEUE])
+        histograms["publish_to_processor"].record(stamps[PROCESSOR_UPDATE] - stamps[BUS_PUBLISH])
+        histograms["ws_to_processor"].record(stamps[PROCESSOR_UPDATE] - stamps[WS_CALLBACK])
+        self._processed[symbol] = stamps
+
+    def record_strategy_read(self, symbol: str):
+        stamps = self._processed.pop(symbol, None)
+        if stamps is None:
+            return
+        stamps.append(time.time_ns())
+        self.histograms["processor_to_strategy"].record(stamps[-1] - stamps[PROCESSOR_UPDATE])
+        self._read[symbol] = stamps
+
+    def record_order_emit(self, symbol: str):
+        stamps = self._read.pop(symbol, None)
+        if stamps is None:
+            return
+        now = time.time_ns()
+        self.histograms["strategy_to_order"].record(now - stamps[-1])
+        self.histograms["ws_to_order"].record(now - stamps[WS_CALLBACK])
+
+    # --- Reporting ---
+
+    def summary(self) -> Dict[str, dict]:
+        return {stage: hist.summary() for stage, hist in self.histograms.items() if hist.count}
+
+    def export(self, influxdb_manager, reset: bool = True):
+        points = [
+            {"measurement": "tick_latency", "fields": entry, "tags": {"stage": stage}}
+            for stage, entry in self.summary().items()
+        ]
+        if points:
+            influxdb_manager.write_points(points)
+        if reset:
+            for hist in self.histograms.values():
+                hist.reset()
\ No newline at end of file
@@ -1,28 +1,194 @@
+import os
+import json
+import time
+import queue
+import atexit
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 50 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+LOG_DUPLICATE_INTERVAL = float(os.environ.get("LOG_DUPLICATE_INTERVAL", 5))
+# Supervised worker processes each get their own, so no two processes rotate the same file
+LOG_DIR = os.environ.get("LOG_DIR", "logs")
+
+_IMMUTABLE_ARG_TYPES = (str, int, float, bool, type(None), bytes)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class LazyQueueHandler(QueueHandler):
+    """Enqueues records without formatting them; the listener thread does the work.
+
+    Messages whose arguments are all immutable stay unformatted until written.
+    Anything else is rendered on the caller's side, because the argument could
+    change before the writer thread gets to it.
+    """
+
+    def prepare(self, record):
+        if record.args and not all(isinstance(arg, _IMMUTABLE_ARG_TYPES) for arg in record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        # Scripts and notebooks that never call setup_logging() still get their lines written
+        if _listener is None:
+            _start_listener()
+        self.queue.put_nowait(record)
+
+
+class DuplicateFilter(logging.Filter):
+    """Drops repeats of the same message within `interval` seconds, noting how many were dropped.
+
+    Only records at `min_level` and above are suppressed, so INFO audit lines
+    (orders, positions, PnL) are always written however often they repeat.
+    """
+
+    def __init__(self, interval: float, min_level: int = logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.min_level = min_level
+        self._seen = {}
+        # Loggers are called from the event loop and from worker threads (to_thread, the gateway pool)
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.min_level:
+            return True
+        try:
+            key = (record.name, record.levelno, record.msg, record.args)
+            hash(key)
+        except TypeError:  # unhashable args
+            return True
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] >= self.interval:
+                suppressed = entry[1] if entry else 0
+                self._seen[key] = [now, 0]
+                if len(self._seen) > 10000:
+                    self._seen.clear()
+            else:
+                entry[1] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg} (suppressed {suppressed} duplicates in the last {self.interval:g}s)"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _RoutingHandler(logging.Handler):
+    """Runs on the listener thread and hands each record to its logger's file handler."""
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = {}
+        self._routes = {}
+
+    def handle(self, record):
+        handler = self._routes.get(record.name)
+        if handler is None:
+            name = record.name
+            while name and name not in self.handlers:
+                name = name.rpartition('.')[0]
+            handler = self._routes[record.name] = self.handlers.get(name, False)
+        if handler and record.levelno >= handler.level:
+            handler.handle(record)
+        return True
+
+
+_log_queue = queue.SimpleQueue()
+_router = _RoutingHandler()
+_listener = None
+_listener_lock = threading.Lock()
+_shut_down = False
+
+
+def _start_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is not None or _shut_down:
+            return
+        os.makedirs(LOG_DIR, exist_ok=True)
+        _listener = QueueListener(_log_queue, _router)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def setup_logging():
+    """Trims per-record work and starts the writer thread, which otherwise starts with the first record."""
+    # None of our formats use the caller's file/line, thread or process, so skip collecting them per record
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    _start_listener()
+
+
+def shutdown_logging():
+    """Flush everything still queued and stop the writer thread."""
+    global _listener, _shut_down
+    with _listener_lock:
+        _shut_down = True
+        listener, _listener = _listener, None
+    if listener:
+        listener.stop()
+        for handler in _router.handlers.values():
+            handler.close()
+
 
 def setup_logger(name, log_file, level=logging.INFO, formatter=None):
-    handler = logging.FileHandler(log_file, encoding='utf-8')
+    # Opened on the first write, from the listener thread
+    handler = RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True
+    )
     handler.setLevel(level)
-    if formatter:
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    elif formatter:
         handler.setFormatter(formatter)
     else:
         handler.setFormatter(logging.Formatter('%(asctime)s.%(msecs)03d - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
-    
+    _router.handlers[name] = handler
+    _router._routes.clear()
+
+    queue_handler = LazyQueueHandler(_log_queue)
+    queue_handler.setLevel(level)
+    if LOG_DUPLICATE_INTERVAL > 0:
+        queue_handler.addFilter(DuplicateFilter(LOG_DUPLICATE_INTERVAL))
+
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    logger.addHandler(handler)
+    logger.addHandler(queue_handler)
     return logger
 
 common_formatter = logging.Formatter('%(asctime)s.%(msecs)03d - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
 # Set up the main application logger
-app_logger = setup_logger('app', 'logs/my_app.log', formatter=common_formatter)
+app_logger = setup_logger('app', os.path.join(LOG_DIR, 'my_app.log'), formatter=common_formatter)
 
 # Set up the WebSocket logger
-ws_logger = setup_logger('websocket', 'logs/ws_logs.log', formatter=common_formatter)
+ws_logger = setup_logger('websocket', os.path.join(LOG_DIR, 'ws_logs.log'), formatter=common_formatter)
 
 # Set up the PNL logger
-pnl_logger = setup_logger('pnl', 'logs/pnl.log', formatter=common_formatter)
+pnl_logger = setup_logger('pnl', os.path.join(LOG_DIR, 'pnl.log'), formatter=common_formatter)
 
 # Set up the position logger
-pos_logger = setup_logger('pos', 'logs/positions.log', formatter=common_formatter)
\ No newline at end of file
+pos_logger = setup_logger('pos', os.path.join(LOG_DIR, 'positions.log'), formatter=common_formatter)
\ No newline at end of file
@@ -1,12 +1,13 @@
 import asyncio
-from NorenRestApiPy.NorenApi import position
 from app.utils import get_account_limits  
 from app.logger_setup import app_logger
 
 class MarginCalculator:
-    def __init__(self, api, account_id):
+    def __init__(self, api, account_id, rest_client=None):
         self.api = api
         self.account_id = account_id
+        # NorenRestClient: SPAN and limits over its pooled, cached async session instead of a thread per call
+        self.rest_client = rest_client
 
     async def calculate_margin(self, option_symbols, adjusted_quantity):
         try:
@@ -34,6 +35,7 @@ class MarginCalculator:
             return None
 
     def _create_position_list(self, option_symbols, adjusted_quantity):
+        from NorenRestApiPy.NorenApi import position
         position_list = []
         for key, symbol_data in option_symbols.items():
             pos = position()
@@ -52,6 +54,8 @@ class MarginCalculator:
 
     async def _calculate_span(self, position_list):
         try:
+            if self.rest_client:
+                return await self.rest_client.span_calculator(position_list)
             return await asyncio.to_thread(self.api.span_calculator, self.account_id, position_list)
         except Exception as e:
             app_logger.error(f"Error in _calculate_span: {e}", exc_info=True)
@@ -59,7 +63,7 @@ class MarginCalculator:
 
     async def get_available_margin(self) -> float:
         """Fetch and return the available margin for the account."""
-        account_limits = await get_account_limits(self.api)
+        account_limits = await get_account_limits(self.rest_client or self.api)
         if not account_limits:
             app_logger.warning("Failed to fetch account limits.")
             return 0
@@ -2,33 +2,57 @@
 import asyncio
 import redis.asyncio as aioredis
 import json
-from typing import Optional
+import time
+from typing import Callable, Dict, List, Optional
 from app.logger_setup import app_logger
+from app.metrics import RedisMetrics
+from app.latency import TickLatencyTracker
+from app.clock import Clock, RealClock
+from app.bars import BarBuilder
+
+def market_data_key(symbol: str) -> str:
+    return f'market_data:{symbol}'
 
 class MarketDataProcessor:
-    def __init__(self, redis_client: aioredis.Redis):
+    def __init__(self, redis_client: aioredis.Redis, pubsub_client: Optional[aioredis.Redis] = None,
+                 metrics: Optional[RedisMetrics] = None, latency_tracker: Optional[TickLatencyTracker] = None,
+                 clock: Optional[Clock] = None, bar_builder: Optional[BarBuilder] = None):
         self.redis = redis_client
+        self.pubsub_client = pubsub_client or redis_client
+        self.metrics = metrics or RedisMetrics()
+        self.latency_tracker = latency_tracker
+        self.clock = clock or RealClock()
+        # One per account when the accounts of a worker share this processor
+        self.bar_builders: List[BarBuilder] = [bar_builder] if bar_builder else []
+        self.tick_listeners: List[Callable[[str, float], None]] = []
         self.pubsub = None
         self.token_symbol_map = {}
+        self.symbol_exchange: Dict[str, str] = {}
+        # Symbols the feed flagged stale (outage or silence); get_ltp refuses them until their next tick
+        self.stale_symbols = set()
+        # Ticks applied since start, for throughput reporting
+        self.ticks = 0
         self._processing_task = None
 
     async def connect(self):
-        self.pubsub = self.redis.pubsub()
+        self.pubsub = self.pubsub_client.pubsub()
         await self.pubsub.subscribe('market_data')
         self._processing_task = asyncio.create_task(self.process_market_data())
 
     async def process_market_data(self):
         try:
             while True:
+                # Drain everything pending before sleeping, so a burst (such as a resubscribe) doesn't queue up
                 message = await self.pubsub.get_message(ignore_subscribe_messages=True)
-                if message:
+                while message:
                     try:
                         data = json.loads(message['data'])
                         await self.update_market_data(data)
                     except json.JSONDecodeError:
-                        app_logger.warning(f"Received non-JSON market data: {message['data']}")
+                        app_logger.warning("Received non-JSON market data: %s", message['data'])
                     except Exception as e:
                         app_logger.error(f"Error handling market data message: {e}", exc_info=True)
+                    message = await self.pubsub.get_message(ignore_subscribe_messages=True)
                 await asyncio.sleep(0.01)
         except asyncio.CancelledError:
             app_logger.info("Market data processing task cancelled.")
@@ -37,37 +61,108 @@ class MarketDataProcessor:
 
     async def update_market_data(self, data: dict):
         if 'lp' in data and 'tk' in data:
+            started = time.perf_counter_ns()
             token = data['tk']
             ltp = float(data['lp'])
             symbol = data.get('ts')
+            round_trips = 0
+            self.ticks += 1
 
-            if symbol and self.token_symbol_map.get(token) != symbol:
+            new_mapping = symbol and self.token_symbol_map.get(token) != symbol
+            if new_mapping:
                 self.token_symbol_map[token] = symbol
-                await self.redis.hset('token_symbol_map', token, symbol)
+                self.symbol_exchange[symbol] = data.get('e')
 
             if token not in self.token_symbol_map:
                 redis_symbol = await self.redis.hget('token_symbol_map', token)
+                round_trips += 1
                 if redis_symbol:
                     self.token_symbol_map[token] = redis_symbol.decode('utf-8')
             
             final_symbol = self.token_symbol_map.get(token)
-            if final_symbol:
-                await self.redis.hset(f'market_data:{final_symbol}', 'ltp', ltp)
+            if new_mapping:
+                # First tick for a token: persist the mapping and the price in one round trip
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.hset('token_symbol_map', token, symbol)
+                pipe.hset(market_data_key(final_symbol), 'ltp', ltp)
+                await pipe.execute()
+                round_trips += 1
+            elif final_symbol:
+                await self.redis.hset(market_data_key(final_symbol), 'ltp', ltp)
+                round_trips += 1
+            if self.stale_symbols:
+                self.stale_symbols.discard(final_symbol)
+            if self.bar_builders and final_symbol:
+                for bar_builder in self.bar_builders:
+                    bar_builder.on_tick(final_symbol, ltp, data.get('v'))
+            if self.tick_listeners and final_symbol:
+                for listener in self.tick_listeners:
+                    listener(final_symbol, ltp)
+            self.metrics.record('update_market_data', round_trips, started)
+            if self.latency_tracker and final_symbol:
+                self.latency_tracker.record_processor_update(final_symbol, data)
+        elif data.get('t') == 'stale':
+            self.mark_stale(data['k'])
+
+    def mark_stale(self, keys):
+        """Flags the symbols of "EXCHANGE|token" keys as stale until each ticks again."""
+        for key in keys:
+            symbol = self.token_symbol_map.get(key.split('|', 1)[-1])
+            if symbol:
+                self.stale_symbols.add(symbol)
+        app_logger.warning("Prices of %d symbol(s) are stale until they tick again.", len(self.stale_symbols))
+
+    def is_stale(self, symbol: str) -> bool:
+        return symbol in self.stale_symbols
+
+    def subscribe_ticks(self, listener: Callable[[str, float], None]):
+        """Calls `listener(symbol, ltp)` for every price update, on the event loop. Keep it cheap."""
+        self.tick_listeners.append(listener)
+
+    def unsubscribe_ticks(self, listener: Callable[[str, float], None]):
+        self.tick_listeners = [cb for cb in self.tick_listeners if cb != listener]
 
-    async def get_ltp(self, symbol: str) -> Optional[float]:
-        ltp = await self.redis.hget(f'market_data:{symbol}', 'ltp')
+    def add_bar_builder(self, bar_builder: BarBuilder):
+        self.bar_builders.append(bar_builder)
+
+    def remove_bar_builder(self, bar_builder: BarBuilder):
+        self.bar_builders = [builder for builder in self.bar_builders if builder is not bar_builder]
+
+    async def get_ltp(self, symbol: str, allow_stale: bool = False) -> Optional[float]:
+        """Last traded price from Redis. None when there is none or, unless `allow_stale`, when it is flagged stale."""
+        if not allow_stale and symbol in self.stale_symbols:
+            app_logger.warning("LTP for %s is stale; refusing it until the next tick.", symbol)
+            return None
+        started = time.perf_counter_ns()
+        ltp = await self.redis.hget(market_data_key(symbol), 'ltp')
+        self.metrics.record('get_ltp', 1, started)
+        if self.latency_tracker:
+            self.latency_tracker.record_strategy_read(symbol)
         if ltp is None:
-            app_logger.warning(f"LTP not found for symbol: {symbol}")
+            app_logger.warning("LTP not found for symbol: %s", symbol)
             return None
         return float(ltp)
 
+    async def get_ltps(self, symbols, allow_stale: bool = False) -> Dict[str, Optional[float]]:
+        started = time.perf_counter_ns()
+        pipe = self.redis.pipeline(transaction=False)
+        for symbol in symbols:
+            pipe.hget(market_data_key(symbol), 'ltp')
+        values = await pipe.execute()
+        self.metrics.record('get_ltps', 1, started)
+        stale = self.stale_symbols if not allow_stale else ()
+        return {
+            symbol: float(value) if value is not None and symbol not in stale else None
+            for symbol, value in zip(symbols, values)
+        }
+
     async def get_ltp_with_retry(self, symbol: str, max_retries: int = 5, retry_delay: float = 1.0) -> Optional[float]:
         for attempt in range(max_retries):
             ltp = await self.get_ltp(symbol)
             if ltp is not None:
                 return ltp
-            app_logger.warning(f"LTP not available for {symbol}. Retrying in {retry_delay}s... (Attempt {attempt+1}/{max_retries})")
-            await asyncio.sleep(retry_delay)
+            app_logger.warning("LTP not available for %s. Retrying in %ss... (Attempt %d/%d)", symbol, retry_delay, attempt + 1, max_retries)
+            await self.clock.sleep(retry_delay)
         app_logger.error(f"Failed to get LTP for {symbol} after {max_retries} retries.")
         return None
 
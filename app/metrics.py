@@ -0,0 +1,154 @@
+# app/metrics.py
+import time
+from typing import Dict, List
+from app.logger_setup import app_logger
+
+# Log-linear buckets: values below 2 * 2**SUB_BUCKET_BITS are exact, above that each
+# power of two is split into 2**SUB_BUCKET_BITS buckets (~3% relative error at 5 bits).
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_TRACKABLE_NS = 1 << 40  # ~18 minutes
+
+
+def _bucket_index(value: int) -> int:
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return SUB_BUCKETS * shift + (value >> shift)
+
+
+def _bucket_upper_bound(index: int) -> int:
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index - SUB_BUCKETS * shift
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """HDR-style histogram of nanosecond latencies with O(1) record."""
+
+    __slots__ = ("counts", "count", "total", "min", "max", "_max_index")
+
+    def __init__(self):
+        self._max_index = _bucket_index(MAX_TRACKABLE_NS)
+        self.counts: List[int] = [0] * (self._max_index + 1)
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, value_ns: int):
+        if value_ns < 0:
+            value_ns = 0
+        index = _bucket_index(value_ns)
+        if index > self._max_index:
+            index = self._max_index
+        self.counts[index] += 1
+        if self.count == 0 or value_ns < self.min:
+            self.min = value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+        self.count += 1
+        self.total += value_ns
+
+    def percentile(self, q: float) -> int:
+        if self.count == 0:
+            return 0
+        target = max(1, int(self.count * q / 100.0 + 0.5))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count:
+                seen += bucket_count
+                if seen >= target:
+                    return min(_bucket_upper_bound(index), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        if other.count:
+            self.min = other.min if self.count == 0 else min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_us": self.mean() / 1000,
+            "min_us": self.min / 1000,
+            "p50_us": self.percentile(50) / 1000,
+            "p90_us": self.percentile(90) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "p999_us": self.percentile(99.9) / 1000,
+            "max_us": self.max / 1000,
+        }
+
+
+class OperationStats:
+    __slots__ = ("calls", "round_trips", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.round_trips = 0
+        self.latency = LatencyHistogram()
+
+    def reset(self):
+        self.calls = 0
+        self.round_trips = 0
+        self.latency.reset()
+
+
+class RedisMetrics:
+    """Per-operation Redis round-trip counts and latency histograms."""
+
+    def __init__(self):
+        self.operations: Dict[str, OperationStats] = {}
+
+    def record(self, operation: str, round_trips: int, started_ns: int):
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = OperationStats()
+        stats.calls += 1
+        stats.round_trips += round_trips
+        stats.latency.record(time.perf_counter_ns() - started_ns)
+
+    def summary(self) -> Dict[str, dict]:
+        result = {}
+        for operation, stats in self.operations.items():
+            if not stats.calls:
+                continue
+            entry = stats.latency.summary()
+            entry["calls"] = stats.calls
+            entry["round_trips_per_call"] = stats.round_trips / stats.calls
+            result[operation] = entry
+        return result
+
+    def log_summary(self):
+        for operation, entry in self.summary().items():
+            app_logger.info(
+                f"Redis op {operation}: {entry['calls']} calls, "
+                f"{entry['round_trips_per_call']:.2f} RT/call, p50 {entry['p50_us']:.1f}us, "
+                f"p99 {entry['p99_us']:.1f}us, max {entry['max_us']:.1f}us"
+            )
+
+    def export(self, influxdb_manager, reset: bool = True):
+        points = [
+            {"measurement": "redis_ops", "fields": entry, "tags": {"operation": operation}}
+            for operation, entry in self.summary().items()
+        ]
+        if points:
+            influxdb_manager.write_points(points)
+        if reset:
+            for stats in self.operations.values():
+                stats.reset()
\ No newline at end of file
@@ -0,0 +1,160 @@
+# app/noren_client.py
+import json
+import time
+import asyncio
+import hashlib
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from app.logger_setup import app_logger
+from app.rate_limiter import AsyncRateLimiter
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+class NorenRestClient:
+    """Async client for the Noren REST reads: login, quotes, limits and SPAN margin.
+
+    Every request goes over one aiohttp session, so connections are kept alive
+    and reused, and many requests can be in flight at once (see
+    `get_quotes_many`). A token bucket paces them to the broker's rate limit.
+    Idempotent reads are cached for a short TTL, and identical reads already in
+    flight share one request. Failures are logged and return None, like the
+    NorenApi wheel's reads.
+    """
+
+    def __init__(self, host: str, userid: Optional[str] = None, susertoken: Optional[str] = None,
+                 actid: Optional[str] = None, rate_limit: float = 20.0, burst: int = 20, timeout: float = 5.0,
+                 max_connections: int = 8, quote_ttl: float = 0.5, limits_ttl: float = 5.0, span_ttl: float = 30.0):
+        self.host = host.rstrip("/")
+        self.userid = userid
+        self.actid = actid or userid
+        self.susertoken = susertoken
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.quote_ttl = quote_ttl
+        self.limits_ttl = limits_ttl
+        self.span_ttl = span_ttl
+        self.rate_limiter = AsyncRateLimiter(rate_limit, burst)
+        self.requests = 0
+        self.cache_hits = 0
+        self._session: Optional["aiohttp.ClientSession"] = None
+        # (route, request key) -> (fetched at, response)
+        self._cache: Dict[Tuple, Tuple[float, Any]] = {}
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+
+    @classmethod
+    def from_api(cls, api, **kwargs) -> "NorenRestClient":
+        return cls(api.host, api.userid, api.susertoken, **kwargs)
+
+    # --- Transport ---
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def _post(self, route: str, values: dict, authenticated: bool = True) -> Optional[dict]:
+        payload = "jData=" + json.dumps(values, default=lambda o: o.encode())
+        if authenticated:
+            payload += f"&jKey={self.susertoken}"
+        await self.rate_limiter.acquire()
+        self.requests += 1
+        try:
+            async with self._get_session().post(f"{self.host}/{route}", data=payload) as response:
+                result = await response.json(content_type=None)
+        except Exception as e:
+            app_logger.error(f"Noren {route} request error: {e}")
+            return None
+        if not isinstance(result, dict) or result.get("stat") != "Ok":
+            app_logger.error(f"Noren {route} failed: {result}")
+            return None
+        return result
+
+    async def _cached(self, key: Tuple, ttl: float, fetch: Callable[[], Awaitable[Optional[dict]]],
+                      max_age: Optional[float] = None) -> Optional[dict]:
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] < (ttl if max_age is None else max_age):
+            self.cache_hits += 1
+            return cached[1]
+        in_flight = self._in_flight.get(key)
+        if in_flight:
+            self.cache_hits += 1
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await fetch()
+            # Only good responses are cached; a failure is retried by the next caller
+            if result is not None and ttl > 0:
+                self._cache[key] = (time.monotonic(), result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marks the exception retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def invalidate(self, route: Optional[str] = None):
+        """Drops cached responses, of one route ('GetQuotes', 'Limits', 'SpanCalc') or all of them."""
+        if route is None:
+            self._cache.clear()
+        else:
+            self._cache = {key: value for key, value in self._cache.items() if key[0] != route}
+
+    # --- Endpoints ---
+
+    async def login(self, userid: str, password: str, twoFA: str, vendor_code: str, api_secret: str,
+                    imei: str) -> Optional[dict]:
+        values = {
+            "source": "API", "apkversion": "1.0.0", "uid": userid,
+            "pwd": hashlib.sha256(password.encode("utf-8")).hexdigest(),
+            "factor2": twoFA, "vc": vendor_code,
+            "appkey": hashlib.sha256(f"{userid}|{api_secret}".encode("utf-8")).hexdigest(),
+            "imei": imei,
+        }
+        result = await self._post("QuickAuth", values, authenticated=False)
+        if result:
+            self.userid = userid
+            self.actid = result.get("actid", userid)
+            self.susertoken = result["susertoken"]
+            self.invalidate()
+        return result
+
+    async def get_quotes(self, exchange: str, token, max_age: Optional[float] = None) -> Optional[dict]:
+        """Quote for one instrument; `max_age` overrides the cache TTL, 0 forces a fresh request."""
+        values = {"uid": self.userid, "exch": exchange, "token": str(token)}
+        return await self._cached(("GetQuotes", exchange, str(token)), self.quote_ttl,
+                                  lambda: self._post("GetQuotes", values), max_age)
+
+    async def get_quotes_many(self, instruments: Iterable[Tuple[str, Any]],
+                              max_age: Optional[float] = None) -> Dict[Tuple[str, str], Optional[dict]]:
+        """Quotes for many (exchange, token) pairs at once, e.g. a whole strike ladder."""
+        instruments = [(exchange, str(token)) for exchange, token in instruments]
+        quotes = await asyncio.gather(*(self.get_quotes(exchange, token, max_age) for exchange, token in instruments))
+        return dict(zip(instruments, quotes))
+
+    async def get_limits(self) -> Optional[dict]:
+        values = {"uid": self.userid, "actid": self.actid}
+        return await self._cached(("Limits",), self.limits_ttl, lambda: self._post("Limits", values))
+
+    async def span_calculator(self, positions: list) -> Optional[dict]:
+        """SPAN and exposure margin for a list of NorenApi `position`s (or dicts with the same fields)."""
+        values = {"actid": self.actid, "pos": positions}
+        key = ("SpanCalc", json.dumps(positions, default=lambda o: o.encode(), sort_keys=True))
+        return await self._cached(key, self.span_ttl, lambda: self._post("SpanCalc", values))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
\ No newline at end of file
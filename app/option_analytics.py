@@ -2,9 +2,10 @@ import numpy as np
 from datetime import datetime, timedelta
 
 class OptionAnalytics:
-    def __init__(self, position_manager, market_data_processor):
+    def __init__(self, position_manager, market_data_processor, iv_surface=None):
         self.position_manager = position_manager
         self.market_data_processor = market_data_processor
+        self.iv_surface = iv_surface
 
     async def calculate_payoff(self, expiry_date, strike_prices, step=1):
         positions = await self.position_manager.get_all_positions()
@@ -43,6 +44,16 @@ class OptionAnalytics:
         total_vega = 0
         
         for symbol, position in positions.items():
+            greeks = self.iv_surface.greeks_for(symbol) if self.iv_surface else None
+            if greeks:
+                # Black-76 off the fitted smile; vega is per vol point and theta per day
+                quantity = position['quantity']
+                total_delta += greeks['delta'] * quantity
+                total_gamma += greeks['gamma'] * quantity
+                total_theta += greeks['theta'] * quantity
+                total_vega += greeks['vega'] * quantity
+                continue
+
             # These calculations would typically use the Black-Scholes model
             # For simplicity, we'll use placeholder calculations here
             option_type = 'call' if 'CE' in symbol else 'put'
@@ -68,6 +79,10 @@ class OptionAnalytics:
         }
 
     async def calculate_implied_volatility(self):
+        # At-the-money IV of the nearest expiry once the surface has a fit
+        atm_iv = self.iv_surface.atm_iv() if self.iv_surface else None
+        if atm_iv is not None:
+            return atm_iv
         # Placeholder for implied volatility calculation
         # This would typically involve iterative calculations using the BS model
         return 0.2  # 20% IV as a placeholder
@@ -1,37 +1,121 @@
 # app/order_execution_engine.py
 import redis.asyncio as aioredis
 import json
-from typing import Optional
+import time
+import asyncio
+from typing import Dict, List, Optional
 from app.logger_setup import app_logger, pos_logger
+from app.metrics import RedisMetrics
+from app.models import OrderStatus
+from app.order_id_allocator import OrderIdAllocator
+from app.order_gateway import NorenOrderGateway, TERMINAL_STATUSES
 from .market_data_processor import MarketDataProcessor
 from .position_manager import PositionManager
 
+class BasketResult:
+    __slots__ = ("ok", "legs", "leg_times_ns", "slippage", "time_skew_us", "price_skew")
+
+    def __init__(self, ok: bool, legs: List[Optional[dict]], leg_times_ns: List[int], reference_prices: Dict[str, Optional[float]]):
+        self.ok = ok
+        self.legs = legs
+        self.leg_times_ns = leg_times_ns
+        # Slippage of each leg's fill against the LTP at the moment the basket went out
+        self.slippage = {
+            leg["symbol"]: leg["price"] - reference_prices[leg["symbol"]]
+            for leg in legs
+            if leg and leg.get("price") is not None and reference_prices.get(leg["symbol"]) is not None
+        }
+        placed = [t for leg, t in zip(legs, leg_times_ns) if leg]
+        self.time_skew_us = (max(placed) - min(placed)) / 1000 if placed else 0.0
+        self.price_skew = max(self.slippage.values()) - min(self.slippage.values()) if self.slippage else 0.0
+
 class OrderExecutionEngine:
     def __init__(
         self,
         market_data_processor: MarketDataProcessor,
         position_manager: PositionManager,
         redis_client: aioredis.Redis,
+        metrics: Optional[RedisMetrics] = None,
+        id_allocator: Optional[OrderIdAllocator] = None,
+        gateway: Optional[NorenOrderGateway] = None,
+        fill_timeout: float = 10.0,
+        namespace: str = "",
+        stale_hold: float = 5.0,
     ):
         self.market_data_processor = market_data_processor
         self.position_manager = position_manager
         self.redis = redis_client
+        self.metrics = metrics or RedisMetrics()
+        self.id_allocator = id_allocator or OrderIdAllocator(redis_client, metrics=self.metrics)
+        self.gateway = gateway
+        self.fill_timeout = fill_timeout
+        # How long a position-reducing market order waits for a stale price to tick again
+        self.stale_hold = stale_hold
+        # Accounts sharing one Redis keep their open orders under their own prefix
+        self.order_key_prefix = f"order:{namespace}:" if namespace else "order:"
+        self.broker_order_ids: Dict[int, str] = {}
+        # Live orders resting at the broker (stop losses), by norenordno, until the broker fills or cancels them
+        self.resting_orders: Dict[str, dict] = {}
+        # Stop losses cancelled at the broker whose market close has not gone through yet
+        self._pending_closes = set()
+        self._fill_tasks = set()
+        if gateway:
+            gateway.on_order_update = self._on_broker_update
+        # Set by halt(): from then on only orders that reduce an open position go out
+        self.halted: Optional[str] = None
     
+    def halt(self, reason: str):
+        self.halted = reason
+        app_logger.warning(f"Trading halted: {reason}. Only position-reducing orders are accepted.")
+
+    def _reduces_position(self, order_details: dict) -> bool:
+        position = self.position_manager.positions.get(order_details["symbol"])
+        if not position:
+            return False
+        return (position["quantity"] < 0) == (order_details["direction"] == "B") \
+            and order_details["quantity"] <= abs(position["quantity"])
+
     async def place_order(self, order_details: dict) -> Optional[dict]:
+        if self.halted and not self._reduces_position(order_details):
+            app_logger.error(f"Order for {order_details['symbol']} rejected: trading halted ({self.halted}).")
+            return None
+        started = time.perf_counter_ns()
+        if self.market_data_processor.latency_tracker:
+            self.market_data_processor.latency_tracker.record_order_emit(order_details["symbol"])
+        # Only an id that had to wait on a block lease cost this order a round trip
+        leases = self.id_allocator.blocking_leases
         order_id = await self.generate_order_id()
         order_details["order_id"] = order_id
+        round_trips = self.id_allocator.blocking_leases - leases
 
         if order_details.get("order_type") == "MKT":
-            ltp = await self.market_data_processor.get_ltp(order_details["symbol"])
+            symbol = order_details["symbol"]
+            # A stale price never prices an order: opening orders are rejected, closing ones wait for a tick
+            if self.market_data_processor.is_stale(symbol) and (
+                not self._reduces_position(order_details) or not await self._wait_for_fresh_price(symbol)
+            ):
+                app_logger.error(f"Price of {symbol} is stale. MKT order cannot be placed.")
+                self.metrics.record("place_order", round_trips, started)
+                return None
+            ltp = await self.market_data_processor.get_ltp(symbol)
+            round_trips += 1
             if ltp is None:
-                app_logger.error(
-                    f"Unable to get LTP for {order_details['symbol']}. MKT order cannot be placed."
-                )
+                app_logger.error(f"Unable to get LTP for {symbol}. MKT order cannot be placed.")
+                self.metrics.record("place_order", round_trips, started)
                 return None
-            order_details["price"] = ltp
-        
-        await self.redis.set(f"order:{order_id}", json.dumps(order_details))
-        await self.redis.publish("orders", json.dumps(order_details))
+            order_details["price"] = order_details["ltp"] = ltp
+
+        if self.gateway and not await self._route_to_broker(order_details):
+            self.metrics.record("place_order", round_trips, started)
+            return None
+
+        payload = json.dumps(order_details)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(f"{self.order_key_prefix}{order_id}", payload)
+        pipe.publish("orders", payload)
+        await pipe.execute()
+        round_trips += 1
+        self.metrics.record("place_order", round_trips, started)
 
         price_info = (
             f"at market price ~{order_details.get('price')}"
@@ -39,26 +123,262 @@ class OrderExecutionEngine:
             else f"with trigger price {order_details.get('trigger_price')}"
         )
         app_logger.info(
-            f"Simulated order placed: ID {order_id} for {order_details['symbol']} "
+            f"{'Live' if self.gateway else 'Simulated'} order placed: ID {order_id} for {order_details['symbol']} "
             f"({order_details['direction']} {order_details['quantity']}) {price_info}"
         )
 
         return order_details
 
+    async def _wait_for_fresh_price(self, symbol: str) -> bool:
+        clock = self.market_data_processor.clock
+        deadline = clock.time() + self.stale_hold
+        app_logger.warning(f"Holding market order for {symbol} up to {self.stale_hold:g}s until its price ticks again.")
+        while self.market_data_processor.is_stale(symbol):
+            if clock.time() >= deadline:
+                return False
+            await clock.sleep(0.1)
+        return True
+
+    async def _route_to_broker(self, order_details: dict) -> bool:
+        norenordno = await self.gateway.place_order(order_details)
+        if norenordno is None:
+            app_logger.error(f"Broker rejected order {order_details['order_id']} for {order_details['symbol']}.")
+            return False
+        order_details["broker_order_id"] = norenordno
+        self.broker_order_ids[order_details["order_id"]] = norenordno
+
+        if order_details.get("order_type") != "MKT":
+            self.resting_orders[norenordno] = order_details
+            return True
+
+        # Market orders report the broker's fill price instead of the LTP estimate
+        update = await self.gateway.wait_for_status(norenordno, TERMINAL_STATUSES, timeout=self.fill_timeout)
+        if not update or update.get("status") != OrderStatus.COMPLETE:
+            app_logger.error(f"Broker order {norenordno} for {order_details['symbol']} did not fill: {update}")
+            return False
+        order_details["price"] = float(update.get("avgprc") or update.get("flprc") or order_details["price"])
+        order_details["filled"] = True
+        return True
+
+    async def place_basket(self, orders: List[dict], all_or_none: bool = True, confirm: bool = True) -> BasketResult:
+        """Send every leg concurrently. With all_or_none, a failed leg cancels the others before any fill is confirmed."""
+        async def place_leg(order):
+            try:
+                return await self.place_order(order), time.perf_counter_ns()
+            except Exception as e:
+                app_logger.error(f"Basket leg {order.get('symbol')} failed: {e}", exc_info=True)
+                return None, time.perf_counter_ns()
+
+        # Snapshot the prices the basket is judged against before any leg can move them
+        reference_prices = await self.market_data_processor.get_ltps([order["symbol"] for order in orders])
+        placed = await asyncio.gather(*(place_leg(order) for order in orders))
+        legs = [leg for leg, _ in placed]
+        leg_times_ns = [placed_ns for _, placed_ns in placed]
+        ok = all(legs)
+
+        if not ok and all_or_none:
+            placed_legs = [leg for leg in legs if leg]
+            app_logger.error(
+                f"Basket of {len(orders)} legs failed on {len(orders) - len(placed_legs)} leg(s). "
+                f"Rolling back {len(placed_legs)} placed leg(s)."
+            )
+            await asyncio.gather(*(self._rollback_leg(leg) for leg in placed_legs))
+            return BasketResult(False, [None] * len(orders), leg_times_ns, reference_prices)
+
+        if confirm:
+            # Resting legs (stop losses, limits) have no fill yet and are confirmed when they fill
+            await asyncio.gather(*(
+                self.confirm_execution(
+                    symbol=leg["symbol"], quantity=leg["quantity"], price=leg["price"], direction=leg["direction"],
+                    reference_price=reference_prices.get(leg["symbol"]), exchange=leg.get("exchange")
+                )
+                for leg in legs if leg and leg.get("price") is not None
+            ))
+
+        result = BasketResult(ok, legs, leg_times_ns, reference_prices)
+        app_logger.info(
+            f"Basket placed: {sum(1 for leg in legs if leg)}/{len(orders)} legs, "
+            f"time skew {result.time_skew_us:.1f}us, price skew {result.price_skew:.2f}, slippage {result.slippage}"
+        )
+        return result
+
+    async def flatten_all(self, reason: str) -> Optional[BasketResult]:
+        """Closes every open position at market, all legs at once. A leg that fails does not hold back the others."""
+        orders = []
+        for symbol, position in self.position_manager.positions.items():
+            # The fill's exchange survives restarts; the feed's mapping only fills in as ticks arrive
+            exchange = position.get("exchange") or self.market_data_processor.symbol_exchange.get(symbol)
+            if not exchange:
+                app_logger.error(f"No exchange known for {symbol}; it cannot be flattened and must be closed by hand.")
+                continue
+            orders.append({
+                "symbol": symbol,
+                "exchange": exchange,
+                "direction": "B" if position["quantity"] < 0 else "S",
+                "quantity": abs(position["quantity"]),
+                "order_type": "MKT",
+            })
+        app_logger.warning(f"Flattening {len(orders)} position(s): {reason}")
+        if not orders:
+            return None
+        basket = await self.place_basket(orders, all_or_none=False, confirm=False)
+        # Confirmed as closes so a leg a stop loss closed meanwhile is not reopened the other way
+        await asyncio.gather(*(
+            self.confirm_execution(
+                symbol=leg["symbol"], quantity=leg["quantity"], price=leg["price"], direction="CLOSE",
+                reference_price=leg.get("ltp")
+            )
+            for leg in basket.legs if leg
+        ))
+        return basket
+
+    async def _rollback_leg(self, leg: dict):
+        if not leg.get("filled"):
+            await self.cancel_order(leg["order_id"], reason="basket_rollback")
+            return
+        # A live fill cannot be cancelled, so flatten it with an offsetting market order
+        await self.place_order({
+            "symbol": leg["symbol"],
+            "exchange": leg.get("exchange"),
+            "direction": "B" if leg["direction"] == "S" else "S",
+            "quantity": leg["quantity"],
+            "order_type": "MKT",
+        })
+
+    def _on_broker_update(self, update: dict):
+        # A resting order the broker filled on its own (a stop loss triggering there) closes its position here too
+        if update.get("status") != OrderStatus.COMPLETE or update["norenordno"] not in self.resting_orders:
+            return
+        task = asyncio.create_task(self._confirm_broker_fill(update["norenordno"], update))
+        self._fill_tasks.add(task)
+        task.add_done_callback(self._fill_tasks.discard)
+
+    async def _confirm_broker_fill(self, norenordno: str, update: dict):
+        # Whoever pops the order confirms it, so a fill seen twice closes the position once
+        order_details = self.resting_orders.pop(norenordno, None)
+        if not order_details:
+            return
+        self.broker_order_ids.pop(order_details["order_id"], None)
+        price = float(update.get("avgprc") or update.get("flprc") or order_details.get("trigger_price") or 0.0)
+        app_logger.info(
+            f"Broker filled order {update['norenordno']} for {order_details['symbol']} "
+            f"({order_details['direction']} {order_details['quantity']}) at {price}"
+        )
+        try:
+            await self.confirm_execution(
+                symbol=order_details["symbol"], quantity=order_details["quantity"], price=price,
+                direction="CLOSE" if self._reduces_position(order_details) else order_details["direction"],
+                order_id_to_remove=order_details["order_id"], reference_price=order_details.get("trigger_price"),
+                exchange=order_details.get("exchange")
+            )
+        except Exception as e:
+            app_logger.error(f"Error confirming broker fill {update['norenordno']}: {e}", exc_info=True)
+
+    def is_order_open(self, order_id: int) -> bool:
+        """Live: whether the broker still holds the order. Simulated orders stay open until cancelled or confirmed."""
+        if not self.gateway:
+            return True
+        return self.broker_order_ids.get(order_id) in self.resting_orders or order_id in self._pending_closes
+
+    async def trigger_stop_order(self, order_id: int, close_order: dict, price: float) -> bool:
+        """Closes the position behind a stop loss the local price check saw trigger; True once it is closed.
+
+        Simulated, the stop fills at `price`. Live, the broker decides: a stop
+        it already filled is confirmed at its fill price; one still resting is
+        cancelled and replaced with a market close through the gateway.
+        """
+        if not self.gateway:
+            await self.confirm_execution(
+                symbol=close_order["symbol"], quantity=close_order["quantity"], price=price, direction="CLOSE",
+                order_id_to_remove=order_id, reference_price=price
+            )
+            return True
+
+        if order_id not in self._pending_closes:
+            norenordno = self.broker_order_ids.get(order_id)
+            if norenordno not in self.resting_orders:
+                # Already filled at the broker and confirmed through reconciliation, or cancelled
+                return True
+            update = self.gateway.orders.get(norenordno) or {}
+            if update.get("status") not in TERMINAL_STATUSES:
+                await self.gateway.cancel_order(norenordno)
+                update = await self.gateway.wait_for_status(norenordno, TERMINAL_STATUSES, timeout=self.fill_timeout)
+            if not update:
+                app_logger.error(f"Stop loss {norenordno} for {close_order['symbol']} neither filled nor cancelled; retrying.")
+                return False
+            if update.get("status") == OrderStatus.COMPLETE:
+                await self._confirm_broker_fill(norenordno, update)
+                return True
+            # Cancelled or rejected at the broker, so the position is still open there: close it at market
+            self.resting_orders.pop(norenordno, None)
+            self.broker_order_ids.pop(order_id, None)
+            self._pending_closes.add(order_id)
+            await self.redis.delete(f"{self.order_key_prefix}{order_id}")
+
+        order_response = await self.place_order(dict(close_order, order_type="MKT"))
+        if not order_response:
+            app_logger.error(f"Market close for {close_order['symbol']} after stop loss {order_id} failed; retrying.")
+            return False
+        self._pending_closes.discard(order_id)
+        await self.confirm_execution(
+            symbol=close_order["symbol"], quantity=close_order["quantity"], price=order_response["price"],
+            direction="CLOSE", reference_price=order_response.get("ltp")
+        )
+        return True
+
+    async def cancel_order(self, order_id: int, reason: str = "cancelled") -> bool:
+        """False when the broker filled the order before the cancel reached it; the fill is confirmed instead."""
+        started = time.perf_counter_ns()
+        norenordno = self.broker_order_ids.pop(order_id, None)
+        if self.gateway and norenordno:
+            await self.gateway.cancel_order(norenordno)
+            if norenordno in self.resting_orders:
+                update = await self.gateway.wait_for_status(norenordno, TERMINAL_STATUSES, timeout=self.fill_timeout)
+                if update and update.get("status") == OrderStatus.COMPLETE:
+                    await self._confirm_broker_fill(norenordno, update)
+                    self.metrics.record("cancel_order", 0, started)
+                    app_logger.warning(f"Order {order_id} filled at the broker before it could be cancelled ({reason}).")
+                    return False
+                self.resting_orders.pop(norenordno, None)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(f"{self.order_key_prefix}{order_id}")
+        pipe.publish("orders", json.dumps({"order_id": order_id, "status": OrderStatus.CANCELLED, "reason": reason}))
+        await pipe.execute()
+        self.metrics.record("cancel_order", 1, started)
+        app_logger.info(f"{'Live' if self.gateway else 'Simulated'} order cancelled: ID {order_id} ({reason})")
+        return True
+
     async def confirm_execution(
-        self, symbol: str, quantity: int, price: float, direction: str, order_id_to_remove: int = None
+        self, symbol: str, quantity: int, price: float, direction: str, order_id_to_remove: int = None,
+        reference_price: Optional[float] = None, exchange: Optional[str] = None
     ):
         if direction in ("S", "B"):
-            await self.position_manager.add_position(symbol, quantity, price, direction)
-            pos_logger.info(f"Position opened/updated for {symbol} at {price}")
+            await self.position_manager.add_position(symbol, quantity, price, direction, reference_price, exchange)
+            pos_logger.info("Position opened/updated for %s at %s", symbol, price)
         elif direction == "CLOSE":
-            await self.position_manager.close_position(symbol, price, quantity)
-            pos_logger.info(f"Position closed for {symbol} at {price}")
+            await self.position_manager.close_position(symbol, price, quantity, reference_price)
+            pos_logger.info("Position closed for %s at %s", symbol, price)
 
         if order_id_to_remove:
-            await self.redis.delete(f"order:{order_id_to_remove}")
+            started = time.perf_counter_ns()
+            await self.redis.delete(f"{self.order_key_prefix}{order_id_to_remove}")
+            self.metrics.record("confirm_execution", 1, started)
 
         return True
 
+    async def purge_orphan_orders(self, keep_order_ids) -> int:
+        prefix = self.order_key_prefix
+        keep = {f"{prefix}{order_id}" for order_id in keep_order_ids}
+        orphans = []
+        async for key in self.redis.scan_iter(match=f"{prefix}*", count=500):
+            key = key.decode("utf-8") if isinstance(key, bytes) else key
+            # Another account's namespace nests under the bare prefix
+            if key not in keep and ":" not in key[len(prefix):]:
+                orphans.append(key)
+        if orphans:
+            await self.redis.delete(*orphans)
+            app_logger.info(f"Removed {len(orphans)} orphan order keys from Redis.")
+        return len(orphans)
+
     async def generate_order_id(self) -> int:
-        return await self.redis.incr("order_id_counter")
\ No newline at end of file
+        return await self.id_allocator.next_id()
\ No newline at end of file
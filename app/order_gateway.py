@@ -0,0 +1,239 @@
+# app/order_gateway.py
+import json
+import time
+import asyncio
+import requests
+import urllib.parse
+import redis.asyncio as aioredis
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Callable, Dict, Iterable, Optional
+from app.logger_setup import app_logger
+from app.models import OrderStatus, ProductType
+from app.rate_limiter import AsyncRateLimiter
+
+ORDER_TYPE_MAP = {
+    "MKT": "MKT",
+    "LMT": "LMT",
+    "SL-M": "SL-MKT",
+    "SL-MKT": "SL-MKT",
+    "SL-LMT": "SL-LMT",
+}
+
+TERMINAL_STATUSES = (OrderStatus.COMPLETE, OrderStatus.REJECTED, OrderStatus.CANCELLED)
+
+
+class NorenOrderGateway:
+    """Routes orders to the Noren REST API without blocking the event loop.
+
+    Requests run on a dedicated thread pool over one keep-alive requests.Session,
+    paced by a token bucket sized to the broker's order-rate limit. Modifies for
+    the same order that queue up behind the limiter are coalesced into a single
+    request carrying the latest values. Order state is reconciled from the
+    `order_updates` channel (or the account's own `order_channel`) that
+    WebSocketManager publishes to.
+    """
+
+    def __init__(self, host: str, userid: str, susertoken: str, actid: Optional[str] = None,
+                 max_workers: int = 4, rate_limit: float = 10.0, burst: int = 10, timeout: float = 5.0,
+                 order_channel: str = "order_updates"):
+        self.host = host.rstrip("/")
+        self.userid = userid
+        self.actid = actid or userid
+        self.susertoken = susertoken
+        self.timeout = timeout
+        self.order_channel = order_channel
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="noren-gateway")
+        self.rate_limiter = AsyncRateLimiter(rate_limit, burst)
+        self.orders: Dict[str, dict] = {}
+        self.on_order_update: Optional[Callable[[dict], None]] = None
+        self.coalesced_modifies = 0
+        self._pending_modifies: Dict[str, tuple] = {}
+        self._status_waiters: Dict[str, list] = {}
+        self._pubsub = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+        # Cleared by close(); redis-py can swallow a cancel that lands inside get_message(timeout=...)
+        self._reconciling = False
+
+    @classmethod
+    def from_api(cls, api, **kwargs) -> "NorenOrderGateway":
+        return cls(api.host, api.userid, api.susertoken, **kwargs)
+
+    # --- Transport ---
+
+    def _post(self, route: str, values: dict) -> Optional[dict]:
+        payload = "jData=" + json.dumps(values) + f"&jKey={self.susertoken}"
+        response = self.session.post(f"{self.host}/{route}", data=payload, timeout=self.timeout)
+        result = response.json()
+        if not isinstance(result, dict) or result.get("stat") != "Ok":
+            app_logger.error(f"Noren {route} failed: {result}")
+            return None
+        return result
+
+    async def _call(self, route: str, values: dict) -> Optional[dict]:
+        await self.rate_limiter.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, self._post, route, values)
+        except Exception as e:
+            app_logger.error(f"Noren {route} request error: {e}", exc_info=True)
+            return None
+
+    # --- Orders ---
+
+    async def place_order(self, order: dict) -> Optional[str]:
+        values = {
+            "ordersource": "API",
+            "uid": self.userid,
+            "actid": self.actid,
+            "trantype": order["direction"],
+            "prd": order.get("product_type", ProductType.MIS),
+            "exch": order["exchange"],
+            # The body is form-encoded, so a symbol like M&M must be quoted as NorenApi does
+            "tsym": urllib.parse.quote_plus(order["symbol"]),
+            "qty": str(order["quantity"]),
+            "dscqty": "0",
+            "prctyp": ORDER_TYPE_MAP[order["order_type"]],
+            "prc": str(order.get("limit_price", 0.0)),
+            "ret": "DAY",
+            "remarks": str(order.get("order_id", "")),
+        }
+        if order.get("trigger_price") is not None:
+            values["trgprc"] = str(order["trigger_price"])
+        result = await self._call("PlaceOrder", values)
+        if not result:
+            return None
+        norenordno = result["norenordno"]
+        self.orders.setdefault(norenordno, {"norenordno": norenordno, "status": OrderStatus.OPEN_PENDING})
+        return norenordno
+
+    async def modify_order(self, norenordno: str, exchange: str, symbol: str, quantity: int,
+                           order_type: str, price: float = 0.0, trigger_price: Optional[float] = None) -> Optional[dict]:
+        values = {
+            "ordersource": "API",
+            "uid": self.userid,
+            "actid": self.actid,
+            "norenordno": str(norenordno),
+            "exch": exchange,
+            "tsym": urllib.parse.quote_plus(symbol),
+            "qty": str(quantity),
+            "prctyp": ORDER_TYPE_MAP[order_type],
+            "prc": str(price),
+        }
+        if trigger_price is not None:
+            values["trgprc"] = str(trigger_price)
+
+        pending = self._pending_modifies.get(norenordno)
+        if pending:
+            # A modify for this order is still waiting on the limiter; send only the latest values
+            pending[0].update(values)
+            self.coalesced_modifies += 1
+            return await asyncio.shield(pending[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending_modifies[norenordno] = (values, future)
+        asyncio.create_task(self._send_modify(norenordno))
+        return await asyncio.shield(future)
+
+    async def _send_modify(self, norenordno: str):
+        await self.rate_limiter.acquire()
+        entry = self._pending_modifies.pop(norenordno, None)
+        if entry is None:
+            return
+        values, future = entry
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, self._post, "ModifyOrder", values)
+        except Exception as e:
+            app_logger.error(f"Noren ModifyOrder request error: {e}", exc_info=True)
+            result = None
+        if not future.done():
+            future.set_result(result)
+
+    async def cancel_order(self, norenordno: str) -> Optional[dict]:
+        pending = self._pending_modifies.pop(norenordno, None)
+        if pending and not pending[1].done():
+            pending[1].set_result(None)
+        return await self._call("CancelOrder", {"ordersource": "API", "uid": self.userid, "norenordno": str(norenordno)})
+
+    # --- Reconciliation ---
+
+    async def start(self, pubsub_client: aioredis.Redis):
+        self._pubsub = pubsub_client.pubsub()
+        await self._pubsub.subscribe(self.order_channel)
+        self._reconciling = True
+        self._reconcile_task = asyncio.create_task(self._reconcile_updates())
+
+    async def _reconcile_updates(self):
+        try:
+            while self._reconciling:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message:
+                    try:
+                        self.apply_order_update(json.loads(message["data"]))
+                    except Exception as e:
+                        app_logger.error(f"Error reconciling order update: {e}", exc_info=True)
+        except asyncio.CancelledError:
+            pass
+
+    def apply_order_update(self, update: dict):
+        norenordno = update.get("norenordno")
+        if not norenordno:
+            return
+        order = self.orders.setdefault(norenordno, {"norenordno": norenordno})
+        order.update(update)
+        order["updated_at"] = time.time()
+        status = update.get("status")
+        if self.on_order_update:
+            self.on_order_update(order)
+
+        waiters = self._status_waiters.get(norenordno)
+        if waiters:
+            for statuses, future in waiters[:]:
+                if status in statuses and not future.done():
+                    future.set_result(dict(order))
+                    waiters.remove((statuses, future))
+            if not waiters:
+                del self._status_waiters[norenordno]
+
+    async def wait_for_status(self, norenordno: str, statuses: Iterable[str] = TERMINAL_STATUSES,
+                              timeout: Optional[float] = None) -> Optional[dict]:
+        statuses = tuple(statuses)
+        order = self.orders.get(norenordno)
+        if order and order.get("status") in statuses:
+            return dict(order)
+        future = asyncio.get_running_loop().create_future()
+        waiter = (statuses, future)
+        self._status_waiters.setdefault(norenordno, []).append(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            app_logger.warning(f"Timed out waiting for order {norenordno} to reach {statuses}")
+            return None
+        finally:
+            # A resolved waiter is already gone; one that timed out or was cancelled is not
+            waiters = self._status_waiters.get(norenordno)
+            if waiters is not None:
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                if not waiters:
+                    del self._status_waiters[norenordno]
+
+    async def close(self):
+        self._reconciling = False
+        if self._reconcile_task:
+            self._reconcile_task.cancel()
+            try:
+                await self._reconcile_task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.unsubscribe(self.order_channel)
+            await self._pubsub.close()
+        self.executor.shutdown(wait=False)
+        self.session.close()
+        app_logger.info(f"Order gateway closed ({self.coalesced_modifies} modifies coalesced).")
\ No newline at end of file
@@ -0,0 +1,80 @@
+# app/order_id_allocator.py
+import time
+import asyncio
+import redis.asyncio as aioredis
+from typing import Optional, Tuple
+from app.logger_setup import app_logger
+from app.metrics import RedisMetrics
+
+
+class OrderIdAllocator:
+    """Hands out order ids from blocks leased with INCRBY on the shared Redis counter.
+
+    Ids stay unique across processes (every lease is a disjoint range of the same
+    counter) and monotonic within a process (blocks are leased one at a time, so a
+    later block always starts above the current one). The next block is leased in
+    the background once the current one runs low, so next_id() normally returns
+    without touching Redis.
+    """
+
+    def __init__(self, redis_client: aioredis.Redis, key: str = "order_id_counter", block_size: int = 100,
+                 low_watermark: Optional[int] = None, metrics: Optional[RedisMetrics] = None):
+        if block_size < 1:
+            raise ValueError(f"block_size must be positive, got {block_size}")
+        self.redis = redis_client
+        self.key = key
+        self.block_size = block_size
+        self.low_watermark = low_watermark if low_watermark is not None else max(1, block_size // 5)
+        self.metrics = metrics or RedisMetrics()
+        self._next = 1
+        self._end = 0
+        self._spare: Optional[Tuple[int, int]] = None
+        self._refill: Optional[asyncio.Task] = None
+        # next_id() calls that had to wait on a lease round trip
+        self.blocking_leases = 0
+
+    async def next_id(self) -> int:
+        if self._next > self._end:
+            await self._switch_block()
+        order_id = self._next
+        self._next += 1
+        if self._spare is None and self._refill is None and self._end - self._next < self.low_watermark:
+            self._refill = asyncio.create_task(self._lease_spare())
+        return order_id
+
+    async def _switch_block(self):
+        while self._next > self._end:
+            if self._spare is None:
+                if self._refill is None:
+                    self._refill = asyncio.create_task(self._lease_spare())
+                if self._end:
+                    app_logger.warning("Order id block exhausted before the next lease completed. Waiting on Redis.")
+                self.blocking_leases += 1
+                await asyncio.shield(self._refill)
+            if self._spare is not None and self._next > self._end:
+                self._next, self._end = self._spare
+                self._spare = None
+
+    async def _lease_spare(self):
+        try:
+            started = time.perf_counter_ns()
+            end = await self.redis.incrby(self.key, self.block_size)
+            self.metrics.record("order_id_lease", 1, started)
+            self._spare = (end - self.block_size + 1, end)
+        finally:
+            self._refill = None
+
+    async def prime(self):
+        """Lease the first block up front so the first order does not wait on Redis."""
+        if self._next > self._end and self._spare is None:
+            await self._switch_block()
+
+    async def close(self):
+        if self._refill:
+            try:
+                await self._refill
+            except Exception as e:
+                app_logger.error(f"Order id lease failed during shutdown: {e}")
+        unused = max(0, self._end - self._next + 1) + (self.block_size if self._spare else 0)
+        if unused:
+            app_logger.info(f"Order id allocator closed with {unused} leased ids unused.")
\ No newline at end of file
@@ -0,0 +1,76 @@
+# app/portfolio_rules.py
+import time
+import asyncio
+from typing import Optional
+from app.logger_setup import app_logger
+
+
+class PortfolioExitRules:
+    """Portfolio-wide exits, checked on every PnL change PositionManager reports.
+
+    - max_daily_loss: total PnL (realized + unrealized) at or below -max_daily_loss.
+    - combined_stop_loss_percentage: buying back all open short legs costs this
+      much more than the premium collected on them.
+    - trailing_profit_activation / trailing_profit_lock_percentage: once total
+      PnL has reached the activation level, it may not fall below the locked
+      share of its peak.
+
+    A check is a few comparisons whatever the number of legs. The first rule to
+    fire halts new entries in the order engine and flattens every position in
+    the same tick. Limits are read from the current rules, so a reload applies
+    to the next tick; 0 disables a rule.
+    """
+
+    def __init__(self, config, order_execution_engine):
+        self.config = config
+        self.order_execution_engine = order_execution_engine
+        self.peak_pnl = 0.0
+        self.fired: Optional[str] = None
+        self.flatten_task: Optional[asyncio.Future] = None
+
+    def on_pnl(self, position_manager):
+        if self.fired:
+            return
+        rules = self.config.rules
+        pnl = position_manager.realized_pnl + position_manager.unrealized_pnl
+        if pnl > self.peak_pnl:
+            self.peak_pnl = pnl
+
+        if rules.max_daily_loss and pnl <= -rules.max_daily_loss:
+            self.fire(f"max daily loss {rules.max_daily_loss} reached, PnL {pnl:.2f}")
+        elif rules.combined_stop_loss_percentage and position_manager.short_entry_premium > 0 \
+                and position_manager.short_premium >= \
+                position_manager.short_entry_premium * (1 + rules.combined_stop_loss_percentage / 100):
+            self.fire(
+                f"combined premium {position_manager.short_premium:.2f} is "
+                f"{rules.combined_stop_loss_percentage}% over the {position_manager.short_entry_premium:.2f} collected"
+            )
+        elif rules.trailing_profit_activation and self.peak_pnl >= rules.trailing_profit_activation \
+                and pnl <= self.peak_pnl * rules.trailing_profit_lock_percentage / 100:
+            self.fire(
+                f"trailing profit lock: PnL {pnl:.2f} fell below "
+                f"{rules.trailing_profit_lock_percentage}% of the {self.peak_pnl:.2f} peak"
+            )
+
+    def fire(self, reason: str):
+        self.fired = reason
+        app_logger.warning(f"Portfolio exit rule fired: {reason}")
+        self.order_execution_engine.halt(reason)
+        self.flatten_task = asyncio.ensure_future(self._flatten(reason, time.perf_counter_ns()))
+
+    async def _flatten(self, reason: str, fired_ns: int):
+        try:
+            basket = await self.order_execution_engine.flatten_all(reason)
+        except Exception as e:
+            app_logger.error(f"Flatten after '{reason}' failed: {e}", exc_info=True)
+            return
+        if basket and basket.legs:
+            placed = [t for leg, t in zip(basket.legs, basket.leg_times_ns) if leg]
+            if placed:
+                app_logger.info(f"Flatten orders out {(max(placed) - fired_ns) / 1e6:.2f} ms after the rule fired.")
+            if not basket.ok:
+                app_logger.error("Some positions could not be flattened; they are still open.")
+
+    async def close(self):
+        if self.flatten_task:
+            await self.flatten_task
\ No newline at end of file
@@ -1,19 +1,83 @@
 class PositionManager:
-    def __init__(self, market_data_processor, influxdb_manager):
+    def __init__(self, market_data_processor, influxdb_manager, state_store=None, journal=None):
         self.positions = {}  # Stores open positions
         self.market_data_processor = market_data_processor
         self.influxdb_manager = influxdb_manager
+        self.state_store = state_store
+        self.journal = journal
         
         # --- NEW: PnL State Management ---
         self.realized_pnl = 0.0
         self.unrealized_pnl = 0.0
         self.trade_margin = 0.0
+        # Premium collected on the open short legs and what buying them back costs now
+        self.short_entry_premium = 0.0
+        self.short_premium = 0.0
+        self.pnl_listeners = []
+
+    def subscribe_pnl(self, listener):
+        """Calls `listener(position_manager)` after every PnL change, including each tick on_tick() applies."""
+        self.pnl_listeners.append(listener)
+
+    def on_tick(self, symbol, ltp):
+        # Tick listener: moves the totals by this leg's change alone, no I/O
+        pos = self.positions.get(symbol)
+        if pos is None:
+            return
+        change = ltp - pos['current_price']
+        if not change:
+            return
+        pos['current_price'] = ltp
+        quantity = pos['quantity']
+        self.unrealized_pnl += change * quantity
+        if quantity < 0:
+            self.short_premium -= change * quantity
+        for listener in self.pnl_listeners:
+            listener(self)
+
+    def _refresh_totals(self):
+        unrealized = short_entry = short_current = 0.0
+        for pos in self.positions.values():
+            unrealized += (pos['current_price'] - pos['entry_price']) * pos['quantity']
+            if pos['quantity'] < 0:
+                short_entry -= pos['entry_price'] * pos['quantity']
+                short_current -= pos['current_price'] * pos['quantity']
+        self.unrealized_pnl = unrealized
+        self.short_entry_premium = short_entry
+        self.short_premium = short_current
 
     def set_trade_margin(self, margin):
         self.trade_margin = margin
+        if self.state_store:
+            self.state_store.record_trade_margin(margin)
+
+    def restore(self, positions, realized_pnl, trade_margin):
+        self.positions = {symbol: dict(pos) for symbol, pos in positions.items()}
+        self.realized_pnl = realized_pnl
+        self.trade_margin = trade_margin
+        self._refresh_totals()
+
+    def capture_state(self):
+        return {
+            'positions': {symbol: dict(pos) for symbol, pos in self.positions.items()},
+            'realized_pnl': self.realized_pnl,
+            'trade_margin': self.trade_margin,
+        }
+
+    def _journal_fill(self, symbol, quantity, price, direction, side, reference_price=None, trade_pnl=None):
+        if self.state_store:
+            self.state_store.record_fill(
+                symbol, quantity, price, direction, self.positions.get(symbol), self.realized_pnl
+            )
+        if self.journal:
+            position = self.positions.get(symbol)
+            self.journal.record_fill(
+                symbol, side, quantity, price, reference_price, position['quantity'] if position else 0,
+                trade_pnl, self.realized_pnl
+            )
 
     # --- REFACTORED: Now handles trade direction and averaging ---
-    async def add_position(self, symbol, quantity, price, direction):
+    async def add_position(self, symbol, quantity, price, direction, reference_price=None, exchange=None):
         signed_quantity = quantity if direction == 'B' else -quantity
         
         if symbol not in self.positions:
@@ -22,6 +86,9 @@ class PositionManager:
                 'entry_price': price,
                 'current_price': price
             }
+            # Kept with the position (and so in its snapshots) for closing it without the feed's mapping
+            if exchange:
+                self.positions[symbol]['exchange'] = exchange
         else:
             # Logic to average price if adding to an existing position
             old_qty = self.positions[symbol]['quantity']
@@ -31,18 +98,20 @@ class PositionManager:
             total_qty = old_qty + signed_quantity
             if total_qty == 0:
                 # This trade closes the position, handle as a close event
-                await self.close_position(symbol, price, abs(signed_quantity))
+                await self.close_position(symbol, price, abs(signed_quantity), reference_price)
                 return
             
             self.positions[symbol]['entry_price'] = (old_value + new_value) / total_qty
             self.positions[symbol]['quantity'] = total_qty
 
+        self._journal_fill(symbol, quantity, price, direction, direction, reference_price)
+
         # Write data and recalculate PnL
         self._write_position_data(symbol, self.positions[symbol]['quantity'], price, "add")
         await self.update_and_write_all_pnl()
 
     # --- NEW: Crucial method to handle closing positions ---
-    async def close_position(self, symbol, exit_price, quantity_to_close):
+    async def close_position(self, symbol, exit_price, quantity_to_close, reference_price=None):
         if symbol not in self.positions:
             return
 
@@ -55,7 +124,8 @@ class PositionManager:
         if original_quantity > 0: # Long position
              signed_qty_to_close *= -1
 
-        trade_pnl = (exit_price - entry_price) * abs(signed_qty_to_close)
+        # signed_qty_to_close is negative for longs, so this is exit - entry for longs and entry - exit for shorts
+        trade_pnl = (entry_price - exit_price) * signed_qty_to_close
         self.realized_pnl += trade_pnl
         
         # Reduce position size or remove completely
@@ -66,6 +136,10 @@ class PositionManager:
         if pos['quantity'] == 0:
             del self.positions[symbol]
 
+        side = 'S' if original_quantity > 0 else 'B'
+        # The quantity actually closed: a close larger than the position only closes what is there
+        self._journal_fill(symbol, abs(signed_qty_to_close), exit_price, 'CLOSE', side, reference_price, trade_pnl)
+
         await self.update_and_write_all_pnl()
 
     # --- REFACTORED: Now only updates price and recalculates unrealized PnL ---
@@ -77,14 +151,16 @@ class PositionManager:
     # --- NEW: Centralized PnL calculation and writing ---
     async def update_and_write_all_pnl(self):
         # 1. Calculate current unrealized PnL
-        current_unrealized_pnl = 0.0
         for symbol, pos in self.positions.items():
             position_pnl = (pos['current_price'] - pos['entry_price']) * pos['quantity']
-            current_unrealized_pnl += position_pnl
             # Write individual position PnL
             self._write_position_data(symbol, pos['quantity'], pos['current_price'], "update", position_pnl)
 
-        self.unrealized_pnl = current_unrealized_pnl
+        self._refresh_totals()
+        for listener in self.pnl_listeners:
+            listener(self)
+        if self.journal:
+            self.journal.record_pnl(self.realized_pnl, self.unrealized_pnl, self.trade_margin)
 
         # 2. Write aggregated PnL data
         await self._write_pnl_data()
@@ -0,0 +1,253 @@
+# app/roll_engine.py
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.clock import RealClock
+from app.logger_setup import app_logger
+from app.metrics import LatencyHistogram
+from app.utils import SYMBOL_MAP, get_expiry_chain, get_underlying_instrument
+
+# resolve_strikes(atm) -> {leg key: (strike, option type)}, the strategy's own strike rule
+StrikeResolver = Callable[[float], Dict[str, Tuple[float, str]]]
+# on_roll(new legs, new ATM strike, fills of the opened legs) runs under the roll lock
+RollCallback = Callable[[Dict[str, dict], float, List[dict]], Awaitable[None]]
+# release_stops(symbols) cancels the stop losses of legs about to be bought back and returns the symbols
+# whose stop loss filled first; restore_stops(symbols) puts them back when the roll basket fails
+StopRelease = Callable[[List[str]], Awaitable[List[str]]]
+StopRestore = Callable[[List[str]], Awaitable[None]]
+
+
+def _instrument(leg: dict) -> Tuple[str, int, str]:
+    return leg['Exchange'], leg['Token'], leg['TradingSymbol']
+
+
+class RollEngine:
+    """Re-centres a short straddle when the underlying drifts away from its strikes.
+
+    The underlying is followed tick by tick. Once it is `roll_threshold_points`
+    from the ATM strike the legs were struck at, the open legs whose strike
+    changes are bought back and the new ones sold in one all-or-none basket.
+    New legs come from the expiry's chain, loaded once at start(). The legs a
+    roll could move to, `roll_watch_strikes` ATM steps either side, stay
+    subscribed and are diffed as the ATM moves, so they already have a price
+    when a roll fires and only the strikes entering or leaving the window go
+    to the broker.
+    """
+
+    def __init__(self, config, websocket_manager, market_data_processor, order_execution_engine, position_manager,
+                 clock=None):
+        self.config = config
+        self.websocket_manager = websocket_manager
+        self.market_data_processor = market_data_processor
+        self.order_execution_engine = order_execution_engine
+        self.position_manager = position_manager
+        self.clock = clock or RealClock()
+        self.histograms = {
+            'decision_to_orders': LatencyHistogram(),
+            'decision_to_protected': LatencyHistogram(),
+        }
+        self.rolls = 0
+        self.legs: Dict[str, dict] = {}
+        self.center: Optional[float] = None
+        self.underlying_price: Optional[float] = None
+        self.chain: Dict[Tuple[float, str], dict] = {}
+        self.step = 0
+        self._underlying: Optional[dict] = None
+        self._resolve_strikes: Optional[StrikeResolver] = None
+        self._on_roll: Optional[RollCallback] = None
+        self._release_stops: Optional[StopRelease] = None
+        self._restore_stops: Optional[StopRestore] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._watched: Dict[str, Tuple[str, int, str]] = {}
+        self._watch_atm: Optional[float] = None
+        self._rolling: Optional[asyncio.Future] = None
+        self._last_roll = float('-inf')
+        self._armed = False
+
+    async def start(self, legs: Dict[str, dict], atm_strike: float, resolve_strikes: StrikeResolver,
+                    on_roll: RollCallback, lock: asyncio.Lock, release_stops: Optional[StopRelease] = None,
+                    restore_stops: Optional[StopRestore] = None) -> bool:
+        tsymbol = self.config.rules.tsymbol
+        try:
+            underlying = await get_underlying_instrument(tsymbol)
+        except Exception as e:
+            app_logger.error(f"Roll engine disabled: no underlying instrument for {tsymbol}: {e}")
+            return False
+        chain = await get_expiry_chain(tsymbol, next(iter(legs.values()))['Expiry'])
+        if not chain:
+            app_logger.error(f"Roll engine disabled: no option chain for the {tsymbol} legs' expiry.")
+            return False
+
+        self.chain = chain
+        self.step = SYMBOL_MAP[tsymbol][1]
+        self.legs = dict(legs)
+        self.center = atm_strike
+        self._underlying = underlying
+        self._resolve_strikes = resolve_strikes
+        self._on_roll = on_roll
+        self._release_stops = release_stops
+        self._restore_stops = restore_stops
+        self._lock = lock
+        self._armed = True
+        await self.websocket_manager.subscribe_symbol(*_instrument(underlying))
+        await self._sync_watch(atm_strike)
+        self.market_data_processor.subscribe_ticks(self.on_tick)
+        app_logger.info(
+            f"Roll engine following {underlying['TradingSymbol']} around ATM {atm_strike}, "
+            f"{len(chain)} options in the chain, {len(self._watched)} watched."
+        )
+        return True
+
+    async def stop(self):
+        """Stops new rolls, waits for one in flight and drops the engine's subscriptions."""
+        if not self._armed:
+            return
+        self._armed = False
+        self.market_data_processor.unsubscribe_ticks(self.on_tick)
+        if self._rolling:
+            await self._rolling
+        await self.websocket_manager.unsubscribe_many(list(self._watched.values()))
+        self._watched = {}
+        await self.websocket_manager.unsubscribe_symbol(*_instrument(self._underlying))
+        self.log_summary()
+
+    def on_tick(self, symbol: str, ltp: float):
+        if not self._armed or symbol != self._underlying['TradingSymbol']:
+            return
+        self.underlying_price = ltp
+        atm = round(ltp / self.step) * self.step
+        if atm != self._watch_atm:
+            self._watch_atm = atm
+            asyncio.ensure_future(self._sync_watch(atm))
+        if self._rolling is not None or atm == self.center:
+            return
+        rules = self.config.rules
+        threshold = rules.roll_threshold_points
+        if threshold > 0 and abs(ltp - self.center) >= threshold \
+                and self.clock.time() - self._last_roll >= rules.roll_cooldown_seconds:
+            app_logger.info("Underlying %s is %.2f from ATM %s; rolling to %s", ltp, ltp - self.center, self.center, atm)
+            self._rolling = asyncio.ensure_future(self._roll(atm, time.perf_counter_ns()))
+
+    async def _sync_watch(self, atm: float):
+        """Subscribes the legs of every ATM within `roll_watch_strikes` steps and drops the ones that left."""
+        if not self._armed:
+            return
+        width = self.config.rules.roll_watch_strikes
+        wanted = {}
+        for offset in range(-width, width + 1):
+            for strike in self._resolve_strikes(atm + offset * self.step).values():
+                leg = self.chain.get(strike)
+                if leg:
+                    wanted[leg['TradingSymbol']] = _instrument(leg)
+        added = [instrument for symbol, instrument in wanted.items() if symbol not in self._watched]
+        removed = [instrument for symbol, instrument in self._watched.items() if symbol not in wanted]
+        self._watched = wanted
+        await self.websocket_manager.subscribe_many(added)
+        await self.websocket_manager.unsubscribe_many(removed)
+
+    async def _roll(self, atm: float, decided_ns: int):
+        try:
+            async with self._lock:
+                if self._armed:
+                    await self._execute_roll(atm, decided_ns)
+        except Exception as e:
+            app_logger.error(f"Roll to ATM {atm} failed: {e}", exc_info=True)
+        finally:
+            self._last_roll = self.clock.time()
+            self._rolling = None
+
+    async def _execute_roll(self, atm: float, decided_ns: int):
+        targets = self._resolve_strikes(atm)
+        positions = self.position_manager.positions
+        closes, opens, rolled = [], [], []
+        legs = dict(self.legs)
+        for key, leg in self.legs.items():
+            position = positions.get(leg['TradingSymbol'])
+            # Legs already stopped out stay closed
+            if not position or position['quantity'] >= 0:
+                continue
+            target = self.chain.get(targets[key])
+            if target is None:
+                app_logger.error(f"No listed option for {key} at {targets[key]}. Roll to ATM {atm} skipped.")
+                return
+            if target['TradingSymbol'] == leg['TradingSymbol']:
+                continue
+            quantity = abs(position['quantity'])
+            closes.append({'symbol': leg['TradingSymbol'], 'exchange': leg['Exchange'], 'direction': 'B',
+                           'quantity': quantity, 'order_type': 'MKT'})
+            opens.append({'symbol': target['TradingSymbol'], 'exchange': target['Exchange'], 'direction': 'S',
+                          'quantity': quantity, 'order_type': 'MKT'})
+            rolled.append(key)
+            legs[key] = target
+        if not opens:
+            self.center = atm
+            return
+
+        ltps = await self.market_data_processor.get_ltps([order['symbol'] for order in opens])
+        unpriced = [symbol for symbol, ltp in ltps.items() if ltp is None]
+        if unpriced:
+            app_logger.warning(f"Roll to ATM {atm} deferred: no price yet for {', '.join(unpriced)}.")
+            return
+
+        # A buy-to-close sent while the leg's SL-M still rests could fill alongside it and leave a naked long
+        released = [order['symbol'] for order in closes]
+        if self._release_stops:
+            stopped = set(await self._release_stops(released))
+            if stopped:
+                # Those legs are closed now and stay closed; the rest still roll
+                app_logger.warning(f"Stop loss filled on {', '.join(stopped)} before the roll to ATM {atm}.")
+                keep = [i for i, order in enumerate(closes) if order['symbol'] not in stopped]
+                for i, key in enumerate(rolled):
+                    if closes[i]['symbol'] in stopped:
+                        legs[key] = self.legs[key]
+                closes = [closes[i] for i in keep]
+                opens = [opens[i] for i in keep]
+                released = [order['symbol'] for order in closes]
+                if not opens:
+                    return
+
+        basket = await self.order_execution_engine.place_basket(closes + opens, all_or_none=True, confirm=True)
+        if not basket.ok:
+            app_logger.error(f"Roll basket to ATM {atm} failed. Legs unchanged.")
+            if self._restore_stops:
+                await self._restore_stops(released)
+            return
+        orders_ns = max(basket.leg_times_ns) - decided_ns
+        self.histograms['decision_to_orders'].record(orders_ns)
+
+        self.legs = legs
+        self.center = atm
+        opened = [
+            {'symbol': leg['symbol'], 'exchange': leg['exchange'], 'order_id': leg['order_id'],
+             'executed_price': leg['price']}
+            for leg in basket.legs[len(closes):]
+        ]
+        await self._on_roll(legs, atm, opened)
+        protected_ns = time.perf_counter_ns() - decided_ns
+        self.histograms['decision_to_protected'].record(protected_ns)
+        self.rolls += 1
+        app_logger.info(
+            f"Rolled {len(opens)} leg(s) to ATM {atm}: orders out {orders_ns / 1e6:.2f} ms and stop losses "
+            f"placed {protected_ns / 1e6:.2f} ms after the decision."
+        )
+
+    def summary(self) -> Dict[str, dict]:
+        return {stage: hist.summary() for stage, hist in self.histograms.items() if hist.count}
+
+    def log_summary(self):
+        for stage, entry in self.summary().items():
+            app_logger.info(
+                f"Roll {stage}: {entry['count']} rolls, p50 {entry['p50_us'] / 1000:.2f}ms, "
+                f"max {entry['max_us'] / 1000:.2f}ms"
+            )
+
+    def export(self, influxdb_manager, reset: bool = True):
+        points = [
+            {"measurement": "roll_latency", "fields": entry, "tags": {"stage": stage}}
+            for stage, entry in self.summary().items()
+        ]
+        if points:
+            influxdb_manager.write_points(points)
+        if reset:
+            for hist in self.histograms.values():
+                hist.reset()
\ No newline at end of file
@@ -0,0 +1,186 @@
+# app/rules.py
+import os
+import asyncio
+from datetime import datetime, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.logger_setup import app_logger
+
+
+class RulesError(ValueError):
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def _parse_time(value) -> time:
+    if isinstance(value, time):
+        return value
+    return datetime.strptime(str(value), '%H:%M:%S').time()
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    raise ValueError(f"expected true/false, got {value!r}")
+
+
+def _positive(parse: Callable) -> Callable:
+    def parse_positive(value):
+        value = parse(value)
+        if value <= 0:
+            raise ValueError(f"must be positive, got {value}")
+        return value
+    return parse_positive
+
+
+def _non_negative(parse: Callable) -> Callable:
+    def parse_non_negative(value):
+        value = parse(value)
+        if value < 0:
+            raise ValueError(f"must not be negative, got {value}")
+        return value
+    return parse_non_negative
+
+
+_REQUIRED = object()
+
+# name: (parser, default). Fields without a default must be present in the rules file.
+FIELDS: Dict[str, Tuple[Callable, Any]] = {
+    'login_time': (_parse_time, None),
+    'start_time': (_parse_time, _REQUIRED),
+    'end_time': (_parse_time, _REQUIRED),
+    'tsymbol': (str, _REQUIRED),
+    'exchange': (str, 'NFO'),
+    'quantity': (_positive(int), _REQUIRED),
+    'use_margin_based_quantity': (_parse_bool, False),
+    'sotm_points': (float, 0.0),
+    'botm_points': (float, 0.0),
+    'bias_points': (float, 0.0),
+    'target_premium': (_non_negative(float), 0.0),
+    'target_delta': (_non_negative(float), 0.0),
+    'max_premium_ratio': (_non_negative(float), 0.0),
+    'scan_strikes_each_side': (_positive(int), 20),
+    'scan_expiries': (_positive(int), 1),
+    'stop_loss_percentage': (_positive(float), _REQUIRED),
+    'max_allowed_margin': (_non_negative(float), 0.0),
+    'max_daily_loss': (_non_negative(float), 0.0),
+    'combined_stop_loss_percentage': (_non_negative(float), 0.0),
+    'trailing_profit_activation': (_non_negative(float), 0.0),
+    'trailing_profit_lock_percentage': (_non_negative(float), 50.0),
+    'roll_threshold_points': (_non_negative(float), 0.0),
+    'roll_cooldown_seconds': (_non_negative(float), 60.0),
+    'roll_watch_strikes': (_non_negative(int), 1),
+    'send_data_to_influxdb': (_parse_bool, False),
+    'live_trading': (_parse_bool, False),
+}
+
+# Read once while the simulation is being wired up, so a reload cannot change them
+RESTART_REQUIRED = ('tsymbol', 'exchange', 'send_data_to_influxdb', 'live_trading')
+
+
+class Rules:
+    """Validated strategy rules with times pre-parsed.
+
+    Instances are never mutated. A reload builds a new one and Config swaps the
+    reference, so code that takes `rules = config.rules` once per decision sees
+    a consistent set of values.
+    """
+
+    __slots__ = tuple(FIELDS) + ('raw',)
+
+    def __init__(self, raw: Dict[str, Any]):
+        errors = []
+        for name, (parse, default) in FIELDS.items():
+            value = raw.get(name)
+            if value is None:
+                if default is _REQUIRED:
+                    errors.append(f"{name}: required")
+                    continue
+                object.__setattr__(self, name, default)
+                continue
+            try:
+                object.__setattr__(self, name, parse(value))
+            except (TypeError, ValueError) as e:
+                errors.append(f"{name}: {e}")
+        if not errors and self.end_time <= self.start_time:
+            errors.append(f"end_time: must be after start_time ({self.start_time})")
+        if errors:
+            raise RulesError(errors)
+        unknown = sorted(set(raw) - set(FIELDS))
+        if unknown:
+            app_logger.warning(f"Unknown keys in rules file (typo?): {', '.join(unknown)}")
+        object.__setattr__(self, 'raw', dict(raw))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Rules are read-only; reload the rules file instead")
+
+    def changed_fields(self, other: "Rules") -> List[str]:
+        return [name for name in FIELDS if getattr(self, name) != getattr(other, name)]
+
+
+def load_rules(file_path: str) -> Rules:
+    import yaml
+    with open(file_path, 'r') as file:
+        raw = yaml.safe_load(file) or {}
+    if not isinstance(raw, dict):
+        raise RulesError([f"{file_path}: expected a mapping at the top level"])
+    return Rules(raw)
+
+
+class RulesWatcher:
+    """Polls the rules file's mtime and size and swaps in a new Rules when it changes.
+
+    Parsing happens off the event loop. An invalid edit is logged and ignored, so
+    the running strategy keeps the last good rules.
+    """
+
+    def __init__(self, config, interval: float = 1.0):
+        self.config = config
+        self.interval = interval
+        self._signature = self._stat()
+        self._task: Optional[asyncio.Task] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.config.rules_file)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                signature = self._stat()
+                if signature is None or signature == self._signature:
+                    continue
+                self._signature = signature
+                await self.reload()
+        except asyncio.CancelledError:
+            pass
+
+    async def reload(self) -> bool:
+        try:
+            rules = await asyncio.to_thread(load_rules, self.config.rules_file)
+        except Exception as e:
+            app_logger.error(f"Rules reload rejected, keeping previous rules: {e}")
+            return False
+        changed = rules.changed_fields(self.config.rules)
+        self.config.rules = rules
+        if changed:
+            app_logger.info(f"Rules reloaded. Changed: {', '.join(changed)}")
+            needs_restart = [name for name in changed if name in RESTART_REQUIRED]
+            if needs_restart:
+                app_logger.warning(f"Changes to {', '.join(needs_restart)} take effect after a restart.")
+        return True
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
\ No newline at end of file
@@ -0,0 +1,176 @@
+# app/shared_feed.py
+# One broker feed shared by every account of a supervised deployment. The
+# supervisor's WebSocketManager owns the socket and publishes ticks on the
+# `market_data` channel as usual; accounts in worker processes ask it for
+# instruments over the `feed_control` channel instead of opening sockets of
+# their own.
+import json
+import asyncio
+import redis.asyncio as aioredis
+from typing import Dict, Iterable, Optional, Tuple
+from app.logger_setup import app_logger, ws_logger
+
+FEED_CONTROL_CHANNEL = 'feed_control'
+
+Instrument = Tuple[str, int, str]
+
+
+class SharedFeed:
+    """Stands in for WebSocketManager where an account subscribes instruments, in a worker process.
+
+    Holds are counted here like WebSocketManager counts them; only an
+    instrument's first hold and its last release go to the FeedHub. The whole
+    set is re-sent every `sync_interval` seconds, so a lost message or a
+    restarted supervisor heals itself.
+    """
+
+    def __init__(self, redis_client: aioredis.Redis, holder: str, sync_interval: float = 5.0):
+        self.redis = redis_client
+        self.holder = holder
+        self.sync_interval = sync_interval
+        # The supervisor only starts workers once its feed is open; outages still arrive as stale flags
+        self.feed_opened = False
+        self.subscriptions: Dict[str, int] = {}
+        self.instruments: Dict[str, Instrument] = {}
+        self._sync_task: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        await self._send('sync', list(self.instruments.values()))
+        self.feed_opened = True
+        self._sync_task = asyncio.create_task(self._sync_periodically())
+
+    async def _send(self, op: str, instruments):
+        try:
+            await self.redis.publish(FEED_CONTROL_CHANNEL, json.dumps(
+                {'holder': self.holder, 'op': op, 'instruments': instruments}
+            ))
+        except Exception as e:
+            app_logger.error(f"Shared feed {op} for {self.holder} failed: {e}")
+
+    async def _sync_periodically(self):
+        try:
+            while True:
+                await asyncio.sleep(self.sync_interval)
+                await self._send('sync', list(self.instruments.values()))
+        except asyncio.CancelledError:
+            pass
+
+    async def subscribe_symbol(self, exchange, token, trading_symbol):
+        await self.subscribe_many([(exchange, token, trading_symbol)])
+
+    async def unsubscribe_symbol(self, exchange, token, trading_symbol):
+        await self.unsubscribe_many([(exchange, token, trading_symbol)])
+
+    async def subscribe_many(self, instruments: Iterable[Instrument]):
+        added = []
+        for exchange, token, trading_symbol in instruments:
+            key = f'{exchange}|{token}'
+            holders = self.subscriptions.get(key, 0)
+            self.subscriptions[key] = holders + 1
+            if not holders:
+                self.instruments[key] = (exchange, token, trading_symbol)
+                added.append(self.instruments[key])
+        if added:
+            await self._send('subscribe', added)
+
+    async def unsubscribe_many(self, instruments: Iterable[Instrument]):
+        removed = []
+        for exchange, token, trading_symbol in instruments:
+            key = f'{exchange}|{token}'
+            if key not in self.subscriptions:
+                continue
+            holders = self.subscriptions[key] - 1
+            if holders:
+                self.subscriptions[key] = holders
+            else:
+                del self.subscriptions[key]
+                removed.append(self.instruments.pop(key))
+        if removed:
+            await self._send('unsubscribe', removed)
+
+    async def close(self):
+        if self._sync_task:
+            self._sync_task.cancel()
+        await self._send('release', [])
+        self.subscriptions.clear()
+        self.instruments.clear()
+
+
+class FeedHub:
+    """Supervisor side: applies the workers' hold requests to the WebSocketManager that owns the feed.
+
+    Each holder (`<worker>/<account>`) holds an instrument at most once here;
+    WebSocketManager counts the holders, so the broker hears about an
+    instrument when its first account wants it and its last one lets go.
+    """
+
+    def __init__(self, websocket_manager, pubsub_client: aioredis.Redis):
+        self.websocket_manager = websocket_manager
+        self.pubsub_client = pubsub_client
+        # holder -> "EXCHANGE|token" -> instrument
+        self.holds: Dict[str, Dict[str, Instrument]] = {}
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._pubsub = self.pubsub_client.pubsub()
+        await self._pubsub.subscribe(FEED_CONTROL_CHANNEL)
+        self._task = asyncio.create_task(self._process_requests())
+
+    async def _process_requests(self):
+        try:
+            while True:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message:
+                    try:
+                        request = json.loads(message['data'])
+                        await self.apply(request['holder'], request['op'], request['instruments'])
+                    except Exception as e:
+                        app_logger.error(f"Error applying feed request: {e}", exc_info=True)
+        except asyncio.CancelledError:
+            pass
+
+    async def apply(self, holder: str, op: str, instruments):
+        held = self.holds.setdefault(holder, {})
+        wanted = {f'{exchange}|{token}': (exchange, token, symbol) for exchange, token, symbol in instruments}
+        if op == 'subscribe':
+            added, removed = [i for key, i in wanted.items() if key not in held], []
+        elif op == 'unsubscribe':
+            added, removed = [], [i for key, i in wanted.items() if key in held]
+        elif op == 'sync':
+            added = [i for key, i in wanted.items() if key not in held]
+            removed = [i for key, i in held.items() if key not in wanted]
+        elif op == 'release':
+            added, removed = [], list(held.values())
+        else:
+            app_logger.warning(f"Unknown feed request '{op}' from {holder}.")
+            return
+        for exchange, token, symbol in added:
+            held[f'{exchange}|{token}'] = (exchange, token, symbol)
+        for exchange, token, _ in removed:
+            del held[f'{exchange}|{token}']
+        if not held:
+            del self.holds[holder]
+        if added:
+            await self.websocket_manager.subscribe_many(added)
+        if removed:
+            await self.websocket_manager.unsubscribe_many(removed)
+        if op == 'sync' and (added or removed):
+            ws_logger.info(f"Feed sync for {holder}: {len(added)} instrument(s) added, {len(removed)} dropped.")
+
+    async def release_worker(self, worker_id):
+        """Drops every hold of a worker that exited; a restarted worker asks again for what it needs."""
+        prefix = f'{worker_id}/'
+        for holder in [holder for holder in self.holds if holder.startswith(prefix)]:
+            await self.apply(holder, 'release', [])
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.unsubscribe(FEED_CONTROL_CHANNEL)
+            await self._pubsub.close()
\ No newline at end of file
@@ -0,0 +1,340 @@
+# app/state_store.py
+import os
+import time
+import zlib
+import pickle
+import struct
+import asyncio
+import threading
+from queue import SimpleQueue
+from typing import Callable, Dict, List, Optional
+from app.logger_setup import app_logger
+
+SNAPSHOT_FILE = "snapshot.bin"
+SNAPSHOT_MAGIC = b"SLTSNAP1"
+WAL_PREFIX = "wal."
+WAL_SUFFIX = ".log"
+
+# Every snapshot and WAL record is framed as <length, crc32> + pickle payload,
+# so a torn write at the tail of a file is detected and ignored on recovery.
+_FRAME = struct.Struct("<II")
+_SNAPSHOT_HEADER = struct.Struct("<8sQII")
+
+_STOP = object()
+
+
+class RecoveredState:
+    __slots__ = ("seq", "positions", "realized_pnl", "trade_margin", "strategy")
+
+    def __init__(self, seq: int = 0, positions: Optional[Dict[str, dict]] = None,
+                 realized_pnl: float = 0.0, trade_margin: float = 0.0,
+                 strategy: Optional[dict] = None):
+        self.seq = seq
+        self.positions = positions if positions is not None else {}
+        self.realized_pnl = realized_pnl
+        self.trade_margin = trade_margin
+        self.strategy = strategy
+
+    def apply(self, kind: str, payload: dict):
+        if kind == "fill":
+            symbol = payload["symbol"]
+            if payload["position"] is None:
+                self.positions.pop(symbol, None)
+            else:
+                self.positions[symbol] = payload["position"]
+            self.realized_pnl = payload["realized_pnl"]
+        elif kind == "margin":
+            self.trade_margin = payload["trade_margin"]
+        elif kind == "strategy":
+            self.strategy = payload["state"]
+
+    def as_dict(self) -> dict:
+        return {
+            "positions": self.positions,
+            "realized_pnl": self.realized_pnl,
+            "trade_margin": self.trade_margin,
+            "strategy": self.strategy,
+        }
+
+
+class StateStore:
+    """Snapshot + write-ahead log of position, order and trigger state.
+
+    Callers on the event loop only assign a sequence number and enqueue; a
+    background thread does the pickling, group-committed writes and fsyncs.
+    """
+
+    def __init__(self, state_dir: str, snapshot_interval: float = 5.0, fsync: bool = True):
+        self.state_dir = state_dir
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.seq = 0
+        self._snapshot_seq = 0
+        # WAL records the last recover() replayed on top of the snapshot
+        self.replayed_records = 0
+        # Failed write attempts; the writer keeps the records and retries them
+        self.write_errors = 0
+        self._queue: SimpleQueue = SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._wal_file = None
+        self._snapshot_task: Optional[asyncio.Task] = None
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    # --- Recovery ---
+
+    def recover(self) -> Optional[RecoveredState]:
+        started = time.perf_counter()
+        state = self._load_snapshot()
+        snapshot_seq = state.seq if state else 0
+        if state is None:
+            state = RecoveredState()
+
+        replayed = 0
+        for path in self._wal_segments():
+            for seq, kind, payload in self._read_wal(path):
+                if seq <= state.seq:
+                    continue
+                state.apply(kind, payload)
+                state.seq = seq
+                replayed += 1
+
+        self.seq = state.seq
+        self.replayed_records = replayed
+        self._snapshot_seq = snapshot_seq
+        if state.seq == 0:
+            return None
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        app_logger.info(
+            f"Recovered state at seq {state.seq} (snapshot {snapshot_seq}, {replayed} WAL records) "
+            f"with {len(state.positions)} open positions in {elapsed_ms:.2f} ms"
+        )
+        return state
+
+    def _load_snapshot(self) -> Optional[RecoveredState]:
+        path = os.path.join(self.state_dir, SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_SNAPSHOT_HEADER.size)
+                magic, seq, length, crc = _SNAPSHOT_HEADER.unpack(header)
+                body = f.read(length)
+            if magic != SNAPSHOT_MAGIC or len(body) != length or zlib.crc32(body) != crc:
+                app_logger.error(f"Snapshot {path} is corrupt. Ignoring it.")
+                return None
+            data = pickle.loads(body)
+            return RecoveredState(seq=seq, **data)
+        except Exception as e:
+            app_logger.error(f"Error loading snapshot {path}: {e}", exc_info=True)
+            return None
+
+    def _wal_segments(self) -> List[str]:
+        segments = []
+        for name in os.listdir(self.state_dir):
+            if name.startswith(WAL_PREFIX) and name.endswith(WAL_SUFFIX):
+                start = int(name[len(WAL_PREFIX):-len(WAL_SUFFIX)])
+                segments.append((start, os.path.join(self.state_dir, name)))
+        return [path for _, path in sorted(segments)]
+
+    def _read_wal(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _FRAME.size <= len(data):
+            length, crc = _FRAME.unpack_from(data, offset)
+            body = data[offset + _FRAME.size:offset + _FRAME.size + length]
+            if len(body) != length or zlib.crc32(body) != crc:
+                app_logger.warning(f"Truncated WAL record in {path} at offset {offset}. Stopping replay.")
+                return
+            yield pickle.loads(body)
+            offset += _FRAME.size + length
+
+    # --- Hot path: sequence + enqueue only ---
+
+    def record_fill(self, symbol: str, quantity: int, price: float, direction: str,
+                    position: Optional[dict], realized_pnl: float):
+        self._append("fill", {
+            "symbol": symbol,
+            "quantity": quantity,
+            "price": price,
+            "direction": direction,
+            "position": dict(position) if position is not None else None,
+            "realized_pnl": realized_pnl,
+            "ts": time.time(),
+        })
+
+    def record_trade_margin(self, trade_margin: float):
+        self._append("margin", {"trade_margin": trade_margin})
+
+    def record_strategy_state(self, state: Optional[dict]):
+        self._append("strategy", {"state": state})
+
+    def _append(self, kind: str, payload: dict):
+        self.seq += 1
+        self._queue.put(("wal", (self.seq, kind, payload)))
+
+    def snapshot(self, state: dict):
+        if self.seq == self._snapshot_seq:
+            return
+        self._snapshot_seq = self.seq
+        self._queue.put(("snapshot", (self.seq, state)))
+
+    async def flush(self):
+        """Waits until everything recorded so far is written (and fsynced, if enabled)."""
+        if not self._thread:
+            return
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        await asyncio.to_thread(done.wait)
+
+    # --- Background writer ---
+
+    def start(self):
+        if self._thread:
+            return
+        self._open_wal(self.seq)
+        self._thread = threading.Thread(target=self._writer_loop, name="state-store-writer", daemon=True)
+        self._thread.start()
+
+    def start_periodic_snapshots(self, capture_state: Callable[[], dict]):
+        self._snapshot_task = asyncio.create_task(self._periodic_snapshots(capture_state))
+
+    async def _periodic_snapshots(self, capture_state: Callable[[], dict]):
+        try:
+            while True:
+                await asyncio.sleep(self.snapshot_interval)
+                self.snapshot(capture_state())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            app_logger.error(f"Error in periodic snapshot task: {e}", exc_info=True)
+
+    def _writer_loop(self):
+        batch = []
+        failures = 0
+        while True:
+            if not batch:
+                batch.append(self._queue.get())
+            while not self._queue.empty():
+                batch.append(self._queue.get())
+            try:
+                if self._write_batch(batch):
+                    return
+                failures = 0
+            except Exception as e:
+                # Nothing is dropped: what did not reach the disk stays in `batch` and is written again
+                failures += 1
+                self.write_errors += 1
+                app_logger.error(
+                    f"State store write failed (attempt {failures}, {len(batch)} records pending): {e}", exc_info=True
+                )
+                if failures >= 3 and any(item is _STOP for item in batch):
+                    app_logger.error(f"State store giving up at shutdown with {len(batch) - 1} records unwritten.")
+                    for item in batch:
+                        if item is not _STOP and item[0] == "flush":
+                            item[1].set()
+                    return
+                time.sleep(min(0.1 * 2 ** failures, 5.0))
+                self._reopen_wal(batch)
+
+    def _write_batch(self, batch: list) -> bool:
+        """Writes `batch` in order, removing each item from it once durable. True when _STOP is reached."""
+        dirty = False
+        done = 0
+        try:
+            for i, item in enumerate(batch):
+                if item is _STOP:
+                    self._sync_wal(dirty)
+                    done = i + 1
+                    return True
+                kind, payload = item
+                if kind == "wal":
+                    body = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+                    self._wal_file.write(_FRAME.pack(len(body), zlib.crc32(body)))
+                    self._wal_file.write(body)
+                    dirty = True
+                elif kind == "snapshot":
+                    self._sync_wal(dirty)
+                    dirty = False
+                    done = i
+                    self._write_snapshot(*payload)
+                    done = i + 1
+                elif kind == "flush":
+                    self._sync_wal(dirty)
+                    dirty = False
+                    done = i + 1
+                    payload.set()
+            self._sync_wal(dirty)
+            done = len(batch)
+            return False
+        finally:
+            del batch[:done]
+
+    def _reopen_wal(self, batch: list):
+        # The failed segment may end in a torn record, which stops replay of that file only. The records being
+        # retried go to a fresh segment named so it sorts after it; one left by an earlier failed retry only
+        # holds records being retried, so it is truncated.
+        first_seq = next((item[1][0] for item in batch if item is not _STOP and item[0] == "wal"), None)
+        if first_seq is None:
+            return
+        try:
+            self._open_wal(first_seq - 1, truncate=True)
+        except Exception as e:
+            app_logger.error(f"State store cannot open a new WAL segment: {e}")
+
+    def _sync_wal(self, dirty: bool):
+        if not dirty:
+            return
+        self._wal_file.flush()
+        if self.fsync:
+            os.fsync(self._wal_file.fileno())
+
+    def _write_snapshot(self, seq: int, state: dict):
+        body = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        path = os.path.join(self.state_dir, SNAPSHOT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, seq, len(body), zlib.crc32(body)))
+            f.write(body)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        # Everything up to seq is now in the snapshot; start a fresh segment.
+        old_segments = self._wal_segments()
+        self._open_wal(seq)
+        for segment in old_segments:
+            if segment != self._wal_file.name:
+                os.remove(segment)
+
+    def _open_wal(self, start_seq: int, truncate: bool = False):
+        if self._wal_file:
+            try:
+                self._wal_file.close()
+            except OSError as e:
+                app_logger.warning(f"Error closing WAL segment {self._wal_file.name}: {e}")
+        path = os.path.join(self.state_dir, f"{WAL_PREFIX}{start_seq:012d}{WAL_SUFFIX}")
+        self._wal_file = open(path, "wb" if truncate else "ab")
+
+    async def close(self, final_state: Optional[dict] = None):
+        if self._snapshot_task:
+            self._snapshot_task.cancel()
+            try:
+                await self._snapshot_task
+            except asyncio.CancelledError:
+                pass
+        if final_state is not None:
+            self.snapshot(final_state)
+        if self._thread:
+            self._queue.put(_STOP)
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+        if self._wal_file:
+            self._wal_file.close()
+            self._wal_file = None
+        if self.write_errors:
+            app_logger.warning(f"State store closed at seq {self.seq} after {self.write_errors} failed write attempts.")
+        else:
+            app_logger.info(f"State store closed at seq {self.seq}.")
\ No newline at end of file
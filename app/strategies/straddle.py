@@ -1,10 +1,11 @@
 import asyncio
-from datetime import datetime
+from app.clock import RealClock
 from app.logger_setup import app_logger, pos_logger
-from app.utils import get_atm_strike, get_option_symbols, adjust_quantity_for_lot_size
+from app.utils import get_atm_strike, get_option_chain, get_option_symbols, get_underlying_price, adjust_quantity_for_lot_size
+from app.strike_scanner import ChainSnapshot, StrikeScanner
 
 class Straddle:
-    def __init__(self, config, api, websocket_manager, market_data_processor, position_manager, order_execution_engine, margin_calculator):
+    def __init__(self, config, api, websocket_manager, market_data_processor, position_manager, order_execution_engine, margin_calculator, state_store=None, clock=None, roll_engine=None, rest_client=None):
         self.config = config
         self.api = api
         self.websocket_manager = websocket_manager
@@ -12,7 +13,19 @@ class Straddle:
         self.position_manager = position_manager
         self.order_execution_engine = order_execution_engine
         self.margin_calculator = margin_calculator
-        self.stop_loss_percentage = self.config.get_rule('stop_loss_percentage') / 100
+        self.state_store = state_store
+        self.clock = clock or RealClock()
+        self.roll_engine = roll_engine
+        self.rest_client = rest_client
+        # (call, put) strike offsets from ATM when the scanner chose the legs; rolls keep them
+        self.leg_offsets = None
+        # Held by the monitor loop while it checks stop losses and by the roll engine while it rolls
+        self.lock = asyncio.Lock()
+        self.session_state = None
+
+    @property
+    def stop_loss_percentage(self):
+        return self.config.rules.stop_loss_percentage / 100
 
     async def setup(self):
         option_symbols, atm_strike = await self._get_option_symbols()
@@ -27,13 +40,17 @@ class Straddle:
         
         await self.subscribe_to_symbols(option_symbols)
         
-        await asyncio.sleep(1)
+        await self.clock.sleep(1)
 
         return option_symbols, final_quantity, final_trade_margin, atm_strike
 
     async def execute(self, option_symbols, final_quantity, atm_strike, end_time):
+        self._persist_state(option_symbols, final_quantity, atm_strike, [])
         initial_order_details = await self.place_initial_orders(option_symbols, final_quantity)
         stop_loss_orders = await self.place_stop_loss_orders(initial_order_details, final_quantity)
+        self._persist_state(option_symbols, final_quantity, atm_strike, stop_loss_orders)
+        if initial_order_details:
+            await self._start_rolling(option_symbols, final_quantity, atm_strike, stop_loss_orders)
 
         await self.monitor_positions_and_stop_loss(stop_loss_orders, option_symbols, final_quantity, end_time)
 
@@ -43,22 +60,123 @@ class Straddle:
         # app_logger.info(f"Final ROI: {roi:.2f}%")
 
         await self.unsubscribe_from_symbols(option_symbols)
+        self._persist_state(None)
+
+    async def resume(self, state, end_time):
+        option_symbols = state['option_symbols']
+        final_quantity = state['final_quantity']
+        self.leg_offsets = state.get('leg_offsets')
+        stop_loss_orders = list(state['stop_loss_orders'])
+        app_logger.info(f"Resuming straddle with {len(stop_loss_orders)} stop loss orders. Skipping setup.")
+
+        await self.subscribe_to_symbols(option_symbols)
+
+        # Legs that filled before their stop loss was placed get one now, off the recorded entry price
+        protected = {sl_order['symbol'] for sl_order in stop_loss_orders}
+        exchanges = {s['TradingSymbol']: s['Exchange'] for s in option_symbols.values()}
+        unprotected = [
+            {'symbol': symbol, 'exchange': exchanges.get(symbol), 'order_id': None, 'executed_price': pos['entry_price']}
+            for symbol, pos in self.position_manager.positions.items()
+            if pos['quantity'] < 0 and symbol not in protected
+        ]
+        if unprotected:
+            stop_loss_orders += await self.place_stop_loss_orders(unprotected, final_quantity)
+        self._persist_state(option_symbols, final_quantity, state['atm_strike'], stop_loss_orders)
+        await self._start_rolling(option_symbols, final_quantity, state['atm_strike'], stop_loss_orders)
+
+        await self.monitor_positions_and_stop_loss(stop_loss_orders, option_symbols, final_quantity, end_time)
+        await self.unsubscribe_from_symbols(option_symbols)
+        self._persist_state(None)
+
+    def _persist_state(self, option_symbols, final_quantity=None, atm_strike=None, stop_loss_orders=None):
+        if option_symbols is None:
+            self.session_state = None
+        else:
+            self.session_state = {
+                'option_symbols': option_symbols,
+                'final_quantity': final_quantity,
+                'atm_strike': atm_strike,
+                'stop_loss_orders': [dict(sl_order) for sl_order in stop_loss_orders],
+                'leg_offsets': list(self.leg_offsets) if self.leg_offsets else None,
+            }
+        if self.state_store:
+            self.state_store.record_strategy_state(self.session_state)
+
+    def capture_state(self):
+        return self.session_state
+
+    async def _start_rolling(self, option_symbols, final_quantity, atm_strike, stop_loss_orders):
+        if not self.roll_engine or not self.config.rules.roll_threshold_points:
+            return
+
+        released_stops = {}
+
+        async def release_stops(symbols):
+            # The old legs' stop losses come off before the roll basket buys those legs back
+            released = [sl_order for sl_order in stop_loss_orders if sl_order['symbol'] in symbols]
+            cancelled = await asyncio.gather(*(
+                self.order_execution_engine.cancel_order(sl_order['sl_order_id'], reason="roll")
+                for sl_order in released
+            ))
+            for sl_order in released:
+                stop_loss_orders.remove(sl_order)
+            released_stops.clear()
+            released_stops.update((sl_order['symbol'], sl_order) for sl_order, ok in zip(released, cancelled) if ok)
+            self._persist_state(
+                option_symbols, final_quantity, self.session_state['atm_strike'] if self.session_state else None,
+                stop_loss_orders
+            )
+            return [sl_order['symbol'] for sl_order, ok in zip(released, cancelled) if not ok]
+
+        async def restore_stops(symbols):
+            restored = [released_stops.pop(symbol) for symbol in symbols if symbol in released_stops]
+            stop_loss_orders.extend(await self._replace_stop_losses(restored, option_symbols, final_quantity))
+            self._persist_state(
+                option_symbols, final_quantity, self.session_state['atm_strike'] if self.session_state else None,
+                stop_loss_orders
+            )
+
+        async def apply_roll(legs, new_atm_strike, opened):
+            # Swap the legs in place: the monitor loop holds these same objects
+            rolled = [key for key in legs if legs[key]['TradingSymbol'] != option_symbols[key]['TradingSymbol']]
+            old_legs = {key: option_symbols[key] for key in rolled}
+            released_stops.clear()
+            stop_loss_orders.extend(await self.place_stop_loss_orders(opened, final_quantity))
+            option_symbols.update(legs)
+            await self.subscribe_to_symbols({key: legs[key] for key in rolled})
+            await self.unsubscribe_from_symbols(old_legs)
+            self._persist_state(option_symbols, final_quantity, new_atm_strike, stop_loss_orders)
+
+        await self.roll_engine.start(
+            option_symbols, atm_strike, self.leg_strikes, apply_roll, self.lock, release_stops, restore_stops
+        )
+
+    async def _stop_rolling(self):
+        if self.roll_engine:
+            await self.roll_engine.stop()
+
+    def leg_strikes(self, atm_strike):
+        if self.leg_offsets:
+            call_offset, put_offset = self.leg_offsets
+            return {'sce': (atm_strike + call_offset, 'CE'), 'spe': (atm_strike + put_offset, 'PE')}
+        rules = self.config.rules
+        return {
+            'sce': (atm_strike + rules.sotm_points + rules.bias_points, 'CE'),
+            'spe': (atm_strike - rules.sotm_points + rules.bias_points, 'PE'),
+        }
 
     async def _get_option_symbols(self):
+        rules = self.config.rules
         try:
-            atm_strike = await get_atm_strike(
-                self.config.get_rule('tsymbol'), 
-                lambda e, t: self.api.get_quotes(e, t)
-            )
+            atm_strike = await get_atm_strike(rules.tsymbol, self._quotes_func())
             if not atm_strike:
                 app_logger.error("Failed to get ATM strike. Aborting simulation.")
                 return None, None
             
-            strikes = {
-                'sce': (atm_strike + self.config.get_rule('sotm_points') + self.config.get_rule('bias_points'), 'CE'),
-                'spe': (atm_strike - self.config.get_rule('sotm_points') + self.config.get_rule('bias_points'), 'PE'),
-            }
-            option_symbols = await get_option_symbols(self.config.get_rule('tsymbol'), strikes)
+            if rules.target_premium or rules.target_delta:
+                option_symbols = await self._scan_option_symbols(atm_strike)
+            else:
+                option_symbols = await get_option_symbols(rules.tsymbol, self.leg_strikes(atm_strike))
             if not option_symbols:
                 app_logger.error("Failed to get option symbols. Aborting simulation.")
                 return None, None
@@ -67,6 +185,36 @@ class Straddle:
             app_logger.error(f"Error getting option symbols: {e}")
             return None, None
 
+    def _quotes_func(self):
+        return self.rest_client.get_quotes if self.rest_client else lambda e, t: self.api.get_quotes(e, t)
+
+    async def _scan_option_symbols(self, atm_strike):
+        """Legs chosen by premium and delta across the chain around ATM, instead of fixed offsets from it."""
+        rules = self.config.rules
+        chain = await get_option_chain(rules.tsymbol, atm_strike, rules.scan_strikes_each_side, rules.scan_expiries)
+        if not chain:
+            return None
+        instruments = [(option['Exchange'], str(option['Token'])) for option in chain]
+        if self.rest_client:
+            quotes = list((await self.rest_client.get_quotes_many(instruments)).values())
+        else:
+            quotes = await asyncio.to_thread(lambda: [self.api.get_quotes(e, t) for e, t in instruments])
+        prices = [float(quote['lp']) if quote and 'lp' in quote else None for quote in quotes]
+        forward = await get_underlying_price(rules.tsymbol, self._quotes_func()) if rules.target_delta else None
+
+        snapshot = ChainSnapshot.from_options(chain, prices, forward, now=self.clock.time())
+        pick = StrikeScanner.from_rules(rules).best(snapshot)
+        if pick is None:
+            app_logger.error(f"No strikes in the {len(chain)}-option chain meet the premium/delta targets.")
+            return None
+        deltas = f" (deltas {pick.call_delta:.2f}/{pick.put_delta:.2f})" if forward else ""
+        app_logger.info(
+            f"Scanner picked {pick.call_strike:g} CE at {pick.call_price} and {pick.put_strike:g} PE at "
+            f"{pick.put_price}{deltas}, expiry {pick.expiry:%d-%b-%Y}."
+        )
+        self.leg_offsets = (pick.call_strike - atm_strike, pick.put_strike - atm_strike)
+        return {'sce': chain[pick.call_row], 'spe': chain[pick.put_row]}
+
     async def subscribe_to_symbols(self, option_symbols):
         for symbol in option_symbols.values():
             await self.websocket_manager.subscribe_symbol(symbol['Exchange'], symbol['Token'], symbol['TradingSymbol'])
@@ -76,7 +224,7 @@ class Straddle:
             await self.websocket_manager.unsubscribe_symbol(symbol['Exchange'], symbol['Token'], symbol['TradingSymbol'])
 
     async def _calculate_final_quantity(self, option_symbols):
-        final_quantity = int(adjust_quantity_for_lot_size(self.config.get_rule('quantity'), option_symbols['sce']['LotSize']))
+        final_quantity = int(adjust_quantity_for_lot_size(self.config.rules.quantity, option_symbols['sce']['LotSize']))
 
         if final_quantity <= 0:
             app_logger.error("Final quantity <= zero. Aborting simulation.")
@@ -90,99 +238,178 @@ class Straddle:
         return required_margin, final_trade_margin   
    
     async def place_initial_orders(self, option_symbols, final_quantity):
-        initial_order_details = []
-        for symbol in option_symbols.values():
-            order = {
+        orders = [
+            {
                 'symbol': symbol['TradingSymbol'],
+                'exchange': symbol['Exchange'],
                 'direction': 'S',
                 'quantity': final_quantity,
                 'order_type': 'MKT'
             }
-            order_response = await self.order_execution_engine.place_order(order)
-            if order_response:
-                order_id = order_response['order_id']
-                executed_price = order_response['price']
-                
-                # Tell the engine to confirm the execution, which updates the position manager
-                await self.order_execution_engine.confirm_execution(
-                    symbol=symbol['TradingSymbol'],
-                    quantity=final_quantity,
-                    price=executed_price,
-                    direction=order['direction']
-                )
-
-                initial_order_details.append({
-                    'symbol': symbol['TradingSymbol'],
-                    'order_id': order_id,
-                    'executed_price': executed_price
-                })
-        return initial_order_details
+            for symbol in option_symbols.values()
+        ]
+        # All legs go out together; if one fails the others are rolled back so we never hold half a straddle
+        basket = await self.order_execution_engine.place_basket(orders, all_or_none=True, confirm=True)
+        if not basket.ok:
+            app_logger.error("Straddle entry basket failed. No positions were opened.")
+            return []
+
+        return [
+            {
+                'symbol': leg['symbol'],
+                'exchange': leg['exchange'],
+                'order_id': leg['order_id'],
+                'executed_price': leg['price']
+            }
+            for leg in basket.legs
+        ]
 
     async def place_stop_loss_orders(self, initial_order_details, final_quantity):
-        stop_loss_orders = []
-        for order_detail in initial_order_details:
-            sl_price = round(order_detail['executed_price'] * (1 + self.stop_loss_percentage), 2)
-            
-            sl_order = {
+        sl_orders = [
+            {
                 'symbol': order_detail['symbol'],
+                'exchange': order_detail['exchange'],
                 'direction': 'B',
                 'quantity': final_quantity,
                 'order_type': 'SL-M',
-                'trigger_price': sl_price,
+                'trigger_price': round(order_detail['executed_price'] * (1 + self.stop_loss_percentage), 2),
                 'parent_order_id': order_detail['order_id']
             }
-            sl_order_response = await self.order_execution_engine.place_order(sl_order)
-            if sl_order_response:
-                stop_loss_orders.append({
-                    'symbol': order_detail['symbol'],
-                    'sl_order_id': sl_order_response['order_id'],
-                    'sl_price': sl_price
-                })
-        return stop_loss_orders
+            for order_detail in initial_order_details
+        ]
+        if not sl_orders:
+            return []
+
+        # Stop losses protect independent legs, so a failed one must not cancel the rest
+        basket = await self.order_execution_engine.place_basket(sl_orders, all_or_none=False, confirm=False)
+        return [
+            {
+                'symbol': sl_order_response['symbol'],
+                'sl_order_id': sl_order_response['order_id'],
+                'sl_price': sl_order_response['trigger_price']
+            }
+            for sl_order_response in basket.legs if sl_order_response
+        ]
+
+    async def _replace_stop_losses(self, released, option_symbols, final_quantity):
+        """Re-places cancelled stop losses at their old trigger prices."""
+        exchanges = {leg['TradingSymbol']: leg['Exchange'] for leg in option_symbols.values()}
+        sl_orders = [
+            {
+                'symbol': sl_order['symbol'],
+                'exchange': exchanges.get(sl_order['symbol']),
+                'direction': 'B',
+                'quantity': final_quantity,
+                'order_type': 'SL-M',
+                'trigger_price': sl_order['sl_price'],
+            }
+            for sl_order in released
+        ]
+        if not sl_orders:
+            return []
+        basket = await self.order_execution_engine.place_basket(sl_orders, all_or_none=False, confirm=False)
+        for sl_order, placed in zip(sl_orders, basket.legs):
+            if not placed:
+                app_logger.error(f"Stop loss for {sl_order['symbol']} could not be restored after a failed roll.")
+        return [
+            {
+                'symbol': sl_order_response['symbol'],
+                'sl_order_id': sl_order_response['order_id'],
+                'sl_price': sl_order_response['trigger_price']
+            }
+            for sl_order_response in basket.legs if sl_order_response
+        ]
 
     async def monitor_positions_and_stop_loss(self, stop_loss_orders, option_symbols, final_quantity, end_time):
+        end_reached = asyncio.Event()
+        exit_timer = self.clock.call_at(self.clock.at_time_of_day(end_time), end_reached.set)
         while True:
-            current_time = datetime.now().time()
-            if current_time >= end_time:
+            if end_reached.is_set():
                 app_logger.info("End time reached. Closing all positions.")
+                await self._stop_rolling()
+                # The stop losses go first; one left at the broker could fill later and open a naked position
+                await self._cancel_stop_losses(stop_loss_orders, option_symbols, final_quantity)
                 await self.close_all_positions(option_symbols, final_quantity)
                 return
 
-            positions = await self.position_manager.get_all_positions()
-            
+            # A roll in flight has legs half swapped; wait for it rather than read them
+            async with self.lock:
+                positions = await self.position_manager.get_all_positions()
+                if positions:
+                    await self._check_stop_losses(positions, stop_loss_orders, option_symbols, final_quantity)
+
             if not positions:
                 app_logger.info("All positions closed. Exiting simulation.")
+                exit_timer.cancel()
+                await self._stop_rolling()
+                await self._cancel_stop_losses(stop_loss_orders, option_symbols, final_quantity)
                 return
 
-            positions_copy = dict(positions)
+            await self.clock.sleep(1)
+
+    async def _cancel_stop_losses(self, stop_loss_orders, option_symbols, final_quantity):
+        # Positions closed some other way (e.g. a portfolio exit) leave their stop losses behind
+        if not stop_loss_orders:
+            return
+        await asyncio.gather(*(
+            self.order_execution_engine.cancel_order(sl_order['sl_order_id'], reason="position_closed")
+            for sl_order in stop_loss_orders
+        ))
+        stop_loss_orders.clear()
+        self._persist_state(
+            option_symbols, final_quantity, self.session_state['atm_strike'] if self.session_state else None,
+            stop_loss_orders
+        )
+
+    async def _check_stop_losses(self, positions, stop_loss_orders, option_symbols, final_quantity):
+        # Live stop losses the broker filled on its own are already reconciled into the positions
+        filled = [sl_order for sl_order in stop_loss_orders
+                  if not self.order_execution_engine.is_order_open(sl_order['sl_order_id'])]
+        if filled:
+            for sl_order in filled:
+                app_logger.info("Stop loss %s for %s filled at the broker", sl_order['sl_order_id'], sl_order['symbol'])
+                stop_loss_orders.remove(sl_order)
+            self._persist_state(
+                option_symbols, final_quantity, self.session_state['atm_strike'] if self.session_state else None,
+                stop_loss_orders
+            )
 
-            for symbol, position in positions_copy.items():
-                if symbol not in positions:
-                    continue
+        positions_copy = dict(positions)
 
-                current_price = await self.market_data_processor.get_ltp(symbol)
-                if current_price:
-                    await self.position_manager.update_position_price(symbol, current_price)
+        for symbol, position in positions_copy.items():
+            if symbol not in positions:
+                continue
 
-                    for sl_order in stop_loss_orders[:]:
-                        if sl_order['symbol'] == symbol:
-                            # Note: Position quantity is now negative for shorts
-                            if (position['quantity'] < 0 and current_price >= sl_order['sl_price']):
-                                app_logger.info(f"Stop loss triggered for {symbol} at {current_price}")
+            current_price = await self.market_data_processor.get_ltp(symbol)
+            if current_price:
+                await self.position_manager.update_position_price(symbol, current_price)
 
-                                # Tell the engine to confirm the close execution
-                                await self.order_execution_engine.confirm_execution(
-                                    symbol=symbol,
-                                    quantity=abs(position['quantity']),
-                                    price=current_price,
-                                    direction='CLOSE',
-                                    order_id_to_remove=sl_order['sl_order_id']
-                                )
+                for sl_order in stop_loss_orders[:]:
+                    if sl_order['symbol'] == symbol:
+                        # Note: Position quantity is now negative for shorts
+                        if (position['quantity'] < 0 and current_price >= sl_order['sl_price']):
+                            app_logger.info("Stop loss triggered for %s at %s", symbol, current_price)
 
-                                stop_loss_orders.remove(sl_order)
-                                break # Exit inner loop for this symbol as its position is closed
+                            # Simulated, the stop fills here; live, only once the broker has closed the position
+                            close_order = {
+                                'symbol': symbol,
+                                'exchange': next((s['Exchange'] for s in option_symbols.values()
+                                                  if s['TradingSymbol'] == symbol), None),
+                                'direction': 'B',
+                                'quantity': abs(position['quantity']),
+                            }
+                            if not await self.order_execution_engine.trigger_stop_order(
+                                sl_order['sl_order_id'], close_order, current_price
+                            ):
+                                break
 
-            await asyncio.sleep(1)
+                            stop_loss_orders.remove(sl_order)
+                            self._persist_state(
+                                option_symbols, final_quantity,
+                                self.session_state['atm_strike'] if self.session_state else None,
+                                stop_loss_orders
+                            )
+                            break # Exit inner loop for this symbol as its position is closed
 
     async def close_all_positions(self, option_symbols, final_quantity):
         # Make a copy of positions to iterate over, as the original dict will be modified
@@ -193,6 +420,7 @@ class Straddle:
             if symbol_info:
                 order = {
                     'symbol': trading_symbol,
+                    'exchange': symbol_info['Exchange'],
                     'direction': 'B', # Always buying to close a short straddle
                     'quantity': abs(position_details['quantity']),
                     'order_type': 'MKT'
@@ -206,5 +434,6 @@ class Straddle:
                         symbol=trading_symbol,
                         quantity=abs(position_details['quantity']),
                         price=executed_price,
-                        direction='CLOSE'
+                        direction='CLOSE',
+                        reference_price=order_response.get('ltp')
                     )
\ No newline at end of file
@@ -0,0 +1,174 @@
+# app/strike_scanner.py
+# Chooses the legs of a short strangle (a straddle when both land on one
+# strike) by premium and delta across every strike and expiry of a chain
+# snapshot. Pure NumPy over arrays, with no I/O, so the same scan runs live on
+# quotes and in backtests on recorded chains.
+import time
+from datetime import datetime, time as dtime
+from typing import Any, List, NamedTuple, Optional, Sequence
+from app.iv_surface import YEAR_SECONDS, MIN_EXPIRY_YEARS, black76_greeks, implied_vol
+
+NAN = float("nan")
+
+
+class ChainSnapshot:
+    """An option chain at one moment, one row per contract, as NumPy arrays.
+
+    `expiry` can hold any sortable values (dates, timestamps, expiry codes);
+    rows are grouped by them. `price` is NaN for contracts without a quote
+    and `delta` NaN where it is unknown. `rows` keeps whatever each row came
+    from, e.g. the symbol master details, so a pick can be turned back into
+    tradable legs.
+    """
+
+    def __init__(self, expiry, strike, is_call, price, delta=None, rows: Optional[Sequence[Any]] = None):
+        import numpy as np
+        self.expiries, self.expiry = np.unique(np.asarray(expiry), return_inverse=True)
+        self.strike = np.asarray(strike, dtype=float)
+        self.is_call = np.asarray(is_call, dtype=bool)
+        self.price = np.asarray(price, dtype=float)
+        self.delta = np.full(len(self.strike), NAN) if delta is None else np.asarray(delta, dtype=float)
+        self.rows = rows
+        # Row numbers of the calls and of the puts of each expiry, fixed for the life of the snapshot
+        self.groups = [
+            (np.flatnonzero((self.expiry == i) & self.is_call), np.flatnonzero((self.expiry == i) & ~self.is_call))
+            for i in range(len(self.expiries))
+        ]
+
+    def __len__(self):
+        return len(self.strike)
+
+    @classmethod
+    def from_frame(cls, frame, expiry: str = 'Expiry', strike: str = 'StrikePrice', option_type: str = 'OptionType',
+                   price: str = 'ltp', delta: Optional[str] = 'delta') -> "ChainSnapshot":
+        """From a DataFrame with one row per contract, e.g. a recorded chain in a backtest."""
+        return cls(
+            frame[expiry].to_numpy(), frame[strike].to_numpy(), (frame[option_type] == 'CE').to_numpy(),
+            frame[price].to_numpy(), frame[delta].to_numpy() if delta and delta in frame else None,
+        )
+
+    @classmethod
+    def from_options(cls, options: List[dict], prices: Sequence[Optional[float]], forward: Optional[float] = None,
+                     now: Optional[float] = None, rate: float = 0.0,
+                     expiry_time: dtime = dtime(15, 30)) -> "ChainSnapshot":
+        """From symbol master details (get_option_chain) and their prices.
+
+        With a `forward`, each delta is Black-76 at the option's own implied
+        vol, taking expiry at `expiry_time` on the expiry date.
+        """
+        prices = [NAN if price is None else float(price) for price in prices]
+        now = time.time() if now is None else now
+        expiries = [option['Expiry'] for option in options]
+        is_call = [option['OptionType'] == 'CE' for option in options]
+        deltas = None
+        if forward:
+            deltas = []
+            for option, price, call in zip(options, prices, is_call):
+                expiry = option['Expiry']
+                day = expiry.date() if isinstance(expiry, datetime) else expiry
+                years = max((datetime.combine(day, expiry_time).timestamp() - now) / YEAR_SECONDS, MIN_EXPIRY_YEARS)
+                vol = implied_vol(price, forward, option['StrikePrice'], years, call, rate) if price > 0 else None
+                deltas.append(black76_greeks(forward, option['StrikePrice'], years, vol, call, rate)['delta']
+                              if vol else NAN)
+        return cls(expiries, [option['StrikePrice'] for option in options], is_call, prices, deltas, options)
+
+
+class Pick(NamedTuple):
+    expiry: Any
+    call_strike: float
+    put_strike: float
+    call_price: float
+    put_price: float
+    call_delta: float
+    put_delta: float
+    score: float
+    # Row numbers in the snapshot
+    call_row: int
+    put_row: int
+
+
+class StrikeScanner:
+    """Ranks short strangles (call strike >= put strike, same expiry) across a chain snapshot.
+
+    Each leg costs its relative distance from `target_premium` plus its
+    relative distance from `target_delta` (absolute delta); a target of 0
+    leaves that term out. A pair costs its two legs plus `balance_weight`
+    times how far the richer leg's premium is above the poorer one's, and is
+    ruled out when that ratio exceeds `max_premium_ratio` (0: no limit).
+    Legs priced under `min_premium` are never picked.
+
+    Leg costs are computed for the whole chain in one pass. Only the
+    `candidates` cheapest calls and puts of each expiry are paired, so a scan
+    stays well under a millisecond at 500 strikes; raise it if a tight
+    premium ratio needs legs further from the targets.
+    """
+
+    def __init__(self, target_premium: float = 0.0, target_delta: float = 0.0, max_premium_ratio: float = 0.0,
+                 min_premium: float = 0.05, balance_weight: float = 0.1, candidates: int = 32):
+        if not target_premium and not target_delta:
+            raise ValueError("StrikeScanner needs a target_premium or a target_delta")
+        self.target_premium = target_premium
+        self.target_delta = target_delta
+        self.max_premium_ratio = max_premium_ratio
+        self.min_premium = min_premium
+        self.balance_weight = balance_weight
+        self.candidates = candidates
+
+    @classmethod
+    def from_rules(cls, rules) -> "StrikeScanner":
+        return cls(rules.target_premium, rules.target_delta, rules.max_premium_ratio)
+
+    def leg_costs(self, snapshot: ChainSnapshot):
+        """Cost of every row as a leg; inf where it can't be one."""
+        import numpy as np
+        price, delta = snapshot.price, snapshot.delta
+        with np.errstate(invalid='ignore'):
+            cost = np.zeros(len(price))
+            if self.target_premium:
+                cost += np.abs(price - self.target_premium) / self.target_premium
+            if self.target_delta:
+                cost += np.abs(np.abs(delta) - self.target_delta) / self.target_delta
+            usable = price >= self.min_premium
+        cost[~(usable & np.isfinite(cost))] = np.inf
+        return cost
+
+    def _shortlist(self, rows, cost):
+        import numpy as np
+        if len(rows) > self.candidates:
+            rows = rows[np.argpartition(cost[rows], self.candidates)[:self.candidates]]
+        return rows[np.isfinite(cost[rows])]
+
+    def scan(self, snapshot: ChainSnapshot, top: int = 1) -> List[Pick]:
+        """The `top` best strangles across all expiries, best first."""
+        import numpy as np
+        cost = self.leg_costs(snapshot)
+        price, strike = snapshot.price, snapshot.strike
+        found = []
+        for expiry, (call_rows, put_rows) in enumerate(snapshot.groups):
+            calls = self._shortlist(call_rows, cost)
+            puts = self._shortlist(put_rows, cost)
+            if not len(calls) or not len(puts):
+                continue
+            call_price, put_price = price[calls][:, None], price[puts][None, :]
+            ratio = np.maximum(call_price, put_price) / np.minimum(call_price, put_price)
+            pair_cost = cost[calls][:, None] + cost[puts][None, :] + self.balance_weight * (ratio - 1.0)
+            pair_cost[strike[calls][:, None] < strike[puts][None, :]] = np.inf
+            if self.max_premium_ratio:
+                pair_cost[ratio > self.max_premium_ratio] = np.inf
+            flat = pair_cost.ravel()
+            best = np.argpartition(flat, top)[:top] if top < flat.size else np.arange(flat.size)
+            for index in best:
+                if np.isfinite(flat[index]):
+                    i, j = divmod(int(index), len(puts))
+                    found.append((float(flat[index]), expiry, int(calls[i]), int(puts[j])))
+        found.sort()
+        delta = snapshot.delta
+        return [
+            Pick(snapshot.expiries[expiry], float(strike[c]), float(strike[p]), float(price[c]), float(price[p]),
+                 float(delta[c]), float(delta[p]), score, c, p)
+            for score, expiry, c, p in found[:top]
+        ]
+
+    def best(self, snapshot: ChainSnapshot) -> Optional[Pick]:
+        picks = self.scan(snapshot)
+        return picks[0] if picks else None
\ No newline at end of file
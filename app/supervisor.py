@@ -0,0 +1,313 @@
+# app/supervisor.py
+import os
+import json
+import time
+import asyncio
+from typing import Callable, Dict, List, Optional
+from app.logger_setup import app_logger
+from app.config import Config
+from app.database_manager import DatabaseManager
+from app.diagnostics import LoopWatchdog
+from app.influxdb_manager import InfluxDBManager
+from app.shared_feed import FeedHub
+from app.utils import login
+from app.websocket_manager import WebSocketManager
+
+WORKER_STATS_CHANNEL = 'worker_stats'
+
+
+def load_accounts(path: str) -> List[dict]:
+    """Accounts file: a YAML list of {name, rules_file (optional), env: {API_USER: ..., ...}}."""
+    import yaml
+    with open(path) as file:
+        accounts = yaml.safe_load(file) or []
+    names = [account.get('name') for account in accounts]
+    if not all(names) or len(set(names)) != len(names):
+        raise ValueError(f"Every account in {path} needs a unique name")
+    return accounts
+
+
+def account_env(account: dict) -> Dict[str, str]:
+    """Environment overrides of one account: its own credentials, and its own state, journal and session files."""
+    name = account['name']
+    env = {
+        'ACCOUNT_NAME': name,
+        'STATE_DIR': os.path.join(os.environ.get('STATE_DIR', 'state'), name),
+    }
+    journal_dir = os.environ.get('JOURNAL_DIR', 'journal')
+    if journal_dir:
+        env['JOURNAL_DIR'] = os.path.join(journal_dir, name)
+    env.update({key: str(value) for key, value in (account.get('env') or {}).items()})
+    return env
+
+
+def shard(accounts: List[dict], workers: int) -> List[List[dict]]:
+    """Deals the accounts round-robin over at most `workers` shards."""
+    workers = max(1, min(workers, len(accounts)))
+    return [accounts[i::workers] for i in range(workers)]
+
+
+class WorkerReporter:
+    """Publishes a worker process's tick throughput, event-loop lag and CPU use on `worker_stats`."""
+
+    def __init__(self, redis_client, worker_id: int, accounts: List[str], tick_count: Callable[[], int],
+                 interval: float = 5.0, lag_threshold_ms: float = 100.0):
+        self.redis = redis_client
+        self.worker_id = worker_id
+        self.accounts = accounts
+        self.tick_count = tick_count
+        self.interval = interval
+        self.watchdog = LoopWatchdog(lag_threshold_ms)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.watchdog.start()
+        self._task = asyncio.create_task(self._report_periodically())
+
+    async def _report_periodically(self):
+        last_ticks, last_time, last_cpu = self.tick_count(), time.monotonic(), time.process_time()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                ticks, now, cpu = self.tick_count(), time.monotonic(), time.process_time()
+                lag = self.watchdog.lag.summary()
+                self.watchdog.lag.reset()
+                report = {
+                    'worker': self.worker_id,
+                    'pid': os.getpid(),
+                    'accounts': self.accounts,
+                    'ticks': ticks,
+                    'ticks_per_s': (ticks - last_ticks) / (now - last_time),
+                    'lag_p50_ms': lag['p50_us'] / 1000,
+                    'lag_p99_ms': lag['p99_us'] / 1000,
+                    'lag_max_ms': lag['max_us'] / 1000,
+                    'stalls': self.watchdog.stalls,
+                    'cpu_percent': (cpu - last_cpu) / (now - last_time) * 100,
+                }
+                last_ticks, last_time, last_cpu = ticks, now, cpu
+                try:
+                    await self.redis.publish(WORKER_STATS_CHANNEL, json.dumps(report))
+                except Exception as e:
+                    app_logger.error(f"Could not publish worker stats: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await self._task
+        await self.watchdog.stop()
+
+
+class WorkerProcess:
+    def __init__(self, worker_id: int, accounts: List[str]):
+        self.worker_id = worker_id
+        self.accounts = accounts
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+        self.last_report = 0.0
+        self.restarts = 0
+        self.stats: Optional[dict] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+
+class Supervisor:
+    """Serves every account of a deployment from one process tree.
+
+    This process logs into the feed account and owns the only broker feed
+    (WebSocketManager plus FeedHub, see app/shared_feed.py). Accounts are
+    dealt over worker processes, each running one SimulationManager per
+    account with that account's own login and session. A worker that dies is
+    restarted on its own, with exponential backoff, after its feed holds are
+    released; one that stops reporting for `hang_timeout` seconds is killed
+    and restarted the same way. Workers report throughput and loop lag every
+    `report_interval` seconds, which are logged and written to InfluxDB.
+    """
+
+    def __init__(self, config: Config, accounts: List[dict], worker_command: List[str], workers: int = 1,
+                 feed_account: Optional[str] = None, report_interval: float = 5.0, hang_timeout: float = 30.0,
+                 restart_backoff: float = 1.0, max_restart_backoff: float = 60.0):
+        if not accounts:
+            raise ValueError("Supervisor needs at least one account")
+        self.config = config
+        self.accounts = {account['name']: account for account in accounts}
+        self.feed_account = self.accounts[feed_account] if feed_account else accounts[0]
+        self.worker_command = worker_command
+        self.report_interval = report_interval
+        self.hang_timeout = hang_timeout
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self.workers = [
+            WorkerProcess(worker_id, [account['name'] for account in accounts])
+            for worker_id, accounts in enumerate(shard(accounts, workers))
+        ]
+        self.db_manager = DatabaseManager(config)
+        influxdb_config = config.get_influxdb_config()
+        self.influxdb_manager = InfluxDBManager(
+            url=influxdb_config.get('url'),
+            token=influxdb_config.get('token'),
+            org=influxdb_config.get('org'),
+            bucket=influxdb_config.get('bucket'),
+            send_data_to_influxdb=config.rules.send_data_to_influxdb
+        )
+        self.api = None
+        self.websocket_manager: WebSocketManager = None
+        self.hub: FeedHub = None
+        self._stats_pubsub = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    @classmethod
+    def from_config(cls, config: Config, worker_command: List[str]) -> "Supervisor":
+        supervisor_config = dict(config.get_supervisor_config())
+        accounts = load_accounts(supervisor_config.pop('accounts_file'))
+        return cls(config, accounts, worker_command, **supervisor_config)
+
+    async def start(self):
+        feed_config = Config(self.feed_account.get('rules_file', self.config.rules_file), account_env(self.feed_account))
+        self.api = await asyncio.to_thread(login, feed_config)
+        if self.api is None:
+            raise RuntimeError(f"Feed account {self.feed_account['name']} could not log in.")
+        redis = await self.db_manager.connect_redis()
+        redis_pubsub = await self.db_manager.connect_redis_pubsub()
+        self.websocket_manager = WebSocketManager(
+            self.api, redis, self.db_manager.redis_metrics, **self.config.get_websocket_config()
+        )
+        self.hub = FeedHub(self.websocket_manager, redis_pubsub)
+        await self.hub.start()
+        await self.websocket_manager.connect()
+        while not self.websocket_manager.feed_opened:
+            await asyncio.sleep(0.1)
+        app_logger.info(f"Shared feed open on account {self.feed_account['name']}.")
+
+        self._stats_pubsub = redis_pubsub.pubsub()
+        await self._stats_pubsub.subscribe(WORKER_STATS_CHANNEL)
+        self._tasks.append(asyncio.create_task(self._collect_stats()))
+        self._tasks.append(asyncio.create_task(self._check_hung_workers()))
+        for worker in self.workers:
+            worker.task = asyncio.create_task(self._run_worker(worker))
+        app_logger.info(f"Supervising {len(self.accounts)} account(s) in {len(self.workers)} worker process(es).")
+
+    async def wait(self):
+        """Returns once every worker has finished for good."""
+        await asyncio.gather(*(worker.task for worker in self.workers))
+
+    # --- Workers ---
+
+    async def _spawn(self, worker: WorkerProcess):
+        env = dict(os.environ, LOG_DIR=os.path.join(os.environ.get('LOG_DIR', 'logs'), f'worker-{worker.worker_id}'))
+        worker.process = await asyncio.create_subprocess_exec(
+            *self.worker_command, '--worker', str(worker.worker_id), '--accounts', ','.join(worker.accounts), env=env
+        )
+        worker.started_at = worker.last_report = time.monotonic()
+        app_logger.info(f"Worker {worker.worker_id} started (pid {worker.process.pid}): {', '.join(worker.accounts)}")
+
+    async def _run_worker(self, worker: WorkerProcess):
+        while not self._stopping:
+            try:
+                await self._spawn(worker)
+                code = await worker.process.wait()
+            except Exception as e:
+                app_logger.error(f"Could not run worker {worker.worker_id}: {e}")
+                code = None
+            await self.hub.release_worker(worker.worker_id)
+            if self._stopping:
+                return
+            if code == 0:
+                app_logger.info(f"Worker {worker.worker_id} finished.")
+                return
+            uptime = time.monotonic() - worker.started_at
+            # A worker that stayed up past the longest backoff starts over from the shortest
+            if uptime > self.max_restart_backoff:
+                worker.restarts = 0
+            delay = min(self.restart_backoff * 2 ** worker.restarts, self.max_restart_backoff)
+            worker.restarts += 1
+            app_logger.error(
+                f"Worker {worker.worker_id} ({', '.join(worker.accounts)}) exited with code {code} after "
+                f"{uptime:.0f}s; restarting in {delay:.1f}s."
+            )
+            await asyncio.sleep(delay)
+
+    async def _check_hung_workers(self):
+        if self.hang_timeout <= 0:
+            return
+        while True:
+            await asyncio.sleep(min(self.report_interval, self.hang_timeout))
+            now = time.monotonic()
+            for worker in self.workers:
+                if worker.alive and now - worker.last_report > self.hang_timeout:
+                    app_logger.error(
+                        f"Worker {worker.worker_id} sent no stats for {now - worker.last_report:.0f}s; killing it."
+                    )
+                    worker.process.kill()
+
+    # --- Stats ---
+
+    async def _collect_stats(self):
+        try:
+            while True:
+                message = await self._stats_pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message:
+                    try:
+                        self.on_stats(json.loads(message['data']))
+                    except Exception as e:
+                        app_logger.error(f"Error handling worker stats: {e}", exc_info=True)
+        except asyncio.CancelledError:
+            pass
+
+    def on_stats(self, report: dict):
+        worker = self.workers[report['worker']]
+        # A report still in flight from a process that has since been replaced
+        if not worker.alive or worker.process.pid != report['pid']:
+            return
+        worker.stats = report
+        worker.last_report = time.monotonic()
+        app_logger.info(
+            f"Worker {worker.worker_id} (pid {report['pid']}, {', '.join(report['accounts'])}): "
+            f"{report['ticks_per_s']:.0f} ticks/s, loop lag p50 {report['lag_p50_ms']:.1f} ms "
+            f"p99 {report['lag_p99_ms']:.1f} ms max {report['lag_max_ms']:.1f} ms, CPU {report['cpu_percent']:.0f}%"
+        )
+        fields = {key: value for key, value in report.items() if key not in ('worker', 'accounts')}
+        fields['restarts'] = worker.restarts
+        self.influxdb_manager.write_points(
+            [{"measurement": "worker_health", "fields": fields, "tags": {"worker": str(worker.worker_id)}}]
+        )
+
+    def summary(self) -> List[dict]:
+        return [
+            dict(worker.stats or {}, worker=worker.worker_id, accounts=worker.accounts, alive=worker.alive,
+                 restarts=worker.restarts)
+            for worker in self.workers
+        ]
+
+    async def stop(self, timeout: float = 30.0):
+        self._stopping = True
+        running = [worker.process for worker in self.workers if worker.alive]
+        for process in running:
+            process.terminate()
+        if running:
+            done, pending = await asyncio.wait([asyncio.ensure_future(p.wait()) for p in running], timeout=timeout)
+            if pending:
+                app_logger.warning(f"{len(pending)} worker(s) did not stop within {timeout:.0f}s; killing them.")
+                for process in running:
+                    if process.returncode is None:
+                        process.kill()
+                await asyncio.wait(pending)
+        for task in self._tasks + [worker.task for worker in self.workers if worker.task]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *(w.task for w in self.workers if w.task), return_exceptions=True)
+        if self._stats_pubsub:
+            await self._stats_pubsub.unsubscribe(WORKER_STATS_CHANNEL)
+            await self._stats_pubsub.close()
+        if self.hub:
+            await self.hub.close()
+        if self.websocket_manager:
+            await self.websocket_manager.close()
+        if self.api:
+            await asyncio.to_thread(self.api.close_websocket)
+        self.influxdb_manager.close()
+        await self.db_manager.close()
\ No newline at end of file
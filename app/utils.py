@@ -1,17 +1,96 @@
-import logging, pyotp, pandas as pd, zipfile, requests, asyncio
+import os, json, logging, zipfile, requests, asyncio
+from datetime import date
 from io import BytesIO
-from NorenRestApiPy.NorenApi import NorenApi
+from urllib.parse import urlparse
+from typing import TYPE_CHECKING, Dict, Optional
 from app.logger_setup import app_logger
 
+# pandas and NorenApi take most of the process import time; they are imported
+# where first used so startup can overlap them with login and connects.
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger(__name__)
 
+NOREN_HOST = os.environ.get('NOREN_HOST', 'https://api.shoonya.com/NorenWClientTP/')
+NOREN_WEBSOCKET = os.environ.get('NOREN_WEBSOCKET', 'wss://api.shoonya.com/NorenWSTP/')
+NOREN_SYMBOLS_URL = os.environ.get('NOREN_SYMBOLS_URL', 'https://api.shoonya.com/')
+SYMBOL_CACHE_DIR = os.environ.get('SYMBOL_CACHE_DIR', 'cache')
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+SYMBOL_MAP = {
+    'NIFTY': ('Nifty 50', 50, 'NSE', 'INDEX'),
+    'BANKNIFTY': ('Nifty Bank', 100, 'NSE', 'INDEX'),
+    'FINNIFTY': ('Nifty Fin Services', 50, 'NSE', 'INDEX'),
+    'MIDCPNIFTY': ('NIFTY MID SELECT', 50, 'NSE', 'INDEX'),
+    'CRUDEOILM': ('CRUDEOILM', 100, 'MCX', 'FUTCOM'), 
+    'CRUDEOIL': ('CRUDEOIL', 100, 'MCX', 'FUTCOM'),
+    'GOLD': ('GOLD', 100, 'MCX', 'FUTCOM'),
+    'GOLDM': ('GOLDM', 100, 'MCX', 'FUTCOM'),
+    'COPPER': ('COPPER', 100, 'MCX', 'FUTCOM'),
+    'SILVERM': ('SILVERM', 100, 'MCX', 'FUTCOM'),
+    'SILVER': ('SILVER', 100, 'MCX', 'FUTCOM'),
+    'NATURALGAS': ('NATURALGAS', 100, 'MCX', 'FUTCOM'),
+    'ZINC': ('ZINC', 100, 'MCX', 'FUTCOM'),
+}
+
+_symbols: Dict[str, "pd.DataFrame"] = {}
+
+def uses_fake_broker() -> bool:
+    # fakes.broker serves the REST API and the feed locally; the real Noren hosts never are
+    return all(urlparse(url).hostname in LOCAL_HOSTS for url in (NOREN_HOST, NOREN_WEBSOCKET))
+
+def _load_cached_session(cache_file: str, userid: str) -> Optional[str]:
+    try:
+        with open(cache_file) as f:
+            session = json.load(f)
+        # Noren session tokens do not survive the end of the trading day
+        if session.get('userid') == userid and session.get('date') == date.today().isoformat():
+            return session.get('susertoken')
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        app_logger.warning(f"Ignoring unreadable session cache {cache_file}: {e}")
+    return None
+
+def _save_cached_session(cache_file: str, userid: str, susertoken: str):
+    try:
+        os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+        fd = os.open(cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'userid': userid, 'susertoken': susertoken, 'date': date.today().isoformat()}, f)
+    except Exception as e:
+        app_logger.warning(f"Could not write session cache {cache_file}: {e}")
+
 def login(config):
+    import pyotp
+    from NorenRestApiPy.NorenApi import NorenApi
+
     class ShoonyaApiPy(NorenApi):
         def __init__(self):
-            NorenApi.__init__(self, host='https://api.shoonya.com/NorenWClientTP/', websocket='wss://api.shoonya.com/NorenWSTP/')
+            NorenApi.__init__(self, host=NOREN_HOST, websocket=NOREN_WEBSOCKET)
+            self.host = NOREN_HOST
+            self.userid = None
+            self.susertoken = None
 
     api = ShoonyaApiPy()        
     creds = config.get_user_credentials()
+    cache_file = config.get_session_cache_file()
+
+    cached_token = _load_cached_session(cache_file, creds["user"]) if cache_file else None
+    if cached_token:
+        try:
+            api.set_session(creds["user"], creds["pwd"], cached_token)
+            limits = api.get_limits()
+            if limits and limits.get('stat') == 'Ok':
+                app_logger.info("Reusing cached session token.")
+                api.userid = creds["user"]
+                api.susertoken = cached_token
+                return api
+            app_logger.info("Cached session token rejected. Logging in again.")
+        except Exception as e:
+            app_logger.warning(f"Cached session check failed: {e}. Logging in again.")
+
     factor2 = pyotp.TOTP(creds["secret"]).now()
     
     try:
@@ -26,6 +105,11 @@ def login(config):
         
         if ret and 'request_time' in ret:
             app_logger.info(f"Login Successful: {ret['request_time']}")
+            # Kept so components with their own HTTP sessions (e.g. the order gateway) can reuse the login
+            api.userid = creds["user"]
+            api.susertoken = ret['susertoken']
+            if cache_file:
+                _save_cached_session(cache_file, api.userid, api.susertoken)
             return api
         else:
             app_logger.error(f"Login failed with response: {ret}")
@@ -41,7 +125,8 @@ def get_quotes(api, exchange, token):
         app_logger.error(f"Error getting quotes: {e}")
         return None
 
-def fetch_symbols(url: str, file_name: str) -> pd.DataFrame:
+def fetch_symbols(url: str, file_name: str) -> "pd.DataFrame":
+    import pandas as pd
     try:
         response = requests.get(url)
         response.raise_for_status() 
@@ -54,41 +139,79 @@ def fetch_symbols(url: str, file_name: str) -> pd.DataFrame:
     except Exception as e:
         app_logger.error(f"Error while fetching symbols from {url}: {e}", exc_info=True)
         return None
+
+def load_symbols(exchange: str) -> Optional["pd.DataFrame"]:
+    """Symbol master for `exchange`, from memory, then today's on-disk cache, then the broker."""
+    symbols = _symbols.get(exchange)
+    if symbols is not None:
+        return symbols
+
+    import pandas as pd
+    cache_file = os.path.join(SYMBOL_CACHE_DIR, f'{exchange}_symbols-{date.today():%Y%m%d}.pkl')
+    if os.path.exists(cache_file):
+        try:
+            symbols = pd.read_pickle(cache_file)
+        except Exception as e:
+            app_logger.warning(f"Ignoring unreadable symbol cache {cache_file}: {e}")
+
+    if symbols is None:
+        symbols = fetch_symbols(f'{NOREN_SYMBOLS_URL}{exchange}_symbols.txt.zip', f'{exchange}_symbols.txt')
+        if symbols is None:
+            return None
+        if 'Expiry' in symbols.columns:
+            symbols['Expiry'] = pd.to_datetime(symbols['Expiry'], format='%d-%b-%Y')
+            symbols['StrikePrice'] = symbols['StrikePrice'].astype(float)
+            symbols.sort_values('Expiry', inplace=True)
+            symbols.reset_index(drop=True, inplace=True)
+        try:
+            os.makedirs(SYMBOL_CACHE_DIR, exist_ok=True)
+            symbols.to_pickle(cache_file)
+        except Exception as e:
+            app_logger.warning(f"Could not write symbol cache {cache_file}: {e}")
+
+    _symbols[exchange] = symbols
+    return symbols
+
+def option_exchange(tsymbol: str) -> str:
+    return 'NFO' if tsymbol in ['NIFTY', 'BANKNIFTY', 'FINNIFTY', 'MIDCPNIFTY'] else 'MCX'
+
+def prefetch_symbols(tsymbol: str) -> bool:
+    """Loads every symbol master the strategy needs for `tsymbol`, so the first lookup does no I/O."""
+    exchanges = {option_exchange(tsymbol)}
+    if tsymbol in SYMBOL_MAP:
+        exchanges.add(SYMBOL_MAP[tsymbol][2])
+    return all(load_symbols(exchange) is not None for exchange in sorted(exchanges))
     
+async def get_underlying_instrument(tsymbol: str) -> dict:
+    """Exchange, Token and TradingSymbol of the index or near futures contract that `tsymbol` options are struck against."""
+    if tsymbol not in SYMBOL_MAP:
+        raise ValueError(f"Invalid tsymbol: {tsymbol}")
+
+    symbol, base, exchange, instrument = SYMBOL_MAP[tsymbol]
+
+    fno_scrips = await asyncio.to_thread(load_symbols, exchange)
+    if fno_scrips is None:
+        raise ValueError(f"Failed to fetch symbols for {exchange}")
+
+    row = fno_scrips[(fno_scrips['Instrument'] == instrument) & (fno_scrips['Symbol'] == symbol)].iloc[0]
+    return {'Exchange': exchange, 'Token': str(row['Token']), 'TradingSymbol': row['TradingSymbol']}
+
+async def get_underlying_price(tsymbol: str, get_quotes_func) -> float:
+    """Last price of the index or near futures contract that `tsymbol` options are struck against."""
+    underlying = await get_underlying_instrument(tsymbol)
+    quotes = get_quotes_func(underlying['Exchange'], underlying['Token'])
+    # NorenRestClient.get_quotes is a coroutine; the NorenApi wheel's returns the quote directly
+    if asyncio.iscoroutine(quotes):
+        quotes = await quotes
+
+    if not quotes or 'lp' not in quotes:
+        raise ValueError("Invalid response from quotes API")
+    return float(quotes['lp'])
+
 async def get_atm_strike(tsymbol: str, get_quotes_func) -> float:
-    symbol_map = {
-        'NIFTY': ('Nifty 50', 50, 'NSE', 'INDEX'),
-        'BANKNIFTY': ('Nifty Bank', 100, 'NSE', 'INDEX'),
-        'FINNIFTY': ('Nifty Fin Services', 50, 'NSE', 'INDEX'),
-        'MIDCPNIFTY': ('NIFTY MID SELECT', 50, 'NSE', 'INDEX'),
-        'CRUDEOILM': ('CRUDEOILM', 100, 'MCX', 'FUTCOM'), 
-        'CRUDEOIL': ('CRUDEOIL', 100, 'MCX', 'FUTCOM'),
-        'GOLD': ('GOLD', 100, 'MCX', 'FUTCOM'),
-        'GOLDM': ('GOLDM', 100, 'MCX', 'FUTCOM'),
-        'COPPER': ('COPPER', 100, 'MCX', 'FUTCOM'),
-        'SILVERM': ('SILVERM', 100, 'MCX', 'FUTCOM'),
-        'SILVER': ('SILVER', 100, 'MCX', 'FUTCOM'),
-        'NATURALGAS': ('NATURALGAS', 100, 'MCX', 'FUTCOM'),
-        'ZINC': ('ZINC', 100, 'MCX', 'FUTCOM'),
-    }
-    
     try:
-        if tsymbol not in symbol_map:
-            raise ValueError(f"Invalid tsymbol: {tsymbol}")
-        
-        symbol, base, exchange, instrument = symbol_map[tsymbol]
-        
-        fno_scrips = fetch_symbols(f'https://api.shoonya.com/{exchange}_symbols.txt.zip', f'{exchange}_symbols.txt')
-        if fno_scrips is None:
-            raise ValueError(f"Failed to fetch symbols for {exchange}")
-        
-        fut_token = str(fno_scrips[(fno_scrips['Instrument'] == instrument) & (fno_scrips['Symbol'] == symbol)].iloc[0]['Token'])
-        quotes = get_quotes_func(exchange, fut_token)
-        
-        if not quotes or 'lp' not in quotes:
-            raise ValueError("Invalid response from quotes API")
-
-        fut = float(quotes['lp'])
+        fut = await get_underlying_price(tsymbol, get_quotes_func)
+        symbol, base, _, _ = SYMBOL_MAP[tsymbol]
         atm_strike = round(fut / base) * base
         app_logger.info(f'{symbol} ATM: {atm_strike}')
         return atm_strike
@@ -98,18 +221,11 @@ async def get_atm_strike(tsymbol: str, get_quotes_func) -> float:
 
 async def get_option_symbols(tsymbol: str, strikes: dict) -> dict:
     try:
-        exchange = 'NFO' if tsymbol in ['NIFTY', 'BANKNIFTY', 'FINNIFTY', 'MIDCPNIFTY'] else 'MCX'
-        file_url = f'https://api.shoonya.com/{exchange}_symbols.txt.zip'
-        file_name = f'{exchange}_symbols.txt'
+        exchange = option_exchange(tsymbol)
         
-        fno_scrips = fetch_symbols(file_url, file_name)
+        fno_scrips = await asyncio.to_thread(load_symbols, exchange)
         if fno_scrips is None:
             raise ValueError(f"Failed to fetch option symbols for {exchange}")
-        
-        fno_scrips['Expiry'] = pd.to_datetime(fno_scrips['Expiry'], format='%d-%b-%Y')
-        fno_scrips['StrikePrice'] = fno_scrips['StrikePrice'].astype(float)
-        fno_scrips.sort_values('Expiry', inplace=True)
-        fno_scrips.reset_index(drop=True, inplace=True)
 
         options = {}
         for opt_key, strike_info in strikes.items():
@@ -119,17 +235,7 @@ async def get_option_symbols(tsymbol: str, strikes: dict) -> dict:
                              (fno_scrips['StrikePrice'] == strike)]
             if row.empty:
                 raise ValueError(f"No option found for {opt_key} with strike {strike} and type {option_type}")
-            options[opt_key] = {
-                'Exchange': row.iloc[0]['Exchange'],
-                'Token': int(row.iloc[0]['Token']),
-                'LotSize': int(row.iloc[0]['LotSize']),
-                'Symbol': row.iloc[0]['Symbol'],
-                'TradingSymbol': row.iloc[0]['TradingSymbol'],
-                'Expiry': row.iloc[0]['Expiry'],
-                'Instrument': row.iloc[0]['Instrument'],
-                'OptionType': row.iloc[0]['OptionType'],
-                'StrikePrice': float(row.iloc[0]['StrikePrice'])
-            }
+            options[opt_key] = _option_details(row.iloc[0])
         
         app_logger.info(f"Symbols Obtained")
         return options
@@ -137,14 +243,75 @@ async def get_option_symbols(tsymbol: str, strikes: dict) -> dict:
         app_logger.error(f"Error while fetching option symbols: {e}", exc_info=True)
         return None
     
+def _option_details(row) -> dict:
+    return {
+        'Exchange': row['Exchange'],
+        'Token': int(row['Token']),
+        'LotSize': int(row['LotSize']),
+        'Symbol': row['Symbol'],
+        'TradingSymbol': row['TradingSymbol'],
+        'Expiry': row['Expiry'],
+        'Instrument': row['Instrument'],
+        'OptionType': row['OptionType'],
+        'StrikePrice': float(row['StrikePrice'])
+    }
+
+async def get_expiry_chain(tsymbol: str, expiry) -> dict:
+    """Every listed call and put of one `tsymbol` expiry, keyed by (strike, option type), in get_option_symbols() form."""
+    import pandas as pd
+    try:
+        expiry = pd.Timestamp(expiry)
+        exchange = option_exchange(tsymbol)
+        fno_scrips = await asyncio.to_thread(load_symbols, exchange)
+        if fno_scrips is None:
+            raise ValueError(f"Failed to fetch option symbols for {exchange}")
+
+        series = fno_scrips[(fno_scrips['Symbol'] == tsymbol) & (fno_scrips['Expiry'] == expiry) &
+                            fno_scrips['OptionType'].isin(['CE', 'PE'])]
+        return {
+            (float(row['StrikePrice']), row['OptionType']): _option_details(row)
+            for _, row in series.iterrows()
+        }
+    except Exception as e:
+        app_logger.error(f"Error while fetching the {expiry} chain of {tsymbol}: {e}", exc_info=True)
+        return None
+
+async def get_option_chain(tsymbol: str, center_strike: float, strikes_each_side: int, expiries: int = 1) -> list:
+    """Calls and puts of the nearest `expiries` expiries, `strikes_each_side` listed strikes either side of `center_strike`."""
+    import pandas as pd
+    try:
+        exchange = option_exchange(tsymbol)
+        fno_scrips = await asyncio.to_thread(load_symbols, exchange)
+        if fno_scrips is None:
+            raise ValueError(f"Failed to fetch option symbols for {exchange}")
+
+        options = fno_scrips[(fno_scrips['Symbol'] == tsymbol) & fno_scrips['OptionType'].isin(['CE', 'PE'])]
+        today = pd.Timestamp(date.today())
+        chain = []
+        for expiry in sorted(options.loc[options['Expiry'] >= today, 'Expiry'].unique())[:expiries]:
+            series = options[options['Expiry'] == expiry]
+            strikes = sorted(series['StrikePrice'].unique())
+            below = [s for s in strikes if s <= center_strike][-(strikes_each_side + 1):]
+            above = [s for s in strikes if s > center_strike][:strikes_each_side]
+            for _, row in series[series['StrikePrice'].isin(below + above)].iterrows():
+                chain.append(_option_details(row))
+        return chain
+    except Exception as e:
+        app_logger.error(f"Error while fetching the option chain: {e}", exc_info=True)
+        return None
+
 def adjust_quantity_for_lot_size(quantity: int, lot_size: int) -> int:
     final_quantity = quantity * lot_size
     app_logger.info(f"Final quantity to be used: {final_quantity}")
     return final_quantity
 
 async def get_account_limits(api):
+    """Account limits from a NorenRestClient, or from the NorenApi wheel on a worker thread."""
     try:
-        limits = await asyncio.to_thread(api.get_limits)
+        if asyncio.iscoroutinefunction(api.get_limits):
+            limits = await api.get_limits()
+        else:
+            limits = await asyncio.to_thread(api.get_limits)
         if limits and limits.get('stat') == 'Ok':
             return limits
         else:
@@ -1,78 +1,325 @@
 import asyncio
 import redis.asyncio as aioredis
 import json
+import socket
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
 from app.logger_setup import app_logger, ws_logger
+from app.metrics import RedisMetrics
+from app.latency import TickLatencyTracker
 from queue import Queue
 from threading import Thread
 
 class WebSocketManager:
-    def __init__(self, api, redis_client: aioredis.Redis):
+    """Runs the broker feed socket and republishes its ticks and order updates on Redis.
+
+    Feed health is tracked per token. A closed socket, or one that stops
+    delivering ticks for `stall_timeout` seconds, starts an outage: every held
+    token is flagged stale on the `market_data` channel (MarketDataProcessor
+    then refuses its price until a fresh tick) and all of them are resubscribed
+    in one request when the feed opens again. NorenApi reopens a closed socket
+    by itself; a stalled one is restarted here, with exponential backoff
+    between attempts that bring no ticks back. An outage ends once every held
+    token has ticked again, and is logged and kept in `gaps`.
+    """
+
+    def __init__(self, api, redis_client: aioredis.Redis, metrics: Optional[RedisMetrics] = None,
+                 latency_tracker: Optional[TickLatencyTracker] = None, heartbeat_interval: float = 0.5,
+                 stall_timeout: float = 5.0, token_stale_after: float = 0.0, reconnect_backoff: float = 0.5,
+                 max_reconnect_backoff: float = 30.0, order_channel: str = 'order_updates'):
         self.api = api
         self.redis = redis_client
+        self.metrics = metrics or RedisMetrics()
+        self.latency_tracker = latency_tracker
+        self.heartbeat_interval = heartbeat_interval
+        self.stall_timeout = stall_timeout
+        self.token_stale_after = token_stale_after
+        self.reconnect_backoff = reconnect_backoff
+        self.max_reconnect_backoff = max_reconnect_backoff
+        self.order_channel = order_channel
         self.feed_opened = False
         self.message_queue = Queue()
         self.processing_task = None
+        self.watchdog_task = None
+        # "EXCHANGE|token" -> number of holders; the broker only hears about the first and last
+        self.subscriptions: Dict[str, int] = {}
+        # Written by the socket thread: monotonic time of each token's last tick, and of any message
+        self.last_tick: Dict[str, float] = {}
+        self.last_message = time.monotonic()
+        self.opened_at = 0.0
+        # Tokens flagged stale -> when; a later tick clears the flag
+        self.stale_tokens: Dict[str, float] = {}
+        self.gaps: Deque[dict] = deque(maxlen=100)
+        self._outage: Optional[dict] = None
+        # Held tokens not heard from since the outage began -> their last tick before it
+        self._awaiting: Dict[str, Optional[float]] = {}
+        self._recovered: Dict[str, float] = {}
+        self._before: Dict[str, Optional[float]] = {}
+        self._restarts = 0
+        self._last_restart = 0.0
 
     async def connect(self):
         self.start_websocket_thread()
         self.processing_task = asyncio.create_task(self.process_queue())
+        self.watchdog_task = asyncio.create_task(self.watch_feed())
 
     def start_websocket_thread(self):
         def run_websocket():
             self.api.start_websocket(
                 order_update_callback=self.sync_event_handler_order_update,
                 subscribe_callback=self.sync_event_handler_feed_update,
-                socket_open_callback=self.open_callback
+                socket_open_callback=self.open_callback,
+                socket_close_callback=self.close_callback
             )
 
         Thread(target=run_websocket, daemon=True).start()
         ws_logger.info("WebSocket client thread started.")
 
     def sync_event_handler_feed_update(self, tick_data):
+        now = time.monotonic()
+        self.last_message = now
+        key = f"{tick_data.get('e')}|{tick_data.get('tk')}"
+        self.last_tick[key] = now
+        if self._awaiting and key in self._awaiting:
+            self._recovered[key] = now
+            self._awaiting.pop(key, None)
+        if self.latency_tracker:
+            self.latency_tracker.stamp_ws_callback(tick_data)
         self.message_queue.put(('feed_update', tick_data))
 
     def sync_event_handler_order_update(self, order):
+        self.last_message = time.monotonic()
         self.message_queue.put(('order_update', order))
 
     async def process_queue(self):
         while True:
-            while not self.message_queue.empty():
-                message_type, data = self.message_queue.get()
+            if not self.message_queue.empty():
+                # Drain everything queued since the last pass and publish it as one pipeline
+                started = time.perf_counter_ns()
+                pipe = self.redis.pipeline(transaction=False)
+                while not self.message_queue.empty():
+                    message_type, data = self.message_queue.get()
+                    if self.latency_tracker:
+                        TickLatencyTracker.stamp(data)
+                    try:
+                        if message_type == 'feed_update':
+                            self.event_handler_feed_update(pipe, data)
+                        elif message_type == 'order_update':
+                            self.event_handler_order_update(pipe, data)
+                        elif message_type == 'feed_open':
+                            self.on_feed_open()
+                        elif message_type == 'feed_closed':
+                            self.on_feed_lost(pipe, 'closed')
+                    except Exception as e:
+                        app_logger.error(f"Error processing message from queue: {e}", exc_info=True)
                 try:
-                    if message_type == 'feed_update':
-                        await self.event_handler_feed_update(data)
-                    elif message_type == 'order_update':
-                        await self.event_handler_order_update(data)
+                    await pipe.execute()
+                    self.metrics.record('publish_batch', 1, started)
                 except Exception as e:
-                    app_logger.error(f"Error processing message from queue: {e}", exc_info=True)
+                    app_logger.error(f"Error publishing queued messages: {e}", exc_info=True)
             await asyncio.sleep(0.01)  # Prevent busy-waiting
 
-    async def event_handler_feed_update(self, tick_data):
-        await self.redis.publish('market_data', json.dumps(tick_data))
+    def event_handler_feed_update(self, pipe, tick_data):
+        if self.latency_tracker:
+            TickLatencyTracker.stamp(tick_data)
+        pipe.publish('market_data', json.dumps(tick_data))
 
-    async def event_handler_order_update(self, order):
-        ws_logger.info(f"order update: {order}")
-        await self.redis.publish('order_updates', json.dumps(order))
+    def event_handler_order_update(self, pipe, order):
+        ws_logger.info("order update: %s", order)
+        pipe.publish(self.order_channel, json.dumps(order))
 
     def open_callback(self):
         self.feed_opened = True
+        self.opened_at = time.monotonic()
         ws_logger.info("WebSocket feed opened")
+        self.message_queue.put(('feed_open', {}))
 
-    async def subscribe_symbol(self, exchange, token, trading_symbol):
+    def close_callback(self):
+        self.feed_opened = False
+        ws_logger.warning("WebSocket feed closed")
+        self.message_queue.put(('feed_closed', {}))
+
+    # --- Outages ---
+
+    def on_feed_open(self):
+        """Runs on the event loop once the socket is (re)opened: every held token goes out in one subscribe."""
+        if self._outage:
+            self._outage['reopened'] = time.monotonic()
+        if not self.subscriptions:
+            return
+        keys = list(self.subscriptions)
         try:
-            self.api.subscribe(f'{exchange}|{token}')
-            ws_logger.info(f"Subscribed to symbol: {trading_symbol}")
+            self.api.subscribe(keys)
+            ws_logger.info(f"Subscribed {len(keys)} held instrument(s) on feed open.")
         except Exception as e:
-            app_logger.error(f"Error subscribing to {exchange}|{token}: {e}")
+            app_logger.error(f"Error resubscribing {len(keys)} instrument(s): {e}")
+
+    def on_feed_lost(self, pipe, reason: str):
+        if self._outage:
+            return
+        now = time.monotonic()
+        self._outage = {'reason': reason, 'started': now, 'wall_time': time.time(), 'reopened': None}
+        self._recovered = {}
+        self._awaiting = {key: self.last_tick.get(key) for key in self.subscriptions}
+        self._before = dict(self._awaiting)
+        self._mark_stale(pipe, list(self.subscriptions))
+        ws_logger.warning(f"Feed {reason}: {len(self.subscriptions)} instrument(s) flagged stale until they tick again.")
+
+    def _mark_stale(self, pipe, keys):
+        if not keys:
+            return
+        now = time.monotonic()
+        for key in keys:
+            self.stale_tokens[key] = now
+        pipe.publish('market_data', json.dumps({'t': 'stale', 'k': keys}))
+
+    def _finish_outage(self):
+        outage, self._outage = self._outage, None
+        recovered = self._recovered
+        token_gaps = [
+            recovered[key] - last for key, last in self._before.items() if last is not None and key in recovered
+        ]
+        report = {
+            'reason': outage['reason'],
+            'wall_time': outage['wall_time'],
+            'recovery_ms': (max(recovered.values(), default=outage['started']) - outage['started']) * 1000,
+            'reopen_ms': (outage['reopened'] - outage['started']) * 1000 if outage['reopened'] else None,
+            'tokens': len(self._before),
+            'max_token_gap_ms': max(token_gaps, default=0.0) * 1000,
+            'restarts': self._restarts,
+        }
+        self.gaps.append(report)
+        self._restarts = 0
+        ws_logger.warning(
+            f"Feed recovered from {report['reason']} outage: {report['tokens']} instrument(s) back after "
+            f"{report['recovery_ms']:.0f} ms, longest token gap {report['max_token_gap_ms']:.0f} ms, "
+            f"{report['restarts']} restart(s)."
+        )
+
+    async def watch_feed(self):
+        """Heartbeat loop: spots stalls and silent tokens, restarts stalled sockets and closes outages."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self._check_feed()
+            except Exception as e:
+                app_logger.error(f"Feed watchdog error: {e}", exc_info=True)
+
+    async def _check_feed(self):
+        now = time.monotonic()
+        last_tick = self.last_tick
+        self.stale_tokens = {
+            key: flagged for key, flagged in self.stale_tokens.items()
+            if key in self.subscriptions and last_tick.get(key, 0.0) <= flagged
+        }
+        if self._outage:
+            self._awaiting = {key: last for key, last in self._awaiting.items() if key in self.subscriptions}
+            if not self._awaiting:
+                self._finish_outage()
+            elif self.feed_opened and now - max(self.last_message, self.opened_at, self._last_restart) > self.stall_timeout:
+                await self._restart()
+            return
+
+        if self.feed_opened and self.subscriptions and now - max(self.last_message, self.opened_at) > self.stall_timeout:
+            pipe = self.redis.pipeline(transaction=False)
+            self.on_feed_lost(pipe, 'stalled')
+            await pipe.execute()
+            await self._restart()
+            return
+
+        if self.token_stale_after > 0:
+            silent = [
+                key for key in self.subscriptions
+                if key not in self.stale_tokens and now - last_tick.get(key, self.opened_at) > self.token_stale_after
+            ]
+            if silent:
+                pipe = self.redis.pipeline(transaction=False)
+                self._mark_stale(pipe, silent)
+                await pipe.execute()
+                ws_logger.warning(f"No tick for {self.token_stale_after}s on {len(silent)} instrument(s); flagged stale.")
+
+    async def _restart(self):
+        """Closes the connected-but-silent socket and opens a new one, backing off on repeated attempts."""
+        if self._restarts:
+            delay = min(self.reconnect_backoff * 2 ** (self._restarts - 1), self.max_reconnect_backoff)
+            if time.monotonic() - self._last_restart < delay:
+                return
+        self._restarts += 1
+        self._last_restart = time.monotonic()
+        ws_logger.warning(f"Restarting the feed socket (attempt {self._restarts}).")
+        # A clean close waits out a close handshake a hung peer never answers (~10 s). Dropping
+        # NorenApi's socket instead ends its run loop at once, and the loop reconnects in ~0.1 s.
+        websocket = getattr(getattr(self.api, '_NorenApi__websocket', None), 'sock', None)
+        if websocket is not None and websocket.sock is not None:
+            try:
+                websocket.sock.shutdown(socket.SHUT_RDWR)
+                return
+            except OSError as e:
+                ws_logger.warning(f"Could not drop the feed socket ({e}); closing it instead.")
+        close_websocket = getattr(self.api, 'close_websocket', None)
+        if close_websocket:
+            await asyncio.to_thread(close_websocket)
+        self.feed_opened = False
+        self.start_websocket_thread()
+
+    def gap_report(self):
+        return list(self.gaps)
+
+    # --- Subscriptions ---
+
+    async def subscribe_symbol(self, exchange, token, trading_symbol):
+        await self.subscribe_many([(exchange, token, trading_symbol)])
 
     async def unsubscribe_symbol(self, exchange, token, trading_symbol):
+        await self.unsubscribe_many([(exchange, token, trading_symbol)])
+
+    async def subscribe_many(self, instruments: Iterable[Tuple[str, int, str]]):
+        """Takes a hold on each (exchange, token, trading symbol); the ones nobody held go out in one request."""
+        added = []
+        for exchange, token, trading_symbol in instruments:
+            key = f'{exchange}|{token}'
+            holders = self.subscriptions.get(key, 0)
+            self.subscriptions[key] = holders + 1
+            if not holders:
+                added.append((key, trading_symbol))
+        # While the feed is down the holds are enough: everything held is subscribed when it opens
+        if not added or not self.feed_opened:
+            return
         try:
-            self.api.unsubscribe(f'{exchange}|{token}')
-            ws_logger.info(f"Unsubscribed from symbol: {trading_symbol}")
+            self.api.subscribe([key for key, _ in added])
+            ws_logger.info(f"Subscribed to symbols: {', '.join(symbol for _, symbol in added)}")
         except Exception as e:
-            app_logger.error(f"Error unsubscribing from {exchange}|{token}: {e}")
+            app_logger.error(f"Error subscribing to {', '.join(key for key, _ in added)}: {e}")
+            for key, _ in added:
+                self._release(key)
+
+    async def unsubscribe_many(self, instruments: Iterable[Tuple[str, int, str]]):
+        """Drops a hold on each instrument; the ones no longer held by anyone go out in one request."""
+        removed = []
+        for exchange, token, trading_symbol in instruments:
+            key = f'{exchange}|{token}'
+            if key in self.subscriptions and not self._release(key):
+                removed.append((key, trading_symbol))
+        if not removed or not self.feed_opened:
+            return
+        try:
+            self.api.unsubscribe([key for key, _ in removed])
+            ws_logger.info(f"Unsubscribed from symbols: {', '.join(symbol for _, symbol in removed)}")
+        except Exception as e:
+            app_logger.error(f"Error unsubscribing from {', '.join(key for key, _ in removed)}: {e}")
+
+    def _release(self, key: str) -> int:
+        holders = self.subscriptions[key] - 1
+        if holders:
+            self.subscriptions[key] = holders
+        else:
+            del self.subscriptions[key]
+        return holders
 
     async def close(self):
+        if self.watchdog_task:
+            self.watchdog_task.cancel()
         if self.processing_task:
             self.processing_task.cancel()
             try:
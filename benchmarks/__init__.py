@@ -0,0 +1,8 @@
+# benchmarks/__init__.py
+# Runs before any benchmark module imports app code: app.logger_setup fixes its
+# log file paths from LOG_DIR on import, and benchmark runs must not write into
+# the repo's logs/.
+import os
+import tempfile
+
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="bench-logs-"))
@@ -0,0 +1,75 @@
+# benchmarks/bench_clock.py
+# Per-timer cost of the timer wheel behind app.clock as the number of live
+# timers grows, and how fast SimulatedClock replays a session of virtual time.
+# Run from the repo root: python -m benchmarks.bench_clock --timers 1000 10000 100000
+import json
+import time
+import random
+import asyncio
+import argparse
+from app.clock import SimulatedClock
+
+
+def wheel_costs(count: int) -> dict:
+    clock = SimulatedClock(start=0.0)
+    fired = [0]
+
+    def on_fire():
+        fired[0] += 1
+
+    delays = [random.uniform(0.001, 6 * 3600) for _ in range(count)]
+    started = time.perf_counter_ns()
+    timers = [clock.call_later(delay, on_fire) for delay in delays]
+    scheduled = time.perf_counter_ns()
+    for timer in timers[::10]:
+        timer.cancel()
+    cancelled = time.perf_counter_ns()
+    clock.advance(6 * 3600 + 1)
+    expired = time.perf_counter_ns()
+    return {
+        "timers": count,
+        "schedule_ns": (scheduled - started) / count,
+        "cancel_ns": (cancelled - scheduled) / len(timers[::10]),
+        "expire_ns": (expired - cancelled) / count,
+        "fired": fired[0],
+    }
+
+
+async def replay_session(strategies: int, hours: float) -> dict:
+    clock = SimulatedClock(start=0.0)
+    checks = [0]
+
+    async def strategy(offset: float):
+        await clock.sleep(offset)
+        deadline = clock.time() + hours * 3600
+        while clock.time() < deadline:
+            checks[0] += 1
+            await clock.sleep(1.0)
+
+    started = time.perf_counter()
+    await clock.run(asyncio.gather(*(strategy(i / strategies) for i in range(strategies))))
+    elapsed = time.perf_counter() - started
+    return {
+        "strategies": strategies,
+        "virtual_hours": hours,
+        "wall_s": elapsed,
+        "speedup": hours * 3600 / elapsed,
+        "monitor_iterations": checks[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the clock's timer wheel and simulated time.")
+    parser.add_argument("--timers", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--strategies", type=int, default=10)
+    parser.add_argument("--hours", type=float, default=1.0)
+    args = parser.parse_args()
+    print(json.dumps({
+        "benchmark": "clock",
+        "wheel": [wheel_costs(count) for count in args.timers],
+        "replay": asyncio.run(replay_session(args.strategies, args.hours)),
+    }))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
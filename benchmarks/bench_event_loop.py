@@ -0,0 +1,132 @@
+# benchmarks/bench_event_loop.py
+# The standard asyncio loop against uvloop on the paths where loop overhead
+# matters: the tick pipeline (WebSocket -> Redis -> MarketDataProcessor), the
+# paper order path (OrderExecutionEngine on Redis), the live order gateway and
+# the REST client fan-out. Each case runs as its own process under each loop,
+# --repeats times, and reports the median of its headline numbers, the CPU the
+# process used and uvloop/asyncio ratios, so EVENT_LOOP can be chosen per
+# deployment from numbers rather than folklore.
+# With --tcp-redis (or --redis HOST:PORT) the hot-path cases talk to Redis over
+# a real socket, as in production, instead of in-process fakeredis.
+# Run from the repo root: python -m benchmarks.bench_event_loop --repeats 3 --tcp-redis
+import sys
+import json
+import argparse
+import resource
+import statistics
+import subprocess
+from typing import Dict, List, Optional, Tuple
+from benchmarks.common import emit
+
+# case -> (benchmark module, its arguments, the result line to read, [(field, higher is better)])
+CASES: Dict[str, Tuple[str, List[str], Optional[str], List[Tuple[str, bool]]]] = {
+    "market_data": ("bench_hot_path", ["--cases", "market_data", "--ticks", "20000"], "market_data",
+                    [("throughput_per_s", True), ("p50_us", False), ("p99_us", False)]),
+    "ws_ingest": ("bench_hot_path", ["--cases", "ws_ingest", "--ticks", "5000", "--ws-ticks", "5000"], "ws_ingest",
+                  # Flat out, its latencies are queueing in front of the processor rather than loop cost
+                  [("throughput_per_s", True)]),
+    "place_order": ("bench_hot_path", ["--cases", "place_order", "--orders", "5000"], "place_order",
+                    [("throughput_per_s", True), ("p50_us", False), ("p99_us", False)]),
+    "pipeline": ("bench_pipeline", ["--tokens", "200", "--seconds", "2",
+                                    "--rates", "500", "1000", "2000", "3000", "4000", "6000", "8000"],
+                 "pipeline_ceiling", [("ceiling_ticks_per_s", True)]),
+    "order_gateway": ("bench_order_gateway", ["--orders", "1000", "--modifies", "200", "--rate-limit", "100000",
+                                              "--burst", "1000", "--latency-ms", "0"], None,
+                      [("orders_per_sec", True), ("max_loop_lag_ms", False)]),
+    "rest_client": ("bench_rest_client", ["--strikes", "200", "--latency-ms", "0"], None,
+                    [("client_fanout_ms", False), ("client_cached_ms", False)]),
+}
+REDIS_CASES = ("market_data", "ws_ingest", "place_order")
+# The fake TCP server answers the order path's pipelined writes one reply per
+# packet and every order waits out a ~40 ms delayed ACK, so it only serves the
+# tick cases; a real server (--redis) serves the order path too
+TCP_FAKE_REDIS_CASES = ("market_data", "ws_ingest")
+
+FAKE_REDIS_SERVER = """
+from fakeredis import TcpFakeServer
+server = TcpFakeServer(("127.0.0.1", 0))
+print(server.server_address[1], flush=True)
+server.serve_forever()
+"""
+
+
+def available_loops() -> List[str]:
+    try:
+        import uvloop  # noqa: F401
+        return ["asyncio", "uvloop"]
+    except ImportError:
+        return ["asyncio"]
+
+
+def run_case(case: str, loop: str, redis: Optional[str], timeout: float) -> Optional[dict]:
+    module, case_args, result_case, _ = CASES[case]
+    command = [sys.executable, "-m", f"benchmarks.{module}", "--loop", loop, *case_args]
+    if redis:
+        command += ["--redis", redis]
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print(f"{case} on {loop} timed out", file=sys.stderr)
+        return None
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    results = [json.loads(line) for line in completed.stdout.splitlines() if line.startswith("{")]
+    result = next((r for r in results if result_case is None or r.get("case") == result_case), None)
+    if completed.returncode or result is None:
+        print(f"{case} on {loop} failed:\n{completed.stderr[-2000:]}", file=sys.stderr)
+        return None
+    result["cpu_s"] = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return result
+
+
+def compare(case: str, runs: Dict[str, List[dict]]) -> dict:
+    fields = CASES[case][3] + [("cpu_s", False)]
+    result = {"case": case, "repeats": {loop: len(results) for loop, results in runs.items()}}
+    for field, higher_is_better in fields:
+        medians = {loop: statistics.median(r[field] for r in results)
+                   for loop, results in runs.items() if results}
+        entry = {loop: round(value, 3) for loop, value in medians.items()}
+        if medians.get("asyncio") and "uvloop" in medians:
+            # Above 1 means uvloop did better, whichever direction the field runs
+            ratio = medians["uvloop"] / medians["asyncio"]
+            entry["uvloop_gain"] = round(ratio if higher_is_better else 1 / ratio, 3) if ratio else None
+        result[field] = entry
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the asyncio and uvloop event loops on the hot paths.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--loops", nargs="+", choices=("asyncio", "uvloop"), default=available_loops())
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per case and loop; medians are reported.")
+    parser.add_argument("--redis", metavar="HOST:PORT", help="Redis server for the hot-path cases.")
+    parser.add_argument("--tcp-redis", action="store_true",
+                        help="Serve fakeredis over TCP from a separate process for the hot-path cases.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-run limit in seconds.")
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    args = parser.parse_args()
+
+    server = None
+    redis = args.redis
+    if args.tcp_redis and not redis:
+        server = subprocess.Popen([sys.executable, "-c", FAKE_REDIS_SERVER], stdout=subprocess.PIPE, text=True)
+        redis = f"127.0.0.1:{server.stdout.readline().strip()}"
+    try:
+        for case in args.cases:
+            runs: Dict[str, List[dict]] = {loop: [] for loop in args.loops}
+            case_redis = redis if case in (TCP_FAKE_REDIS_CASES if server else REDIS_CASES) else None
+            # Alternate the loops so drift on the box (thermal, noisy neighbours) hits both alike
+            for _ in range(args.repeats):
+                for loop in args.loops:
+                    result = run_case(case, loop, case_redis, args.timeout)
+                    if result:
+                        runs[loop].append(result)
+            emit("event_loop", dict(compare(case, runs), redis=case_redis or "fakeredis"), args.output)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
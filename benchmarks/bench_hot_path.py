@@ -0,0 +1,284 @@
+# benchmarks/bench_hot_path.py
+# Throughput and latency of each stage between a broker tick and the PnL write,
+# all offline: fakeredis for Redis, StubNorenApi for the broker socket, the fake
+# Noren REST server for symbol masters and a recording InfluxDB writer.
+# Prints one JSON line per case; --output appends the same lines to a JSONL file.
+# --redis HOST:PORT swaps fakeredis for a Redis server over TCP, --loop picks
+# the event loop (see benchmarks.bench_event_loop for both loops side by side).
+# Run from the repo root: python -m benchmarks.bench_hot_path --ticks 20000 --rate 0
+#   python -m benchmarks.bench_hot_path --cases ws_ingest --ws-ticks 2000 --rate 500
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import fakeredis
+import redis.asyncio as aioredis
+from app.metrics import LatencyHistogram
+from app.latency import TickLatencyTracker
+from app.websocket_manager import WebSocketManager
+from app.market_data_processor import MarketDataProcessor, market_data_key
+from app.position_manager import PositionManager
+from app.order_execution_engine import OrderExecutionEngine
+from app.option_analytics import OptionAnalytics
+from benchmarks.common import (Pacer, TickGenerator, add_loop_argument, emit, option_instruments, run as run_on_loop,
+                               throughput_result)
+from fakes.influxdb import RecordingInfluxDBManager
+from fakes.noren_api import StubNorenApi
+
+CASES = ("ws_ingest", "market_data", "bars", "pnl", "place_order", "option_symbols", "option_analytics")
+
+
+def redis_client(args, server: fakeredis.FakeServer = None):
+    if args.redis:
+        host, port = args.redis.rsplit(":", 1)
+        return aioredis.Redis(host=host, port=int(port))
+    return fakeredis.FakeAsyncRedis(server=server)
+
+
+async def bench_ws_ingest(args) -> dict:
+    """WebSocket callback -> queue -> `market_data` publish -> MarketDataProcessor, end to end."""
+    server = fakeredis.FakeServer()
+    redis = redis_client(args, server)
+    pubsub_redis = redis_client(args, server)
+    tracker = TickLatencyTracker(sample_every=1)
+    api = StubNorenApi()
+    processor = MarketDataProcessor(redis, pubsub_redis, latency_tracker=tracker)
+    ws_manager = WebSocketManager(api, redis, latency_tracker=tracker)
+    await processor.connect()
+    await ws_manager.connect()
+    await asyncio.to_thread(api.opened.wait, 5)
+
+    generator = TickGenerator(option_instruments(args.symbols), ticks_per_second=args.rate or 1000)
+
+    ticks = min(args.ticks, args.ws_ticks)
+
+    def produce():
+        pacer = Pacer(args.rate)
+        for _ in range(ticks):
+            api.push_tick(generator.next_tick())
+            pacer.wait()
+
+    delivered = tracker.histograms["ws_to_processor"]
+    started = time.perf_counter()
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    deadline = started + args.timeout
+    while delivered.count < ticks and time.perf_counter() < deadline:
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    await producer
+
+    await ws_manager.close()
+    await processor.close()
+    stages = {stage: round(entry["p99_us"], 2) for stage, entry in tracker.summary().items()}
+    return throughput_result("ws_ingest", delivered, elapsed, offered_rate=args.rate, sent=ticks,
+                             delivered=delivered.count, stage_p99_us=stages)
+
+
+async def bench_market_data(args) -> dict:
+    redis = redis_client(args)
+    processor = MarketDataProcessor(redis)
+    generator = TickGenerator(option_instruments(args.symbols), ticks_per_second=args.rate or 1000)
+    ticks = [generator.next_tick() for _ in range(args.ticks)]
+
+    hist = LatencyHistogram()
+    pacer = Pacer(args.rate)
+    started = time.perf_counter()
+    for tick in ticks:
+        before = time.perf_counter_ns()
+        await processor.update_market_data(tick)
+        hist.record(time.perf_counter_ns() - before)
+        await pacer.wait_async()
+    elapsed = time.perf_counter() - started
+    return throughput_result("market_data", hist, elapsed, offered_rate=args.rate, symbols=args.symbols)
+
+
+async def bench_bars(args) -> dict:
+    """BarBuilder.on_tick across --symbols instruments, with simulated time running at --rate (1000/s if 0)."""
+    from app.bars import BarBuilder
+    instruments = option_instruments(args.symbols)
+    generator = TickGenerator(instruments, ticks_per_second=args.rate or 1000)
+    symbols = {token: symbol for _, token, symbol, _ in instruments}
+    ticks = [generator.next_tick() for _ in range(args.ticks)]
+    builder = BarBuilder(capacity=len(instruments), persist=True)
+    completed = []
+    builder.subscribe(completed.append)
+    step = 1.0 / (args.rate or 1000)
+    now = 1_700_000_000.0
+    cumulative = {token: 0 for token in symbols}
+
+    hist = LatencyHistogram()
+    started = time.perf_counter()
+    for tick in ticks:
+        token = tick['tk']
+        cumulative[token] += 75
+        now += step
+        before = time.perf_counter_ns()
+        builder.on_tick(symbols[token], float(tick['lp']), cumulative[token], now)
+        hist.record(time.perf_counter_ns() - before)
+    elapsed = time.perf_counter() - started
+    before = time.perf_counter_ns()
+    builder.sweep(now + 3600)
+    sweep_ms = (time.perf_counter_ns() - before) / 1e6
+    return throughput_result("bars", hist, elapsed, symbols=args.symbols, timeframes=list(builder.timeframes),
+                             simulated_seconds=round(args.ticks * step, 1), completed_bars=len(completed),
+                             sweep_ms=round(sweep_ms, 3))
+
+
+async def bench_pnl(args) -> dict:
+    influxdb = RecordingInfluxDBManager(latency=args.influx_latency_ms / 1000)
+    positions = PositionManager(None, influxdb)
+    instruments = option_instruments(args.positions)
+    for i, (_, _, symbol, price) in enumerate(instruments):
+        positions.positions[symbol] = {'quantity': -75 if i % 2 else 75, 'entry_price': price, 'current_price': price}
+    generator = TickGenerator(instruments, ticks_per_second=args.rate or 1000)
+    symbols = {token: symbol for _, token, symbol, _ in instruments}
+    # The first write imports the InfluxDB client; keep that out of the numbers
+    await positions.update_and_write_all_pnl()
+    influxdb.write_api.points = 0
+
+    hist = LatencyHistogram()
+    pacer = Pacer(args.rate)
+    started = time.perf_counter()
+    for _ in range(args.ticks):
+        tick = generator.next_tick()
+        positions.positions[symbols[tick['tk']]]['current_price'] = float(tick['lp'])
+        before = time.perf_counter_ns()
+        await positions.update_and_write_all_pnl()
+        hist.record(time.perf_counter_ns() - before)
+        await pacer.wait_async()
+    elapsed = time.perf_counter() - started
+    return throughput_result("pnl", hist, elapsed, positions=args.positions,
+                             influx_latency_ms=args.influx_latency_ms,
+                             points_per_update=influxdb.write_api.points / max(1, args.ticks))
+
+
+async def bench_place_order(args) -> dict:
+    redis = redis_client(args)
+    processor = MarketDataProcessor(redis)
+    engine = OrderExecutionEngine(processor, PositionManager(processor, RecordingInfluxDBManager()), redis)
+    symbols = [symbol for _, _, symbol, _ in option_instruments(args.symbols)]
+    for i, symbol in enumerate(symbols):
+        await redis.hset(market_data_key(symbol), 'ltp', 100.0 + i)
+
+    hist = LatencyHistogram()
+    pacer = Pacer(args.rate)
+    orders = min(args.ticks, args.orders)
+    started = time.perf_counter()
+    for i in range(orders):
+        order = {'symbol': symbols[i % len(symbols)], 'quantity': 75, 'direction': 'S', 'order_type': 'MKT'}
+        before = time.perf_counter_ns()
+        await engine.place_order(order)
+        hist.record(time.perf_counter_ns() - before)
+        await pacer.wait_async()
+    elapsed = time.perf_counter() - started
+    return throughput_result("place_order", hist, elapsed, offered_rate=args.rate)
+
+
+async def bench_option_symbols(args) -> dict:
+    from fakes.noren_rest import FakeNorenRestServer
+    server = FakeNorenRestServer().start()
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.utils reads these when first imported, and nothing above imports it
+        os.environ["NOREN_SYMBOLS_URL"] = server.url
+        os.environ["SYMBOL_CACHE_DIR"] = tmp
+        from app.utils import get_option_symbols
+        strikes = [24000 + offset * 50 for offset in range(-10, 11)]
+
+        started = time.perf_counter()
+        options = await get_option_symbols("NIFTY", {"ce": (strikes[0], "CE"), "pe": (strikes[0], "PE")})
+        cold_ms = (time.perf_counter() - started) * 1000
+        server.stop()
+        if options is None:
+            return {"case": "option_symbols", "error": "symbol master could not be loaded"}
+
+        hist = LatencyHistogram()
+        lookups = min(args.ticks, args.lookups)
+        started = time.perf_counter()
+        for i in range(lookups):
+            strike = strikes[i % len(strikes)]
+            before = time.perf_counter_ns()
+            await get_option_symbols("NIFTY", {"ce": (strike, "CE"), "pe": (strike, "PE")})
+            hist.record(time.perf_counter_ns() - before)
+        elapsed = time.perf_counter() - started
+    return throughput_result("option_symbols", hist, elapsed, cold_ms=round(cold_ms, 2), legs_per_lookup=2)
+
+
+class _AnalyticsInputs:
+    """Position book and spot in the shape OptionAnalytics reads.
+
+    PositionManager and MarketDataProcessor do not yet provide
+    get_total_pnl() and get_underlying_price(), so both come from here.
+    """
+
+    def __init__(self, legs: int, spot: float = 24010.0):
+        self.spot = spot
+        self.positions = {
+            f"NIFTY_{24000 + (i // 2) * 50}_{'CE' if i % 2 == 0 else 'PE'}":
+                {'quantity': -75, 'entry_price': 120.0 + i, 'current_price': 118.0 + i}
+            for i in range(legs)
+        }
+
+    async def get_all_positions(self):
+        return self.positions
+
+    async def get_total_pnl(self):
+        pnl = sum((p['current_price'] - p['entry_price']) * p['quantity'] for p in self.positions.values())
+        return pnl, pnl / 1e5 * 100
+
+    async def get_underlying_price(self):
+        return self.spot
+
+
+async def bench_option_analytics(args) -> dict:
+    inputs = _AnalyticsInputs(args.positions)
+    analytics = OptionAnalytics(inputs, inputs)
+    per_method = {}
+    total = LatencyHistogram()
+    started = time.perf_counter()
+    for name, call in (
+        ("payoff", lambda: analytics.calculate_payoff(None, None, step=args.payoff_step)),
+        ("greeks", analytics.calculate_greeks),
+        ("risk_metrics", analytics.calculate_risk_metrics),
+    ):
+        hist = LatencyHistogram()
+        for _ in range(args.analytics_runs):
+            before = time.perf_counter_ns()
+            await call()
+            hist.record(time.perf_counter_ns() - before)
+        per_method[name] = {key: round(value, 2) for key, value in hist.summary().items() if key in ("mean_us", "p99_us")}
+        total.merge(hist)
+    elapsed = time.perf_counter() - started
+    return throughput_result("option_analytics", total, elapsed, positions=args.positions, methods=per_method)
+
+
+async def run(args):
+    for case in args.cases:
+        result = await globals()[f"bench_{case}"](args)
+        emit("hot_path", result, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tick-to-PnL hot path.")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--ticks", type=int, default=20000, help="Operations per case (ticks, updates, orders).")
+    parser.add_argument("--rate", type=float, default=0.0, help="Offered ticks per second; 0 runs flat out.")
+    parser.add_argument("--symbols", type=int, default=4, help="Instruments in the synthetic feed.")
+    parser.add_argument("--positions", type=int, default=4, help="Open positions for the PnL and analytics cases.")
+    parser.add_argument("--ws-ticks", type=int, default=1000, help="Cap on ticks for ws_ingest.")
+    parser.add_argument("--orders", type=int, default=5000, help="Cap on orders for place_order.")
+    parser.add_argument("--lookups", type=int, default=500, help="Cap on lookups for option_symbols.")
+    parser.add_argument("--analytics-runs", type=int, default=50)
+    parser.add_argument("--payoff-step", type=float, default=1.0)
+    parser.add_argument("--influx-latency-ms", type=float, default=0.0,
+                        help="Simulated synchronous InfluxDB write time for the pnl case.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Give up waiting on ws_ingest delivery after this.")
+    parser.add_argument("--redis", metavar="HOST:PORT", help="Use this Redis server instead of in-process fakeredis.")
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    add_loop_argument(parser)
+    args = parser.parse_args()
+    run_on_loop(run(args), args.loop)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,86 @@
+# benchmarks/bench_indicators.py
+# Per-update cost of the streaming indicators against their vectorised batch()
+# forms, and the largest difference between the two series as a correctness check.
+# Run from the repo root: python -m benchmarks.bench_indicators --updates 200000
+import math
+import time
+import random
+import argparse
+import numpy as np
+from app.indicators import ATR, EMA, VWAP, RealizedVolatility, RollingMax, RollingMin, ZScore
+from benchmarks.common import emit
+
+
+def synthetic_bars(count: int, seed: int = 3):
+    rng = random.Random(seed)
+    price = 100.0
+    high, low, close, volume = [], [], [], []
+    for _ in range(count):
+        price *= math.exp(rng.gauss(0.0, 0.001))
+        spread = abs(rng.gauss(0.0, 0.05))
+        high.append(price + spread)
+        low.append(price - spread)
+        close.append(price)
+        volume.append(float(rng.randint(0, 20) * 75))
+    return high, low, close, volume
+
+
+def cases(window: int):
+    # name -> (streaming factory, update args per row, batch call)
+    return {
+        "ema": (lambda: EMA(window), lambda h, l, c, v: (c,), lambda h, l, c, v: EMA.batch(c, window)),
+        "zscore": (lambda: ZScore(window), lambda h, l, c, v: (c,), lambda h, l, c, v: ZScore.batch(c, window)),
+        "realized_vol": (lambda: RealizedVolatility(window), lambda h, l, c, v: (c,),
+                         lambda h, l, c, v: RealizedVolatility.batch(c, window)),
+        "atr": (lambda: ATR(window), lambda h, l, c, v: (h, l, c), lambda h, l, c, v: ATR.batch(h, l, c, window)),
+        "vwap": (VWAP, lambda h, l, c, v: (c, v), lambda h, l, c, v: VWAP.batch(c, v)),
+        "rolling_max": (lambda: RollingMax(window), lambda h, l, c, v: (h,),
+                        lambda h, l, c, v: RollingMax.batch(h, window)),
+        "rolling_min": (lambda: RollingMin(window), lambda h, l, c, v: (l,),
+                        lambda h, l, c, v: RollingMin.batch(l, window)),
+    }
+
+
+def run(args):
+    high, low, close, volume = synthetic_bars(args.updates)
+    arrays = [np.asarray(a) for a in (high, low, close, volume)]
+    for name, (factory, row_args, batch) in cases(args.window).items():
+        if args.cases and name not in args.cases:
+            continue
+        indicator = factory()
+        rows = list(zip(*row_args(high, low, close, volume)))
+        update = indicator.update
+        streamed = np.empty(len(rows))
+        started = time.perf_counter_ns()
+        for i, row in enumerate(rows):
+            streamed[i] = update(*row)
+        streaming_ns = (time.perf_counter_ns() - started) / len(rows)
+
+        # The first call pays for importing pandas; keep it out of the numbers
+        batch(*(a[:10] for a in arrays))
+        started = time.perf_counter_ns()
+        batched = batch(*arrays)
+        batch_ns = (time.perf_counter_ns() - started) / len(rows)
+        both = ~(np.isnan(streamed) | np.isnan(batched))
+        emit("indicators", {
+            "case": name,
+            "updates": len(rows),
+            "window": args.window,
+            "update_ns": round(streaming_ns, 1),
+            "batch_ns_per_row": round(batch_ns, 2),
+            "max_abs_diff": float(np.max(np.abs(streamed[both] - batched[both]))) if both.any() else None,
+            "nan_mismatch": int(np.sum(np.isnan(streamed) != np.isnan(batched))),
+        }, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming indicators.")
+    parser.add_argument("--updates", type=int, default=200000)
+    parser.add_argument("--window", type=int, default=300)
+    parser.add_argument("--cases", nargs="*", help="Only these indicators.")
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+# benchmarks/bench_iv_surface.py
+# Cost of the IV surface: per-tick on_price(), iv() and greeks() lookups, and
+# cold and warm-started SVI refits, on a synthetic chain priced off a known
+# smile. Also reports how far the fitted IVs are from that smile.
+# Run from the repo root: python -m benchmarks.bench_iv_surface --strikes 41
+import math
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime
+from app.iv_surface import SVI, IVSurface, black76_price
+from benchmarks.common import emit
+
+TRUE_SMILE = SVI(a=0.0004, b=0.004, rho=-0.4, m=0.01, sigma=0.05)
+
+
+def timed_us(fn, *args, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+async def run(args):
+    now = datetime(2024, 10, 21, 10, 0).timestamp()
+    surface = IVSurface(rate=args.rate, time_source=lambda: now)
+    expiry = datetime(2024, 10, 24, 15, 30)
+    years = surface.years_to(expiry, now)
+    strikes = [args.forward - (args.strikes // 2) * args.step + i * args.step for i in range(args.strikes)]
+    for strike in strikes:
+        for option_type in ("CE", "PE"):
+            surface.add_option(f"N{strike:.0f}{option_type}", expiry, strike, option_type)
+
+    rng = random.Random(5)
+
+    def publish(forward: float, shift: float):
+        for strike in strikes:
+            vol = math.sqrt((TRUE_SMILE.total_variance(math.log(strike / forward)) + shift) / years)
+            for option_type in ("CE", "PE"):
+                price = black76_price(forward, strike, years, vol, option_type == "CE", args.rate)
+                surface.on_price(f"N{strike:.0f}{option_type}", round(max(price, 0.05), 2))
+
+    surface.set_forward(args.forward)
+    publish(args.forward, 0.0)
+    started = time.perf_counter()
+    await surface.refit()
+    cold_ms = (time.perf_counter() - started) * 1000
+
+    warm = []
+    shift = 0.0
+    for _ in range(args.refits):
+        shift = rng.uniform(-2e-5, 2e-5)
+        publish(args.forward + rng.uniform(-30, 30), shift)
+        started = time.perf_counter()
+        await surface.refit(force=True)
+        warm.append((time.perf_counter() - started) * 1000)
+
+    smile = surface.smiles[expiry]
+    errors = [
+        abs(smile.iv(strike) - math.sqrt((TRUE_SMILE.total_variance(math.log(strike / smile.forward)) + shift) / years))
+        for strike in strikes[2:-2]
+    ]
+    atm = round(smile.forward / args.step) * args.step + args.step / 2
+    emit("iv_surface", {
+        "strikes": args.strikes,
+        "options": 2 * args.strikes,
+        "cold_fit_ms": round(cold_ms, 2),
+        "warm_fit_ms_mean": round(sum(warm) / len(warm), 2),
+        "warm_fit_ms_max": round(max(warm), 2),
+        "max_iv_error": round(max(errors), 5),
+        "on_price_us": round(timed_us(surface.on_price, f"N{strikes[0]:.0f}CE", 101.5, repeat=args.lookups), 3),
+        "iv_us": round(timed_us(surface.iv, atm, repeat=args.lookups), 3),
+        "greeks_us": round(timed_us(surface.greeks, atm, "CE", repeat=args.lookups), 3),
+    }, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the implied-volatility surface.")
+    parser.add_argument("--strikes", type=int, default=41)
+    parser.add_argument("--step", type=float, default=50.0)
+    parser.add_argument("--forward", type=float, default=24010.0)
+    parser.add_argument("--rate", type=float, default=0.065)
+    parser.add_argument("--refits", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+# benchmarks/bench_journal.py
+# Recording cost of the columnar trade journal on the hot path, and how long
+# session analytics take over months of journal data.
+# Run from the repo root: python -m benchmarks.bench_journal --days 90
+import math
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from app.journal import JournalReader, TradeJournal
+from benchmarks.common import emit
+
+SESSION_SECONDS = int(6.25 * 3600)
+
+
+def synthetic_session(journal: TradeJournal, day: datetime, rng: random.Random):
+    """A short straddle: two legs sold at the open, stop losses or a square-off later, PnL every second."""
+    start_ns = int(day.replace(hour=9, minute=15).timestamp() * 1e9)
+    fills = []
+    realized = 0.0
+    for leg in ("CE", "PE"):
+        symbol = f"NIFTY{day:%d%b}{leg[0]}24000".upper()
+        entry = rng.uniform(80, 140)
+        fills.append((start_ns + rng.randint(0, 5) * 10**9, symbol, "S", 75, entry, entry + rng.uniform(-0.3, 0.3),
+                      -75, None, realized))
+        exit_price = entry * rng.uniform(0.3, 1.3)
+        trade_pnl = (entry - exit_price) * 75
+        realized += trade_pnl
+        exit_ns = start_ns + rng.randint(600, SESSION_SECONDS) * 10**9
+        fills.append((exit_ns, symbol, "B", 75, exit_price, exit_price - rng.uniform(-0.3, 0.3), 0, trade_pnl, realized))
+    journal.write_rows("fills", fills)
+
+    pnl_rows = []
+    total = 0.0
+    for second in range(0, SESSION_SECONDS):
+        total += rng.gauss(0, 40) - total * 0.001
+        pnl_rows.append((start_ns + second * 10**9, total, 0.0, total, 150000.0))
+    journal.write_rows("pnl", pnl_rows)
+
+
+async def run(args):
+    results = {"days": args.days}
+    with tempfile.TemporaryDirectory() as root:
+        journal = TradeJournal(root, "straddle", flush_interval=args.flush_interval, pnl_interval=0.0)
+        journal.start()
+        started = time.perf_counter_ns()
+        for i in range(args.records):
+            journal.record_pnl(float(i), 1.5 * i, 1e5)
+        results["record_pnl_ns_per_call"] = (time.perf_counter_ns() - started) / args.records
+        started = time.perf_counter_ns()
+        for i in range(args.records):
+            journal.record_fill("NIFTY24OCTC24000", "S", 75, 100.0, 100.1, -75, None, float(i))
+        results["record_fill_ns_per_call"] = (time.perf_counter_ns() - started) / args.records
+        started = time.perf_counter()
+        await journal.close()
+        results["drain_and_compact_ms"] = (time.perf_counter() - started) * 1000
+
+    with tempfile.TemporaryDirectory() as root:
+        rng = random.Random(11)
+        journal = TradeJournal(root, "straddle")
+        first_day = datetime(2024, 1, 1)
+        started = time.perf_counter()
+        for offset in range(args.days):
+            synthetic_session(journal, first_day + timedelta(days=offset), rng)
+        results["generate_s"] = time.perf_counter() - started
+
+        reader = JournalReader(root)
+        for label, start, end in (
+            ("all", None, None),
+            ("last_30_days", (first_day + timedelta(days=max(0, args.days - 30))).date(), None),
+        ):
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                sessions = reader.session_analytics(start, end, "straddle")
+                timings.append(time.perf_counter() - started)
+            results[f"session_analytics_{label}_ms"] = min(timings) * 1000
+            results[f"session_analytics_{label}_sessions"] = len(sessions)
+        started = time.perf_counter()
+        pnl = reader.pnl(columns=["total_pnl"])
+        results["read_pnl_ms"] = (time.perf_counter() - started) * 1000
+        results["pnl_rows"] = len(pnl)
+        assert not math.isnan(sessions["max_drawdown"].iloc[-1])
+    emit("journal", results, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the columnar trade journal.")
+    parser.add_argument("--days", type=int, default=90, help="Sessions of synthetic history to query.")
+    parser.add_argument("--records", type=int, default=100000, help="Records for the hot-path cost measurement.")
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+# benchmarks/bench_logging.py
+# Per-call cost of a log statement on the caller's thread: the old synchronous
+# FileHandler with f-strings versus the queue pipeline in app.logger_setup.
+# Calls are issued in short bursts with idle time in between, like log lines on
+# the tick path, so the writer thread drains the queue between bursts.
+# Run from the repo root: python -m benchmarks.bench_logging --calls 20000 --burst 50
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+from app import logger_setup
+from app.logger_setup import setup_logger, setup_logging, shutdown_logging, common_formatter
+
+
+def wait_for_writer():
+    while not logger_setup._log_queue.empty():
+        time.sleep(0.001)
+
+
+def per_call_ns(log, calls: int, burst: int) -> float:
+    elapsed = 0
+    for start in range(0, calls - burst + 1, burst):
+        started = time.perf_counter_ns()
+        for i in range(start, start + burst):
+            log(i)
+        elapsed += time.perf_counter_ns() - started
+        wait_for_writer()
+    return elapsed / (calls // burst * burst)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-call logging cost.")
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=50)
+    args = parser.parse_args()
+    setup_logging()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_logger = logging.getLogger("bench.sync")
+        sync_logger.propagate = False
+        sync_logger.setLevel(logging.INFO)
+        handler = logging.FileHandler(os.path.join(tmp, "sync.log"), encoding="utf-8")
+        handler.setFormatter(common_formatter)
+        sync_logger.addHandler(handler)
+
+        queue_logger = setup_logger("bench.queue", os.path.join(tmp, "queue.log"), formatter=common_formatter)
+        queue_logger.propagate = False
+
+        symbol, ltp = "NIFTY24OCT24000CE", 131.45
+        results = {
+            "benchmark": "logging",
+            "calls": args.calls,
+            "burst": args.burst,
+            "sync_fstring_ns": per_call_ns(
+                lambda i: sync_logger.info(f"Position opened/updated for {symbol} at {ltp + i}"), args.calls, args.burst),
+            "queue_lazy_ns": per_call_ns(
+                lambda i: queue_logger.info("Position opened/updated for %s at %s", symbol, ltp + i), args.calls, args.burst),
+            "queue_duplicate_suppressed_ns": per_call_ns(
+                lambda i: queue_logger.warning("LTP not found for symbol: %s", symbol), args.calls, args.burst),
+            "disabled_debug_fstring_ns": per_call_ns(
+                lambda i: queue_logger.debug(f"tick {symbol} {ltp + i}"), args.calls, args.burst),
+            "disabled_debug_lazy_ns": per_call_ns(
+                lambda i: queue_logger.debug("tick %s %s", symbol, ltp + i), args.calls, args.burst),
+        }
+        shutdown_logging()
+        handler.close()
+        with open(os.path.join(tmp, "queue.log")) as f:
+            results["queue_lines_written"] = sum(1 for _ in f)
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
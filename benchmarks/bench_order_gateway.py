@@ -0,0 +1,82 @@
+# benchmarks/bench_order_gateway.py
+# Drives NorenOrderGateway against the local fake Noren REST server.
+# Run from the repo root: python -m benchmarks.bench_order_gateway --orders 200
+import json
+import time
+import asyncio
+import argparse
+import fakeredis
+from app.order_gateway import NorenOrderGateway, TERMINAL_STATUSES
+from benchmarks.common import add_loop_argument, emit, run as run_on_loop
+from fakes.noren_rest import FakeNorenRestServer
+
+
+async def run(args):
+    server = FakeNorenRestServer(latency=args.latency_ms / 1000).start()
+    redis = fakeredis.FakeAsyncRedis()
+    loop = asyncio.get_running_loop()
+    # Stand in for WebSocketManager, which republishes broker order updates on `order_updates`
+    server.on_order_update = lambda update: asyncio.run_coroutine_threadsafe(
+        redis.publish("order_updates", json.dumps(update)), loop
+    )
+
+    gateway = NorenOrderGateway(server.url, "FAKEUSER", "fake-session-token", max_workers=args.workers,
+                                rate_limit=args.rate_limit, burst=args.burst)
+    await gateway.start(redis)
+    await asyncio.sleep(0.05)
+
+    order = {"symbol": "NIFTY24OCT24000CE", "exchange": "NFO", "direction": "S", "quantity": 75, "order_type": "MKT"}
+    event_loop_lag = []
+
+    async def watch_loop():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            event_loop_lag.append(time.perf_counter() - started - 0.001)
+
+    watcher = asyncio.create_task(watch_loop())
+    started = time.perf_counter()
+    norenordnos = await asyncio.gather(*(gateway.place_order(dict(order, order_id=i)) for i in range(args.orders)))
+    place_elapsed = time.perf_counter() - started
+    fills = await asyncio.gather(*(gateway.wait_for_status(n, TERMINAL_STATUSES, timeout=5) for n in norenordnos))
+
+    sl = dict(order, order_type="SL-M", direction="B", trigger_price=130.0, order_id=-1)
+    sl_norenordno = await gateway.place_order(sl)
+    await asyncio.gather(*(
+        gateway.modify_order(sl_norenordno, "NFO", sl["symbol"], 75, "SL-M", trigger_price=130.0 + i * 0.05)
+        for i in range(args.modifies)
+    ))
+    watcher.cancel()
+
+    results = {
+        "orders": args.orders,
+        "orders_per_sec": args.orders / place_elapsed,
+        "rate_limit": args.rate_limit,
+        "filled": sum(1 for f in fills if f and f.get("status") == "COMPLETE"),
+        "modifies_requested": args.modifies,
+        "modifies_sent": server.requests["ModifyOrder"],
+        "modifies_coalesced": gateway.coalesced_modifies,
+        "http_connections": len(server.connections),
+        "max_loop_lag_ms": max(event_loop_lag) * 1000 if event_loop_lag else 0.0,
+    }
+    await gateway.close()
+    server.stop()
+    emit("order_gateway", results, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the live order gateway against a fake Noren server.")
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--modifies", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate-limit", type=float, default=100.0)
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    add_loop_argument(parser)
+    args = parser.parse_args()
+    run_on_loop(run(args), args.loop)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,115 @@
+# benchmarks/bench_pipeline.py
+# Throughput ceiling of the market-data pipeline on one box: the real NorenApi
+# client reads the fake Noren WebSocket feed, WebSocketManager publishes to
+# fakeredis and MarketDataProcessor consumes it. The offered tick rate steps up
+# until the pipeline stops keeping up (delivers under --keep-up of what the feed
+# sent, or falls further behind than --max-lag-ms).
+# Run from the repo root: python -m benchmarks.bench_pipeline --tokens 1000 --rates 50 100 500 2000
+import time
+import asyncio
+import argparse
+import fakeredis
+from app.logger_setup import app_logger
+from app.latency import TickLatencyTracker
+from app.market_data_processor import MarketDataProcessor
+from app.websocket_manager import WebSocketManager
+from benchmarks.common import add_loop_argument, emit, run as run_on_loop
+from fakes.broker import FakeBroker
+
+
+async def drain(tracker: TickLatencyTracker, timeout: float) -> bool:
+    """Waits until every tick the WebSocket thread received has reached MarketDataProcessor."""
+    received = tracker.histograms["exchange_to_ws"]
+    delivered = tracker.histograms["ws_to_processor"]
+    deadline = time.perf_counter() + timeout
+    while delivered.count < received.count:
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+async def run(args):
+    broker = FakeBroker(rate=0.0, burst_every=args.burst_every, burst_seconds=args.burst_seconds,
+                        burst_multiplier=args.burst_multiplier).start()
+    server = fakeredis.FakeServer()
+    redis = fakeredis.FakeAsyncRedis(server=server)
+    tracker = TickLatencyTracker(sample_every=1)
+    processor = MarketDataProcessor(redis, fakeredis.FakeAsyncRedis(server=server), latency_tracker=tracker)
+    ws_manager = WebSocketManager(broker.api(), redis, latency_tracker=tracker)
+    await processor.connect()
+    await ws_manager.connect()
+    while not ws_manager.feed_opened:
+        await asyncio.sleep(0.01)
+
+    keys = [f"NFO|{100000 + i}" for i in range(args.tokens)]
+    for start in range(0, len(keys), 500):
+        ws_manager.api.subscribe(keys[start:start + 500], feed_type='d' if args.depth else 't')
+    # Subscription acknowledgements arrive as one burst of `tk`/`dk` ticks; let them through first
+    await asyncio.sleep(0.5)
+    if not await drain(tracker, args.drain_timeout):
+        app_logger.warning("Subscription acknowledgements were still queued when the first step started.")
+
+    received = tracker.histograms["exchange_to_ws"]
+    delivered = tracker.histograms["ws_to_processor"]
+    ceiling = 0.0
+    try:
+        for rate in args.rates:
+            for hist in tracker.histograms.values():
+                hist.reset()
+            broker.feed.rate = rate
+            started = time.perf_counter()
+            await asyncio.sleep(args.seconds)
+            elapsed = time.perf_counter() - started
+            broker.feed.rate = 0.0
+            received_count, delivered_count = received.count, delivered.count
+            p99_ms = delivered.percentile(99) / 1e6
+            step = {
+                "case": "pipeline_step",
+                "offered_rate": rate,
+                "tokens": args.tokens,
+                "feed": "depth" if args.depth else "touchline",
+                "received_per_s": round(received_count / elapsed, 1),
+                "delivered_per_s": round(delivered_count / elapsed, 1),
+                "ws_to_processor_p50_ms": round(delivered.percentile(50) / 1e6, 3),
+                "ws_to_processor_p99_ms": round(p99_ms, 3),
+                "ws_to_dequeue_p99_ms": round(tracker.histograms["ws_to_dequeue"].percentile(99) / 1e6, 3),
+                "publish_to_processor_p99_ms": round(tracker.histograms["publish_to_processor"].percentile(99) / 1e6, 3),
+            }
+            emit("pipeline", step, args.output)
+            keeping_up = received_count and delivered_count >= args.keep_up * received_count and p99_ms <= args.max_lag_ms
+            if not keeping_up:
+                break
+            ceiling = max(ceiling, delivered_count / elapsed)
+            # Let the queues empty so the next step starts clean
+            await drain(tracker, args.drain_timeout)
+    finally:
+        await ws_manager.close()
+        await processor.close()
+        ws_manager.api.close_websocket()
+        broker.stop()
+    emit("pipeline", {"case": "pipeline_ceiling", "tokens": args.tokens, "ceiling_ticks_per_s": round(ceiling, 1),
+                      "keep_up": args.keep_up, "max_lag_ms": args.max_lag_ms}, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the tick throughput ceiling of the market-data pipeline.")
+    parser.add_argument("--tokens", type=int, default=1000, help="Tokens subscribed on the fake feed.")
+    parser.add_argument("--rates", type=float, nargs="+", default=[25, 50, 100, 250, 500, 1000, 2500, 5000])
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each rate step.")
+    parser.add_argument("--depth", action="store_true", help="Subscribe to depth instead of touchline.")
+    parser.add_argument("--keep-up", type=float, default=0.95, help="Delivered/received ratio that counts as keeping up.")
+    parser.add_argument("--max-lag-ms", type=float, default=250.0, help="ws_to_processor p99 that counts as keeping up.")
+    parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="Longest wait for queued ticks to clear before a step.")
+    parser.add_argument("--burst-every", type=float, default=0.0)
+    parser.add_argument("--burst-seconds", type=float, default=1.0)
+    parser.add_argument("--burst-multiplier", type=float, default=10.0)
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    add_loop_argument(parser)
+    args = parser.parse_args()
+    run_on_loop(run(args), args.loop)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,94 @@
+# benchmarks/bench_portfolio_rules.py
+# Per-tick cost of incremental PnL plus the portfolio exit rules, and the time
+# from a rule firing to the flatten orders being out, offline on fakeredis.
+# A short book of --legs option legs is opened, ticks move their prices without
+# crossing any limit, then the premium is pushed through the combined stop.
+# Run from the repo root: python -m benchmarks.bench_portfolio_rules --legs 20
+import time
+import random
+import asyncio
+import argparse
+from types import SimpleNamespace
+import fakeredis
+from app.rules import Rules
+from app.metrics import LatencyHistogram
+from app.market_data_processor import MarketDataProcessor, market_data_key
+from app.position_manager import PositionManager
+from app.order_execution_engine import OrderExecutionEngine
+from app.portfolio_rules import PortfolioExitRules
+from benchmarks.common import emit, option_instruments
+from fakes.influxdb import RecordingInfluxDBManager
+
+
+async def run(args):
+    config = SimpleNamespace(rules=Rules({
+        'start_time': '09:15:00', 'end_time': '15:15:00', 'tsymbol': 'NIFTY', 'quantity': 1,
+        'stop_loss_percentage': 30, 'max_daily_loss': 1e9, 'combined_stop_loss_percentage': args.stop,
+        'trailing_profit_activation': 1e9,
+    }))
+    redis = fakeredis.FakeAsyncRedis()
+    processor = MarketDataProcessor(redis)
+    positions = PositionManager(processor, RecordingInfluxDBManager())
+    engine = OrderExecutionEngine(processor, positions, redis)
+    rules = PortfolioExitRules(config, engine)
+    positions.subscribe_pnl(rules.on_pnl)
+
+    symbols = [symbol for _, _, symbol, _ in option_instruments(args.legs)]
+    for symbol in symbols:
+        await redis.hset(market_data_key(symbol), 'ltp', 100.0)
+        await positions.add_position(symbol, 75, 100.0, 'S')
+
+    rng = random.Random(11)
+    on_tick = positions.on_tick
+    hist = LatencyHistogram()
+    # Stay well inside the combined stop: every leg within +-5% of its entry
+    ticks = [(symbols[rng.randrange(len(symbols))], round(100.0 * rng.uniform(0.95, 1.05), 2))
+             for _ in range(args.ticks)]
+    started = time.perf_counter()
+    for symbol, price in ticks:
+        before = time.perf_counter_ns()
+        on_tick(symbol, price)
+        hist.record(time.perf_counter_ns() - before)
+    elapsed = time.perf_counter() - started
+    drift = abs(positions.unrealized_pnl - sum(
+        (p['current_price'] - p['entry_price']) * p['quantity'] for p in positions.positions.values()
+    ))
+
+    # Every leg up by the stop percentage and a bit: the last of these ticks fires the rule
+    for symbol in symbols:
+        price = 100.0 * (1 + args.stop / 100) + 1
+        await redis.hset(market_data_key(symbol), 'ltp', price)
+        on_tick(symbol, price)
+    fired = rules.fired is not None
+    flatten_started = time.perf_counter()
+    await rules.close()
+    flatten_ms = (time.perf_counter() - flatten_started) * 1000
+    rejected = await engine.place_order({'symbol': symbols[0], 'quantity': 75, 'direction': 'S', 'order_type': 'MKT'})
+
+    summary = hist.summary()
+    emit("portfolio_rules", {
+        "legs": args.legs,
+        "ticks": args.ticks,
+        "tick_p50_ns": round(summary["p50_us"] * 1000),
+        "tick_p99_ns": round(summary["p99_us"] * 1000),
+        "ticks_per_s": round(args.ticks / elapsed),
+        "incremental_pnl_drift": drift,
+        "fired": fired,
+        "flatten_ms": round(flatten_ms, 2),
+        "open_after_flatten": len(positions.positions),
+        "realized_pnl": round(positions.realized_pnl, 2),
+        "new_entry_rejected": rejected is None,
+    }, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the portfolio exit rules.")
+    parser.add_argument("--legs", type=int, default=20)
+    parser.add_argument("--ticks", type=int, default=200000)
+    parser.add_argument("--stop", type=float, default=20.0, help="combined_stop_loss_percentage")
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,97 @@
+# benchmarks/bench_rest_client.py
+# NorenRestClient against the local fake Noren REST server, next to the
+# NorenApi wheel it replaces for reads. Fetches quotes for a strike ladder:
+# the wheel one call at a time on a worker thread (what get_atm_strike and
+# friends did), then the client fanned out over its keep-alive pool, cold and
+# cached. Also checks that concurrent identical reads share one request and
+# that the rate limiter holds the configured pace.
+# Run from the repo root: python -m benchmarks.bench_rest_client --strikes 41 --latency-ms 5
+import time
+import asyncio
+import argparse
+from app.noren_client import NorenRestClient
+from benchmarks.common import add_loop_argument, emit, run as run_on_loop
+from fakes.noren_api import fake_noren_api
+from fakes.noren_rest import FakeNorenRestServer
+
+
+async def run(args):
+    server = FakeNorenRestServer(latency=args.latency_ms / 1000).start()
+    try:
+        # Calls and strikes of the ladder, as the symbol master numbers them
+        ladder = [("NFO", str(40001 + i)) for i in range(args.strikes * 2)]
+
+        api = fake_noren_api(server.url, "ws://127.0.0.1:9/")
+        server.connections.clear()
+        started = time.perf_counter()
+        wheel_quotes = [await asyncio.to_thread(api.get_quotes, exchange, token) for exchange, token in ladder]
+        wheel_ms = (time.perf_counter() - started) * 1000
+        wheel_connections = len(server.connections)
+
+        client = NorenRestClient(server.url, "FAKEUSER", "fake-session-token", rate_limit=args.rate_limit,
+                                 burst=int(args.rate_limit), max_connections=args.connections)
+        try:
+            # One request to open the pool, so the timings below exclude connection setup
+            await client.get_limits()
+            server.connections.clear()
+            started = time.perf_counter()
+            quotes = await client.get_quotes_many(ladder, max_age=0)
+            cold_ms = (time.perf_counter() - started) * 1000
+            client_connections = len(server.connections)
+            started = time.perf_counter()
+            cached = await client.get_quotes_many(ladder)
+            cached_ms = (time.perf_counter() - started) * 1000
+            correct = all(
+                quote and float(quote["lp"]) == round(server.price_of(token), 2) for (_, token), quote in quotes.items()
+            ) and cached == quotes and all(wheel_quotes)
+
+            client.invalidate()
+            requests = client.requests
+            await asyncio.gather(*(client.get_limits() for _ in range(args.strikes)))
+            shared_requests = client.requests - requests
+        finally:
+            await client.close()
+
+        paced = NorenRestClient(server.url, "FAKEUSER", "fake-session-token", rate_limit=args.pace, burst=1,
+                                quote_ttl=0)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(paced.get_quotes("NFO", 40001 + i) for i in range(int(args.pace * 2))))
+            paced_rps = paced.requests / (time.perf_counter() - started)
+        finally:
+            await paced.close()
+    finally:
+        server.stop()
+
+    emit("rest_client", {
+        "quotes": len(ladder),
+        "server_latency_ms": args.latency_ms,
+        "wheel_sequential_ms": round(wheel_ms, 1),
+        "wheel_connections": wheel_connections,
+        "client_fanout_ms": round(cold_ms, 1),
+        "client_connections": client_connections,
+        "client_cached_ms": round(cached_ms, 2),
+        "speedup": round(wheel_ms / cold_ms, 1),
+        "quotes_correct": correct,
+        "concurrent_identical_reads": args.strikes,
+        "requests_for_identical_reads": shared_requests,
+        "rate_limit": args.pace,
+        "paced_requests_per_s": round(paced_rps, 1),
+    }, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the async Noren REST client.")
+    parser.add_argument("--strikes", type=int, default=41, help="Strikes in the ladder; two quotes each.")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Added to every fake REST call.")
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--rate-limit", type=float, default=1000.0, help="Client rate limit for the ladder runs.")
+    parser.add_argument("--pace", type=float, default=20.0, help="Rate limit for the pacing check.")
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    add_loop_argument(parser)
+    args = parser.parse_args()
+    run_on_loop(run(args), args.loop)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,125 @@
+# benchmarks/bench_roll.py
+# Decision-to-orders latency of the ATM roll engine, offline: fakeredis for
+# Redis, StubNorenApi for the broker socket and the fake Noren REST server for
+# the symbol master. A short NIFTY straddle is opened, then the underlying is
+# walked back and forth past the roll threshold; every crossing is one roll.
+# Also reports how many instruments each roll added or dropped at the broker.
+# Run from the repo root: python -m benchmarks.bench_roll --rolls 200
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from types import SimpleNamespace
+import fakeredis
+from app.rules import Rules
+from app.market_data_processor import MarketDataProcessor
+from app.position_manager import PositionManager
+from app.order_execution_engine import OrderExecutionEngine
+from app.websocket_manager import WebSocketManager
+from benchmarks.common import emit
+from fakes.influxdb import RecordingInfluxDBManager
+from fakes.noren_api import StubNorenApi
+
+
+class CountingNorenApi(StubNorenApi):
+    def __init__(self):
+        super().__init__()
+        self.changes = 0
+
+    def subscribe(self, instrument, feed_type='t'):
+        self.changes += len(instrument) if isinstance(instrument, list) else 1
+        super().subscribe(instrument, feed_type)
+
+    def unsubscribe(self, instrument, feed_type='t'):
+        self.changes += len(instrument) if isinstance(instrument, list) else 1
+        super().unsubscribe(instrument, feed_type)
+
+
+async def run(args):
+    from fakes.noren_rest import FakeNorenRestServer
+    server = FakeNorenRestServer().start()
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.utils reads these when first imported, and nothing above imports it
+        os.environ["NOREN_SYMBOLS_URL"] = server.url
+        os.environ["SYMBOL_CACHE_DIR"] = tmp
+        from app.utils import get_expiry_chain, get_option_symbols, get_underlying_instrument, load_symbols
+        from app.roll_engine import RollEngine
+        from app.strategies.straddle import Straddle
+        await asyncio.to_thread(load_symbols, "NFO")
+        underlying = await get_underlying_instrument("NIFTY")
+        server.stop()
+
+    config = SimpleNamespace(rules=Rules({
+        'start_time': '09:15:00', 'end_time': '15:15:00', 'tsymbol': 'NIFTY', 'quantity': 1,
+        'stop_loss_percentage': 30, 'roll_threshold_points': args.threshold, 'roll_cooldown_seconds': 0,
+        'roll_watch_strikes': args.watch,
+    }))
+    redis = fakeredis.FakeAsyncRedis()
+    api = CountingNorenApi()
+    processor = MarketDataProcessor(redis)
+    positions = PositionManager(processor, RecordingInfluxDBManager())
+    engine = OrderExecutionEngine(processor, positions, redis)
+    ws_manager = WebSocketManager(api, redis)
+    roll_engine = RollEngine(config, ws_manager, processor, engine, positions)
+    straddle = Straddle(config, api, ws_manager, processor, positions, engine, None, roll_engine=roll_engine)
+
+    center = 24000.0
+    option_symbols = await get_option_symbols("NIFTY", straddle.leg_strikes(center))
+    chain = await get_expiry_chain("NIFTY", option_symbols['sce']['Expiry'])
+    for option in chain.values():
+        await processor.update_market_data({'t': 'tk', 'e': option['Exchange'], 'tk': str(option['Token']),
+                                            'ts': option['TradingSymbol'], 'lp': '100.00'})
+    await processor.update_market_data({'t': 'tk', 'e': underlying['Exchange'], 'tk': underlying['Token'],
+                                        'ts': underlying['TradingSymbol'], 'lp': f"{center:.2f}"})
+
+    await straddle.subscribe_to_symbols(option_symbols)
+    initial = await straddle.place_initial_orders(option_symbols, 75)
+    stop_loss_orders = await straddle.place_stop_loss_orders(initial, 75)
+    await straddle._start_rolling(option_symbols, 75, center, stop_loss_orders)
+
+    api.changes = 0
+    started = time.perf_counter()
+    for i in range(args.rolls):
+        # Alternate up and down so the walk stays inside the listed strikes
+        price = center + (args.threshold + 1) * (1 if i % 2 == 0 else -1)
+        rolls = roll_engine.rolls
+        await processor.update_market_data({'t': 'tf', 'e': underlying['Exchange'], 'tk': underlying['Token'],
+                                            'lp': f"{price:.2f}"})
+        while roll_engine._rolling is not None:
+            await asyncio.sleep(0)
+        if roll_engine.rolls == rolls:
+            emit("roll", {"error": f"no roll at underlying {price}; see the app log"}, args.output)
+            return
+        center = roll_engine.center
+    elapsed = time.perf_counter() - started
+    await roll_engine.stop()
+
+    legs = {leg['TradingSymbol'] for leg in option_symbols.values()}
+    summary = roll_engine.summary()
+    emit("roll", {
+        "rolls": roll_engine.rolls,
+        "threshold": args.threshold,
+        "watch_strikes": args.watch,
+        "rolls_per_s": round(roll_engine.rolls / elapsed, 1),
+        "decision_to_orders_p50_ms": round(summary["decision_to_orders"]["p50_us"] / 1000, 3),
+        "decision_to_orders_p99_ms": round(summary["decision_to_orders"]["p99_us"] / 1000, 3),
+        "decision_to_protected_p50_ms": round(summary["decision_to_protected"]["p50_us"] / 1000, 3),
+        "decision_to_protected_p99_ms": round(summary["decision_to_protected"]["p99_us"] / 1000, 3),
+        "broker_subscription_changes_per_roll": round(api.changes / max(1, roll_engine.rolls), 2),
+        "open_legs_match": set(positions.positions) == legs,
+        "stop_losses": len(stop_loss_orders),
+    }, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ATM rolls of the straddle.")
+    parser.add_argument("--rolls", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=60.0)
+    parser.add_argument("--watch", type=int, default=1)
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
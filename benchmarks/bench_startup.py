@@ -0,0 +1,142 @@
+# benchmarks/bench_startup.py
+# Cold-start cost of simulation.py: import time, time until every startup
+# dependency (broker session, symbol masters, Redis, InfluxDB client) is ready,
+# and time until the first market-data tick reaches MarketDataProcessor.
+# Each measurement runs in a fresh interpreter against the fake Noren broker
+# (REST and WebSocket feed), with fakeredis standing in for Redis.
+# Run from the repo root: python -m benchmarks.bench_startup --runs 5 --latency-ms 50
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+IMPORT_PROBE = (
+    "import sys, time; started = time.perf_counter(); import simulation; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def run_child(args, env) -> dict:
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", *args],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+async def child_warm_up(mode: str):
+    import fakeredis
+    started = time.perf_counter()
+    import simulation
+    from app.utils import login, prefetch_symbols
+    from app.logger_setup import setup_logging
+    imported = time.perf_counter()
+    setup_logging()
+
+    simulation_manager = simulation.SimulationManager(simulation.Config("rules/tbs_rules.yaml"))
+    db_manager = simulation_manager.db_manager
+    redis_server = fakeredis.FakeServer()
+    db_manager.redis = fakeredis.FakeAsyncRedis(server=redis_server)
+    db_manager.redis_pubsub = fakeredis.FakeAsyncRedis(server=redis_server)
+    if mode == "sequential":
+        # The previous startup order: login, then symbol downloads, then connects, one after another
+        simulation_manager.api = login(simulation_manager.config)
+        prefetch_symbols(simulation_manager.config.get_rule("tsymbol"))
+        await db_manager.connect_redis()
+        await db_manager.connect_redis_pubsub()
+        simulation_manager.influxdb_manager.connect()
+        ok = simulation_manager.api is not None
+    else:
+        ok = await simulation_manager.warm_up()
+    ready = time.perf_counter()
+    first_tick = await child_first_tick(simulation_manager) if ok else None
+    print(json.dumps({"ok": ok, "import_s": imported - started, "ready_s": ready - started,
+                      "first_tick_s": first_tick - started if first_tick else None}))
+
+
+async def child_first_tick(simulation_manager) -> float:
+    from app.market_data_processor import MarketDataProcessor, market_data_key
+    from app.websocket_manager import WebSocketManager
+    from fakes.noren_rest import UNDERLYINGS
+    exchange, _, symbol, token = UNDERLYINGS["NIFTY"][:4]
+    db_manager = simulation_manager.db_manager
+    processor = MarketDataProcessor(db_manager.redis, db_manager.redis_pubsub)
+    ws_manager = WebSocketManager(simulation_manager.api, db_manager.redis)
+    await processor.connect()
+    await ws_manager.connect()
+    while not ws_manager.feed_opened:
+        await asyncio.sleep(0.001)
+    await ws_manager.subscribe_symbol(exchange, token, symbol)
+    key = market_data_key(symbol.upper().replace(" ", ""))
+    while await db_manager.redis.hget(key, "ltp") is None:
+        await asyncio.sleep(0.001)
+    first_tick = time.perf_counter()
+    await ws_manager.close()
+    await processor.close()
+    return first_tick
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark simulation startup.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--tick-rate", type=float, default=100.0, help="Fake feed ticks per second.")
+    parser.add_argument("--child", choices=("sequential", "concurrent"))
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child_warm_up(args.child))
+        return
+
+    from fakes.broker import FakeBroker
+    broker = FakeBroker(latency=args.latency_ms / 1000, rate=args.tick_rate).start()
+    tmp = tempfile.mkdtemp()
+    env = dict(
+        os.environ, **broker.env(),
+        STATE_DIR=tmp, SESSION_CACHE_FILE=os.path.join(tmp, "session.json"),
+        SYMBOL_CACHE_DIR=os.path.join(tmp, "cache"), INFLUXDB_URL="http://127.0.0.1:8086",
+        API_USER="FAKEUSER", API_PWD="fake", API_VC="FAKEUSER_U", API_KEY="fake", API_IMEI="fake",
+        API_SECRET="JBSWY3DPEHPK3PXP", LOG_DUPLICATE_INTERVAL="0",
+    )
+
+    def clear_caches():
+        shutil.rmtree(os.path.join(tmp, "cache"), ignore_errors=True)
+        if os.path.exists(env["SESSION_CACHE_FILE"]):
+            os.remove(env["SESSION_CACHE_FILE"])
+
+    import_times, sequential, cold, warm, first_ticks = [], [], [], [], []
+    try:
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            import_times.append(float(output.strip().splitlines()[-1]))
+            clear_caches()
+            sequential.append(run_child(["--child", "sequential"], env)["ready_s"])
+            clear_caches()
+            cold.append(run_child(["--child", "concurrent"], env)["ready_s"])
+            # Session token and symbol masters are now cached on disk
+            result = run_child(["--child", "concurrent"], env)
+            warm.append(result["ready_s"])
+            first_ticks.append(result["first_tick_s"])
+    finally:
+        broker.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps({
+        "benchmark": "startup",
+        "runs": args.runs,
+        "broker_latency_ms": args.latency_ms,
+        "import_simulation_ms": statistics.median(import_times) * 1000,
+        "ready_sequential_ms": statistics.median(sequential) * 1000,
+        "ready_concurrent_cold_ms": statistics.median(cold) * 1000,
+        "ready_concurrent_cached_ms": statistics.median(warm) * 1000,
+        "first_tick_cached_ms": statistics.median(first_ticks) * 1000 if None not in first_ticks else None,
+    }))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
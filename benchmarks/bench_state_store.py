@@ -0,0 +1,84 @@
+# benchmarks/bench_state_store.py
+# Run from the repo root: python -m benchmarks.bench_state_store --positions 50 --fills 20000
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from app.logger_setup import setup_logging
+from app.state_store import StateStore
+
+
+def _position_book(count):
+    return {
+        f"NIFTY24OCT{24000 + i * 50}CE": {'quantity': -75, 'entry_price': 100.0 + i, 'current_price': 101.0 + i}
+        for i in range(count)
+    }
+
+
+def _strategy_state(positions):
+    return {
+        'option_symbols': {f"leg{i}": {'TradingSymbol': symbol, 'Token': 40000 + i} for i, symbol in enumerate(positions)},
+        'final_quantity': 75,
+        'atm_strike': 24000,
+        'stop_loss_orders': [
+            {'symbol': symbol, 'sl_order_id': i, 'sl_price': 130.0} for i, symbol in enumerate(positions)
+        ],
+    }
+
+
+async def run(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as state_dir:
+        store = StateStore(state_dir, snapshot_interval=3600, fsync=not args.no_fsync)
+        store.recover()
+        store.start()
+
+        positions = _position_book(args.positions)
+        symbols = list(positions)
+        started = time.perf_counter_ns()
+        for i in range(args.fills):
+            symbol = symbols[i % len(symbols)]
+            store.record_fill(symbol, 75, 100.0, 'S', positions[symbol], float(i))
+        results['record_fill_ns_per_call'] = (time.perf_counter_ns() - started) / args.fills
+
+        state = {'positions': positions, 'realized_pnl': 0.0, 'trade_margin': 1e6, 'strategy': _strategy_state(positions)}
+        # Let the writer catch up so the timing below covers the snapshot alone
+        await store.flush()
+        started = time.perf_counter()
+        store.snapshot(state)
+        await store.flush()
+        results['snapshot_write_ms'] = (time.perf_counter() - started) * 1000
+
+        # Leave these WAL records un-snapshotted so recovery has to replay them.
+        for i in range(args.fills):
+            symbol = symbols[i % len(symbols)]
+            store.record_fill(symbol, 75, 100.0, 'S', positions[symbol], float(i))
+        started = time.perf_counter()
+        await store.close()
+        results['wal_drain_ms'] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        recovering = StateStore(state_dir)
+        recovered = recovering.recover()
+        results['recovery_ms'] = (time.perf_counter() - started) * 1000
+        results['recovered_positions'] = len(recovered.positions)
+        results['replayed_records'] = recovering.replayed_records
+        results['lost_records'] = args.fills - recovering.replayed_records
+        results['write_errors'] = store.write_errors
+
+    results.update({'benchmark': 'state_store', 'positions': args.positions, 'fills': args.fills})
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark state snapshot and recovery times.")
+    parser.add_argument('--positions', type=int, default=50)
+    parser.add_argument('--fills', type=int, default=20000)
+    parser.add_argument('--no-fsync', action='store_true')
+    setup_logging()
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,150 @@
+# benchmarks/bench_supervisor.py
+# The multi-account supervisor end to end against the fake broker: real
+# supervisor and worker processes, real SimulationManagers (paper trading a
+# NIFTY straddle plus an IV-surface chain per account) and fakeredis served over
+# TCP so pub/sub crosses processes. For each worker count it reports every
+# worker's tick throughput, loop lag and CPU, and the feed's subscription count
+# (one per instrument however many accounts hold it). Then one worker is killed
+# with SIGKILL and the time until its replacement is processing ticks again is
+# measured, while the other workers must carry on without a restart.
+# Run from the repo root: python -m benchmarks.bench_supervisor --accounts 4 --workers 1 2 4
+import os
+import sys
+import time
+import shutil
+import signal
+import asyncio
+import argparse
+import tempfile
+import threading
+from benchmarks.common import emit
+from fakes.broker import FakeBroker
+
+
+def write_files(tmp: str, accounts: int):
+    import yaml
+    with open("rules/tbs_rules.yaml") as file:
+        rules = yaml.safe_load(file)
+    now = time.localtime()
+    rules.update({
+        'tsymbol': 'NIFTY', 'send_data_to_influxdb': False, 'live_trading': False,
+        'start_time': time.strftime('%H:%M:%S', now), 'end_time': '23:59:59',
+    })
+    with open(os.path.join(tmp, "rules.yaml"), "w") as file:
+        yaml.safe_dump(rules, file)
+    with open(os.path.join(tmp, "accounts.yaml"), "w") as file:
+        yaml.safe_dump([
+            {'name': f'client{i}', 'env': {'API_USER': f'FAKE{i}', 'API_PWD': 'fake', 'API_VC': f'FAKE{i}_U',
+                                           'API_KEY': 'fake', 'API_IMEI': 'fake', 'API_SECRET': 'JBSWY3DPEHPK3PXP'}}
+            for i in range(accounts)
+        ], file)
+
+
+async def wait_for(condition, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+async def run_case(args, workers: int, tmp: str):
+    from app.config import Config
+    from app.supervisor import Supervisor
+    os.environ.update(SUPERVISOR_WORKERS=str(workers), STATE_DIR=os.path.join(tmp, f"state-{workers}"))
+    supervisor = Supervisor.from_config(Config(os.environ["RULES_FILE"]), [sys.executable, "supervisor.py"])
+    started = time.perf_counter()
+    try:
+        await supervisor.start()
+        trading = lambda: all(w.stats and w.stats['ticks_per_s'] > 0 for w in supervisor.workers)
+        if not await wait_for(trading, args.timeout):
+            emit("supervisor", {"workers": workers, "error": "not every worker got ticks",
+                                "summary": supervisor.summary()}, args.output)
+            return
+        ready_s = time.perf_counter() - started
+        # Let the reporting window fill with steady-state numbers only
+        await asyncio.sleep(args.seconds)
+        summary = supervisor.summary()
+        emit("supervisor", {
+            "workers": workers,
+            "accounts": args.accounts,
+            "ready_s": round(ready_s, 2),
+            "feed_instruments": len(supervisor.websocket_manager.subscriptions),
+            "account_holds": sum(len(held) for held in supervisor.hub.holds.values()),
+            "ticks_per_s_total": round(sum(w["ticks_per_s"] for w in summary)),
+            "per_worker": [{
+                "worker": w["worker"], "accounts": len(w["accounts"]), "ticks_per_s": round(w["ticks_per_s"]),
+                "lag_p99_ms": round(w["lag_p99_ms"], 2), "lag_max_ms": round(w["lag_max_ms"], 2),
+                "cpu_percent": round(w["cpu_percent"]),
+            } for w in summary],
+        }, args.output)
+
+        if not args.crash:
+            return
+        victim = supervisor.workers[0]
+        old_pid = victim.process.pid
+        others = {w.worker_id: w.restarts for w in supervisor.workers[1:]}
+        killed = time.perf_counter()
+        os.kill(old_pid, signal.SIGKILL)
+        released = await wait_for(lambda: not any(h.startswith("0/") for h in supervisor.hub.holds), args.timeout)
+        released_ms = (time.perf_counter() - killed) * 1000
+        respawned = await wait_for(lambda: victim.alive and victim.process.pid != old_pid, args.timeout)
+        respawn_ms = (time.perf_counter() - killed) * 1000
+        recovered = await wait_for(lambda: victim.stats and victim.stats['pid'] != old_pid
+                                   and victim.stats['ticks_per_s'] > 0, args.timeout)
+        emit("supervisor_crash", {
+            "workers": workers,
+            "holds_released": released,
+            "holds_released_ms": round(released_ms, 1),
+            "respawn_ms": round(respawn_ms, 1) if respawned else None,
+            "kill_to_ticking_ms": round((time.perf_counter() - killed) * 1000, 1) if recovered else None,
+            "restarts": victim.restarts,
+            "other_workers_restarted": any(w.restarts != others[w.worker_id] for w in supervisor.workers[1:]),
+            "feed_instruments_after": len(supervisor.websocket_manager.subscriptions),
+        }, args.output)
+    finally:
+        await supervisor.stop()
+
+
+async def run(args):
+    from fakeredis import TcpFakeServer
+    broker = FakeBroker(rate=args.rate).start()
+    redis_server = TcpFakeServer(("127.0.0.1", 0))
+    threading.Thread(target=redis_server.serve_forever, daemon=True).start()
+    tmp = tempfile.mkdtemp()
+    write_files(tmp, args.accounts)
+    # Read by the supervisor here and inherited by its workers; app.utils reads NOREN_* when first imported
+    os.environ.update(
+        broker.env(), REDIS_HOST="127.0.0.1", REDIS_PORT=str(redis_server.server_address[1]),
+        RULES_FILE=os.path.join(tmp, "rules.yaml"), ACCOUNTS_FILE=os.path.join(tmp, "accounts.yaml"),
+        SYMBOL_CACHE_DIR=os.path.join(tmp, "cache"), LOG_DIR=os.path.join(tmp, "logs"), JOURNAL_DIR="",
+        INFLUXDB_URL="http://127.0.0.1:8086", IV_SURFACE_STRIKES=str(args.chain_strikes),
+        WORKER_REPORT_INTERVAL=str(args.report_interval), WORKER_RESTART_BACKOFF="0.5",
+        RULES_RELOAD_INTERVAL="0", BAR_TIMEFRAMES="", LOG_DUPLICATE_INTERVAL="0",
+    )
+    try:
+        for workers in args.workers:
+            await run_case(args, workers, tmp)
+    finally:
+        redis_server.shutdown()
+        broker.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the multi-account supervisor.")
+    parser.add_argument("--accounts", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--rate", type=float, default=200.0, help="Fake feed ticks per second.")
+    parser.add_argument("--chain-strikes", type=int, default=5, help="IV surface strikes each side per account.")
+    parser.add_argument("--report-interval", type=float, default=1.0)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Steady-state time before sampling.")
+    parser.add_argument("--no-crash", dest="crash", action="store_false", help="Skip the worker kill.")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
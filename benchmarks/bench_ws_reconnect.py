@@ -0,0 +1,108 @@
+# benchmarks/bench_ws_reconnect.py
+# Feed outage recovery against the fake broker: the real NorenApi client reads
+# the fake Noren WebSocket, WebSocketManager publishes to fakeredis and
+# MarketDataProcessor consumes it. Each round either drops every connection
+# (network loss) or silences them while leaving them open (a hung feed), then
+# times how long until every subscribed token has ticked again. Also checks
+# that prices were flagged stale and refused while the feed was out.
+# Run from the repo root: python -m benchmarks.bench_ws_reconnect --tokens 200 --rounds 5
+import time
+import asyncio
+import argparse
+import fakeredis
+from app.market_data_processor import MarketDataProcessor
+from app.websocket_manager import WebSocketManager
+from benchmarks.common import emit
+from fakes.broker import FakeBroker
+
+
+async def wait_for(condition, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.005)
+    return True
+
+
+async def run(args):
+    broker = FakeBroker(rate=args.rate).start()
+    server = fakeredis.FakeServer()
+    redis = fakeredis.FakeAsyncRedis(server=server)
+    processor = MarketDataProcessor(redis, fakeredis.FakeAsyncRedis(server=server))
+    ws_manager = WebSocketManager(broker.api(), redis, heartbeat_interval=args.heartbeat,
+                                  stall_timeout=args.stall_timeout, reconnect_backoff=args.backoff)
+    await processor.connect()
+    await ws_manager.connect()
+    try:
+        if not await wait_for(lambda: ws_manager.feed_opened, 10):
+            emit("ws_reconnect", {"error": "feed never opened"}, args.output)
+            return
+        await ws_manager.subscribe_many(
+            [("NFO", 100000 + i, f"NFO{100000 + i}") for i in range(args.tokens)]
+        )
+        if not await wait_for(lambda: len(processor.token_symbol_map) >= args.tokens, 10):
+            emit("ws_reconnect", {"error": "not every token ticked after subscribing"}, args.output)
+            return
+
+        for scenario in args.scenarios:
+            for _ in range(args.rounds):
+                gaps = len(ws_manager.gaps)
+                started = time.perf_counter()
+                if scenario == "drop":
+                    broker.feed.drop_connections()
+                else:
+                    broker.feed.stall_connections()
+                flagged = await wait_for(lambda: processor.stale_symbols, args.stall_timeout + 5)
+                stale_seen = len(processor.stale_symbols)
+                symbol = next(iter(processor.stale_symbols), None)
+                refused = symbol is not None and await processor.get_ltp(symbol) is None
+                recovered = await wait_for(lambda: len(ws_manager.gaps) > gaps, args.timeout)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if not recovered:
+                    emit("ws_reconnect", {"scenario": scenario, "error": "feed did not recover",
+                                          "waited_ms": round(elapsed_ms)}, args.output)
+                    return
+                gap = ws_manager.gaps[-1]
+                # The processor sees the fresh ticks after the manager does; wait until it has unflagged them all
+                cleared = await wait_for(lambda: not processor.stale_symbols, args.timeout)
+                cleared_ms = (time.perf_counter() - started) * 1000
+                emit("ws_reconnect", {
+                    "scenario": scenario,
+                    "tokens": args.tokens,
+                    "detected": gap["reason"],
+                    "stale_flagged": stale_seen if flagged else 0,
+                    "stale_price_refused": refused,
+                    "reopen_ms": round(gap["reopen_ms"], 1) if gap["reopen_ms"] is not None else None,
+                    "recovery_ms": round(gap["recovery_ms"], 1),
+                    "max_token_gap_ms": round(gap["max_token_gap_ms"], 1),
+                    "restarts": gap["restarts"],
+                    "fault_to_recovered_ms": round(elapsed_ms, 1),
+                    "fault_to_stale_cleared_ms": round(cleared_ms, 1) if cleared else None,
+                }, args.output)
+                # Let ticks settle before the next fault
+                await asyncio.sleep(args.settle)
+    finally:
+        await ws_manager.close()
+        await processor.close()
+        ws_manager.api.close_websocket()
+        broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feed outage detection and recovery.")
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=100.0, help="Fake feed ticks per second.")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--scenarios", nargs="+", default=["drop", "stall"], choices=["drop", "stall"])
+    parser.add_argument("--heartbeat", type=float, default=0.1)
+    parser.add_argument("--stall-timeout", type=float, default=1.0)
+    parser.add_argument("--backoff", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--settle", type=float, default=0.5)
+    parser.add_argument("--output", help="Also append results to this JSONL file.")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,151 @@
+# benchmarks/common.py
+# Shared pieces for the benchmarks: synthetic tick generation, rate pacing and
+# result output. Every result is one JSON object per line on stdout, optionally
+# appended to a JSONL file so runs can be compared over time.
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from typing import Any, Coroutine, Dict, Iterator, List, Optional, Tuple
+from app.metrics import LatencyHistogram
+
+
+class TickGenerator:
+    """Noren-style touchline ticks following geometric Brownian motion per instrument.
+
+    The first tick of each token is a full `tk` acknowledgement carrying the
+    trading symbol; later ones are `tf` updates with only the token, like the
+    real feed.
+    """
+
+    def __init__(self, instruments: List[Tuple[str, str, str, float]], volatility: float = 0.2,
+                 ticks_per_second: float = 1000.0, seed: int = 7):
+        # instruments: (exchange, token, trading symbol, starting price)
+        self.instruments = instruments
+        self.prices = [price for _, _, _, price in instruments]
+        self._seen = set()
+        self._random = random.Random(seed)
+        # One step per tick, scaled so a trading year of ticks carries `volatility`
+        steps_per_year = ticks_per_second * 6.25 * 3600 * 250 / max(1, len(instruments))
+        self._sigma = volatility / math.sqrt(steps_per_year)
+
+    def __iter__(self) -> Iterator[dict]:
+        while True:
+            yield self.next_tick()
+
+    def next_tick(self) -> dict:
+        index = self._random.randrange(len(self.instruments))
+        exchange, token, symbol, _ = self.instruments[index]
+        sigma = self._sigma
+        price = self.prices[index] * math.exp(-0.5 * sigma * sigma + sigma * self._random.gauss(0.0, 1.0))
+        self.prices[index] = price
+        tick = {'e': exchange, 'tk': token, 'lp': f"{price:.2f}", 'ft': str(int(time.time())), 'v': '1'}
+        if token in self._seen:
+            tick['t'] = 'tf'
+        else:
+            self._seen.add(token)
+            tick['t'] = 'tk'
+            tick['ts'] = symbol
+        return tick
+
+
+def option_instruments(count: int, base_price: float = 100.0) -> List[Tuple[str, str, str, float]]:
+    """`count` NIFTY weekly option legs alternating CE/PE around 24000."""
+    instruments = []
+    for i in range(count):
+        strike = 24000 + (i // 2) * 50
+        option_type = 'C' if i % 2 == 0 else 'P'
+        instruments.append(('NFO', str(40000 + i), f"NIFTY24OCT{option_type}{strike}", base_price + i))
+    return instruments
+
+
+class Pacer:
+    """Holds a loop to `rate` operations per second; a rate of 0 runs flat out.
+
+    Checks the schedule every `batch` operations, so pacing costs next to
+    nothing at high rates.
+    """
+
+    def __init__(self, rate: float, batch: int = 50):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.batch = batch if rate > 0 else 0
+        self.started = time.perf_counter()
+        self.count = 0
+
+    def _delay(self) -> float:
+        self.count += 1
+        if not self.batch or self.count % self.batch:
+            return 0.0
+        return self.started + self.count * self.interval - time.perf_counter()
+
+    def wait(self):
+        delay = self._delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        delay = self._delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def throughput_result(case: str, hist: LatencyHistogram, elapsed: float, **extra) -> dict:
+    summary = hist.summary()
+    result = {
+        "case": case,
+        "ops": hist.count,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_per_s": round(hist.count / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_us": round(summary["mean_us"], 2),
+        "p50_us": round(summary["p50_us"], 2),
+        "p99_us": round(summary["p99_us"], 2),
+        "max_us": round(summary["max_us"], 2),
+    }
+    result.update(extra)
+    return result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+_run_info: Dict[str, object] = {}
+# Set by run(); benchmarks started with plain asyncio.run leave it out of their results
+_event_loop: Optional[str] = None
+
+
+def add_loop_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--loop", choices=("asyncio", "uvloop"), default="asyncio",
+                        help="Event loop to run the benchmark on.")
+
+
+def run(main: Coroutine[Any, Any, Any], loop: str = "asyncio") -> Any:
+    """Runs a benchmark's coroutine on `loop` and tags everything it emits with the loop actually used."""
+    global _event_loop
+    from app import event_loop
+    _event_loop = event_loop.resolve(loop)
+    if _event_loop != loop:
+        print(f"{loop} is not installed; running on {_event_loop}.", file=sys.stderr)
+    return event_loop.run(main, _event_loop)
+
+
+def emit(benchmark: str, result: dict, output: Optional[str] = None):
+    """Prints `result` as one JSON line tagged with the run's time, git revision and interpreter."""
+    if not _run_info:
+        _run_info.update(git_rev=_git_revision(), python=platform.python_version(),
+                         implementation=sys.implementation.name)
+    tags = dict(_run_info, event_loop=_event_loop) if _event_loop else _run_info
+    line = json.dumps(dict({"benchmark": benchmark, "ts": round(time.time(), 3)}, **result, **tags))
+    print(line, flush=True)
+    if output:
+        with open(output, "a") as f:
+            f.write(line + "\n")
\ No newline at end of file
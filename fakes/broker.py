@@ -0,0 +1,75 @@
+# fakes/broker.py
+# The fake REST server and the fake WebSocket feed wired together: the feed
+# prices tokens from the REST symbol masters, REST quotes and market fills
+# follow the feed, and REST order events go out as `om` messages on the feed.
+#
+# To run simulation.py unchanged against it:
+#   python -m fakes.broker --rate 5000 --burst-every 30
+# then export the NOREN_* variables it prints before starting the simulation.
+import time
+import argparse
+from typing import Optional
+from fakes.noren_rest import FakeNorenRestServer
+from fakes.noren_ws import FakeNorenFeedServer, load_replay
+
+
+class FakeBroker:
+    def __init__(self, host: str = "127.0.0.1", rest_port: int = 0, ws_port: int = 0, latency: float = 0.0,
+                 replay_file: Optional[str] = None, **feed_options):
+        self.rest = FakeNorenRestServer(host, rest_port, latency=latency)
+        self.feed = FakeNorenFeedServer(
+            host, ws_port, instruments=self.rest.instrument, prices=self.rest.prices,
+            replay=load_replay(replay_file) if replay_file else None, **feed_options
+        )
+        self.rest.on_order_update = self.feed.publish_order_update
+
+    def start(self) -> "FakeBroker":
+        self.rest.start()
+        self.feed.start()
+        return self
+
+    def stop(self):
+        self.feed.stop()
+        self.rest.stop()
+
+    def env(self) -> dict:
+        return {"NOREN_HOST": self.rest.url, "NOREN_SYMBOLS_URL": self.rest.url, "NOREN_WEBSOCKET": self.feed.url}
+
+    def api(self):
+        from fakes.noren_api import fake_noren_api
+        return fake_noren_api(self.rest.url, self.feed.url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake Noren REST API and market-data feed.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--rest-port", type=int, default=8000)
+    parser.add_argument("--ws-port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Ticks per second per connection.")
+    parser.add_argument("--volatility", type=float, default=0.2)
+    parser.add_argument("--burst-every", type=float, default=0.0, help="Seconds between bursts; 0 disables them.")
+    parser.add_argument("--burst-seconds", type=float, default=1.0)
+    parser.add_argument("--burst-multiplier", type=float, default=10.0)
+    parser.add_argument("--replay", help="CSV of exchange,token,price rows to replay instead of random prices.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every REST call.")
+    args = parser.parse_args()
+
+    broker = FakeBroker(
+        args.host, args.rest_port, args.ws_port, latency=args.latency_ms / 1000, replay_file=args.replay,
+        rate=args.rate, volatility=args.volatility, burst_every=args.burst_every,
+        burst_seconds=args.burst_seconds, burst_multiplier=args.burst_multiplier,
+    ).start()
+    for name, value in broker.env().items():
+        print(f"export {name}={value}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"feed sent: {dict(broker.feed.sent)}, REST calls: {dict(broker.rest.requests)}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,39 @@
+# fakes/influxdb.py
+# InfluxDBManager that builds points exactly as the real one does but hands them
+# to an in-memory write API, optionally sleeping to mimic a synchronous HTTP
+# write to the server.
+import time
+from app.influxdb_manager import InfluxDBManager
+
+
+class RecordingWriteApi:
+    def __init__(self, latency: float = 0.0, keep: bool = False):
+        self.latency = latency
+        self.keep = keep
+        self.writes = 0
+        self.points = 0
+        self.records = []
+
+    def write(self, bucket, org, record):
+        if self.latency:
+            time.sleep(self.latency)
+        records = record if isinstance(record, list) else [record]
+        self.writes += 1
+        self.points += len(records)
+        if self.keep:
+            self.records.extend(records)
+
+
+class RecordingInfluxDBManager(InfluxDBManager):
+    def __init__(self, latency: float = 0.0, keep: bool = False, send_data_to_influxdb: bool = True):
+        super().__init__("http://influxdb.invalid", "fake-token", "fake-org", "fake-bucket", send_data_to_influxdb)
+        self.write_api = RecordingWriteApi(latency, keep)
+
+    def connect(self):
+        return self.write_api
+
+    def query_data(self, measurement, start="-1h"):
+        return iter(())
+
+    def close(self):
+        pass
\ No newline at end of file
@@ -0,0 +1,56 @@
+# fakes/noren_api.py
+# Broker API stand-ins. StubNorenApi is in-process with no sockets: benchmarks
+# push ticks and order updates straight into the callbacks registered through
+# start_websocket(), the way NorenApi's websocket thread would. fake_noren_api()
+# is the real NorenApi client pointed at the fake REST and WebSocket servers.
+import threading
+from typing import Callable, Dict, Optional
+
+
+def fake_noren_api(rest_url: str, ws_url: str, userid: str = "FAKEUSER", susertoken: str = "fake-session-token"):
+    """A logged-in NorenApi for SimulationManager(config, api=...), talking to fakes.broker."""
+    from NorenRestApiPy.NorenApi import NorenApi
+    api = NorenApi(host=rest_url, websocket=ws_url)
+    api.set_session(userid, "fake", susertoken)
+    # Same attributes login() sets, used by the order gateway
+    api.host = rest_url
+    api.userid = userid
+    api.susertoken = susertoken
+    return api
+
+
+class StubNorenApi:
+    def __init__(self, prices: Optional[Dict[str, float]] = None):
+        self.prices: Dict[str, float] = dict(prices or {})
+        self.subscriptions = set()
+        self.on_feed: Optional[Callable[[dict], None]] = None
+        self.on_order: Optional[Callable[[dict], None]] = None
+        self.opened = threading.Event()
+
+    def start_websocket(self, order_update_callback=None, subscribe_callback=None, socket_open_callback=None,
+                        socket_close_callback=None, socket_error_callback=None):
+        self.on_order = order_update_callback
+        self.on_feed = subscribe_callback
+        self.opened.set()
+        if socket_open_callback:
+            socket_open_callback()
+
+    def subscribe(self, instrument, feed_type='t'):
+        for key in instrument if isinstance(instrument, list) else [instrument]:
+            self.subscriptions.add(key)
+
+    def unsubscribe(self, instrument, feed_type='t'):
+        for key in instrument if isinstance(instrument, list) else [instrument]:
+            self.subscriptions.discard(key)
+
+    def get_quotes(self, exchange, token):
+        price = self.prices.get(str(token))
+        if price is None:
+            return {"stat": "Not_Ok", "emsg": "no data"}
+        return {"stat": "Ok", "exch": exchange, "token": str(token), "lp": f"{price:.2f}"}
+
+    def push_tick(self, tick: dict):
+        self.on_feed(tick)
+
+    def push_order_update(self, order: dict):
+        self.on_order(order)
\ No newline at end of file
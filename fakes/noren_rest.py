@@ -0,0 +1,236 @@
+# fakes/noren_rest.py
+# Local stand-in for the Noren REST API, for exercising the order gateway and
+# REST clients without a broker. Speaks the same `jData=<json>&jKey=<token>`
+# form bodies and HTTP/1.1 keep-alive as the real endpoint.
+import io
+import json
+import math
+import time
+import random
+import urllib.parse
+import zipfile
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+# tsymbol: (underlying exchange, instrument, symbol, token, price, strike step, option exchange, lot size)
+UNDERLYINGS = {
+    'NIFTY': ('NSE', 'INDEX', 'Nifty 50', '26000', 24010.0, 50, 'NFO', 75),
+    'BANKNIFTY': ('NSE', 'INDEX', 'Nifty Bank', '26009', 51230.0, 100, 'NFO', 15),
+    'CRUDEOIL': ('MCX', 'FUTCOM', 'CRUDEOIL', '430000', 6020.0, 50, 'MCX', 100),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, a kept-alive
+    # client's delayed ACK would hold every response back ~40 ms
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        data = self.server.fake.symbol_master(self.path.rstrip("/").rsplit("/", 1)[-1])
+        self.send_response(200 if data else 404)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(len(data or b"")))
+        self.end_headers()
+        self.wfile.write(data or b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        route = self.path.rstrip("/").rsplit("/", 1)[-1]
+        result = self.server.fake.handle(route, body, self.client_address)
+        data = json.dumps(result).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeNorenRestServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 default_price: float = 100.0, reject_symbols=(), fail_routes=()):
+        self.latency = latency
+        self.default_price = default_price
+        self.reject_symbols = set(reject_symbols)
+        # Routes that answer Not_Ok, as the broker does for a bad session or an outage
+        self.fail_routes = set(fail_routes)
+        self.prices: Dict[str, float] = {}
+        self.orders: Dict[str, dict] = {}
+        self.requests = Counter()
+        self.connections = set()
+        self.on_order_update: Optional[Callable[[dict], None]] = None
+        self._order_seq = 24000000000000
+        self._symbol_masters: Dict[str, bytes] = {}
+        self._instruments: Dict[Tuple[str, str], Tuple[str, float, int]] = {}
+        for underlying in UNDERLYINGS.values():
+            self.prices.setdefault(underlying[3], underlying[4])
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeNorenRestServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-noren-rest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+    def price_of(self, key: str) -> float:
+        return self.prices.get(key, self.default_price)
+
+    # --- Symbol masters ---
+
+    def symbol_master(self, file_name: str) -> Optional[bytes]:
+        """Zipped `<EXCH>_symbols.txt` covering UNDERLYINGS, with 20 strikes either side of each price."""
+        exchange = file_name.split("_", 1)[0]
+        if not file_name.endswith("_symbols.txt.zip") or exchange not in ("NSE", "NFO", "MCX"):
+            return None
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if exchange not in self._symbol_masters:
+                self._symbol_masters[exchange] = self._build_symbol_master(exchange)
+            return self._symbol_masters[exchange]
+
+    def instrument(self, exchange: str, token: str) -> Optional[Tuple[str, float, int]]:
+        """(trading symbol, fair price, lot size) of a token in the symbol masters, for the fake feed."""
+        with self._lock:
+            if exchange in ("NSE", "NFO", "MCX") and exchange not in self._symbol_masters:
+                self._symbol_masters[exchange] = self._build_symbol_master(exchange)
+            return self._instruments.get((exchange, str(token)))
+
+    def _build_symbol_master(self, exchange: str) -> bytes:
+        expiry = (date.today() + timedelta(days=(3 - date.today().weekday()) % 7)).strftime("%d-%b-%Y").upper()
+        if exchange == "NSE":
+            lines = ["Exchange,Token,LotSize,Symbol,TradingSymbol,Instrument,TickSize"]
+        else:
+            lines = ["Exchange,Token,LotSize,Symbol,TradingSymbol,Expiry,Instrument,OptionType,StrikePrice,TickSize"]
+        token = 40000
+        for tsymbol, (exch, instrument, symbol, und_token, price, step, opt_exch, lot) in UNDERLYINGS.items():
+            if exch == exchange == "NSE":
+                lines.append(f"NSE,{und_token},1,{symbol},{symbol.upper().replace(' ', '')},{instrument},0.05")
+                self._instruments[(exchange, und_token)] = (symbol.upper().replace(' ', ''), price, 1)
+            if exch == exchange == "MCX":
+                lines.append(f"MCX,{und_token},{lot},{symbol},{tsymbol}{expiry[3:6]}FUT,{expiry},{instrument},XX,0,1")
+                self._instruments[(exchange, und_token)] = (f"{tsymbol}{expiry[3:6]}FUT", price, lot)
+            if opt_exch != exchange:
+                continue
+            atm = round(price / step) * step
+            for strike in range(int(atm - 20 * step), int(atm + 21 * step), step):
+                for option_type in ("CE", "PE"):
+                    token += 1
+                    instname = "OPTIDX" if exchange == "NFO" else "OPTFUT"
+                    trading_symbol = f"{tsymbol}{expiry[:2]}{expiry[3:6]}{option_type[0]}{strike}"
+                    lines.append(f"{exchange},{token},{lot},{tsymbol},{trading_symbol},"
+                                 f"{expiry},{instname},{option_type},{strike},0.05")
+                    intrinsic = max(0.0, price - strike if option_type == "CE" else strike - price)
+                    # Rough weekly time value: ~0.4% of spot at the money, fading away from it
+                    time_value = 0.004 * price * math.exp(-abs(strike - price) / (0.02 * price))
+                    self._instruments[(exchange, str(token))] = (trading_symbol, round(intrinsic + time_value, 2), lot)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr(f"{exchange}_symbols.txt", "\n".join(lines) + "\n")
+        return buffer.getvalue()
+
+    # --- Request handling ---
+
+    def handle(self, route: str, body: str, client_address) -> object:
+        if self.latency:
+            time.sleep(self.latency)
+        values = {}
+        if body.startswith("jData="):
+            # Form-decoded as the real server does, so an unquoted symbol like M&M comes apart here too
+            values = json.loads(urllib.parse.parse_qs(body)["jData"][0])
+        with self._lock:
+            self.requests[route] += 1
+            self.connections.add(client_address)
+        if route in self.fail_routes:
+            return {"stat": "Not_Ok", "emsg": f"{route} unavailable"}
+        handler = getattr(self, f"_route_{route}", None)
+        if handler is None:
+            return {"stat": "Not_Ok", "emsg": f"Unknown route {route}"}
+        return handler(values)
+
+    def _route_QuickAuth(self, values):
+        return {"stat": "Ok", "susertoken": "fake-session-token", "uname": values.get("uid"),
+                "request_time": time.strftime("%H:%M:%S %d-%m-%Y")}
+
+    def _route_GetQuotes(self, values):
+        token = str(values.get("token"))
+        price = self.price_of(token)
+        return {"stat": "Ok", "exch": values.get("exch"), "token": token, "lp": f"{price:.2f}",
+                "bp1": f"{price - 0.05:.2f}", "sp1": f"{price + 0.05:.2f}", "request_time": time.strftime("%H:%M:%S")}
+
+    def _route_Limits(self, values):
+        return {"stat": "Ok", "actid": values.get("actid"), "cash": "1000000.00", "marginused": "0.00"}
+
+    def _route_SpanCalc(self, values):
+        legs = max(1, len(values.get("pos", [])))
+        return {"stat": "Ok", "span": f"{60000.0 * legs:.2f}", "expo": f"{20000.0 * legs:.2f}",
+                "span_trade": f"{60000.0 * legs:.2f}", "expo_trade": f"{20000.0 * legs:.2f}"}
+
+    def _route_PlaceOrder(self, values):
+        tsym = values.get("tsym")
+        if tsym in self.reject_symbols:
+            return {"stat": "Not_Ok", "emsg": f"Order rejected for {tsym}"}
+        with self._lock:
+            self._order_seq += 1
+            norenordno = str(self._order_seq)
+        order = {
+            "norenordno": norenordno, "tsym": tsym, "exch": values.get("exch"), "trantype": values.get("trantype"),
+            "qty": values.get("qty"), "prctyp": values.get("prctyp"), "prc": values.get("prc"),
+            "trgprc": values.get("trgprc"), "remarks": values.get("remarks"), "status": "OPEN",
+        }
+        self.orders[norenordno] = order
+        self._emit(order)
+        if order["prctyp"] == "MKT":
+            price = self.price_of(tsym) * (1 + random.uniform(-0.001, 0.001))
+            order.update({"status": "COMPLETE", "fillshares": order["qty"], "avgprc": f"{price:.2f}", "flprc": f"{price:.2f}"})
+            self._emit(order)
+        return {"stat": "Ok", "norenordno": norenordno, "request_time": time.strftime("%H:%M:%S")}
+
+    def _route_ModifyOrder(self, values):
+        order = self.orders.get(values.get("norenordno"))
+        if not order or order["status"] in ("COMPLETE", "CANCELED", "REJECTED"):
+            return {"stat": "Not_Ok", "emsg": "Order not modifiable"}
+        order.update({"qty": values.get("qty"), "prctyp": values.get("prctyp"), "prc": values.get("prc"),
+                      "trgprc": values.get("trgprc", order.get("trgprc"))})
+        self._emit(order)
+        return {"stat": "Ok", "result": order["norenordno"]}
+
+    def _route_CancelOrder(self, values):
+        order = self.orders.get(values.get("norenordno"))
+        if not order or order["status"] in ("COMPLETE", "CANCELED", "REJECTED"):
+            return {"stat": "Not_Ok", "emsg": "Order not cancellable"}
+        order["status"] = "CANCELED"
+        self._emit(order)
+        return {"stat": "Ok", "result": order["norenordno"]}
+
+    def _route_OrderBook(self, values):
+        return list(self.orders.values()) or {"stat": "Not_Ok", "emsg": "no data"}
+
+    def _route_SingleOrdHist(self, values):
+        order = self.orders.get(values.get("norenordno"))
+        return [dict(order, stat="Ok")] if order else {"stat": "Not_Ok", "emsg": "no data"}
+
+    def _emit(self, order: dict):
+        if self.on_order_update:
+            self.on_order_update(dict(order, t="om"))
\ No newline at end of file
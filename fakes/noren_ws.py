@@ -0,0 +1,396 @@
+# fakes/noren_ws.py
+# Local stand-in for the Noren market-data WebSocket. Implements just enough of
+# RFC 6455 for websocket-client (handshake, masked client frames, ping/pong,
+# close) and the Noren feed protocol: `c` login, `t`/`u` touchline, `d`/`ud`
+# depth subscriptions and `om` order updates. Subscribed tokens get `tk`/`dk`
+# acknowledgements followed by `tf`/`df` updates whose prices follow geometric
+# Brownian motion, or a replayed price file, at a configurable rate with
+# optional bursts.
+import json
+import math
+import time
+import base64
+import random
+import struct
+import asyncio
+import hashlib
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+# (exchange, token) -> (trading symbol, starting price, lot size), or None when unknown
+InstrumentLookup = Callable[[str, str], Optional[Tuple[str, float, int]]]
+
+
+def _unmask(payload: bytes, mask: bytes) -> bytes:
+    if not payload:
+        return payload
+    repeated = (mask * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(payload), "big")
+
+
+def encode_frame(payload: bytes, opcode: int = OP_TEXT) -> bytes:
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[bool, int, bytes]:
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = _unmask(payload, mask)
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class _Quote:
+    __slots__ = ("exchange", "token", "symbol", "lot", "open", "high", "low", "close", "price", "volume")
+
+    def __init__(self, exchange: str, token: str, symbol: str, price: float, lot: int):
+        self.exchange = exchange
+        self.token = token
+        self.symbol = symbol
+        self.lot = lot
+        self.open = self.high = self.low = self.close = self.price = price
+        self.volume = 0
+
+    def move(self, price: float, volume: int):
+        self.price = price
+        self.volume += volume
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+
+    def touchline(self, full: bool, feed_time: str) -> dict:
+        change = (self.price - self.close) / self.close * 100 if self.close else 0.0
+        tick = {"t": "tk" if full else "tf", "e": self.exchange, "tk": self.token, "lp": f"{self.price:.2f}",
+                "pc": f"{change:.2f}", "v": str(self.volume), "ft": feed_time}
+        if full:
+            tick.update(ts=self.symbol, ti="0.05", ls=str(self.lot), pp="2", o=f"{self.open:.2f}",
+                        h=f"{self.high:.2f}", l=f"{self.low:.2f}", c=f"{self.close:.2f}")
+        return tick
+
+    def depth(self, full: bool, feed_time: str, levels: int) -> dict:
+        tick = self.touchline(full, feed_time)
+        tick["t"] = "dk" if full else "df"
+        spread = max(0.05, round(self.price * 0.0002 / 0.05) * 0.05)
+        for level in range(1, (levels if full else 1) + 1):
+            tick[f"bp{level}"] = f"{self.price - spread * level:.2f}"
+            tick[f"sp{level}"] = f"{self.price + spread * level:.2f}"
+            tick[f"bq{level}"] = str(self.lot * (10 + 7 * level))
+            tick[f"sq{level}"] = str(self.lot * (12 + 5 * level))
+        return tick
+
+
+class _Connection:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.logged_in = False
+        # Stalled connections stay open and answer pings but get no feed messages
+        self.stalled = False
+        self.touchline: Set[Tuple[str, str]] = set()
+        self.depth: Set[Tuple[str, str]] = set()
+        # Touchline and depth subscriptions together, in subscription order
+        self.keys: List[Tuple[str, str]] = []
+
+
+class FakeNorenFeedServer:
+    """Fake Noren WebSocket feed running on its own thread and event loop.
+
+    `rate` is ticks per second per connection, spread at random over the
+    connection's subscribed tokens. Every `burst_every` seconds the rate is
+    multiplied by `burst_multiplier` for `burst_seconds`. `instruments` looks
+    up symbol, price and lot size for a token (FakeNorenRestServer.instrument
+    fits); unknown tokens get a made-up symbol and `default_price`. With
+    `replay`, prices come from that iterable of (exchange, token, price)
+    instead of the random walk.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, rate: float = 1000.0, volatility: float = 0.2,
+                 burst_every: float = 0.0, burst_seconds: float = 1.0, burst_multiplier: float = 10.0,
+                 instruments: Optional[InstrumentLookup] = None, default_price: float = 100.0,
+                 replay: Optional[Iterator[Tuple[str, str, float]]] = None, depth_levels: int = 5,
+                 prices: Optional[Dict[str, float]] = None, step_interval: float = 0.005, seed: int = 7):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.volatility = volatility
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self.burst_multiplier = burst_multiplier
+        self.instruments = instruments
+        self.default_price = default_price
+        self.replay = replay
+        self.depth_levels = depth_levels
+        # Shared with FakeNorenRestServer.prices so quotes and market fills follow the feed
+        self.prices = prices if prices is not None else {}
+        self.step_interval = step_interval
+        self.sent = Counter()
+        self.quotes: Dict[Tuple[str, str], _Quote] = {}
+        self._random = random.Random(seed)
+        self._connections: Set[_Connection] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._started_at = 0.0
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
+    def start(self) -> "FakeNorenFeedServer":
+        self._thread = threading.Thread(target=self._run, name="fake-noren-ws", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self
+
+    def stop(self):
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def publish_order_update(self, order: dict):
+        """Sends an `om` message to every logged-in connection. Safe from any thread."""
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._send_order_update, dict(order, t="om"))
+
+    def drop_connections(self):
+        """Aborts every client connection without a close frame, like a network drop. Safe from any thread."""
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._drop_connections)
+
+    def stall_connections(self):
+        """Silences the current connections while leaving them open, like a feed that hangs. New ones are served."""
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._stall_connections)
+
+    def _drop_connections(self):
+        for connection in list(self._connections):
+            connection.writer.transport.abort()
+            self._connections.discard(connection)
+
+    def _stall_connections(self):
+        for connection in self._connections:
+            connection.stalled = True
+
+    def current_rate(self) -> float:
+        if self.burst_every > 0 and (time.monotonic() - self._started_at) % self.burst_every < self.burst_seconds:
+            return self.rate * self.burst_multiplier
+        return self.rate
+
+    # --- Server loop ---
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started_at = time.monotonic()
+        feed = self._loop.create_task(self._feed())
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            feed.cancel()
+            self._server.close()
+            for connection in list(self._connections):
+                connection.writer.close()
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            if not await self._handshake(reader, writer):
+                return
+            connection = _Connection(writer)
+            self._connections.add(connection)
+            try:
+                await self._serve(reader, connection)
+            finally:
+                self._connections.discard(connection)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        request = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        headers = {}
+        for line in request.split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        await writer.drain()
+        return True
+
+    async def _serve(self, reader: asyncio.StreamReader, connection: _Connection):
+        fragments = []
+        while True:
+            fin, opcode, payload = await read_frame(reader)
+            if opcode == OP_CLOSE:
+                connection.writer.write(encode_frame(payload[:2], OP_CLOSE))
+                return
+            if opcode == OP_PING:
+                connection.writer.write(encode_frame(payload, OP_PONG))
+                continue
+            if opcode == OP_PONG:
+                continue
+            fragments.append(payload)
+            if not fin:
+                continue
+            message, fragments = b"".join(fragments), []
+            try:
+                self._on_message(connection, json.loads(message))
+            except (ValueError, KeyError) as e:
+                self._send(connection, {"t": "er", "emsg": str(e)})
+
+    def _on_message(self, connection: _Connection, message: dict):
+        if connection.stalled:
+            return
+        kind = message.get("t")
+        if kind == "c":
+            connection.logged_in = bool(message.get("uid") and message.get("susertoken"))
+            self._send(connection, {"t": "ck", "s": "OK" if connection.logged_in else "NOT_OK",
+                                    "uid": message.get("uid")})
+            return
+        if kind == "h" or not connection.logged_in:
+            return
+        if kind == "o":
+            # Order updates already go to every logged-in session, as with the real feed
+            self._send(connection, {"t": "ok"})
+            return
+        keys = [tuple(key.split("|", 1)) for key in message.get("k", "").split("#") if "|" in key]
+        if kind in ("t", "d"):
+            feed_time = str(int(time.time()))
+            subscriptions = connection.touchline if kind == "t" else connection.depth
+            for key in keys:
+                quote = self._quote(*key)
+                if key not in connection.touchline and key not in connection.depth:
+                    connection.keys.append(key)
+                subscriptions.add(key)
+                ack = quote.touchline(True, feed_time) if kind == "t" else quote.depth(True, feed_time, self.depth_levels)
+                self._send(connection, ack)
+        elif kind in ("u", "ud"):
+            subscriptions = connection.touchline if kind == "u" else connection.depth
+            for key in keys:
+                subscriptions.discard(key)
+                if key not in connection.touchline and key not in connection.depth and key in connection.keys:
+                    connection.keys.remove(key)
+            self._send(connection, {"t": "uk" if kind == "u" else "udk", "k": message.get("k", "")})
+
+    def _quote(self, exchange: str, token: str) -> _Quote:
+        quote = self.quotes.get((exchange, token))
+        if quote is None:
+            known = self.instruments(exchange, token) if self.instruments else None
+            symbol, price, lot = known or (f"{exchange}{token}", self.default_price, 1)
+            quote = self.quotes[(exchange, token)] = _Quote(exchange, token, symbol, price, lot)
+        return quote
+
+    def _send(self, connection: _Connection, message: dict):
+        connection.writer.write(encode_frame(json.dumps(message).encode()))
+        self.sent[message["t"]] += 1
+
+    def _send_order_update(self, message: dict):
+        for connection in self._connections:
+            if connection.logged_in and not connection.stalled:
+                self._send(connection, message)
+
+    # --- Tick generation ---
+
+    async def _feed(self):
+        owed = {}
+        next_step = time.monotonic()
+        while True:
+            next_step += self.step_interval
+            await asyncio.sleep(max(0.0, next_step - time.monotonic()))
+            if time.monotonic() - next_step > 1.0:
+                # Fell far behind (loop stalled); drop the backlog instead of bursting to catch up
+                next_step = time.monotonic()
+            per_step = self.current_rate() * self.step_interval
+            feed_time = str(int(time.time()))
+            for connection in list(self._connections):
+                keys = connection.keys
+                if not keys or connection.stalled:
+                    continue
+                owed[connection] = owed.get(connection, 0.0) + per_step
+                count = int(owed[connection])
+                owed[connection] -= count
+                frames = [self._next_tick(connection, keys, feed_time) for _ in range(count)]
+                frames = [frame for frame in frames if frame]
+                if frames:
+                    connection.writer.write(b"".join(frames))
+                    try:
+                        await connection.writer.drain()
+                    except ConnectionError:
+                        self._connections.discard(connection)
+            for connection in list(owed):
+                if connection not in self._connections:
+                    del owed[connection]
+
+    def _next_tick(self, connection: _Connection, keys: List[Tuple[str, str]], feed_time: str) -> Optional[bytes]:
+        if self.replay is not None:
+            try:
+                exchange, token, price = next(self.replay)
+            except StopIteration:
+                self.replay = None
+                return None
+            key = (exchange, str(token))
+            if key not in connection.touchline and key not in connection.depth:
+                return None
+        else:
+            key = keys[self._random.randrange(len(keys))]
+            price = None
+        quote = self.quotes[key] if key in self.quotes else self._quote(*key)
+        if price is None:
+            # Each token takes about rate / len(keys) steps per second over a 6.25 hour session
+            steps_per_year = max(1.0, self.rate / len(keys)) * 6.25 * 3600 * 250
+            sigma = self.volatility / math.sqrt(steps_per_year)
+            price = max(0.05, quote.price * math.exp(-0.5 * sigma * sigma + sigma * self._random.gauss(0.0, 1.0)))
+        quote.move(float(price), quote.lot * self._random.randint(1, 20))
+        self.prices[quote.token] = self.prices[quote.symbol] = quote.price
+        tick = quote.depth(False, feed_time, 1) if key in connection.depth else quote.touchline(False, feed_time)
+        self.sent[tick["t"]] += 1
+        return encode_frame(json.dumps(tick).encode())
+
+
+def load_replay(path: str, loop: bool = True) -> Iterator[Tuple[str, str, float]]:
+    """Reads `exchange,token,price` rows (header optional) for FakeNorenFeedServer(replay=...)."""
+    rows = []
+    with open(path) as f:
+        for line in f:
+            parts = [part.strip() for part in line.split(",")]
+            if len(parts) < 3:
+                continue
+            try:
+                rows.append((parts[0], parts[1], float(parts[2])))
+            except ValueError:
+                continue  # header
+    while rows:
+        yield from rows
+        if not loop:
+            return
\ No newline at end of file
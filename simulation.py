@@ -1,23 +1,47 @@
 import redis.asyncio as aioredis
 import os
+import time
 import asyncio
-from app.logger_setup import app_logger
+from app.logger_setup import app_logger, setup_logging
 from app.position_manager import PositionManager
 from app.websocket_manager import WebSocketManager
 from app.market_data_processor import MarketDataProcessor
 from app.order_execution_engine import OrderExecutionEngine
 from app.config import Config
-from app.utils import login
+from app.utils import login, prefetch_symbols, get_underlying_price, get_option_chain, uses_fake_broker
 from app.influxdb_manager import InfluxDBManager
 from app.margin_calculator import MarginCalculator
 from app.strategies.straddle import Straddle
 from app.database_manager import DatabaseManager
+from app.state_store import StateStore
+from app.journal import TradeJournal
+from app.bars import BarBuilder
+from app.iv_surface import IVSurface
+from app.roll_engine import RollEngine
+from app.portfolio_rules import PortfolioExitRules
+from app.order_id_allocator import OrderIdAllocator
+from app.order_gateway import NorenOrderGateway
+from app.noren_client import NorenRestClient
+from app.shared_feed import SharedFeed
+from app.latency import TickLatencyTracker
+from app.diagnostics import Diagnostics
+from app.rules import RulesWatcher
+from app.clock import Clock, RealClock, SimulatedClock
+from app import event_loop
 from datetime import datetime, timedelta
 
 class SimulationManager:
-    def __init__(self, config: Config, api):
+    def __init__(self, config: Config, api=None, clock: Clock = None, feed_holder: str = None,
+                 market_data_processor: MarketDataProcessor = None):
         self.config = config
         self.api = api
+        self.clock = clock or RealClock()
+        # Set under the supervisor: market data comes from its shared feed, and this is the name holds go under
+        self.feed_holder = feed_holder
+        # A worker's accounts read one processor it owns, so each tick is applied to Redis once per worker
+        self.shared_market_data_processor = market_data_processor
+        self.account = config.get_account_name()
+        self._warmed_up = False
         self.db_manager = DatabaseManager(config)
         influxdb_config = self.config.get_influxdb_config()
         self.influxdb_manager = InfluxDBManager(
@@ -25,58 +49,292 @@ class SimulationManager:
             token=influxdb_config.get('token'),
             org=influxdb_config.get('org'),
             bucket=influxdb_config.get('bucket'),
-            send_data_to_influxdb=config.get_rule('send_data_to_influxdb')
+            send_data_to_influxdb=config.rules.send_data_to_influxdb
         )
+        self.state_store = StateStore(**self.config.get_state_config())
+        journal_config = self.config.get_journal_config()
+        self.journal = TradeJournal(time_source=self.clock.time, **journal_config) if journal_config['root'] else None
+        self.bar_config = self.config.get_bar_config()
+        self.bar_builder = BarBuilder(
+            self.bar_config['timeframes'], self.bar_config['history'],
+            persist=config.rules.send_data_to_influxdb and self.bar_config['persist_interval'] > 0,
+            time_source=self.clock.time
+        ) if self.bar_config['timeframes'] else None
+        self._bar_timers = []
+        self.iv_surface_config = self.config.get_iv_surface_config()
+        self.iv_surface = IVSurface(
+            rate=self.iv_surface_config['rate'], refit_fraction=self.iv_surface_config['refit_fraction'],
+            time_source=self.clock.time
+        ) if self.iv_surface_config['strikes_each_side'] > 0 else None
+        self._iv_timer = None
+        self.recovered_state = None
+        self._metrics_timer = None
+        reload_interval = self.config.get_rules_reload_interval()
+        self.rules_watcher = RulesWatcher(config, reload_interval) if reload_interval > 0 else None
+        sample_every = self.config.get_latency_sample_every()
+        self.latency_tracker = TickLatencyTracker(sample_every) if sample_every > 0 else None
+        diagnostics_config = self.config.get_diagnostics_config()
+        self.diagnostics = (
+            Diagnostics(self.influxdb_manager, **{k: v for k, v in diagnostics_config.items() if k != 'enabled'})
+            if diagnostics_config['enabled'] else None
+        )
+        self.order_id_allocator: OrderIdAllocator = None
+        self.order_gateway: NorenOrderGateway = None
+        self.rest_client: NorenRestClient = None
         self.redis: aioredis.Redis = None
         self.market_data_processor: MarketDataProcessor = None
         self.position_manager: PositionManager = None
         self.order_execution_engine: OrderExecutionEngine = None
         self.websocket_manager: WebSocketManager = None
+        self.feed = None
         self.margin_calculator: MarginCalculator = None
+        self.roll_engine: RollEngine = None
+        self.portfolio_rules: PortfolioExitRules = None
         self.strategy: Straddle = None
 
+    async def warm_up(self) -> bool:
+        """Runs the slow startup I/O concurrently: broker login, symbol masters, Redis and InfluxDB."""
+        started = time.perf_counter()
+        steps = {
+            'login': asyncio.to_thread(login, self.config) if self.api is None else None,
+            'symbols': asyncio.to_thread(prefetch_symbols, self.config.rules.tsymbol),
+            'redis': self.db_manager.connect_redis(),
+            'redis_pubsub': self.db_manager.connect_redis_pubsub(),
+            'influxdb': asyncio.to_thread(self._connect_influxdb),
+        }
+        steps = {name: step for name, step in steps.items() if step is not None}
+        results = dict(zip(steps, await asyncio.gather(*steps.values(), return_exceptions=True)))
+
+        ok = True
+        for name, result in results.items():
+            if isinstance(result, BaseException):
+                app_logger.error(f"Startup step '{name}' failed: {result}")
+                ok = False
+        if 'login' in results:
+            self.api = results['login'] if not isinstance(results['login'], BaseException) else None
+        if self.api is None:
+            app_logger.error("Broker login failed.")
+            ok = False
+        if results['symbols'] is False:
+            # Not fatal: the strategy retries the download when it looks symbols up
+            app_logger.warning("Symbol masters could not be preloaded.")
+        self._warmed_up = ok
+        app_logger.info(f"Startup warm-up finished in {time.perf_counter() - started:.2f}s.")
+        return ok
+
+    def _connect_influxdb(self):
+        self.influxdb_manager.connect()
+        influxdb_config = self.config.get_influxdb_config()
+        if self.config.rules.send_data_to_influxdb and influxdb_config['downsample_every']:
+            self.influxdb_manager.ensure_downsampling_tasks(
+                influxdb_config['downsample_every'], influxdb_config['downsample_bucket']
+            )
+
     async def setup(self):
+        if not self._warmed_up and not await self.warm_up():
+            raise RuntimeError("Startup warm-up failed.")
         app_logger.info("Setting up simulation components...")
+        if self.diagnostics:
+            self.diagnostics.start()
         self.redis = await self.db_manager.connect_redis()
-        self.market_data_processor = MarketDataProcessor(self.redis)
-        self.position_manager = PositionManager(self.market_data_processor, self.influxdb_manager)
-        self.order_execution_engine = OrderExecutionEngine(self.market_data_processor, self.position_manager, self.redis)
-        self.websocket_manager = WebSocketManager(self.api, self.redis)
-        self.margin_calculator = MarginCalculator(self.api, self.config.get_user_credentials())
+        redis_pubsub = await self.db_manager.connect_redis_pubsub()
+        redis_metrics = self.db_manager.redis_metrics
+        if self.shared_market_data_processor:
+            self.market_data_processor = self.shared_market_data_processor
+            if self.bar_builder:
+                self.market_data_processor.add_bar_builder(self.bar_builder)
+        else:
+            self.market_data_processor = MarketDataProcessor(
+                self.redis, redis_pubsub, redis_metrics, self.latency_tracker, self.clock, self.bar_builder
+            )
+        self.position_manager = PositionManager(
+            self.market_data_processor, self.influxdb_manager, self.state_store, self.journal
+        )
+        self.order_id_allocator = OrderIdAllocator(
+            self.redis, block_size=self.config.get_order_id_block_size(), metrics=redis_metrics
+        )
+        await self.order_id_allocator.prime()
+        self.rest_client = NorenRestClient.from_api(self.api, **self.config.get_rest_config())
+        if self.config.rules.live_trading:
+            self.order_gateway = NorenOrderGateway.from_api(
+                self.api, order_channel=self.order_channel, **self.config.get_broker_config()
+            )
+            await self.order_gateway.start(redis_pubsub)
+            app_logger.info("Live trading enabled. Orders are routed to the broker.")
+        self.order_execution_engine = OrderExecutionEngine(
+            self.market_data_processor, self.position_manager, self.redis, redis_metrics,
+            self.order_id_allocator, self.order_gateway, namespace=self.account
+        )
+        self.portfolio_rules = PortfolioExitRules(self.config, self.order_execution_engine)
+        self.position_manager.subscribe_pnl(self.portfolio_rules.on_pnl)
+        self.market_data_processor.subscribe_ticks(self.position_manager.on_tick)
+        # On a shared feed the account's own socket is only needed for its order updates
+        if not self.feed_holder or self.config.rules.live_trading:
+            self.websocket_manager = WebSocketManager(
+                self.api, self.redis, redis_metrics, self.latency_tracker, order_channel=self.order_channel,
+                **self.config.get_websocket_config()
+            )
+        self.feed = (
+            SharedFeed(self.redis, self.feed_holder, self.config.get_shared_feed_sync_interval())
+            if self.feed_holder else self.websocket_manager
+        )
+        self.margin_calculator = MarginCalculator(self.api, self.config.get_user_credentials(), self.rest_client)
+        self.roll_engine = RollEngine(
+            self.config, self.feed, self.market_data_processor, self.order_execution_engine,
+            self.position_manager, self.clock
+        )
         self.strategy = Straddle(
-            self.config, self.api, self.websocket_manager, self.market_data_processor,
-            self.position_manager, self.order_execution_engine, self.margin_calculator
+            self.config, self.api, self.feed, self.market_data_processor,
+            self.position_manager, self.order_execution_engine, self.margin_calculator, self.state_store, self.clock,
+            self.roll_engine, self.rest_client
         )
-        await self.market_data_processor.connect()
-        await self.websocket_manager.connect()
+        await self.restore_state()
+        self.state_store.start()
+        self.state_store.start_periodic_snapshots(self.capture_state)
+        if self.journal:
+            self.journal.start()
+        if not self.shared_market_data_processor:
+            await self.market_data_processor.connect()
+        if self.websocket_manager:
+            await self.websocket_manager.connect()
+        if self.feed is not self.websocket_manager:
+            await self.feed.connect()
+        self._metrics_timer = self.clock.call_every(10.0, self.report_metrics)
+        if self.bar_builder:
+            self._bar_timers.append(self.clock.call_every(self.bar_builder.timeframes[0], self.bar_builder.sweep))
+            if self.bar_builder.persist:
+                self._bar_timers.append(self.clock.call_every(self.bar_config['persist_interval'], self.persist_bars))
+        if self.rules_watcher:
+            self.rules_watcher.start()
+
+    @property
+    def order_channel(self) -> str:
+        return f'order_updates:{self.account}' if self.account else 'order_updates'
+
+    def report_metrics(self):
+        self.db_manager.redis_metrics.export(self.influxdb_manager)
+        if self.latency_tracker:
+            self.latency_tracker.export(self.influxdb_manager)
+        if self.roll_engine:
+            self.roll_engine.export(self.influxdb_manager, reset=False)
+
+    async def start_iv_surface(self):
+        """Subscribes the option chain around the money and keeps the IV surface fitted from its ticks."""
+        tsymbol = self.config.rules.tsymbol
+        try:
+            underlying = await get_underlying_price(tsymbol, self.rest_client.get_quotes)
+        except Exception as e:
+            app_logger.error(f"IV surface disabled: no underlying price for {tsymbol}: {e}")
+            return
+        chain = await get_option_chain(
+            tsymbol, underlying, self.iv_surface_config['strikes_each_side'], self.iv_surface_config['expiries']
+        )
+        if not chain:
+            app_logger.error(f"IV surface disabled: no option chain for {tsymbol}.")
+            return
+        self.iv_surface.set_forward(underlying)
+        for option in chain:
+            self.iv_surface.add_option(option['TradingSymbol'], option['Expiry'].to_pydatetime(),
+                                       option['StrikePrice'], option['OptionType'])
+            await self.feed.subscribe_symbol(option['Exchange'], option['Token'], option['TradingSymbol'])
+        self.market_data_processor.subscribe_ticks(self.iv_surface.on_price)
+        self._iv_timer = self.clock.call_every(self.iv_surface_config['refit_interval'], self.iv_surface.refit)
+        app_logger.info(f"IV surface tracking {len(chain)} options of {tsymbol} around {underlying}.")
+
+    async def persist_bars(self):
+        await asyncio.to_thread(self.bar_builder.export, self.influxdb_manager)
+
+    async def restore_state(self):
+        recovered = self.state_store.recover()
+        keep_order_ids = []
+        if recovered:
+            self.position_manager.restore(recovered.positions, recovered.realized_pnl, recovered.trade_margin)
+            if recovered.strategy and recovered.positions:
+                self.recovered_state = recovered
+                keep_order_ids = [sl['sl_order_id'] for sl in recovered.strategy['stop_loss_orders']]
+        await self.order_execution_engine.purge_orphan_orders(keep_order_ids)
+
+    def capture_state(self):
+        state = self.position_manager.capture_state()
+        state['strategy'] = self.strategy.capture_state()
+        return state
+
+    def detach_market_data(self):
+        processor = self.shared_market_data_processor
+        if self.position_manager:
+            processor.unsubscribe_ticks(self.position_manager.on_tick)
+        if self.iv_surface:
+            processor.unsubscribe_ticks(self.iv_surface.on_price)
+        if self.bar_builder:
+            processor.remove_bar_builder(self.bar_builder)
 
     async def cleanup(self):
+        if self._metrics_timer:
+            self._metrics_timer.cancel()
+        for timer in self._bar_timers:
+            timer.cancel()
+        if self._iv_timer:
+            self._iv_timer.cancel()
+        if self.bar_builder and self.bar_builder.persist:
+            self.bar_builder.sweep()
+            await self.persist_bars()
+        if self.rules_watcher:
+            await self.rules_watcher.stop()
+        if self.roll_engine:
+            await self.roll_engine.stop()
+        if self.portfolio_rules:
+            await self.portfolio_rules.close()
+        if self.position_manager and self.strategy:
+            await self.state_store.close(self.capture_state())
+        if self.journal:
+            await self.journal.close()
+        if self.order_id_allocator:
+            await self.order_id_allocator.close()
+        if self.order_gateway:
+            await self.order_gateway.close()
+        if self.rest_client:
+            await self.rest_client.close()
+        if self.feed and self.feed is not self.websocket_manager:
+            await self.feed.close()
         if self.websocket_manager:
             await self.websocket_manager.close()
-        if self.market_data_processor:
+        if self.shared_market_data_processor:
+            self.detach_market_data()
+        elif self.market_data_processor:
             await self.market_data_processor.close()
+        # Diagnostics writes its last report through InfluxDB, so it stops first
+        if self.diagnostics:
+            await self.diagnostics.stop()
         if self.influxdb_manager:
             self.influxdb_manager.close()
         if self.db_manager:
             await self.db_manager.close()
+        self.clock.close()
 
     async def run(self):
         app_logger.info("Starting simulation.")
         try:
             await self.setup()
 
-            while not self.websocket_manager.feed_opened:
+            while not self.feed.feed_opened:
                 app_logger.debug("Waiting for WebSocket feed to open...")
                 await asyncio.sleep(0.1)
             
             app_logger.info("WebSocket connected. Proceeding with simulation.")
 
+            if self.iv_surface:
+                await self.start_iv_surface()
+
+            end_time = self.config.rules.end_time
+            if self.recovered_state:
+                await self.strategy.resume(self.recovered_state.strategy, end_time)
+                return
+
             option_symbols, final_quantity, final_trade_margin, atm_strike = await self.strategy.setup()
             if not option_symbols or final_quantity <= 0:
                 app_logger.error("Strategy setup failed. Aborting simulation.")
                 return
 
-            end_time = datetime.strptime(self.config.get_rule('end_time'), '%H:%M:%S').time()
             await self.strategy.execute(option_symbols, final_quantity, atm_strike, end_time)
 
         except Exception as e:
@@ -84,17 +342,31 @@ class SimulationManager:
         finally:
             await self.cleanup()
 
-async def main():
-    rules_file = os.environ.get('RULES_FILE', '/app/creds/tbs_rules.yaml')
-    config = Config(rules_file)
-    api = login(config)
-    
-    simulation = SimulationManager(config, api)
+def build_clock(config: Config) -> Clock:
+    clock_config = config.get_clock_config()
+    if clock_config['mode'] != 'simulated':
+        return RealClock()
+    if config.rules.live_trading:
+        app_logger.error("The simulated clock is for simulation runs only; using the real clock for live trading.")
+        return RealClock()
+    if not uses_fake_broker():
+        app_logger.error("The simulated clock needs the fake broker and feed (NOREN_HOST and NOREN_WEBSOCKET "
+                         "exported by fakes.broker); using the real clock.")
+        return RealClock()
+    start = clock_config['start']
+    start = datetime.fromisoformat(start) if start else datetime.combine(datetime.now().date(), config.rules.start_time)
+    app_logger.info(f"Running on a simulated clock starting at {start}.")
+    return SimulatedClock(start=start)
+
+async def main(config: Config):
+    simulation = SimulationManager(config, clock=build_clock(config))
+    if not await simulation.warm_up():
+        await simulation.cleanup()
+        return
     
-    start_time_str = config.get_rule('start_time')
-    start_time = datetime.strptime(start_time_str, '%H:%M:%S').time()
-    now = datetime.now()
-    today_start_time = datetime.combine(now.date(), start_time)
+    start_time = config.rules.start_time
+    now = simulation.clock.now()
+    today_start_time = simulation.clock.at_time_of_day(start_time)
     
     if now > today_start_time:
         start_datetime = today_start_time + timedelta(days=1)
@@ -104,10 +376,15 @@ async def main():
     delay = (start_datetime - now).total_seconds()
     
     if delay > 0:
-        app_logger.info(f"Waiting for {delay:.2f} seconds until start time: {start_time_str}")
-        # await asyncio.sleep(delay)
+        app_logger.info(f"Waiting for {delay:.2f} seconds until start time: {start_time}")
+        # await simulation.clock.sleep_until(start_datetime)
     
-    await simulation.run()
+    if isinstance(simulation.clock, SimulatedClock):
+        await simulation.clock.run(simulation.run())
+    else:
+        await simulation.run()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    setup_logging()
+    config = Config(os.environ.get('RULES_FILE', '/app/creds/tbs_rules.yaml'))
+    event_loop.run(main(config), config.get_event_loop())
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+import sys
+import signal
+import asyncio
+import argparse
+from typing import List
+from app.logger_setup import app_logger, setup_logging
+from app.config import Config
+from app import event_loop
+from app.database_manager import DatabaseManager
+from app.market_data_processor import MarketDataProcessor
+from app.supervisor import Supervisor, WorkerReporter, account_env, load_accounts
+from simulation import SimulationManager
+
+RULES_FILE = os.environ.get('RULES_FILE', '/app/creds/tbs_rules.yaml')
+
+
+async def run_worker(worker_id: int, names: List[str]):
+    """One worker process: a SimulationManager per account, all on the supervisor's shared feed."""
+    config = Config(RULES_FILE)
+    supervisor_config = config.get_supervisor_config()
+    accounts = {account['name']: account for account in load_accounts(supervisor_config['accounts_file'])}
+    db_manager = DatabaseManager(config)
+    redis = await db_manager.connect_redis()
+    # Every account sees the same feed, so the worker applies each tick once for all of them
+    market_data_processor = MarketDataProcessor(
+        redis, await db_manager.connect_redis_pubsub(), db_manager.redis_metrics
+    )
+    await market_data_processor.connect()
+    simulations = [
+        SimulationManager(
+            Config(accounts[name].get('rules_file', RULES_FILE), account_env(accounts[name])),
+            feed_holder=f'{worker_id}/{name}', market_data_processor=market_data_processor
+        )
+        for name in names
+    ]
+    reporter = WorkerReporter(
+        redis, worker_id, names, lambda: market_data_processor.ticks, supervisor_config['report_interval']
+    )
+    reporter.start()
+    runs = asyncio.gather(*(simulation.run() for simulation in simulations))
+    # SIGTERM from the supervisor cancels the runs, so every account still cleans up and snapshots its state
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, runs.cancel)
+    try:
+        await runs
+    except asyncio.CancelledError:
+        app_logger.info(f"Worker {worker_id} stopped.")
+    finally:
+        await reporter.stop()
+        await market_data_processor.close()
+        await db_manager.close()
+
+
+async def run_supervisor():
+    config = Config(RULES_FILE)
+    supervisor = Supervisor.from_config(config, [sys.executable, os.path.abspath(__file__)])
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await supervisor.start()
+        finished = asyncio.create_task(supervisor.wait())
+        stopped = asyncio.create_task(stop.wait())
+        await asyncio.wait([finished, stopped], return_when=asyncio.FIRST_COMPLETED)
+        stopped.cancel()
+    except Exception as e:
+        app_logger.error(f"Supervisor failed: {e}", exc_info=True)
+    finally:
+        await supervisor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every account in ACCOUNTS_FILE on one shared feed.")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--accounts", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    setup_logging()
+    # Workers inherit EVENT_LOOP from the supervisor's environment
+    loop = Config(RULES_FILE).get_event_loop()
+    if args.worker is not None:
+        event_loop.run(run_worker(args.worker, args.accounts.split(',')), loop)
+    else:
+        event_loop.run(run_supervisor(), loop)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,99 @@
+# tests/test_noren_client.py
+# NorenRestClient against the local fake Noren REST server.
+import time
+import asyncio
+import pytest
+from app.noren_client import NorenRestClient
+from fakes.noren_rest import FakeNorenRestServer
+
+
+@pytest.fixture
+def server():
+    server = FakeNorenRestServer().start()
+    yield server
+    server.stop()
+
+
+def run_with_client(server, test, **kwargs):
+    async def main():
+        client = NorenRestClient(server.url, "FAKEUSER", "fake-session-token", **kwargs)
+        try:
+            return await test(client)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def test_quotes_limits_and_span(server):
+    server.prices["40001"] = 123.45
+
+    async def test(client):
+        return (await client.get_quotes("NFO", 40001), await client.get_limits(),
+                await client.span_calculator([{"exch": "NFO", "tsym": "A"}, {"exch": "NFO", "tsym": "B"}]))
+
+    quote, limits, span = run_with_client(server, test)
+    assert quote["lp"] == "123.45" and quote["token"] == "40001"
+    assert limits["cash"] == "1000000.00"
+    assert float(span["span"]) == 120000.0 and float(span["expo"]) == 40000.0
+
+
+def test_quotes_many_returns_each_instrument(server):
+    ladder = [("NFO", str(40001 + i)) for i in range(10)]
+    for i, (_, token) in enumerate(ladder):
+        server.prices[token] = 100.0 + i
+
+    quotes = run_with_client(server, lambda client: client.get_quotes_many(ladder))
+    assert [float(quotes[instrument]["lp"]) for instrument in ladder] == [100.0 + i for i in range(10)]
+
+
+def test_cached_reads_are_reused_within_ttl(server):
+    async def test(client):
+        first = await client.get_quotes("NFO", 40001)
+        second = await client.get_quotes("NFO", 40001)
+        assert second == first and server.requests["GetQuotes"] == 1 and client.cache_hits == 1
+        await client.get_quotes("NFO", 40001, max_age=0)
+        assert server.requests["GetQuotes"] == 2
+        time.sleep(0.1)
+        await client.get_quotes("NFO", 40001)
+        assert server.requests["GetQuotes"] == 3
+
+    run_with_client(server, test, quote_ttl=0.05)
+
+
+def test_identical_reads_in_flight_share_one_request(server):
+    server.latency = 0.05
+
+    async def test(client):
+        return await asyncio.gather(*(client.get_limits() for _ in range(10)))
+
+    results = run_with_client(server, test)
+    assert server.requests["Limits"] == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_failed_reads_return_none_and_are_not_cached(server):
+    server.fail_routes.add("Limits")
+
+    async def test(client):
+        assert await client.get_limits() is None
+        assert await client.get_limits() is None
+        assert server.requests["Limits"] == 2
+        server.fail_routes.clear()
+        assert (await client.get_limits())["stat"] == "Ok"
+
+    run_with_client(server, test)
+
+
+def test_unreachable_server_returns_none():
+    server = FakeNorenRestServer()
+    url = server.url
+    server.stop()
+
+    async def main():
+        client = NorenRestClient(url, "FAKEUSER", "fake-session-token", timeout=1)
+        try:
+            return await client.get_quotes("NFO", 40001)
+        finally:
+            await client.close()
+
+    assert asyncio.run(main()) is None
\ No newline at end of file
@@ -0,0 +1,105 @@
+# tests/test_order_gateway.py
+# NorenOrderGateway against the local fake Noren REST server, with order updates
+# coming back over fakeredis the way WebSocketManager republishes them.
+import json
+import asyncio
+import fakeredis
+import pytest
+from app.models import OrderStatus
+from app.order_gateway import NorenOrderGateway, TERMINAL_STATUSES
+from fakes.noren_rest import FakeNorenRestServer
+
+ORDER = {"symbol": "NIFTY24OCT24000CE", "exchange": "NFO", "direction": "S", "quantity": 75, "order_type": "MKT"}
+
+
+@pytest.fixture
+def server():
+    server = FakeNorenRestServer().start()
+    yield server
+    server.stop()
+
+
+def run_with_gateway(server, test):
+    async def main():
+        redis = fakeredis.FakeAsyncRedis()
+        loop = asyncio.get_running_loop()
+        server.on_order_update = lambda update: asyncio.run_coroutine_threadsafe(
+            redis.publish("order_updates", json.dumps(update)), loop
+        )
+        gateway = NorenOrderGateway(server.url, "FAKEUSER", "fake-session-token")
+        await gateway.start(redis)
+        try:
+            return await test(gateway)
+        finally:
+            await gateway.close()
+    return asyncio.run(main())
+
+
+def test_market_order_resolves_on_fill(server):
+    server.prices["NIFTY24OCT24000CE"] = 120.0
+
+    async def test(gateway):
+        norenordno = await gateway.place_order(dict(ORDER, order_id=1))
+        update = await gateway.wait_for_status(norenordno, TERMINAL_STATUSES, timeout=5)
+        return norenordno, update, gateway
+
+    norenordno, update, gateway = run_with_gateway(server, test)
+    assert update["status"] == OrderStatus.COMPLETE
+    assert update["norenordno"] == norenordno
+    assert abs(float(update["avgprc"]) - 120.0) < 0.2
+    assert server.orders[norenordno]["remarks"] == "1"
+    assert gateway._status_waiters == {}
+
+
+def test_stop_loss_is_modified_and_cancelled(server):
+    async def test(gateway):
+        norenordno = await gateway.place_order(dict(ORDER, direction="B", order_type="SL-M", trigger_price=130.0))
+        opened = await gateway.wait_for_status(norenordno, (OrderStatus.OPEN,), timeout=5)
+        modified = await gateway.modify_order(norenordno, "NFO", ORDER["symbol"], 75, "SL-M", trigger_price=131.5)
+        cancelled = await gateway.cancel_order(norenordno)
+        update = await gateway.wait_for_status(norenordno, TERMINAL_STATUSES, timeout=5)
+        return norenordno, opened, modified, cancelled, update, gateway
+
+    norenordno, opened, modified, cancelled, update, gateway = run_with_gateway(server, test)
+    assert opened["status"] == OrderStatus.OPEN and opened["trgprc"] == "130.0"
+    assert modified["stat"] == "Ok" and server.orders[norenordno]["trgprc"] == "131.5"
+    assert cancelled["stat"] == "Ok"
+    assert update["status"] == OrderStatus.CANCELLED
+    assert gateway.orders[norenordno]["status"] == OrderStatus.CANCELLED
+    assert gateway._status_waiters == {}
+
+
+def test_order_without_trigger_price_sends_no_trgprc(server):
+    async def test(gateway):
+        return await gateway.place_order(dict(ORDER, order_id=2))
+
+    norenordno = run_with_gateway(server, test)
+    assert server.orders[norenordno]["trgprc"] is None
+
+
+def test_symbol_with_ampersand_reaches_the_broker_intact(server):
+    async def test(gateway):
+        norenordno = await gateway.place_order(dict(ORDER, symbol="M&M-EQ", exchange="NSE", order_type="SL-M",
+                                                    direction="B", trigger_price=3000.0))
+        await gateway.modify_order(norenordno, "NSE", "M&M-EQ", 75, "SL-M", trigger_price=3010.0)
+        return norenordno
+
+    norenordno = run_with_gateway(server, test)
+    assert server.orders[norenordno]["tsym"] == "M&M-EQ"
+    assert server.orders[norenordno]["trgprc"] == "3010.0"
+
+
+def test_rejected_order_returns_none(server):
+    server.reject_symbols.add(ORDER["symbol"])
+    assert run_with_gateway(server, lambda gateway: gateway.place_order(ORDER)) is None
+
+
+def test_wait_for_status_timeout_leaves_no_waiter(server):
+    async def test(gateway):
+        norenordno = await gateway.place_order(dict(ORDER, order_type="SL-M", trigger_price=130.0))
+        update = await gateway.wait_for_status(norenordno, TERMINAL_STATUSES, timeout=0.05)
+        return update, gateway
+
+    update, gateway = run_with_gateway(server, test)
+    assert update is None
+    assert gateway._status_waiters == {}
\ No newline at end of file